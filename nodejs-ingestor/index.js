@@ -6,6 +6,7 @@ const app = express();
 const PORT = process.env.PORT || 3000;
 const RABBITMQ_URL = process.env.RABBITMQ_URL || 'amqp://localhost';
 const EXCHANGE_NAME = 'motor.alerts';
+const READINGS_EXCHANGE_NAME = 'motor.readings';
 
 // Middleware
 app.use(cors());
@@ -19,6 +20,7 @@ async function connectRabbitMQ() {
     const connection = await amqp.connect(RABBITMQ_URL);
     channel = await connection.createChannel();
     await channel.assertExchange(EXCHANGE_NAME, 'fanout', { durable: true });
+    await channel.assertExchange(READINGS_EXCHANGE_NAME, 'fanout', { durable: true });
     console.log('Connected to RabbitMQ');
   } catch (error) {
     console.error('Failed to connect to RabbitMQ:', error);
@@ -89,7 +91,9 @@ async function publishAlert(alert) {
   if (channel) {
     try {
       const message = JSON.stringify(alert);
-      channel.publish(EXCHANGE_NAME, '', Buffer.from(message));
+      // The routing key is ignored by the fanout exchange; the processor's
+      // sharded mode hashes it so each motor's alerts stay on one shard
+      channel.publish(EXCHANGE_NAME, alert.motorId, Buffer.from(message));
       console.log('Alert published to RabbitMQ:', alert);
     } catch (error) {
       console.error('Failed to publish alert to RabbitMQ:', error);
@@ -99,6 +103,21 @@ async function publishAlert(alert) {
   }
 }
 
+// Publish every valid reading to RabbitMQ for the processor's raw reading
+// aggregates (--mode readings). Not logged per reading: there are far more
+// readings than alerts
+function publishReading(data) {
+  if (channel) {
+    try {
+      const { motorId, timestamp, vibration, temperature } = data;
+      const message = JSON.stringify({ motorId, timestamp, vibration, temperature });
+      channel.publish(READINGS_EXCHANGE_NAME, String(motorId), Buffer.from(message));
+    } catch (error) {
+      console.error('Failed to publish reading to RabbitMQ:', error);
+    }
+  }
+}
+
 // API endpoint for sensor data
 app.post('/api/sensor', async (req, res) => {
   try {
@@ -108,6 +127,8 @@ app.post('/api/sensor', async (req, res) => {
       return res.status(400).json({ error: validation.error });
     }
     
+    publishReading(req.body);
+    
     // Check thresholds
     const alerts = checkThresholds(req.body);
     
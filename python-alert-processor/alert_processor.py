@@ -1,16 +1,30 @@
+import argparse
+import functools
 import json
 import logging
+import os
+import queue
 import signal
 import sys
+import threading
 import time
-from datetime import datetime
-from typing import Dict, Any
-
-import pika
-from pika.exceptions import AMQPConnectionError, AMQPChannelError
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, Any, Union
 
+import codec
+import metrics
+import retry
+import timeseries
+from backends import AlertStore, Broker, PikaBroker
+from cache import RecentAlertCache
+from coalescer import AlertCoalescer
 from config import Config
 from database import DatabaseManager
+from flow import FlowController
+from notifier import NotificationPublisher
+from spill import START, SpillLog
+from timeseries import TimeSeriesStore
 
 # Configure logging
 logging.basicConfig(
@@ -19,13 +33,138 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+REQUIRED_FIELDS = ('motorId', 'timestamp', 'sensorType', 'value', 'alertType')
+_REQUIRED_FIELD_SET = frozenset(REQUIRED_FIELDS)
+
+def validate_alert(alert_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate a decoded alert message and convert it to store fields.
+    
+    Raises ValueError or KeyError for an invalid message. Also used by the
+    bulk backfill for CSV rows, whose values are all strings.
+    """
+    # Validate required fields (one set check on the common path; the
+    # ordered scan names the first missing field)
+    if type(alert_data) is not dict or not alert_data.keys() >= _REQUIRED_FIELD_SET:
+        for field in REQUIRED_FIELDS:
+            if field not in alert_data:
+                raise ValueError(f"Missing required field: {field}")
+    
+    # Parse timestamp
+    timestamp = codec.parse_timestamp(alert_data['timestamp'])
+    
+    return {
+        'motor_id': alert_data['motorId'],
+        'sensor_type': alert_data['sensorType'],
+        'timestamp': timestamp,
+        'value': float(alert_data['value']),
+        'alert_type': alert_data['alertType']
+    }
+
+def parse_alert_message(message_body: Union[bytes, str]) -> Dict[str, Any]:
+    """Parse alert message from JSON (shared by every processor engine)"""
+    try:
+        return validate_alert(codec.loads(message_body))
+    except (json.JSONDecodeError, ValueError, KeyError) as e:
+        logger.error(f"Failed to parse alert message: {e}")
+        raise
+
+def build_notification(alert_data: Dict[str, Any], alert_id: int) -> Dict[str, Any]:
+    """Build the notification published to motor.notifications for a stored alert"""
+    return {
+        'alertId': alert_id,
+        'motorId': alert_data['motor_id'],
+        'sensorType': alert_data['sensor_type'],
+        'timestamp': alert_data['timestamp'].isoformat(),
+        'value': alert_data['value'],
+        'alertType': alert_data['alert_type'],
+        'processedAt': datetime.utcnow().isoformat()
+    }
+
+def build_episode_notification(episode) -> Dict[str, Any]:
+    """Build the notification published when a coalesced alert episode closes"""
+    return {
+        'episodeId': episode.episode_id,
+        'alertId': episode.alert_id,
+        'motorId': episode.motor_id,
+        'sensorType': episode.sensor_type,
+        'alertType': episode.alert_type,
+        'count': episode.count,
+        'maxValue': episode.max_value,
+        'firstTimestamp': episode.first_timestamp.isoformat(),
+        'lastTimestamp': episode.last_timestamp.isoformat(),
+        'processedAt': datetime.utcnow().isoformat()
+    }
+
 class AlertProcessor:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, broker: Broker = None, store: AlertStore = None):
         self.config = config
-        self.db_manager = DatabaseManager(config)
+        self.broker = broker or PikaBroker(config)
+        self.db_manager = store or DatabaseManager(config)
+        self.notifier = NotificationPublisher(config)
+        self.recent_cache = None
+        if config.RECENT_CACHE_SIZE > 0:
+            self.recent_cache = RecentAlertCache(config.RECENT_CACHE_SIZE, config.RECENT_CACHE_MAX_MOTORS)
+        self.coalescer = None
+        if config.COALESCE_WINDOW_S > 0:
+            self.coalescer = AlertCoalescer(config.COALESCE_WINDOW_S, config.COALESCE_MAX_EPISODES)
+        self.coalesce_timer = None
+        # Columnar store of alert values (TIMESERIES_WINDOW > 0), created at startup
+        self.timeseries = None
+        self.next_timeseries_snapshot = 0.0
+        
+        # Alerts written to disk while the store is unavailable (SPILL_DIR set)
+        self.spill = None
+        if config.SPILL_DIR:
+            self.spill = SpillLog(config.SPILL_DIR, config.SPILL_SEGMENT_BYTES)
+        self.spill_acks = []
+        self.spill_timer = None
+        self.spill_position = START
+        self.replayer = None
+        self.replay_stop = threading.Event()
+        self.replay_lock = threading.Lock()
+        
         self.connection = None
         self.channel = None
         self.should_stop = False
+        # Monotonic time startup() began, and the seconds from then to the first ack
+        self.started_at = None
+        self.first_ack_s = None
+        # (body, properties) of every unsettled delivery, to move failed ones to a retry queue
+        self.deliveries = {}
+        
+        # Pending (delivery_tag, body) pairs when micro-batching is enabled
+        self.batch = []
+        self.batch_timer = None
+        # Alerts per insert; flow control moves it between 1 and BATCH_SIZE
+        self.batch_size = config.BATCH_SIZE
+        
+        # Adaptive prefetch window and consumer pauses (FLOW_CONTROL)
+        self.flow = None
+        if config.FLOW_CONTROL:
+            self.flow = FlowController(
+                config.FLOW_PREFETCH_MIN,
+                config.FLOW_PREFETCH_MAX,
+                config.FLOW_TARGET_LATENCY_MS / 1000.0,
+                config.FLOW_PAUSE_MS / 1000.0,
+                initial=max(config.PREFETCH_COUNT, config.BATCH_SIZE * config.WORKER_COUNT)
+            )
+        self.next_flow_adjustment = 0.0
+        self.consumer_tag = None
+        
+        # Per-worker queues when processing concurrently (WORKER_COUNT > 1)
+        self.work_queues = []
+        self.workers = []
+        # Alerts handed to each worker and not yet handed back
+        self.worker_pending = []
+        
+        # Monotonic time of the next partition maintenance run
+        self.next_partition_maintenance = 0.0
+        
+        # Serves /metrics while running (METRICS_PORT > 0)
+        self.metrics_server = None
+        # Serves the dashboard read API while running (READ_API_PORT > 0)
+        self.read_api = None
+        self.next_queue_depth_poll = 0.0
         
         # Setup signal handlers for graceful shutdown
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -39,106 +178,159 @@ class AlertProcessor:
             self.connection.close()
     
     def connect_rabbitmq(self):
-        """Establish RabbitMQ connection and setup exchanges/queues"""
-        try:
-            # Establish connection
-            parameters = pika.URLParameters(self.config.RABBITMQ_URL)
-            self.connection = pika.BlockingConnection(parameters)
-            self.channel = self.connection.channel()
-            
-            # Declare exchanges
-            self.channel.exchange_declare(
-                exchange=self.config.MOTOR_ALERTS_EXCHANGE,
-                exchange_type='fanout',
-                durable=True
-            )
-            
-            self.channel.exchange_declare(
-                exchange=self.config.MOTOR_NOTIFICATIONS_EXCHANGE,
-                exchange_type='fanout',
-                durable=True
-            )
-            
-            # Declare and bind queue for motor.alerts
-            self.channel.queue_declare(
-                queue=self.config.MOTOR_ALERTS_QUEUE,
-                durable=True
-            )
-            
-            self.channel.queue_bind(
-                exchange=self.config.MOTOR_ALERTS_EXCHANGE,
-                queue=self.config.MOTOR_ALERTS_QUEUE
-            )
-            
-            # Set QoS to control message prefetch
-            self.channel.basic_qos(prefetch_count=self.config.PREFETCH_COUNT)
-            
-            logger.info("Connected to RabbitMQ and setup exchanges/queues")
-            return True
-            
-        except AMQPConnectionError as e:
-            logger.error(f"Failed to connect to RabbitMQ: {e}")
-            return False
-        except Exception as e:
-            logger.error(f"Unexpected error connecting to RabbitMQ: {e}")
+        """Connect the broker and set QoS to control message prefetch"""
+        if not self.broker.connect():
             return False
+        
+        self.connection = self.broker.connection
+        self.channel = self.broker.channel
+        self.notifier.attach(self.connection, self.channel)
+        
+        # Set QoS to control message prefetch
+        # (a batch can never fill if fewer messages than BATCH_SIZE are in flight)
+        if self.flow is not None:
+            self.apply_flow()
+        else:
+            self.channel.basic_qos(prefetch_count=self.prefetch_window())
+        return True
+    
+    def prefetch_window(self):
+        """Deliveries the broker sends before waiting for acks"""
+        if self.flow is not None:
+            return self.flow.prefetch
+        return max(self.config.PREFETCH_COUNT, self.config.BATCH_SIZE * self.config.WORKER_COUNT)
     
     def disconnect_rabbitmq(self):
         """Close RabbitMQ connection"""
-        if self.connection and not self.connection.is_closed:
-            self.connection.close()
-            logger.info("Disconnected from RabbitMQ")
+        self.broker.disconnect()
     
-    def parse_alert_message(self, message_body: str) -> Dict[str, Any]:
+    def parse_alert_message(self, message_body: Union[bytes, str]) -> Dict[str, Any]:
         """Parse alert message from JSON"""
+        started = time.perf_counter()
         try:
-            alert_data = json.loads(message_body)
-            
-            # Validate required fields
-            required_fields = ['motorId', 'timestamp', 'sensorType', 'value', 'alertType']
-            for field in required_fields:
-                if field not in alert_data:
-                    raise ValueError(f"Missing required field: {field}")
-            
-            # Parse timestamp
-            timestamp = datetime.fromisoformat(alert_data['timestamp'].replace('Z', '+00:00'))
-            
-            return {
-                'motor_id': alert_data['motorId'],
-                'sensor_type': alert_data['sensorType'],
-                'timestamp': timestamp,
-                'value': float(alert_data['value']),
-                'alert_type': alert_data['alertType']
-            }
-            
-        except (json.JSONDecodeError, ValueError, KeyError) as e:
-            logger.error(f"Failed to parse alert message: {e}")
-            raise
+            return parse_alert_message(message_body)
+        finally:
+            metrics.PARSE_SECONDS.observe(time.perf_counter() - started)
+    
+    def insert_alert(self, alert_data: Dict[str, Any]) -> int:
+        """Insert one alert into the store, timing the call"""
+        started = time.perf_counter()
+        try:
+            return self.db_manager.insert_alert(**alert_data)
+        finally:
+            self._insert_timed(time.perf_counter() - started, 1)
+    
+    def insert_alerts(self, alerts):
+        """Insert several alerts with one store call, timing the call"""
+        started = time.perf_counter()
+        try:
+            return self.db_manager.insert_alerts(alerts)
+        finally:
+            self._insert_timed(time.perf_counter() - started, len(alerts))
+    
+    def _insert_timed(self, seconds, count):
+        metrics.INSERT_SECONDS.observe(seconds)
+        metrics.BATCH_SIZE.observe(count)
+        if self.flow is not None:
+            self.flow.observe(seconds)
+    
+    def record_first_ack(self):
+        """Record the time from startup to the first acked message, once"""
+        if self.first_ack_s is not None or self.started_at is None:
+            return
+        self.first_ack_s = time.monotonic() - self.started_at
+        metrics.FIRST_ACK_SECONDS.set(self.first_ack_s)
+        logger.info(f"First message acked {self.first_ack_s:.3f}s after startup")
+    
+    def ack_alert(self, delivery_tag, multiple=False):
+        """Ack a delivery (with `multiple`, every delivery up to it)"""
+        self.channel.basic_ack(delivery_tag=delivery_tag, multiple=multiple)
+        self.record_first_ack()
+        if multiple:
+            for tag in [tag for tag in self.deliveries if tag <= delivery_tag]:
+                del self.deliveries[tag]
+        else:
+            self.deliveries.pop(delivery_tag, None)
+    
+    def reject_alert(self, delivery_tag, error, transient=False):
+        """Settle a message that failed processing without blocking on a retry.
+        
+        A transient failure (storing it) is republished to a delay queue for
+        a later attempt; a permanent one, or a transient one out of
+        RETRY_ATTEMPTS, to the dead-letter queue. The delivery is then acked.
+        Without a dead-letter queue it is nacked without requeue.
+        """
+        body, properties = self.deliveries.pop(delivery_tag, (None, None))
+        route = None
+        if body is not None:
+            route = retry.route_failure(self.config, getattr(properties, 'headers', None), error, transient)
+        if route is None:
+            # Requeueing would redeliver it straight back and loop forever
+            self.channel.basic_nack(delivery_tag=delivery_tag, requeue=False)
+            metrics.record_rejected()
+            return
+        
+        queue, headers = route
+        try:
+            self.broker.republish(queue, body, properties, headers)
+        except Exception as e:
+            logger.error(f"Failed to move alert message to {queue}: {e}")
+            # Redelivered at once rather than lost; the channel is most likely closed anyway
+            self.channel.basic_nack(delivery_tag=delivery_tag, requeue=True)
+            return
+        self.channel.basic_ack(delivery_tag=delivery_tag)
+        self.record_first_ack()
+        if queue == self.config.DEAD_LETTER_QUEUE:
+            logger.warning(f"Moved alert message to {queue} after {retry.attempts(headers)} retries: {error}")
+            metrics.record_dead_lettered()
+        else:
+            metrics.record_retried()
+    
+    def alert_stored(self, alert_data: Dict[str, Any], alert_id: int):
+        """Update in-process state for a newly stored alert and notify the dashboard"""
+        if self.coalescer is not None:
+            self.coalescer.stored(alert_data, alert_id)
+        
+        if self.recent_cache is not None:
+            self.recent_cache.add({
+                'id': alert_id,
+                **alert_data,
+                # Stands in for the column default, which the insert doesn't return
+                'created_at': datetime.now(timezone.utc)
+            })
+        
+        if self.timeseries is not None:
+            self.timeseries.add(alert_data, alert_id)
+        
+        if self.read_api is not None:
+            self.read_api.alert_stored(alert_data['motor_id'])
+        
+        self.publish_notification(alert_data, alert_id)
+    
+    def get_recent_alerts(self, motor_id, limit=5):
+        """Recent alerts for a motor, served from the cache when possible"""
+        if self.recent_cache is None:
+            return self.db_manager.get_recent_alerts(motor_id, limit)
+        
+        alerts = self.recent_cache.get(motor_id, limit)
+        if alerts is None:
+            rows = self.db_manager.get_recent_alerts(motor_id, max(limit, self.recent_cache.size))
+            # get_recent_alerts returns [] on errors too, so only cache real results
+            if rows:
+                self.recent_cache.fill(motor_id, rows)
+            alerts = rows[:limit]
+        return alerts
+    
+    def get_alert_summary(self):
+        """alert_summary statistics, served from the time-series store when enabled"""
+        if self.timeseries is None:
+            return self.db_manager.get_alert_summary()
+        return self.timeseries.summary()
     
     def publish_notification(self, alert_data: Dict[str, Any], alert_id: int):
         """Publish notification to motor.notifications exchange"""
         try:
-            notification = {
-                'alertId': alert_id,
-                'motorId': alert_data['motor_id'],
-                'sensorType': alert_data['sensor_type'],
-                'timestamp': alert_data['timestamp'].isoformat(),
-                'value': alert_data['value'],
-                'alertType': alert_data['alert_type'],
-                'processedAt': datetime.utcnow().isoformat()
-            }
-            
-            message = json.dumps(notification)
-            
-            self.channel.basic_publish(
-                exchange=self.config.MOTOR_NOTIFICATIONS_EXCHANGE,
-                routing_key='',
-                body=message,
-                properties=pika.BasicProperties(
-                    delivery_mode=2,  # Make message persistent
-                    content_type='application/json'
-                )
-            )
+            self.notifier.publish(build_notification(alert_data, alert_id))
             
             logger.info(f"Published notification for alert ID: {alert_id}")
             
@@ -148,51 +340,513 @@ class AlertProcessor:
     
     def process_alert(self, ch, method, properties, body):
         """Process a single alert message"""
+        if self.flow is not None:
+            self.flow.delivered()
+        if self.work_queues:
+            self.dispatch_alert(ch, method, properties, body)
+            return
+        
+        if self.config.BATCH_SIZE > 1:
+            self.enqueue_alert(ch, method, properties, body)
+            return
+        
+        self.deliveries[method.delivery_tag] = (body, properties)
         try:
             # Parse the alert message
-            alert_data = self.parse_alert_message(body.decode('utf-8'))
+            alert_data = self.parse_alert_message(body)
+        except Exception as e:
+            logger.error(f"Failed to process alert: {e}")
+            self.reject_alert(method.delivery_tag, e)
+            return
+        
+        try:
+            if self.coalesce(method.delivery_tag, alert_data):
+                return
+            
+            if self.spill_alerts([(method.delivery_tag, alert_data)]):
+                return
             
             logger.info(f"Processing alert for motor {alert_data['motor_id']}: "
                        f"{alert_data['sensor_type']} = {alert_data['value']}")
             
             # Insert alert into database
-            alert_id = self.db_manager.insert_alert(
-                motor_id=alert_data['motor_id'],
-                sensor_type=alert_data['sensor_type'],
-                timestamp=alert_data['timestamp'],
-                value=alert_data['value'],
-                alert_type=alert_data['alert_type']
-            )
+            try:
+                alert_id = self.insert_alert(alert_data)
+            except Exception:
+                if self.spill_alerts([(method.delivery_tag, alert_data)], failed=True):
+                    return
+                raise
             
-            # Publish notification
-            self.publish_notification(alert_data, alert_id)
+            # Cache and publish notification
+            self.alert_stored(alert_data, alert_id)
             
             # Acknowledge the message
-            ch.basic_ack(delivery_tag=method.delivery_tag)
+            self.ack_alert(method.delivery_tag)
+            metrics.record_acked((alert_data,))
             
             logger.info(f"Successfully processed alert ID: {alert_id}")
             
         except Exception as e:
             logger.error(f"Failed to process alert: {e}")
-            # Reject the message and don't requeue to avoid infinite loops
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            # Try again later from a delay queue, without holding up the consumer
+            self.reject_alert(method.delivery_tag, e, transient=True)
     
-    def start_consuming(self):
-        """Start consuming messages from the motor.alerts queue"""
+    def enqueue_alert(self, ch, method, properties, body):
+        """Add a message to the pending batch, flushing when it is full"""
+        self.deliveries[method.delivery_tag] = (body, properties)
+        self.batch.append((method.delivery_tag, body))
+        
+        if len(self.batch) >= self.batch_size:
+            self.flush_batch()
+        elif self.batch_timer is None:
+            # First message of a new batch: bound how long it may wait
+            self.batch_timer = self.connection.call_later(
+                self.config.BATCH_TIMEOUT_MS / 1000.0,
+                self._on_batch_timeout
+            )
+    
+    def _on_batch_timeout(self):
+        """Flush a partially filled batch once BATCH_TIMEOUT_MS has elapsed"""
+        self.batch_timer = None
+        self.flush_batch()
+    
+    def flush_batch(self):
+        """Insert, notify and acknowledge all pending messages"""
+        if self.batch_timer is not None:
+            self.connection.remove_timeout(self.batch_timer)
+            self.batch_timer = None
+        
+        batch, self.batch = self.batch, []
+        if not batch:
+            return
+        
+        # Reject unparseable messages individually so they cannot poison the batch
+        parsed = []
+        for delivery_tag, body in batch:
+            try:
+                parsed.append((delivery_tag, self.parse_alert_message(body)))
+            except Exception as e:
+                logger.error(f"Failed to process alert: {e}")
+                self.reject_alert(delivery_tag, e)
+        
+        if self.coalescer is not None:
+            parsed = [
+                (delivery_tag, alert_data) for delivery_tag, alert_data in parsed
+                if not self.coalesce(delivery_tag, alert_data)
+            ]
+        
+        if not parsed or self.spill_alerts(parsed):
+            return
+        
         try:
-            logger.info("Starting to consume messages from motor.alerts queue...")
-            
-            self.channel.basic_consume(
-                queue=self.config.MOTOR_ALERTS_QUEUE,
-                on_message_callback=self.process_alert
+            alert_ids = self.insert_alerts([alert_data for _, alert_data in parsed])
+        except Exception as e:
+            if self.spill_alerts(parsed, failed=True):
+                return
+            logger.warning(f"Batch insert of {len(parsed)} alerts failed, "
+                           f"falling back to per-row inserts: {e}")
+            self._process_batch_rows(parsed)
+            return
+        
+        for (_, alert_data), alert_id in zip(parsed, alert_ids):
+            self.alert_stored(alert_data, alert_id)
+        
+        # Unless an earlier repeat alert is still waiting for its episode to be
+        # written, every earlier delivery has already been acked or nacked, so
+        # one cumulative ack settles the whole batch
+        last_tag = max(tag for tag, _ in parsed)
+        tags = {tag for tag, _ in parsed}
+        if all(tag in tags for tag in self.deliveries if tag <= last_tag):
+            self.ack_alert(last_tag, multiple=True)
+        else:
+            for tag in tags:
+                self.ack_alert(tag)
+        metrics.record_acked([alert_data for _, alert_data in parsed])
+        
+        logger.info(f"Successfully processed batch of {len(alert_ids)} alerts")
+    
+    def _process_batch_rows(self, parsed):
+        """Insert a failed batch row by row, acking or nacking each message on its own"""
+        for delivery_tag, alert_data in parsed:
+            if self.spill_alerts([(delivery_tag, alert_data)]):
+                continue
+            try:
+                alert_id = self.insert_alert(alert_data)
+                self.alert_stored(alert_data, alert_id)
+                self.ack_alert(delivery_tag)
+                metrics.record_acked((alert_data,))
+            except Exception as e:
+                if self.spill_alerts([(delivery_tag, alert_data)], failed=True):
+                    continue
+                logger.error(f"Failed to process alert: {e}")
+                self.reject_alert(delivery_tag, e, transient=True)
+    
+    def coalesce(self, delivery_tag, alert_data):
+        """Fold a repeat alert into its open episode; False if it must be stored"""
+        if self.coalescer is None or not self.coalescer.fold(alert_data, (delivery_tag, alert_data)):
+            if self.coalescer is not None and self.coalesce_timer is None:
+                self.coalesce_timer = self.connection.call_later(
+                    self.config.COALESCE_FLUSH_MS / 1000.0,
+                    self._on_coalesce_timeout
+                )
+            return False
+        
+        # The repeat lives on only in the episode, so it is acked once the next flush writes that
+        metrics.MESSAGES_COALESCED.inc()
+        if self.coalescer.unacked >= max(1, self.prefetch_window() // 2):
+            # Don't leave the broker waiting on the flush timer for acks
+            self.flush_episodes()
+        return True
+    
+    def _on_coalesce_timeout(self):
+        self.coalesce_timer = None
+        self.flush_episodes()
+        # Keep flushing while episodes are open so they close once they go quiet
+        if self.coalescer.has_open_episodes():
+            self.coalesce_timer = self.connection.call_later(
+                self.config.COALESCE_FLUSH_MS / 1000.0,
+                self._on_coalesce_timeout
             )
+    
+    def flush_episodes(self):
+        """Close quiet episodes, write changed ones and notify the dashboard of closed ones"""
+        self.coalescer.expire()
+        if not self.channel.is_open:
+            # The folded repeats can no longer be acked, and the broker redelivers
+            # them; counted in the episodes as well, they would be counted twice.
+            # The channel only closes while the consumer thread handles I/O, so
+            # it stays open from here until the acks below
+            self.coalescer.drop_acks(lambda ack: True)
+        episodes = self.coalescer.take_updates()
+        if not episodes:
+            return
+        
+        try:
+            episode_ids = self.db_manager.save_episodes(episodes)
+        except Exception as e:
+            # Keep them for the next flush rather than losing the counts; the
+            # repeats folded in since the last write are retried and fold in again
+            logger.error(f"Failed to save {len(episodes)} alert episodes: {e}")
+            for delivery_tag, _ in self.coalescer.requeue(episodes):
+                self.reject_alert(delivery_tag, e, transient=True)
+            return
+        
+        acks = self.coalescer.written(episodes)
+        for delivery_tag, _ in acks:
+            self.ack_alert(delivery_tag)
+        metrics.record_acked([alert_data for _, alert_data in acks])
+        
+        for episode, episode_id in zip(episodes, episode_ids):
+            episode.episode_id = episode_id
+            if episode.closed:
+                try:
+                    self.notifier.publish(build_episode_notification(episode))
+                except Exception as e:
+                    logger.error(f"Failed to publish episode notification: {e}")
+        
+        logger.info(f"Saved {len(episodes)} alert episodes")
+    
+    def spill_alerts(self, items, failed=False):
+        """Append (delivery_tag, alert_data) pairs to the spill log while the store is down.
+        
+        Returns False, leaving the messages to the caller, when spilling is off,
+        or when the store is not spilling yet and either no insert has failed or
+        the store still passes its health check (the alert itself was bad).
+        Spilled messages are acked once the log is synced.
+        """
+        if self.spill is None:
+            return False
+        
+        if not self.spill.active:
+            if not failed or self.db_manager.health_check():
+                return False
+            self.spill.active = True
+            logger.warning(f"Database unavailable, spilling alerts to {self.config.SPILL_DIR}")
+        
+        for delivery_tag, alert_data in items:
+            try:
+                self.spill.append(alert_data)
+            except OSError as e:
+                logger.error(f"Failed to spill alert: {e}")
+                self.reject_alert(delivery_tag, e, transient=True)
+                continue
+            self.spill_acks.append(delivery_tag)
+        
+        if len(self.spill_acks) >= self.config.SPILL_FSYNC_BATCH:
+            self.sync_spill()
+        elif self.spill_acks and self.spill_timer is None:
+            self.spill_timer = self.connection.call_later(
+                self.config.SPILL_FSYNC_MS / 1000.0,
+                self._on_spill_timeout
+            )
+        return True
+    
+    def _on_spill_timeout(self):
+        self.spill_timer = None
+        self.sync_spill()
+    
+    def sync_spill(self):
+        """fsync the spill log, then ack every message spilled since the last sync"""
+        if self.spill_timer is not None:
+            self.connection.remove_timeout(self.spill_timer)
+            self.spill_timer = None
+        
+        delivery_tags, self.spill_acks = self.spill_acks, []
+        try:
+            self.spill.sync()
+        except OSError as e:
+            logger.error(f"Failed to sync spill log: {e}")
+            for delivery_tag in delivery_tags:
+                self.reject_alert(delivery_tag, e, transient=True)
+            return
+        
+        for delivery_tag in delivery_tags:
+            self.ack_alert(delivery_tag)
+        metrics.MESSAGES_SPILLED.inc(len(delivery_tags))
+    
+    def open_spill(self):
+        """Open the spill log, resuming a replay left unfinished by an earlier run"""
+        self.spill.open()
+        self.spill_position = self.db_manager.get_spill_checkpoint(self.spill.spill_id) or START
+        if self.spill.read(self.spill_position, 1)[0]:
+            # Keep new alerts behind the backlog so they are stored in order
+            self.spill.active = True
+            logger.warning(f"Found unreplayed alerts in {self.config.SPILL_DIR}, replaying them first")
+    
+    def _replay_loop(self):
+        while not self.replay_stop.wait(self.config.RETRY_DELAY):
+            if self.spill.active:
+                self.replay_spill()
+    
+    def replay_spill(self):
+        """Load spilled alerts into the store in log order (replayer thread).
+        
+        Once everything synced so far is replayed, the consumer thread is asked
+        to replay the remaining tail and switch back to direct inserts.
+        """
+        while not self.replay_stop.is_set():
+            try:
+                with self.db_manager.pooled_connection():
+                    if not self.db_manager.health_check():
+                        return
+                    with self.replay_lock:
+                        alerts, alert_ids = self._replay_next()
+            except Exception as e:
+                logger.warning(f"Replay of spilled alerts failed, retrying in {self.config.RETRY_DELAY}s: {e}")
+                return
+            if not alerts:
+                break
+            self.connection.add_callback_threadsafe(
+                functools.partial(self._complete_replayed, alerts, alert_ids)
+            )
+        
+        self.connection.add_callback_threadsafe(self._resume_direct_inserts)
+    
+    def _replay_next(self):
+        """Replay one batch from the spill position, returning (alerts, alert_ids); hold replay_lock.
+        
+        The batch is inserted together with the log position it reaches, so a
+        replay cut short by a failure or a crash resumes without duplicates.
+        """
+        alerts, position = self.spill.read(self.spill_position, self.config.SPILL_REPLAY_BATCH)
+        alert_ids = []
+        if alerts:
+            alert_ids = self.db_manager.insert_spilled_alerts(alerts, self.spill.spill_id, position)
+            metrics.SPILL_REPLAYED.inc(len(alert_ids))
+        self.spill_position = position
+        self.spill.discard_before(position)
+        return alerts, alert_ids
+    
+    def _complete_replayed(self, alerts, alert_ids):
+        """Cache and notify replayed alerts (runs on the consumer thread)"""
+        for alert_data, alert_id in zip(alerts, alert_ids):
+            self.alert_stored(alert_data, alert_id)
+    
+    def _resume_direct_inserts(self):
+        """Replay the rest of the spill log and go back to direct inserts (consumer thread)"""
+        if not self.spill.active or any(self.worker_pending):
+            # Workers still hold alerts that must be spilled before direct inserts resume
+            return
+        if self.spill_acks:
+            self.sync_spill()
+        
+        # The consumer's own connection may have been dropped during the outage
+        if not self.db_manager.health_check() and not self.db_manager.connect():
+            return
+        
+        # Nothing is appended while this runs on the consumer thread, so the
+        # log stays empty once this tail is replayed
+        with self.replay_lock:
+            while True:
+                try:
+                    alerts, alert_ids = self._replay_next()
+                except Exception as e:
+                    logger.warning(f"Replay of spilled alerts failed: {e}")
+                    return
+                if not alerts:
+                    break
+                self._complete_replayed(alerts, alert_ids)
+            self.spill.active = False
+        
+        logger.info("Spilled alerts replayed, resuming direct inserts")
+    
+    def start_replayer(self):
+        self.replay_stop.clear()
+        self.replayer = threading.Thread(target=self._replay_loop, name="spill-replayer", daemon=True)
+        self.replayer.start()
+    
+    def stop_replayer(self):
+        self.replay_stop.set()
+        self.replayer.join()
+        self.replayer = None
+    
+    def start_workers(self):
+        """Start the worker threads that write alerts through the connection pool"""
+        self.worker_pending = [0] * self.config.WORKER_COUNT
+        for index in range(self.config.WORKER_COUNT):
+            work_queue = queue.Queue()
+            worker = threading.Thread(
+                target=self._worker_loop,
+                args=(work_queue, index),
+                name=f"alert-worker-{index}",
+                daemon=True
+            )
+            self.work_queues.append(work_queue)
+            self.workers.append(worker)
+            worker.start()
+        
+        logger.info(f"Started {len(self.workers)} alert workers")
+    
+    def stop_workers(self):
+        """Let the workers drain their queues, then wait for them to exit"""
+        for work_queue in self.work_queues:
+            work_queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        
+        self.work_queues = []
+        self.workers = []
+        logger.info("Stopped alert workers")
+    
+    def dispatch_alert(self, ch, method, properties, body):
+        """Hand a message to the worker that owns its motor"""
+        self.deliveries[method.delivery_tag] = (body, properties)
+        try:
+            alert_data = self.parse_alert_message(body)
+        except Exception as e:
+            logger.error(f"Failed to process alert: {e}")
+            self.reject_alert(method.delivery_tag, e)
+            return
+        
+        if self.coalesce(method.delivery_tag, alert_data):
+            return
+        
+        # A stable hash keeps every alert of one motor on the same worker, in order
+        shard = zlib.crc32(alert_data['motor_id'].encode('utf-8')) % len(self.work_queues)
+        
+        # While spilling, an alert only bypasses its worker once the worker has
+        # handed back everything before it; otherwise it would be spilled first
+        if self.worker_pending[shard] == 0 and self.spill_alerts([(method.delivery_tag, alert_data)]):
+            return
+        
+        self.worker_pending[shard] += 1
+        self.work_queues[shard].put((method.delivery_tag, alert_data))
+    
+    def _worker_loop(self, work_queue, shard):
+        """Insert queued alerts, taking up to BATCH_SIZE at a time"""
+        stopping = False
+        while not stopping:
+            item = work_queue.get()
+            if item is None:
+                break
             
+            items = [item]
+            while len(items) < self.batch_size:
+                try:
+                    item = work_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                items.append(item)
+            
+            results = self._write_alerts(items)
+            try:
+                self.connection.add_callback_threadsafe(
+                    functools.partial(self._complete_alerts, shard, results)
+                )
+            except Exception as e:
+                # Connection already closed: unacked messages will be redelivered
+                logger.error(f"Failed to hand results back to consumer thread: {e}")
+    
+    def _write_alerts(self, items):
+        """Insert alerts on a pooled connection, returning (delivery_tag, alert_data, alert_id, error) tuples.
+        
+        alert_id is None for alerts that were not stored, with the exception in error.
+        """
+        if self.spill is not None and self.spill.active:
+            # Hand them straight back to be spilled behind the alerts before them
+            return [(delivery_tag, alert_data, None, None) for delivery_tag, alert_data in items]
+        try:
+            with self.db_manager.pooled_connection():
+                if len(items) > 1:
+                    try:
+                        alert_ids = self.insert_alerts(
+                            [alert_data for _, alert_data in items]
+                        )
+                        return [
+                            (delivery_tag, alert_data, alert_id, None)
+                            for (delivery_tag, alert_data), alert_id in zip(items, alert_ids)
+                        ]
+                    except Exception as e:
+                        logger.warning(f"Batch insert of {len(items)} alerts failed, "
+                                       f"falling back to per-row inserts: {e}")
+                
+                results = []
+                for delivery_tag, alert_data in items:
+                    try:
+                        results.append((delivery_tag, alert_data, self.insert_alert(alert_data), None))
+                    except Exception as e:
+                        logger.error(f"Failed to process alert: {e}")
+                        results.append((delivery_tag, alert_data, None, e))
+                return results
+        except Exception as e:
+            logger.error(f"Failed to acquire database connection: {e}")
+            return [(delivery_tag, alert_data, None, e) for delivery_tag, alert_data in items]
+    
+    def _complete_alerts(self, shard, results):
+        """Publish and acknowledge written alerts (runs on the consumer thread)"""
+        self.worker_pending[shard] -= len(results)
+        for delivery_tag, alert_data, alert_id, error in results:
+            if alert_id is None:
+                if not self.spill_alerts([(delivery_tag, alert_data)], failed=True):
+                    self.reject_alert(delivery_tag, error, transient=True)
+                continue
+            self.alert_stored(alert_data, alert_id)
+            self.ack_alert(delivery_tag)
+            metrics.record_acked((alert_data,))
+    
+    def start_consuming(self):
+        """Start consuming messages from the motor.alerts queue"""
+        try:
             logger.info("Waiting for messages. To exit press CTRL+C")
             
             # Start consuming with timeout to allow for graceful shutdown
             while not self.should_stop:
                 try:
                     self.connection.process_data_events(time_limit=1)
+                    now = time.monotonic()
+                    if now >= self.next_partition_maintenance:
+                        self.maintain_partitions()
+                    if self.flow is not None:
+                        # Reads the queue depth as well
+                        if now >= self.next_flow_adjustment:
+                            self.adjust_flow()
+                    elif now >= self.next_queue_depth_poll:
+                        self.poll_queue_depth()
+                    if self.timeseries is not None and now >= self.next_timeseries_snapshot:
+                        self.save_timeseries()
                 except KeyboardInterrupt:
                     logger.info("Received keyboard interrupt")
                     break
@@ -200,31 +854,276 @@ class AlertProcessor:
                     logger.error(f"Error processing data events: {e}")
                     break
             
+            self.settle_pending()
+            
             logger.info("Stopped consuming messages")
             
         except Exception as e:
             logger.error(f"Error in start_consuming: {e}")
             raise
     
+    def maintain_partitions(self):
+        """Run store partition maintenance now and schedule the next run"""
+        self.next_partition_maintenance = time.monotonic() + self.config.PARTITION_MAINTENANCE_INTERVAL_S
+        # Failures are logged by the store; alerts outside every partition
+        # still land in the default partition, so processing carries on
+        self.db_manager.maintain_partitions()
+    
+    def load_timeseries(self):
+        """Create the time-series store from its snapshot, or from the store's daily rollup"""
+        if timeseries.np is None:
+            logger.error("TIMESERIES_WINDOW needs numpy (pip install numpy)")
+            return False
+        self.timeseries = TimeSeriesStore(self.config.TIMESERIES_WINDOW)
+        self.next_timeseries_snapshot = time.monotonic() + self.config.TIMESERIES_SNAPSHOT_S
+        
+        path = self.config.TIMESERIES_SNAPSHOT
+        if path and os.path.exists(path):
+            try:
+                self.timeseries.load(path)
+            except Exception as e:
+                logger.error(f"Failed to load time-series snapshot {path}: {e}")
+                self.timeseries = TimeSeriesStore(self.config.TIMESERIES_WINDOW)
+            else:
+                # Catch up on alerts stored since the snapshot was written
+                caught_up = 0
+                while True:
+                    rows = self.db_manager.get_alerts_after(self.timeseries.last_id, timeseries.CATCH_UP_BATCH)
+                    for row in rows:
+                        self.timeseries.add(row, row['id'])
+                    caught_up += len(rows)
+                    if len(rows) < timeseries.CATCH_UP_BATCH:
+                        break
+                logger.info(f"Loaded time-series snapshot with {len(self.timeseries.keys)} series, "
+                            f"caught up on {caught_up} alerts")
+                return True
+        
+        # From the daily rollup: aggregating motor_alerts itself would scan the whole table
+        rows = self.db_manager.get_alert_totals()
+        if rows is None:
+            logger.warning("The daily rollup has days without value aggregates; warming from motor_alerts. "
+                           "Run `python manage.py backfill-daily-counts` to rebuild them")
+            rows = self.db_manager.get_alert_summary()
+        self.timeseries.warm(rows)
+        logger.info(f"Warmed time-series aggregates for {len(self.timeseries.keys)} series")
+        return True
+    
+    def save_timeseries(self):
+        """Snapshot the time-series store (TIMESERIES_SNAPSHOT) and schedule the next snapshot"""
+        self.next_timeseries_snapshot = time.monotonic() + self.config.TIMESERIES_SNAPSHOT_S
+        if not self.config.TIMESERIES_SNAPSHOT:
+            return
+        try:
+            self.timeseries.save(self.config.TIMESERIES_SNAPSHOT)
+        except OSError as e:
+            logger.error(f"Failed to save time-series snapshot: {e}")
+    
+    def adjust_flow(self):
+        """Resize the prefetch window and batch size from the last interval, pausing or resuming consumption"""
+        self.next_flow_adjustment = time.monotonic() + self.config.FLOW_INTERVAL_MS / 1000.0
+        try:
+            queue_depth = self.broker.queue_depth()
+        except Exception as e:
+            logger.error(f"Failed to read alerts queue depth: {e}")
+            return
+        metrics.QUEUE_DEPTH.set(queue_depth)
+        
+        was_paused = self.flow.paused
+        if not self.flow.adjust(len(self.deliveries), queue_depth):
+            return
+        if self.flow.paused:
+            self.pause_consuming()
+            return
+        self.apply_flow()
+        if was_paused:
+            self.resume_consuming()
+        logger.debug(f"Flow control: {self.flow.stats()}, batch size {self.batch_size}")
+    
+    def apply_flow(self):
+        """Set the channel prefetch to the flow controller's window, and the batch size to fit in it"""
+        self.channel.basic_qos(prefetch_count=self.flow.prefetch)
+        # Each worker's batch must still fill within the window
+        self.batch_size = max(1, min(self.config.BATCH_SIZE, self.flow.prefetch // self.config.WORKER_COUNT))
+        metrics.PREFETCH_WINDOW.set(self.flow.prefetch)
+    
+    def pause_consuming(self):
+        """Stop deliveries while the store catches up; the backlog waits in RabbitMQ"""
+        if self.consumer_tag is None:
+            return
+        # pika returns deliveries not yet dispatched to the queue; those
+        # already dispatched are still processed and settled as usual
+        self.channel.basic_cancel(self.consumer_tag)
+        self.consumer_tag = None
+        metrics.CONSUMER_PAUSED.set(1)
+        metrics.CONSUMER_PAUSES.inc()
+        logger.warning(f"Database is falling behind (insert latency {self.flow.stats()['latency_ms']} ms); "
+                       f"pausing consumption for {self.config.FLOW_PAUSE_MS} ms")
+    
+    def resume_consuming(self):
+        """Start deliveries again after a pause"""
+        self.consumer_tag = self.channel.basic_consume(
+            queue=self.config.MOTOR_ALERTS_QUEUE,
+            on_message_callback=self.process_alert
+        )
+        metrics.CONSUMER_PAUSED.set(0)
+        logger.info(f"Resuming consumption with a prefetch window of {self.flow.prefetch}")
+    
+    def poll_queue_depth(self):
+        """Sample how many messages are waiting in the alerts queue"""
+        self.next_queue_depth_poll = time.monotonic() + self.config.METRICS_QUEUE_POLL_S
+        try:
+            metrics.QUEUE_DEPTH.set(self.broker.queue_depth())
+        except Exception as e:
+            logger.error(f"Failed to read alerts queue depth: {e}")
+    
+    def start_read_api(self):
+        """Serve the read API on READ_API_HOST:READ_API_PORT (0 disables), next to the consumer"""
+        if self.config.READ_API_PORT <= 0:
+            return
+        # Imported here so the read API module is only loaded when enabled
+        from read_api import ReadService
+        # PostgreSQL is queried over a pool of the read API's own; other stores are shared
+        store = None if isinstance(self.db_manager, DatabaseManager) else self.db_manager
+        service = ReadService(self.config, store=store, recent_cache=self.recent_cache,
+                              timeseries=self.timeseries)
+        try:
+            if service.start():
+                self.read_api = service
+            else:
+                logger.error("Failed to start read API")
+        except OSError as e:
+            logger.error(f"Failed to start read API: {e}")
+    
+    def stop_read_api(self):
+        if self.read_api is not None:
+            self.read_api.stop()
+            self.read_api = None
+    
+    def start_metrics_server(self):
+        """Serve /metrics on METRICS_HOST:METRICS_PORT (0 disables)"""
+        if self.config.METRICS_PORT <= 0:
+            return
+        try:
+            self.metrics_server = metrics.start_http_server(self.config.METRICS_HOST, self.config.METRICS_PORT)
+        except OSError as e:
+            # Metrics are diagnostics only, so keep processing without them
+            logger.error(f"Failed to start metrics server: {e}")
+    
+    def stop_metrics_server(self):
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+            self.metrics_server.server_close()
+            self.metrics_server = None
+    
+    def settle_pending(self):
+        """Settle anything still waiting in a partial batch or a worker queue"""
+        if self.batch and self.channel and self.channel.is_open:
+            self.flush_batch()
+        
+        if self.workers:
+            self.stop_workers()
+            if self.connection and self.connection.is_open:
+                self.connection.process_data_events(time_limit=0)
+        
+        if self.spill is not None:
+            if self.spill_acks and self.channel and self.channel.is_open:
+                self.sync_spill()
+            if self.replayer is not None:
+                self.stop_replayer()
+                if self.connection and self.connection.is_open:
+                    self.connection.process_data_events(time_limit=0)
+            self.spill.close()
+        
+        if self.coalescer is not None:
+            if self.coalesce_timer is not None:
+                self.connection.remove_timeout(self.coalesce_timer)
+                self.coalesce_timer = None
+            self.coalescer.close_all()
+            self.flush_episodes()
+            logger.info(f"Alert coalescer stats: {self.coalescer.stats()}")
+        
+        if self.channel and self.channel.is_open:
+            self.notifier.flush(final=True)
+        logger.info(f"Notification publisher stats: {self.notifier.stats()}")
+        
+        if self.timeseries is not None:
+            self.save_timeseries()
+    
+    def startup(self):
+        """Connect the store and broker and start any workers; returns True on success"""
+        self.started_at = time.monotonic()
+        self.first_ack_s = None
+        
+        # Connect to database
+        if not self.db_manager.connect():
+            logger.error("Failed to connect to database")
+            return False
+        
+        # Create tables if they don't exist
+        if not self.db_manager.create_tables():
+            logger.error("Failed to create database tables")
+            return False
+        
+        # Make sure today's and upcoming partitions exist before consuming
+        self.maintain_partitions()
+        
+        # Warm the recent-alert cache with one query covering all motors
+        if self.recent_cache is not None:
+            self.recent_cache.warm(
+                self.db_manager.get_recent_alerts_by_motor(self.recent_cache.size)
+            )
+            logger.info(f"Warmed recent-alert cache for {len(self.recent_cache.motors)} motors")
+        
+        if self.config.TIMESERIES_WINDOW > 0 and not self.load_timeseries():
+            return False
+        
+        if self.spill is not None:
+            try:
+                self.open_spill()
+            except Exception as e:
+                logger.error(f"Failed to open spill log: {e}")
+                return False
+        
+        # Start the worker pool for concurrent processing (the spill replayer
+        # also writes through it, next to the consumer's connection)
+        if self.config.WORKER_COUNT > 1 or self.spill is not None:
+            if not self.db_manager.create_pool(1, self.config.DB_POOL_SIZE):
+                logger.error("Failed to create database connection pool")
+                return False
+        
+        # Connect to RabbitMQ
+        if not self.connect_rabbitmq():
+            logger.error("Failed to connect to RabbitMQ")
+            return False
+        
+        if self.config.WORKER_COUNT > 1:
+            self.start_workers()
+        
+        if self.spill is not None:
+            self.start_replayer()
+        
+        logger.info("Starting to consume messages from motor.alerts queue...")
+        self.consumer_tag = self.channel.basic_consume(
+            queue=self.config.MOTOR_ALERTS_QUEUE,
+            on_message_callback=self.process_alert
+        )
+        
+        startup_s = time.monotonic() - self.started_at
+        metrics.STARTUP_SECONDS.set(startup_s)
+        logger.info(f"Started in {startup_s:.3f}s")
+        return True
+    
     def run(self):
         """Main run method"""
         logger.info("Starting Alert Processor...")
         
         try:
-            # Connect to database
-            if not self.db_manager.connect():
-                logger.error("Failed to connect to database")
-                return False
+            self.start_metrics_server()
             
-            # Create tables if they don't exist
-            if not self.db_manager.create_tables():
-                logger.error("Failed to create database tables")
+            if not self.startup():
                 return False
             
-            # Connect to RabbitMQ
-            if not self.connect_rabbitmq():
-                logger.error("Failed to connect to RabbitMQ")
-                return False
+            self.start_read_api()
             
             # Start consuming messages
             self.start_consuming()
@@ -237,17 +1136,53 @@ class AlertProcessor:
             # Cleanup
             self.disconnect_rabbitmq()
             self.db_manager.disconnect()
+            self.stop_metrics_server()
+            self.stop_read_api()
             logger.info("Alert Processor stopped")
         
         return True
 
 def main():
     """Main entry point"""
+    parser = argparse.ArgumentParser(description="Motor alert processor")
+    parser.add_argument(
+        '--mode',
+        choices=['alerts', 'readings'],
+        default='alerts',
+        help="Consume threshold alerts (default) or raw readings into time-bucket aggregates"
+    )
+    parser.add_argument(
+        '--engine',
+        choices=['blocking', 'asyncio'],
+        default=Config.PROCESSOR_ENGINE,
+        help="Processing engine (default: PROCESSOR_ENGINE or 'blocking')"
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=Config.PROCESS_WORKERS,
+        help="Shard processes, each consuming its own share of motors (default: PROCESS_WORKERS or 1)"
+    )
+    args = parser.parse_args()
+    
     config = Config()
-    processor = AlertProcessor(config)
     
     try:
-        success = processor.run()
+        if args.mode == 'readings':
+            # One blocking consumer whatever --engine and --workers say; run
+            # more processes on READINGS_QUEUE to scale out
+            from readings_processor import ReadingsProcessor
+            success = ReadingsProcessor(config).run()
+        elif args.workers > 1:
+            from supervisor import Supervisor
+            success = Supervisor(config, args.engine, args.workers).run()
+        elif args.engine == 'asyncio':
+            # Imported lazily so the blocking engine doesn't need aio-pika/asyncpg
+            import asyncio
+            from async_processor import AsyncAlertProcessor
+            success = asyncio.run(AsyncAlertProcessor(config).run())
+        else:
+            success = AlertProcessor(config).run()
         sys.exit(0 if success else 1)
     except KeyboardInterrupt:
         logger.info("Received keyboard interrupt, shutting down...")
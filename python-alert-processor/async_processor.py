@@ -0,0 +1,489 @@
+import asyncio
+import logging
+import signal
+import time
+
+import aio_pika
+import asyncpg
+from aio_pika.exceptions import ChannelInvalidStateError, ChannelNotFoundEntity
+
+import codec
+import metrics
+import partitions
+import retry
+from alert_processor import build_episode_notification, build_notification, parse_alert_message
+from backends import shard_queue
+from coalescer import AlertCoalescer
+from config import Config
+from database import (
+    INSERT_ALERTS_SQL, INSERT_EPISODE_SQL, SAVE_SCHEMA_VERSION_SQL, SCHEMA_LOCK_SQL, SCHEMA_STATEMENTS,
+    SCHEMA_VERSION_SQL, SCHEMA_VERSION_TABLE_SQL, UPDATE_EPISODE_SQL, numbered_params, schema_version
+)
+
+logger = logging.getLogger(__name__)
+
+INSERT_ALERT_SQL = INSERT_ALERTS_SQL.format(values="($1, $2, $3, $4, $5)")
+INSERT_EPISODE_ASYNC_SQL = INSERT_EPISODE_SQL.format(values="($1, $2, $3, $4, $5, $6, $7, $8, $9)")
+UPDATE_EPISODE_ASYNC_SQL = UPDATE_EPISODE_SQL.format(values="($1, $2, $3, $4, $5, $6)", id="$7")
+SAVE_SCHEMA_VERSION_ASYNC_SQL = numbered_params(SAVE_SCHEMA_VERSION_SQL)
+# Same version DatabaseManager records for the text layout
+SCHEMA_VERSION = schema_version(SCHEMA_STATEMENTS + (partitions.DEFAULT_PARTITION_SQL,))
+
+def _channel_closed(ack):
+    """Whether the channel an episode ack (message, alert_data) was delivered on has closed"""
+    message, _ = ack
+    try:
+        message.channel
+    except ChannelInvalidStateError:
+        return True
+    return False
+
+class AsyncAlertProcessor:
+    """asyncio engine: same parse -> insert -> notify -> ack flow as AlertProcessor,
+    with up to MAX_IN_FLIGHT messages processed concurrently"""
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.pool = None
+        self.connection = None
+        self.channel = None
+        self.queue = None
+        self.notifications_exchange = None
+        self.in_flight = None
+        self.tasks = set()
+        self.stop_event = None
+        self.coalescer = None
+        self.episode_lock = None
+        # Monotonic time run() began, and the seconds from then to the first ack
+        self.started_at = None
+        self.first_ack_s = None
+        if config.COALESCE_WINDOW_S > 0:
+            self.coalescer = AlertCoalescer(config.COALESCE_WINDOW_S, config.COALESCE_MAX_EPISODES)
+
+    def _signal_handler(self, signum):
+        """Handle shutdown signals"""
+        logger.info(f"Received signal {signum}, initiating graceful shutdown...")
+        self.stop_event.set()
+
+    async def connect_database(self):
+        """Create the asyncpg connection pool"""
+        try:
+            self.pool = await asyncpg.create_pool(
+                host=self.config.DB_HOST,
+                port=self.config.DB_PORT,
+                database=self.config.DB_NAME,
+                user=self.config.DB_USER,
+                password=self.config.DB_PASSWORD,
+                min_size=1,
+                max_size=self.config.DB_POOL_SIZE,
+                # asyncpg prepares every statement it runs and caches it per connection
+                statement_cache_size=100 if self.config.PREPARED_STATEMENTS else 0
+            )
+            logger.info("Connected to PostgreSQL database")
+            return True
+        except (asyncpg.PostgresError, OSError) as e:
+            logger.error(f"Failed to connect to database: {e}")
+            return False
+
+    async def create_tables(self):
+        """Create the motor_alerts table if it doesn't exist, as DatabaseManager.create_tables"""
+        if self.config.COMPACT_SCHEMA:
+            logger.error("COMPACT_SCHEMA is only supported by the blocking engine (--engine blocking)")
+            return False
+        try:
+            async with self.pool.acquire() as connection:
+                try:
+                    applied = await connection.fetchval(SCHEMA_VERSION_SQL)
+                except asyncpg.UndefinedTableError:
+                    applied = None
+                if applied == SCHEMA_VERSION:
+                    logger.info(f"Database schema is up to date (version {SCHEMA_VERSION})")
+                    return True
+                
+                async with connection.transaction():
+                    await connection.execute(SCHEMA_LOCK_SQL)
+                    await connection.execute(SCHEMA_VERSION_TABLE_SQL)
+                    if await connection.fetchval(SCHEMA_VERSION_SQL) == SCHEMA_VERSION:
+                        logger.info(f"Database schema version {SCHEMA_VERSION} was applied by another processor")
+                        return True
+                    for statement in SCHEMA_STATEMENTS:
+                        await connection.execute(statement)
+                    if await connection.fetchval(partitions.TABLE_KIND_SQL) == 'p':
+                        await connection.execute(partitions.DEFAULT_PARTITION_SQL)
+                    else:
+                        logger.warning("motor_alerts is not partitioned; "
+                                       "run 'python manage.py migrate-partitions' to migrate it")
+                    await connection.execute(SAVE_SCHEMA_VERSION_ASYNC_SQL, SCHEMA_VERSION)
+            logger.info(f"Database tables and indexes created successfully (schema version {SCHEMA_VERSION})")
+            return True
+        except asyncpg.PostgresError as e:
+            logger.error(f"Failed to create tables: {e}")
+            return False
+
+    async def maintain_partitions(self):
+        """Create upcoming motor_alerts partitions and expire old ones per the retention policy"""
+        try:
+            async with self.pool.acquire() as connection:
+                async with connection.transaction():
+                    await connection.execute(partitions.MAINTENANCE_LOCK_SQL)
+                    if await connection.fetchval(partitions.TABLE_KIND_SQL) != 'p':
+                        logger.warning("Skipping partition maintenance: motor_alerts is not partitioned")
+                        return False
+                    existing = [row['relname'] for row in await connection.fetch(partitions.LIST_PARTITIONS_SQL)]
+                    plan = partitions.plan_for_config(existing, self.config)
+                    for statement in plan.statements:
+                        await connection.execute(statement)
+
+            if plan.created or plan.expired:
+                logger.info(f"Partition maintenance: created {plan.created}, expired {plan.expired} "
+                            f"({self.config.PARTITION_RETENTION_ACTION})")
+            return True
+        except asyncpg.PostgresError as e:
+            logger.error(f"Failed to maintain partitions: {e}")
+            return False
+
+    async def _maintain_partitions_periodically(self):
+        while True:
+            await asyncio.sleep(self.config.PARTITION_MAINTENANCE_INTERVAL_S)
+            await self.maintain_partitions()
+
+    async def _poll_queue_depth_periodically(self):
+        while True:
+            try:
+                # Re-declaring with the same arguments changes nothing and reports the message count
+                result = await self.queue.declare()
+                metrics.QUEUE_DEPTH.set(result.message_count)
+            except Exception as e:
+                logger.error(f"Failed to read alerts queue depth: {e}")
+            await asyncio.sleep(self.config.METRICS_QUEUE_POLL_S)
+
+    async def connect_rabbitmq(self):
+        """Establish RabbitMQ connection and setup exchanges/queues"""
+        try:
+            self.connection = await aio_pika.connect_robust(self.config.RABBITMQ_URL)
+            self.channel = await self.connection.channel()
+
+            # Prefetch matches the in-flight limit so the broker never sends more than we can work on
+            await self.channel.set_qos(prefetch_count=self.config.MAX_IN_FLIGHT)
+
+            alerts_exchange = await self.channel.declare_exchange(
+                self.config.MOTOR_ALERTS_EXCHANGE,
+                aio_pika.ExchangeType.FANOUT,
+                durable=True
+            )
+            self.notifications_exchange = await self.channel.declare_exchange(
+                self.config.MOTOR_NOTIFICATIONS_EXCHANGE,
+                aio_pika.ExchangeType.FANOUT,
+                durable=True
+            )
+
+            self.queue = await self.channel.declare_queue(
+                self.config.MOTOR_ALERTS_QUEUE,
+                durable=True
+            )
+            if self.config.SHARD is None:
+                await self.queue.bind(alerts_exchange)
+                await self.warn_if_sharded()
+            else:
+                # Same topology as backends.declare_shard_queue
+                shard_exchange = await self.channel.declare_exchange(
+                    self.config.SHARD_EXCHANGE,
+                    'x-consistent-hash',
+                    durable=True
+                )
+                await shard_exchange.bind(alerts_exchange)
+                await self.queue.bind(shard_exchange, routing_key='1')
+
+            # Same delay and dead-letter queues as backends.declare_failure_queues
+            for queue, arguments in retry.failure_queues(self.config):
+                await self.channel.declare_queue(queue, durable=True, arguments=arguments or None)
+
+            logger.info("Connected to RabbitMQ and setup exchanges/queues")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to connect to RabbitMQ: {e}")
+            return False
+
+    async def warn_if_sharded(self):
+        """Same check as PikaBroker.connect: shard queues of a --workers run still exist"""
+        # The broker closes a channel on a missing queue, so keep the lookup off self.channel
+        channel = await self.connection.channel()
+        try:
+            await channel.declare_queue(shard_queue(self.config, 0), passive=True)
+        except ChannelNotFoundEntity:
+            return
+        finally:
+            if not channel.is_closed:
+                await channel.close()
+        logger.warning("Shard queues of a --workers run exist; once no shard process is left, "
+                       "run `python manage.py retire-shards` so they stop taking alerts")
+
+    async def publish_notification(self, alert_data, alert_id):
+        """Publish notification to motor.notifications exchange"""
+        try:
+            await self._publish(build_notification(alert_data, alert_id))
+            logger.info(f"Published notification for alert ID: {alert_id}")
+        except Exception as e:
+            logger.error(f"Failed to publish notification: {e}")
+            # Don't raise here as the alert was already saved to database
+
+    async def _publish(self, notification):
+        started = time.perf_counter()
+        await self.notifications_exchange.publish(
+            aio_pika.Message(
+                body=codec.encode_notification(notification),
+                content_type='application/json',
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+            ),
+            routing_key=''
+        )
+        metrics.PUBLISH_SECONDS.observe(time.perf_counter() - started)
+        metrics.NOTIFICATIONS_PUBLISHED.inc()
+
+    async def flush_episodes(self, close_all=False):
+        """Close quiet episodes, write changed ones and notify the dashboard of closed ones"""
+        # One flush at a time, so an episode is never inserted twice
+        async with self.episode_lock:
+            if close_all:
+                self.coalescer.close_all()
+            await self._flush_episodes()
+
+    async def _flush_episodes(self):
+        self.coalescer.expire()
+        # Repeats from a channel that has closed are redelivered; keep them out of the counts
+        self.coalescer.drop_acks(_channel_closed)
+        episodes = self.coalescer.take_updates()
+        if not episodes:
+            return
+
+        try:
+            episode_ids = []
+            async with self.pool.acquire() as connection:
+                async with connection.transaction():
+                    for episode in episodes:
+                        if episode.episode_id is None:
+                            episode_ids.append(
+                                await connection.fetchval(INSERT_EPISODE_ASYNC_SQL, *episode.row())
+                            )
+                        else:
+                            await connection.execute(
+                                UPDATE_EPISODE_ASYNC_SQL,
+                                episode.alert_id, *episode.state(), episode.episode_id
+                            )
+                            episode_ids.append(episode.episode_id)
+        except Exception as e:
+            # Keep them for the next flush rather than losing the counts; the
+            # repeats folded in since the last write are retried and fold in again
+            logger.error(f"Failed to save {len(episodes)} alert episodes: {e}")
+            for message, _ in self.coalescer.requeue(episodes):
+                await self.reject_alert(message, e, transient=True)
+            return
+
+        # The channel may have closed during the write: take those repeats back
+        # out again, and the next flush corrects the stored counts
+        self.coalescer.drop_acks(_channel_closed, episodes)
+        acks = self.coalescer.written(episodes)
+        for message, _ in acks:
+            await message.ack()
+        if acks:
+            self.record_first_ack()
+            metrics.record_acked([alert_data for _, alert_data in acks])
+
+        for episode, episode_id in zip(episodes, episode_ids):
+            episode.episode_id = episode_id
+            if episode.closed:
+                try:
+                    await self._publish(build_episode_notification(episode))
+                except Exception as e:
+                    logger.error(f"Failed to publish episode notification: {e}")
+
+        logger.info(f"Saved {len(episodes)} alert episodes")
+
+    async def _flush_episodes_periodically(self):
+        while True:
+            await asyncio.sleep(self.config.COALESCE_FLUSH_MS / 1000.0)
+            await self.flush_episodes()
+
+    def record_first_ack(self):
+        """Record the time from startup to the first acked message, once"""
+        if self.first_ack_s is not None or self.started_at is None:
+            return
+        self.first_ack_s = time.monotonic() - self.started_at
+        metrics.FIRST_ACK_SECONDS.set(self.first_ack_s)
+        logger.info(f"First message acked {self.first_ack_s:.3f}s after startup")
+
+    async def process_alert(self, message):
+        """Process a single alert message"""
+        async with self.in_flight:
+            # Parse errors are permanent; anything after parsing is retried later
+            transient = False
+            try:
+                started = time.perf_counter()
+                try:
+                    alert_data = parse_alert_message(message.body)
+                finally:
+                    metrics.PARSE_SECONDS.observe(time.perf_counter() - started)
+                transient = True
+
+                if self.coalescer is not None and self.coalescer.fold(alert_data, (message, alert_data)):
+                    # Folded into its open episode; acked once the next flush writes that
+                    metrics.MESSAGES_COALESCED.inc()
+                    if (self.coalescer.unacked >= max(1, self.config.MAX_IN_FLIGHT // 2)
+                            and not self.episode_lock.locked()):
+                        # Don't leave the broker waiting on the flush timer for acks
+                        await self.flush_episodes()
+                    return
+
+                logger.info(f"Processing alert for motor {alert_data['motor_id']}: "
+                            f"{alert_data['sensor_type']} = {alert_data['value']}")
+
+                started = time.perf_counter()
+                try:
+                    alert_id = await self.pool.fetchval(
+                        INSERT_ALERT_SQL,
+                        alert_data['motor_id'],
+                        alert_data['sensor_type'],
+                        alert_data['timestamp'],
+                        alert_data['value'],
+                        alert_data['alert_type']
+                    )
+                finally:
+                    metrics.INSERT_SECONDS.observe(time.perf_counter() - started)
+                    metrics.BATCH_SIZE.observe(1)
+                if self.coalescer is not None:
+                    self.coalescer.stored(alert_data, alert_id)
+
+                await self.publish_notification(alert_data, alert_id)
+                await message.ack()
+                self.record_first_ack()
+                metrics.record_acked((alert_data,))
+
+                logger.info(f"Successfully processed alert ID: {alert_id}")
+
+            except Exception as e:
+                logger.error(f"Failed to process alert: {e}")
+                await self.reject_alert(message, e, transient)
+
+    async def reject_alert(self, message, error, transient):
+        """Move a failed message to a delay queue or the dead-letter queue, as AlertProcessor.reject_alert"""
+        route = retry.route_failure(self.config, message.headers, error, transient)
+        if route is None:
+            # Requeueing would redeliver it straight back and loop forever
+            await message.nack(requeue=False)
+            metrics.record_rejected()
+            return
+
+        queue, headers = route
+        try:
+            await self.channel.default_exchange.publish(
+                aio_pika.Message(
+                    message.body,
+                    headers=headers,
+                    content_type=message.content_type,
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+                ),
+                routing_key=queue
+            )
+        except Exception as e:
+            logger.error(f"Failed to move alert message to {queue}: {e}")
+            # Redelivered at once rather than lost; the channel is most likely closed anyway
+            await message.nack(requeue=True)
+            return
+        await message.ack()
+        self.record_first_ack()
+        if queue == self.config.DEAD_LETTER_QUEUE:
+            logger.warning(f"Moved alert message to {queue} after {retry.attempts(headers)} retries: {error}")
+            metrics.record_dead_lettered()
+        else:
+            metrics.record_retried()
+
+    async def _on_message(self, message):
+        # Run each message as its own task so the consumer keeps reading
+        task = asyncio.create_task(self.process_alert(message))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def start_consuming(self):
+        """Consume until a shutdown signal arrives, then drain in-flight messages"""
+        logger.info("Starting to consume messages from motor.alerts queue...")
+        consumer_tag = await self.queue.consume(self._on_message)
+        startup_s = time.monotonic() - self.started_at
+        metrics.STARTUP_SECONDS.set(startup_s)
+        logger.info(f"Started in {startup_s:.3f}s")
+        logger.info("Waiting for messages. To exit press CTRL+C")
+
+        await self.stop_event.wait()
+
+        await self.queue.cancel(consumer_tag)
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.coalescer is not None:
+            await self.flush_episodes(close_all=True)
+            logger.info(f"Alert coalescer stats: {self.coalescer.stats()}")
+        logger.info("Stopped consuming messages")
+
+    async def run(self):
+        """Main run method"""
+        logger.info("Starting Async Alert Processor...")
+        self.started_at = time.monotonic()
+
+        self.in_flight = asyncio.Semaphore(self.config.MAX_IN_FLIGHT)
+        self.episode_lock = asyncio.Lock()
+        self.stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self._signal_handler, signum)
+
+        maintenance = None
+        episode_flusher = None
+        queue_poller = None
+        metrics_server = None
+        try:
+            if self.config.METRICS_PORT > 0:
+                try:
+                    metrics_server = metrics.start_http_server(self.config.METRICS_HOST, self.config.METRICS_PORT)
+                except OSError as e:
+                    logger.error(f"Failed to start metrics server: {e}")
+
+            if not await self.connect_database():
+                return False
+
+            if not await self.create_tables():
+                return False
+
+            await self.maintain_partitions()
+            maintenance = asyncio.create_task(self._maintain_partitions_periodically())
+
+            if not await self.connect_rabbitmq():
+                logger.error("Failed to connect to RabbitMQ")
+                return False
+
+            if self.coalescer is not None:
+                episode_flusher = asyncio.create_task(self._flush_episodes_periodically())
+            queue_poller = asyncio.create_task(self._poll_queue_depth_periodically())
+
+            await self.start_consuming()
+
+        except Exception as e:
+            logger.error(f"Unexpected error in run: {e}")
+            return False
+
+        finally:
+            if maintenance:
+                maintenance.cancel()
+            if episode_flusher:
+                episode_flusher.cancel()
+            if queue_poller:
+                queue_poller.cancel()
+            if self.connection and not self.connection.is_closed:
+                await self.connection.close()
+                logger.info("Disconnected from RabbitMQ")
+            if self.pool:
+                await self.pool.close()
+                logger.info("Disconnected from PostgreSQL database")
+            if metrics_server:
+                metrics_server.shutdown()
+                metrics_server.server_close()
+            logger.info("Async Alert Processor stopped")
+
+        return True
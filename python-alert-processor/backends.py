@@ -0,0 +1,974 @@
+"""
+Transport and storage backends for the alert processor.
+
+AlertProcessor talks to RabbitMQ through a Broker and to PostgreSQL through
+an AlertStore. The in-process implementations here (InMemoryBroker and
+SQLiteAlertStore) let the whole pipeline run without a live RabbitMQ or
+PostgreSQL, e.g. for load tests on a laptop or in CI.
+"""
+
+import base64
+import functools
+import heapq
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import date, datetime
+from types import SimpleNamespace
+
+import pika
+from pika.exceptions import AMQPConnectionError, ChannelClosedByBroker
+
+import readings
+import retry
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+def encode_history_cursor(timestamp, alert_id):
+    """Opaque cursor of the history page after the alert at (timestamp, alert_id)"""
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{alert_id}".encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_history_cursor(cursor):
+    """(timestamp, alert_id) of a cursor made by encode_history_cursor; ValueError for anything else"""
+    try:
+        timestamp, alert_id = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8').split('|')
+        return datetime.fromisoformat(timestamp), int(alert_id)
+    except ValueError:
+        # Also covers bad base64 (binascii.Error) and bad UTF-8
+        raise ValueError("cursor is not valid")
+
+class Broker(ABC):
+    """Message transport used by AlertProcessor.
+
+    After connect() succeeds, `connection` and `channel` expose the subset of
+    pika's BlockingConnection / BlockingChannel API that the processor uses:
+    process_data_events, call_later, remove_timeout, add_callback_threadsafe,
+    is_open/is_closed and close on the connection; basic_qos, basic_consume,
+    basic_publish, confirm_delivery, basic_ack and basic_nack on the channel.
+    Failed messages are moved to a delay or dead-letter queue with republish().
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.connection = None
+        self.channel = None
+
+    @abstractmethod
+    def connect(self):
+        """Connect and declare exchanges/queues, returning True on success"""
+
+    @abstractmethod
+    def queue_depth(self):
+        """Number of messages waiting in the alerts queue (not yet delivered)"""
+
+    @abstractmethod
+    def republish(self, queue, body, properties, headers):
+        """Publish a delivered message to `queue` through the default exchange, with new headers"""
+
+    def disconnect(self):
+        """Close the broker connection"""
+        if self.connection and not self.connection.is_closed:
+            self.connection.close()
+            logger.info("Disconnected from RabbitMQ")
+
+def shard_queue(config, shard):
+    """Name of the queue consumed by shard process `shard`"""
+    return f"{config.MOTOR_ALERTS_QUEUE}.shard-{shard}"
+
+def declare_shard_queue(channel, config, queue):
+    """Declare `queue` as one shard of motor.alerts on a pika channel.
+
+    motor.alerts is bound to a consistent-hash exchange (SHARD_EXCHANGE),
+    which hashes each message's routing key (the ingestor sets it to the
+    motor ID) onto the shard queues bound to it, so every alert for a motor
+    lands on the same queue. Each queue binds with weight "1", i.e. an equal
+    share of the hash ring. Needs the rabbitmq_consistent_hash_exchange plugin.
+    """
+    channel.exchange_declare(
+        exchange=config.SHARD_EXCHANGE,
+        exchange_type='x-consistent-hash',
+        durable=True
+    )
+    channel.exchange_bind(
+        destination=config.SHARD_EXCHANGE,
+        source=config.MOTOR_ALERTS_EXCHANGE
+    )
+    channel.queue_declare(queue=queue, durable=True)
+    channel.queue_bind(exchange=config.SHARD_EXCHANGE, queue=queue, routing_key='1')
+
+def _passive_declare(connection, queue):
+    """Method frame of a passive declare of `queue` (message and consumer count), None if it is missing"""
+    # The broker closes the channel of a lookup that fails, so each gets a channel of its own
+    channel = connection.channel()
+    try:
+        return channel.queue_declare(queue=queue, passive=True).method
+    except ChannelClosedByBroker:
+        return None
+    finally:
+        if channel.is_open:
+            channel.close()
+
+def find_shard_queues(connection, config, first=0):
+    """[(queue, message_count, consumer_count)] of shard queues `first`, `first` + 1, ... on a pika connection.
+
+    Shard queues are numbered from 0 without gaps, so the first missing one
+    ends the search.
+    """
+    queues = []
+    for shard in itertools.count(first):
+        queue = shard_queue(config, shard)
+        method = _passive_declare(connection, queue)
+        if method is None:
+            return queues
+        queues.append((queue, method.message_count, method.consumer_count))
+
+def _move_messages(channel, queue, exchange, routing_key):
+    """Move every message of `queue` to `exchange`, acking each once the broker confirmed its copy.
+
+    A `routing_key` of None keeps each message's own routing key.
+    """
+    moved = 0
+    while True:
+        method, properties, body = channel.basic_get(queue=queue, auto_ack=False)
+        if method is None:
+            return moved
+        channel.basic_publish(
+            exchange=exchange,
+            routing_key=method.routing_key if routing_key is None else routing_key,
+            body=body,
+            properties=properties,
+            mandatory=True
+        )
+        channel.basic_ack(method.delivery_tag)
+        moved += 1
+
+def retire_shard_queues(connection, config, first=0, to_queue=None):
+    """Retire shard queues `first`, `first` + 1, ... of SHARD_EXCHANGE on a pika connection.
+
+    They are left over from a run with more shard processes, and would keep
+    taking their share of the motors with nobody consuming them. A queue
+    that still has consumers belongs to a process that is running and is
+    left alone. Every other one is unbound, then its delay queues (see
+    retry.py) and the queue itself are emptied and deleted, delay queues
+    first, since they dead-letter into the shard queue. Their alerts go to
+    `to_queue` or, if None, back to SHARD_EXCHANGE by their routing key,
+    onto the shard queues that remain. Alerts waiting for a retry are
+    retried at once. Their routing key is a queue name rather than a motor
+    ID, so they all hash onto one shard.
+    """
+    if to_queue is None:
+        exchange, routing_key = config.SHARD_EXCHANGE, None
+    else:
+        exchange, routing_key = '', to_queue
+    channel = connection.channel()
+    try:
+        # Each message is acked only after the broker has taken its copy
+        channel.confirm_delivery()
+        for queue, _, consumer_count in find_shard_queues(connection, config, first):
+            if consumer_count:
+                logger.warning(f"Not retiring shard queue {queue}: {consumer_count} consumers are attached")
+                continue
+            channel.queue_unbind(queue=queue, exchange=config.SHARD_EXCHANGE, routing_key='1')
+            delay_queues = [retry.retry_queue(config, attempt, queue)
+                            for attempt in range(1, config.RETRY_ATTEMPTS + 1)]
+            for source in [name for name in delay_queues if _passive_declare(connection, name)] + [queue]:
+                moved = _move_messages(channel, source, exchange, routing_key)
+                if moved:
+                    logger.info(f"Moved {moved} messages from {source} to {to_queue or exchange}")
+                channel.queue_delete(queue=source)
+            logger.info(f"Retired shard queue {queue}")
+    finally:
+        if channel.is_open:
+            channel.close()
+
+def retire_sharding(connection, config):
+    """Undo the topology of a sharded run for an unsharded consumer, on a pika connection.
+
+    Binds the unsharded alerts queue to motor.alerts and unbinds
+    SHARD_EXCHANGE, so alerts are no longer copied to the shard queues as
+    well, then retires every shard queue into the alerts queue. Refuses,
+    returning False, while any shard queue has a consumer: a sharded
+    deployment is still running. Does nothing if there is no SHARD_EXCHANGE,
+    i.e. the processor never ran sharded. Run by `manage.py retire-shards`.
+    """
+    channel = connection.channel()
+    try:
+        try:
+            channel.exchange_declare(exchange=config.SHARD_EXCHANGE, passive=True)
+        except ChannelClosedByBroker:
+            logger.info(f"There is no {config.SHARD_EXCHANGE}; nothing to retire")
+            return True
+        consumed = [queue for queue, _, consumer_count in find_shard_queues(connection, config) if consumer_count]
+        if consumed:
+            logger.error(f"Shard queues {', '.join(consumed)} have consumers; stop the sharded processes first")
+            return False
+        # Bind the unsharded queue first so no alert is dropped in between
+        channel.queue_declare(queue=config.MOTOR_ALERTS_QUEUE, durable=True)
+        channel.queue_bind(exchange=config.MOTOR_ALERTS_EXCHANGE, queue=config.MOTOR_ALERTS_QUEUE)
+        channel.exchange_unbind(destination=config.SHARD_EXCHANGE, source=config.MOTOR_ALERTS_EXCHANGE)
+        logger.info(f"Unbound {config.SHARD_EXCHANGE} from {config.MOTOR_ALERTS_EXCHANGE}")
+    finally:
+        if channel.is_open:
+            channel.close()
+    retire_shard_queues(connection, config, to_queue=config.MOTOR_ALERTS_QUEUE)
+    return True
+
+def declare_failure_queues(channel, config):
+    """Declare the delay queues and the dead-letter queue of the alerts queue (see retry.py)"""
+    for queue, arguments in retry.failure_queues(config):
+        channel.queue_declare(queue=queue, durable=True, arguments=arguments or None)
+
+class PikaBroker(Broker):
+    """RabbitMQ over a pika BlockingConnection"""
+
+    def connect(self):
+        """Establish RabbitMQ connection and setup exchanges/queues"""
+        try:
+            # Establish connection
+            parameters = pika.URLParameters(self.config.RABBITMQ_URL)
+            self.connection = pika.BlockingConnection(parameters)
+            self.channel = self.connection.channel()
+
+            # Declare exchanges
+            self.channel.exchange_declare(
+                exchange=self.config.MOTOR_ALERTS_EXCHANGE,
+                exchange_type='fanout',
+                durable=True
+            )
+
+            self.channel.exchange_declare(
+                exchange=self.config.MOTOR_NOTIFICATIONS_EXCHANGE,
+                exchange_type='fanout',
+                durable=True
+            )
+
+            if self.config.SHARD is None:
+                # Declare and bind queue for motor.alerts
+                self.channel.queue_declare(
+                    queue=self.config.MOTOR_ALERTS_QUEUE,
+                    durable=True
+                )
+
+                self.channel.queue_bind(
+                    exchange=self.config.MOTOR_ALERTS_EXCHANGE,
+                    queue=self.config.MOTOR_ALERTS_QUEUE
+                )
+
+                if find_shard_queues(self.connection, self.config):
+                    logger.warning("Shard queues of a --workers run exist; once no shard process is left, "
+                                   "run `python manage.py retire-shards` so they stop taking alerts")
+            else:
+                declare_shard_queue(self.channel, self.config, self.config.MOTOR_ALERTS_QUEUE)
+
+            declare_failure_queues(self.channel, self.config)
+
+            logger.info("Connected to RabbitMQ and setup exchanges/queues")
+            return True
+
+        except AMQPConnectionError as e:
+            logger.error(f"Failed to connect to RabbitMQ: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"Unexpected error connecting to RabbitMQ: {e}")
+            return False
+
+    def queue_depth(self):
+        # A passive declare only reports on the queue; it fails if the queue is missing
+        result = self.channel.queue_declare(queue=self.config.MOTOR_ALERTS_QUEUE, passive=True)
+        return result.method.message_count
+
+    def republish(self, queue, body, properties, headers):
+        self.channel.basic_publish(
+            exchange='',
+            routing_key=queue,
+            body=body,
+            properties=pika.BasicProperties(
+                content_type=getattr(properties, 'content_type', None),
+                headers=headers,
+                delivery_mode=2  # persistent, like the queues it goes to
+            )
+        )
+
+class InMemoryBroker(Broker):
+    """Single-queue, in-process broker with RabbitMQ-like ack/nack semantics.
+
+    Messages published with publish_alert() are delivered to the consumer by
+    process_data_events(), at most `prefetch_count` unacknowledged at a time.
+    Nacked messages are requeued at the head of the queue or, with
+    requeue=False, recorded in `dead_lettered`. Republished messages go
+    through the declared delay queues (their TTL is a timer, after which they
+    return to the alerts queue) or, on the dead-letter queue, are recorded in
+    `dead_lettered` with their headers in `dead_letter_headers` (None for
+    nacked messages). Notifications published by
+    the processor are recorded per exchange in `published`. If `on_settle`
+    is set it is called as on_settle(properties, acked) for every settled
+    delivery, e.g. to measure per-message latency.
+    """
+
+    def __init__(self, config: Config):
+        super().__init__(config)
+        self.connection = _InMemoryConnection(self)
+        self.channel = _InMemoryChannel(self)
+
+        self.ready = deque()
+        self.unacked = {}
+        self.prefetch_count = 0
+        self.consumer = None
+        self.acked_count = 0
+        self.dead_lettered = []
+        self.dead_letter_headers = []
+        # Declared queues other than the alerts queue, with their arguments
+        self.queues = {}
+        self.published = defaultdict(list)
+        self.on_settle = None
+
+        self._delivery_tags = itertools.count(1)
+        self._condition = threading.Condition()
+        self._callbacks = deque()
+        self._timers = []
+        self._timer_ids = itertools.count()
+        self._cancelled_timers = set()
+        self._closed = True
+
+    def connect(self):
+        self._closed = False
+        declare_failure_queues(self.channel, self.config)
+        logger.info("Connected to in-memory broker")
+        return True
+
+    def publish_alert(self, body, properties=None):
+        """Enqueue a message on the alerts queue (safe to call from any thread)"""
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        with self._condition:
+            self.ready.append((body, properties, False))
+            self._condition.notify_all()
+
+    def queue_depth(self):
+        with self._condition:
+            return len(self.ready)
+
+    def republish(self, queue, body, properties, headers):
+        fields = dict(vars(properties)) if properties is not None else {}
+        properties = SimpleNamespace(**{**fields, 'headers': headers})
+        if queue == self.config.DEAD_LETTER_QUEUE:
+            with self._condition:
+                self.dead_lettered.append(body)
+                self.dead_letter_headers.append(headers)
+            return
+        arguments = self.queues.get(queue)
+        if arguments is None or arguments.get('x-dead-letter-routing-key') != self.config.MOTOR_ALERTS_QUEUE:
+            # The default exchange drops messages for queues that don't exist
+            logger.warning(f"Dropped message republished to undeclared queue {queue}")
+            return
+        # The delay queue's TTL, after which it dead-letters back to the alerts queue
+        self.connection.call_later(
+            arguments['x-message-ttl'] / 1000.0,
+            functools.partial(self._requeue, body, properties)
+        )
+
+    def _requeue(self, body, properties):
+        with self._condition:
+            self.ready.append((body, properties, False))
+            self._condition.notify_all()
+
+    def is_drained(self):
+        """True when every message has been delivered and settled"""
+        with self._condition:
+            return not self.ready and not self.unacked and not self._callbacks
+
+    def drain(self, timeout=None):
+        """Process events until the queue is empty and all deliveries are settled"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.is_drained() or self._timers:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            self.process_data_events(time_limit=0.01)
+        return True
+
+    def process_data_events(self, time_limit=0):
+        """Run due callbacks and timers, then deliver up to the prefetch window"""
+        with self._condition:
+            if not self._has_work():
+                self._condition.wait(timeout=min(time_limit or 0, self._next_timer_delay()))
+
+            callbacks = list(self._callbacks)
+            self._callbacks.clear()
+
+        for callback in callbacks:
+            callback()
+        self._run_due_timers()
+        self._deliver()
+
+    def _has_work(self):
+        return bool(self._callbacks) or self._next_timer_delay() == 0 or self._can_deliver()
+
+    def _can_deliver(self):
+        if self.consumer is None or not self.ready:
+            return False
+        return not self.prefetch_count or len(self.unacked) < self.prefetch_count
+
+    def _next_timer_delay(self):
+        if not self._timers:
+            return float('inf')
+        return max(0.0, self._timers[0][0] - time.monotonic())
+
+    def _run_due_timers(self):
+        while True:
+            with self._condition:
+                if not self._timers or self._timers[0][0] > time.monotonic():
+                    return
+                _, timer_id, callback = heapq.heappop(self._timers)
+                if timer_id in self._cancelled_timers:
+                    self._cancelled_timers.discard(timer_id)
+                    continue
+            callback()
+
+    def _deliver(self):
+        while True:
+            with self._condition:
+                if not self._can_deliver():
+                    return
+                body, properties, redelivered = self.ready.popleft()
+                delivery_tag = next(self._delivery_tags)
+                self.unacked[delivery_tag] = (body, properties)
+
+            method = SimpleNamespace(
+                delivery_tag=delivery_tag,
+                redelivered=redelivered,
+                exchange=self.config.MOTOR_ALERTS_EXCHANGE,
+                routing_key=''
+            )
+            self.consumer(self.channel, method, properties, body)
+
+    def _settle(self, delivery_tag, multiple):
+        if multiple:
+            tags = [tag for tag in self.unacked if tag <= delivery_tag]
+        else:
+            tags = [delivery_tag] if delivery_tag in self.unacked else []
+        return [(tag, self.unacked.pop(tag)) for tag in tags]
+
+class _InMemoryConnection:
+    def __init__(self, broker):
+        self._broker = broker
+
+    @property
+    def is_closed(self):
+        return self._broker._closed
+
+    @property
+    def is_open(self):
+        return not self._broker._closed
+
+    def close(self):
+        broker = self._broker
+        with broker._condition:
+            broker._closed = True
+            # Like RabbitMQ, unacknowledged deliveries return to the queue
+            for tag in sorted(broker.unacked, reverse=True):
+                body, properties = broker.unacked.pop(tag)
+                broker.ready.appendleft((body, properties, True))
+            broker._condition.notify_all()
+
+    def process_data_events(self, time_limit=0):
+        self._broker.process_data_events(time_limit)
+
+    def call_later(self, delay, callback):
+        broker = self._broker
+        with broker._condition:
+            timer_id = next(broker._timer_ids)
+            heapq.heappush(broker._timers, (time.monotonic() + delay, timer_id, callback))
+            return timer_id
+
+    def remove_timeout(self, timer_id):
+        broker = self._broker
+        with broker._condition:
+            if any(entry[1] == timer_id for entry in broker._timers):
+                broker._cancelled_timers.add(timer_id)
+
+    def add_callback_threadsafe(self, callback):
+        broker = self._broker
+        with broker._condition:
+            broker._callbacks.append(callback)
+            broker._condition.notify_all()
+
+class _InMemoryChannel:
+    def __init__(self, broker):
+        self._broker = broker
+
+    @property
+    def is_open(self):
+        return not self._broker._closed
+
+    def confirm_delivery(self):
+        # Publishes to the in-memory broker cannot be lost, so every one is confirmed
+        pass
+
+    def basic_qos(self, prefetch_count=0, **kwargs):
+        self._broker.prefetch_count = prefetch_count
+
+    def queue_declare(self, queue, durable=False, arguments=None, **kwargs):
+        with self._broker._condition:
+            self._broker.queues[queue] = dict(arguments or {})
+
+    def basic_consume(self, queue, on_message_callback, **kwargs):
+        self._broker.consumer = on_message_callback
+        return 'ctag-in-memory'
+
+    def basic_cancel(self, consumer_tag=None):
+        # Deliveries only happen in process_data_events, so none can be pending
+        self._broker.consumer = None
+        return []
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, **kwargs):
+        self._broker.published[exchange].append(body)
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        broker = self._broker
+        with broker._condition:
+            settled = broker._settle(delivery_tag, multiple)
+            broker.acked_count += len(settled)
+        if broker.on_settle:
+            for _, (_, properties) in settled:
+                broker.on_settle(properties, True)
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        broker = self._broker
+        with broker._condition:
+            settled = broker._settle(delivery_tag, multiple)
+            for _, (body, properties) in reversed(settled):
+                if requeue:
+                    broker.ready.appendleft((body, properties, True))
+                else:
+                    broker.dead_lettered.append(body)
+                    broker.dead_letter_headers.append(None)
+        if broker.on_settle and not requeue:
+            for _, (_, properties) in settled:
+                broker.on_settle(properties, False)
+
+class AlertStore(ABC):
+    """Alert storage used by AlertProcessor.
+
+    Implementations return rows from the read methods as dicts with the same
+    keys as the motor_alerts columns.
+    """
+
+    @abstractmethod
+    def connect(self):
+        """Open the store, returning True on success"""
+
+    @abstractmethod
+    def disconnect(self):
+        """Close the store"""
+
+    @abstractmethod
+    def create_tables(self):
+        """Create the alert schema if needed, returning True on success"""
+
+    @abstractmethod
+    def insert_alert(self, motor_id, sensor_type, timestamp, value, alert_type):
+        """Insert one alert and return its ID"""
+
+    @abstractmethod
+    def insert_alerts(self, alerts):
+        """Insert several alerts, returning their IDs in input order"""
+
+    @abstractmethod
+    def save_episodes(self, episodes):
+        """Insert new coalescer episodes and update known ones, returning their IDs in input order"""
+
+    @abstractmethod
+    def insert_spilled_alerts(self, alerts, spill_id, position):
+        """Insert alerts replayed from a spill log and record `position` as that log's
+        checkpoint in the same transaction, returning the IDs in input order"""
+
+    @abstractmethod
+    def get_spill_checkpoint(self, spill_id):
+        """(segment, offset) the spill log has been replayed up to, or None"""
+
+    @abstractmethod
+    def save_reading_buckets(self, rows):
+        """Merge reading bucket rows (readings.ReadingAggregator.close_buckets()) into the
+        reading tables atomically, returning how many were written"""
+
+    @abstractmethod
+    def get_recent_alerts(self, motor_id, limit=5):
+        """Get recent alerts for a specific motor"""
+
+    @abstractmethod
+    def get_recent_alerts_by_motor(self, limit=5):
+        """Get the most recent alerts of every motor"""
+
+    @abstractmethod
+    def get_daily_alert_counts(self, start_date, end_date):
+        """Get daily alert counts per motor between two dates"""
+
+    @abstractmethod
+    def get_alert_summary(self):
+        """Per (motor_id, sensor_type, alert_type) aggregates like the alert_summary view, plus last_id"""
+
+    @abstractmethod
+    def get_alert_totals(self):
+        """get_alert_summary() rows from a rollup rather than the alerts, with last_id the highest
+        alert ID of all; None if the rollup cannot provide them"""
+
+    @abstractmethod
+    def get_alerts_after(self, alert_id, limit, motor_id=None):
+        """Up to `limit` alerts (of `motor_id` if given) with an ID above `alert_id`, in ID order"""
+
+    @abstractmethod
+    def get_alert_history(self, limit, after=None, motor_id=None, sensor_type=None, alert_type=None,
+                          start=None, end=None):
+        """(alerts, next cursor) of one history page, newest first by (timestamp, id).
+
+        `after` is the cursor returned with the previous page; the next cursor
+        is None after the last page. Filters are optional, with
+        start <= timestamp < end.
+        """
+
+    @abstractmethod
+    def maintain_partitions(self):
+        """Create upcoming storage partitions and expire old ones, returning True on success"""
+
+    @abstractmethod
+    def health_check(self):
+        """Return True if the store is usable"""
+
+    @abstractmethod
+    def create_pool(self, minconn, maxconn):
+        """Prepare the store for use from several worker threads"""
+
+    @abstractmethod
+    def pooled_connection(self):
+        """Context manager binding a connection to the calling worker thread"""
+
+class SQLiteAlertStore(AlertStore):
+    """AlertStore on SQLite (in memory by default), for tests and load runs"""
+
+    def __init__(self, config: Config = None, path=':memory:'):
+        self.config = config
+        self.path = path
+        self.connection = None
+        self._lock = threading.RLock()
+
+    def connect(self):
+        if self.connection is not None:
+            # Reconnecting would lose an in-memory database's contents
+            return True
+        self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        logger.info(f"Connected to SQLite store at {self.path}")
+        return True
+
+    def disconnect(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+    def create_tables(self):
+        with self._lock:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS motor_alerts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    motor_id TEXT NOT NULL,
+                    sensor_type TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    value REAL NOT NULL,
+                    alert_type TEXT NOT NULL,
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                );
+                CREATE INDEX IF NOT EXISTS idx_motor_alerts_motor_timestamp
+                ON motor_alerts(motor_id, timestamp DESC);
+                CREATE TABLE IF NOT EXISTS motor_alert_episodes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    alert_id INTEGER,
+                    motor_id TEXT NOT NULL,
+                    sensor_type TEXT NOT NULL,
+                    alert_type TEXT NOT NULL,
+                    first_timestamp TEXT NOT NULL,
+                    last_timestamp TEXT NOT NULL,
+                    alert_count INTEGER NOT NULL,
+                    max_value REAL NOT NULL,
+                    closed INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS motor_alert_spill_checkpoints (
+                    spill_id TEXT PRIMARY KEY,
+                    segment INTEGER NOT NULL,
+                    segment_offset INTEGER NOT NULL
+                );
+            """)
+            for suffix, _ in readings.RESOLUTIONS:
+                self.connection.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {readings.reading_table(suffix)} (
+                        motor_id TEXT NOT NULL,
+                        sensor_type TEXT NOT NULL,
+                        bucket TEXT NOT NULL,
+                        reading_count INTEGER NOT NULL,
+                        min_value REAL NOT NULL,
+                        max_value REAL NOT NULL,
+                        sum_value REAL NOT NULL,
+                        avg_value REAL GENERATED ALWAYS AS (sum_value / reading_count),
+                        last_value REAL NOT NULL,
+                        last_at TEXT NOT NULL,
+                        PRIMARY KEY (motor_id, sensor_type, bucket)
+                    );
+                """)
+        return True
+
+    def insert_alert(self, motor_id, sensor_type, timestamp, value, alert_type):
+        with self._lock:
+            cursor = self.connection.execute("""
+                INSERT INTO motor_alerts (motor_id, sensor_type, timestamp, value, alert_type)
+                VALUES (?, ?, ?, ?, ?);
+            """, (motor_id, sensor_type, timestamp.isoformat(), value, alert_type))
+            return cursor.lastrowid
+
+    def insert_alerts(self, alerts):
+        with self._lock:
+            # One transaction, so the batch is all-or-nothing like the PostgreSQL insert
+            self.connection.execute("BEGIN")
+            try:
+                alert_ids = self._insert_alert_rows(alerts)
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+            return alert_ids
+
+    def _insert_alert_rows(self, alerts):
+        return [
+            self.connection.execute("""
+                INSERT INTO motor_alerts (motor_id, sensor_type, timestamp, value, alert_type)
+                VALUES (?, ?, ?, ?, ?);
+            """, (alert['motor_id'], alert['sensor_type'], alert['timestamp'].isoformat(),
+                  alert['value'], alert['alert_type'])).lastrowid
+            for alert in alerts
+        ]
+
+    def insert_spilled_alerts(self, alerts, spill_id, position):
+        with self._lock:
+            self.connection.execute("BEGIN")
+            try:
+                alert_ids = self._insert_alert_rows(alerts)
+                self.connection.execute("""
+                    INSERT INTO motor_alert_spill_checkpoints (spill_id, segment, segment_offset)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT (spill_id) DO UPDATE
+                    SET segment = excluded.segment, segment_offset = excluded.segment_offset;
+                """, (spill_id,) + tuple(position))
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+            return alert_ids
+
+    def get_spill_checkpoint(self, spill_id):
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT segment, segment_offset FROM motor_alert_spill_checkpoints WHERE spill_id = ?;",
+                (spill_id,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def save_episodes(self, episodes):
+        with self._lock:
+            self.connection.execute("BEGIN")
+            try:
+                episode_ids = []
+                for episode in episodes:
+                    first_timestamp, last_timestamp, count, max_value, closed = episode.state()
+                    state = (first_timestamp.isoformat(), last_timestamp.isoformat(),
+                             count, max_value, closed)
+                    if episode.episode_id is None:
+                        episode_ids.append(self.connection.execute("""
+                            INSERT INTO motor_alert_episodes
+                                (alert_id, motor_id, sensor_type, alert_type, first_timestamp,
+                                 last_timestamp, alert_count, max_value, closed)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
+                        """, (episode.alert_id, episode.motor_id, episode.sensor_type,
+                              episode.alert_type) + state).lastrowid)
+                    else:
+                        self.connection.execute("""
+                            UPDATE motor_alert_episodes
+                            SET alert_id = ?, first_timestamp = ?, last_timestamp = ?,
+                                alert_count = ?, max_value = ?, closed = ?
+                            WHERE id = ?;
+                        """, (episode.alert_id,) + state + (episode.episode_id,))
+                        episode_ids.append(episode.episode_id)
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+            return episode_ids
+
+    def save_reading_buckets(self, rows):
+        with self._lock:
+            self.connection.execute("BEGIN")
+            try:
+                for row in rows:
+                    suffix, motor_id, sensor_type, bucket, count, minimum, maximum, total, last, last_at = row
+                    self.connection.execute(f"""
+                        INSERT INTO {readings.reading_table(suffix)} AS buckets
+                            (motor_id, sensor_type, bucket, reading_count, min_value, max_value,
+                             sum_value, last_value, last_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (motor_id, sensor_type, bucket) DO UPDATE
+                        SET reading_count = buckets.reading_count + excluded.reading_count,
+                            min_value = MIN(buckets.min_value, excluded.min_value),
+                            max_value = MAX(buckets.max_value, excluded.max_value),
+                            sum_value = buckets.sum_value + excluded.sum_value,
+                            last_value = CASE WHEN excluded.last_at >= buckets.last_at
+                                              THEN excluded.last_value ELSE buckets.last_value END,
+                            last_at = MAX(buckets.last_at, excluded.last_at);
+                    """, (motor_id, sensor_type, bucket.isoformat(), count, minimum, maximum,
+                          total, last, last_at.isoformat()))
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+            return len(rows)
+
+    def get_recent_alerts(self, motor_id, limit=5):
+        with self._lock:
+            rows = self.connection.execute("""
+                SELECT id, motor_id, sensor_type, timestamp, value, alert_type, created_at
+                FROM motor_alerts
+                WHERE motor_id = ?
+                ORDER BY timestamp DESC
+                LIMIT ?;
+            """, (motor_id, limit)).fetchall()
+        return [self._alert_row(row) for row in rows]
+
+    @staticmethod
+    def _alert_row(row):
+        alert = dict(row)
+        alert['timestamp'] = datetime.fromisoformat(alert['timestamp'])
+        return alert
+
+    def get_recent_alerts_by_motor(self, limit=5):
+        with self._lock:
+            rows = self.connection.execute("""
+                SELECT id, motor_id, sensor_type, timestamp, value, alert_type, created_at
+                FROM (
+                    SELECT *,
+                        ROW_NUMBER() OVER (
+                            PARTITION BY motor_id ORDER BY timestamp DESC, id DESC
+                        ) AS motor_rank
+                    FROM motor_alerts
+                )
+                WHERE motor_rank <= ?
+                ORDER BY motor_id, timestamp DESC;
+            """, (limit,)).fetchall()
+        return [self._alert_row(row) for row in rows]
+
+    def get_daily_alert_counts(self, start_date, end_date):
+        with self._lock:
+            rows = self.connection.execute("""
+                SELECT
+                    motor_id,
+                    DATE(timestamp) as alert_date,
+                    COUNT(*) as count
+                FROM motor_alerts
+                WHERE DATE(timestamp) BETWEEN ? AND ?
+                GROUP BY motor_id, DATE(timestamp)
+                ORDER BY alert_date DESC, motor_id;
+            """, (start_date.isoformat(), end_date.isoformat())).fetchall()
+        return [
+            {'motor_id': row['motor_id'], 'alert_date': date.fromisoformat(row['alert_date']),
+             'count': row['count']}
+            for row in rows
+        ]
+
+    def get_alert_summary(self):
+        with self._lock:
+            rows = self.connection.execute("""
+                SELECT motor_id, sensor_type, alert_type,
+                    COUNT(*) AS total_alerts,
+                    MIN(timestamp) AS first_alert,
+                    MAX(timestamp) AS last_alert,
+                    AVG(value) AS avg_value,
+                    MIN(value) AS min_value,
+                    MAX(value) AS max_value,
+                    MAX(id) AS last_id
+                FROM motor_alerts
+                GROUP BY motor_id, sensor_type, alert_type
+                ORDER BY motor_id, sensor_type, alert_type;
+            """).fetchall()
+        return [
+            dict(row, first_alert=datetime.fromisoformat(row['first_alert']),
+                 last_alert=datetime.fromisoformat(row['last_alert']))
+            for row in rows
+        ]
+
+    def get_alert_totals(self):
+        # There is no rollup here; the summary is cheap at the sizes this store is used for
+        return self.get_alert_summary()
+
+    def get_alerts_after(self, alert_id, limit, motor_id=None):
+        with self._lock:
+            rows = self.connection.execute("""
+                SELECT id, motor_id, sensor_type, timestamp, value, alert_type, created_at
+                FROM motor_alerts
+                WHERE id > ? AND (? IS NULL OR motor_id = ?)
+                ORDER BY id
+                LIMIT ?;
+            """, (alert_id, motor_id, motor_id, limit)).fetchall()
+        return [self._alert_row(row) for row in rows]
+
+    def get_alert_history(self, limit, after=None, motor_id=None, sensor_type=None, alert_type=None,
+                          start=None, end=None):
+        conditions, params = [], []
+        for column, value in (('motor_id', motor_id), ('sensor_type', sensor_type), ('alert_type', alert_type)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(start.isoformat())
+        if end is not None:
+            conditions.append("timestamp < ?")
+            params.append(end.isoformat())
+        if after is not None:
+            timestamp, alert_id = decode_history_cursor(after)
+            conditions.append("(timestamp, id) < (?, ?)")
+            params += [timestamp.isoformat(), alert_id]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self.connection.execute(f"""
+                SELECT id, motor_id, sensor_type, timestamp, value, alert_type, created_at
+                FROM motor_alerts
+                {where}
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?;
+            """, params + [limit + 1]).fetchall()
+        alerts = [self._alert_row(row) for row in rows[:limit]]
+        if len(rows) <= limit:
+            return alerts, None
+        return alerts, encode_history_cursor(alerts[-1]['timestamp'], alerts[-1]['id'])
+
+    def maintain_partitions(self):
+        # SQLite has no table partitioning; everything lives in one table
+        return True
+
+    def health_check(self):
+        try:
+            with self._lock:
+                self.connection.execute("SELECT 1;")
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"SQLite health check failed: {e}")
+            return False
+
+    def create_pool(self, minconn, maxconn):
+        # A single connection serialised by a lock stands in for the pool
+        return True
+
+    @contextmanager
+    def pooled_connection(self):
+        yield self.connection
@@ -0,0 +1,215 @@
+"""
+Parallel bulk load of historical alerts (python manage.py backfill-alerts).
+
+The input is a JSONL file with one queue message per line, or a CSV file
+whose header names the message fields (motorId, sensorType, timestamp,
+value, alertType; other columns are ignored). Every record is checked with
+the processor's own validation; invalid ones are counted and skipped.
+
+The file is cut into chunks of about BACKFILL_CHUNK_BYTES at line
+boundaries. A pool of worker processes, each with its own connection, loads
+the chunks with COPY. Each chunk is recorded in motor_alert_backfill_chunks
+in the same transaction as its rows, so an interrupted backfill can simply
+be run again: chunks already loaded are skipped and none is loaded twice.
+
+COPY bypasses the daily rollup, so motor_alert_daily_counts is rebuilt for
+the loaded days at the end. With defer_indexes, the secondary indexes of
+motor_alerts are dropped for the load and rebuilt once afterwards.
+
+CSV records must each fit on one line (no quoted newlines).
+"""
+
+import csv
+import io
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timezone
+
+import codec
+from alert_processor import REQUIRED_FIELDS, validate_alert
+from config import Config
+from database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('jsonl', 'csv')
+_EXTENSIONS = {'.jsonl': 'jsonl', '.ndjson': 'jsonl', '.json': 'jsonl', '.csv': 'csv'}
+# Most rejected records logged per chunk; the rest are only counted
+MAX_LOGGED_REJECTS = 5
+# Least time between two progress lines
+REPORT_INTERVAL_S = 5.0
+
+def input_format(path):
+    """Input format from the file extension"""
+    fmt = _EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"Cannot tell the format of {path}; pass --format jsonl or csv")
+    return fmt
+
+def read_header(path):
+    """(CSV field names, offset of the first record)"""
+    with open(path, 'rb') as file:
+        line = file.readline()
+    fieldnames = next(csv.reader([line.decode('utf-8-sig')]), [])
+    missing = [field for field in REQUIRED_FIELDS if field not in fieldnames]
+    if missing:
+        raise ValueError(f"CSV header of {path} lacks {', '.join(missing)}")
+    return fieldnames, len(line)
+
+def file_chunks(path, chunk_bytes, start=0):
+    """[(start, end)] byte ranges of about `chunk_bytes` each, ending at line boundaries.
+
+    The same file and chunk size always give the same ranges, which is what
+    lets a rerun match them against the loaded chunks.
+    """
+    size = os.path.getsize(path)
+    chunks = []
+    with open(path, 'rb') as file:
+        while start < size:
+            file.seek(min(start + chunk_bytes, size))
+            if file.tell() < size:
+                file.seek(file.tell() - 1)
+                file.readline()
+            end = file.tell()
+            chunks.append((start, end))
+            start = end
+    return chunks
+
+def _csv_record(row):
+    # Short rows get None for the missing fields, long ones a None key; both read as missing
+    return {key: value for key, value in row.items() if key is not None and value is not None}
+
+def parse_chunk(data, fmt, fieldnames=None):
+    """(alerts, rejected, first error messages) for the records in `data`"""
+    if fmt == 'csv':
+        records = csv.DictReader(io.StringIO(data.decode('utf-8')), fieldnames=fieldnames)
+        decode = _csv_record
+    else:
+        records = (line for line in data.splitlines() if line.strip())
+        decode = codec.loads
+    alerts = []
+    rejected = 0
+    errors = []
+    for record in records:
+        try:
+            alerts.append(validate_alert(decode(record)))
+        except (ValueError, KeyError, TypeError) as e:
+            rejected += 1
+            if len(errors) < MAX_LOGGED_REJECTS:
+                errors.append(f"{type(e).__name__}: {e}")
+    return alerts, rejected, errors
+
+def _utc_day(timestamp):
+    # Naive timestamps are UTC, as everywhere else in the pipeline
+    return timestamp.astimezone(timezone.utc).date() if timestamp.tzinfo else timestamp.date()
+
+# Each worker process keeps one connection for all of its chunks
+_worker_db = None
+_worker_days = set()
+
+def _init_worker(config):
+    global _worker_db
+    _worker_db = DatabaseManager(config)
+    if not _worker_db.connect():
+        raise RuntimeError("Failed to connect to database")
+    with _worker_db.connection.cursor() as cursor:
+        # The chunk and its progress row commit together, so a crash loses
+        # both or neither; no need to wait for the WAL flush
+        cursor.execute("SET synchronous_commit = off;")
+
+def load_chunk(path, fmt, fieldnames, source, start, end):
+    """Parse and COPY one chunk in a worker process; returns (loaded, rejected)"""
+    with open(path, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+    alerts, rejected, errors = parse_chunk(data, fmt, fieldnames)
+    for error in errors:
+        logger.error(f"Rejected record in chunk at byte {start} of {path}: {error}")
+
+    # Give the rows their own partitions instead of the default one
+    days = {_utc_day(alert['timestamp']) for alert in alerts} - _worker_days
+    if days:
+        _worker_db.ensure_partitions(days)
+        _worker_days.update(days)
+    _worker_db.copy_alert_chunk(alerts, source, start, end, rejected)
+    return len(alerts), rejected
+
+def _pending_chunks(chunks, loaded):
+    """Chunks not loaded yet; fails if earlier runs cut the file differently"""
+    pending = []
+    for start, end in chunks:
+        if loaded.get(start) == end:
+            continue
+        if any(start < other_end and other_start < end for other_start, other_end in loaded.items()):
+            raise ValueError("This input was partly loaded with a different chunk size; "
+                             "use the same chunk size, or --restart")
+        pending.append((start, end))
+    return pending
+
+def backfill_alerts(config: Config, db_manager, path, fmt=None, workers=None, chunk_bytes=None,
+                    defer_indexes=False, source=None, restart=False):
+    """Load the alerts in `path` into motor_alerts; returns True if every chunk loaded.
+
+    `source` names the input in motor_alert_backfill_chunks (default: its
+    absolute path). With `restart`, chunks loaded by earlier runs are
+    forgotten and loaded again.
+    """
+    fmt = fmt or input_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown backfill format: {fmt}")
+    workers = workers or config.BACKFILL_WORKERS
+    chunk_bytes = chunk_bytes or config.BACKFILL_CHUNK_BYTES
+    source = source or os.path.abspath(path)
+
+    fieldnames, first_record = read_header(path) if fmt == 'csv' else (None, 0)
+    if restart:
+        db_manager.reset_backfill(source)
+    chunks = file_chunks(path, chunk_bytes, first_record)
+    pending = _pending_chunks(chunks, db_manager.get_backfill_chunks(source))
+    if len(pending) < len(chunks):
+        logger.info(f"Resuming backfill of {source}: {len(chunks) - len(pending)} of "
+                    f"{len(chunks)} chunks already loaded")
+
+    loaded = rejected = failed = 0
+    started = last_report = time.monotonic()
+    indexes = db_manager.drop_secondary_indexes() if defer_indexes and pending else []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(config,)) as executor:
+            futures = {
+                executor.submit(load_chunk, path, fmt, fieldnames, source, start, end): start
+                for start, end in pending
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    chunk_loaded, chunk_rejected = future.result()
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Backfill chunk at byte {futures[future]} of {path} failed: {e}")
+                    continue
+                loaded += chunk_loaded
+                rejected += chunk_rejected
+                now = time.monotonic()
+                if now - last_report >= REPORT_INTERVAL_S or done == len(futures):
+                    logger.info(f"Backfill: {done}/{len(futures)} chunks, {loaded} alerts "
+                                f"({rejected} rejected), {loaded / (now - started):.0f} rows/s")
+                    last_report = now
+    finally:
+        if indexes:
+            db_manager.create_indexes(indexes)
+
+    total_loaded, total_rejected, first_day, last_day = db_manager.get_backfill_totals(source)
+    if loaded and first_day is not None:
+        # COPY skipped the rollup; recount every day the input touches
+        db_manager.backfill_daily_counts(first_day, last_day)
+
+    elapsed = time.monotonic() - started
+    logger.info(f"Backfilled {loaded} alerts ({rejected} rejected) from {path} in {elapsed:.1f}s "
+                f"({loaded / elapsed if elapsed else 0:.0f} rows/s); {total_loaded} alerts and "
+                f"{total_rejected} rejects over all runs")
+    if failed:
+        logger.error(f"{failed} chunks failed; run the backfill again to retry them")
+    return failed == 0
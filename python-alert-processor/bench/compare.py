@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Compare two benchmark result files written by run_bench.py
+
+    python bench/compare.py baseline.json candidate.json --threshold 10
+
+Exits with status 1 if any metric regressed by more than the threshold.
+"""
+
+import argparse
+import json
+import sys
+
+def metrics(results):
+    """Flatten results into {name: (value, higher_is_better)}"""
+    flat = {}
+    for name, scenario in results['scenarios'].items():
+        flat[f"{name}.msgs_per_s"] = (scenario['msgs_per_s'], True)
+        for q in ('p50', 'p95', 'p99'):
+            flat[f"{name}.{q}_ms"] = (scenario['latency_ms'][q], False)
+    for name, stage in results['stages'].items():
+        flat[f"stage.{name}.us_per_msg"] = (stage['us_per_msg'], False)
+    for name, value in results['allocations'].items():
+        flat[f"alloc.{name}"] = (value, False)
+    # Absent from results written before startup was measured
+    if 'startup' in results:
+        for name in ('ready', 'first_ack'):
+            flat[f"startup.{name}_p50_ms"] = (results['startup'][f"{name}_ms"]['p50'], False)
+    return flat
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two benchmark runs")
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help="percent change counted as a regression (default 10)")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = metrics(json.load(f))
+    with open(args.candidate) as f:
+        candidate = metrics(json.load(f))
+
+    regressions = []
+    print(f"{'metric':<32} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for name in sorted(baseline.keys() & candidate.keys()):
+        before, higher_is_better = baseline[name]
+        after, _ = candidate[name]
+        if before is None or after is None:
+            continue
+
+        change = (after - before) / before * 100 if before else 0.0
+        worse = -change if higher_is_better else change
+        flag = ''
+        if worse > args.threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<32} {before:>12.2f} {after:>12.2f} {change:>+8.1f}%{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold}%")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Alert history pages by keyset versus OFFSET, and insert cost per index set
+
+Fills the text layout in a scratch schema of the configured database with
+synthetic alerts, then times the same history page at growing depths,
+fetched with get_alert_history's (timestamp, id) cursor and with OFFSET,
+for all motors, one motor, one alert type and one sensor type of one motor.
+Separately, loads alerts through insert_alerts with the current indexes, with
+the six single-column and composite indexes they replaced, and with one
+index per filter combination, to compare load rate and index size.
+
+    python bench/history_bench.py --rows 1000000 --output history.json
+
+The scratch schemas are dropped afterwards unless --keep is given.
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+
+import psycopg2.extras
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alert_processor import parse_alert_message
+from backends import encode_history_cursor
+from run_bench import percentiles
+from schema_bench import SIZE_SQL, open_layout, timed
+from workload import generate_alerts
+
+# The motor_alerts indexes before the history indexes replaced them
+LEGACY_INDEXES = (
+    "CREATE INDEX idx_motor_alerts_motor_id ON motor_alerts(motor_id);",
+    "CREATE INDEX idx_motor_alerts_timestamp ON motor_alerts(timestamp);",
+    "CREATE INDEX idx_motor_alerts_created_at ON motor_alerts(created_at);",
+    "CREATE INDEX idx_motor_alerts_sensor_type ON motor_alerts(sensor_type);",
+    "CREATE INDEX idx_motor_alerts_alert_type ON motor_alerts(alert_type);",
+    "CREATE INDEX idx_motor_alerts_motor_timestamp ON motor_alerts(motor_id, timestamp DESC);",
+)
+
+# One index per filter combination, each filter a key column before (timestamp, id)
+PER_FILTER_INDEXES = tuple(
+    f"CREATE INDEX idx_motor_alerts_{name}time ON motor_alerts({columns}timestamp DESC, id DESC);"
+    for name, columns in (('', ''), ('motor_', 'motor_id, '), ('sensor_', 'sensor_type, '),
+                          ('motor_sensor_', 'motor_id, sensor_type, '), ('alert_', 'alert_type, '),
+                          ('motor_alert_', 'motor_id, alert_type, '))
+)
+
+# Index sets loaded for comparison; None keeps the current ones
+INDEX_SETS = {'legacy': LEGACY_INDEXES, 'per_filter': PER_FILTER_INDEXES, 'history': None}
+
+CURRENT_INDEXES_SQL = """
+    SELECT indexname FROM pg_indexes
+    WHERE schemaname = current_schema() AND tablename = 'motor_alerts' AND indexname <> 'motor_alerts_pkey';
+"""
+
+# Filters of each timed page scope, given a random motor
+SCOPES = {
+    'all': lambda motor_id: {},
+    'motor': lambda motor_id: {'motor_id': motor_id},
+    'alert_type': lambda motor_id: {'alert_type': 'CRITICAL'},
+    'motor_sensor_type': lambda motor_id: {'motor_id': motor_id, 'sensor_type': 'vibration'},
+}
+
+# Fills motor_alerts server-side: every motor reports once per step, like the workload
+FILL_SQL = """
+    INSERT INTO motor_alerts (motor_id, sensor_type, timestamp, value, alert_type)
+    SELECT 'MTR-' || lpad((n %% %(motors)s)::text, 4, '0'),
+           (ARRAY['temperature', 'vibration', 'current'])[1 + n %% 3],
+           %(start)s::timestamptz + (n / %(motors)s) * %(step)s::interval,
+           50 + n %% 97,
+           (ARRAY['HIGH', 'CRITICAL'])[1 + n %% 2]
+    FROM generate_series(0, %(rows)s - 1) AS n;
+"""
+
+OFFSET_SQL = """
+    SELECT id, motor_id, sensor_type, timestamp, value, alert_type, created_at
+    FROM motor_alerts
+    {where}
+    ORDER BY timestamp DESC, id DESC
+    LIMIT %s OFFSET %s;
+"""
+
+def history_where(filters):
+    """(WHERE clause, parameters) of equality filters on motor_alerts columns"""
+    if not filters:
+        return "", []
+    return "WHERE " + " AND ".join(f"{column} = %s" for column in filters), list(filters.values())
+
+def offset_page(db_manager, where, params, limit, offset):
+    """The page `offset` rows deep, fetched like get_alert_history fetches its rows"""
+    with db_manager.connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+        cursor.execute(OFFSET_SQL.format(where=where), params + [limit, offset])
+        return cursor.fetchall()
+
+def load_indexes(index_set, alerts, args):
+    schema = f"bench_history_{index_set}_{os.getpid()}"
+    db_manager = open_layout('text', schema)
+    try:
+        with db_manager.connection.cursor() as cursor:
+            if INDEX_SETS[index_set] is not None:
+                cursor.execute(CURRENT_INDEXES_SQL)
+                for index, in cursor.fetchall():
+                    cursor.execute(f"DROP INDEX {index};")
+                for statement in INDEX_SETS[index_set]:
+                    cursor.execute(statement)
+        db_manager.ensure_partitions({alert['timestamp'].date() for alert in alerts})
+        samples = []
+        started = time.perf_counter()
+        for i in range(0, len(alerts), args.batch_size):
+            timed(samples, db_manager.insert_alerts, alerts[i:i + args.batch_size])
+        load_s = time.perf_counter() - started
+        with db_manager.connection.cursor() as cursor:
+            cursor.execute(SIZE_SQL, (db_manager.alerts_table,))
+            _, index_bytes = cursor.fetchone()
+        return {
+            'load_rows_per_s': len(alerts) / load_s,
+            'insert_batch_ms': percentiles(samples),
+            'index_bytes': index_bytes,
+        }
+    finally:
+        if not args.keep:
+            with db_manager.connection.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA {schema} CASCADE;")
+        db_manager.disconnect()
+
+def page_depths(start, args):
+    schema = f"bench_history_pages_{os.getpid()}"
+    db_manager = open_layout('text', schema)
+    rng = random.Random(args.seed)
+    step = timedelta(days=args.days) / (args.rows / args.motors)
+    try:
+        db_manager.ensure_partitions({(start + timedelta(days=day)).date() for day in range(args.days + 1)})
+        with db_manager.connection.cursor() as cursor:
+            cursor.execute(FILL_SQL, {'motors': args.motors, 'start': start, 'step': step, 'rows': args.rows})
+            # Sets the visibility map too, as autovacuum does for settled partitions
+            cursor.execute("VACUUM ANALYZE motor_alerts;")
+
+        results = {}
+        for scope, scope_filters in SCOPES.items():
+            for pages in args.depths:
+                offset = pages * args.page_size
+                keyset, offsets = [], []
+                for _ in range(args.queries):
+                    filters = scope_filters(f"MTR-{rng.randrange(args.motors):04d}")
+                    where, params = history_where(filters)
+                    expected = timed(offsets, offset_page, db_manager, where, params, args.page_size, offset)
+                    if not expected:
+                        # The scope has fewer pages than that
+                        break
+                    # The cursor a client holds after `pages` pages: that of the row before this page
+                    after = None
+                    if offset:
+                        row = offset_page(db_manager, where, params, 1, offset - 1)[0]
+                        after = encode_history_cursor(row['timestamp'], row['id'])
+                    rows, _ = timed(keyset, lambda: db_manager.get_alert_history(args.page_size, after, **filters))
+                    if [row['id'] for row in rows] != [row['id'] for row in expected]:
+                        raise RuntimeError(f"keyset and OFFSET pages differ at {scope} page {pages}")
+                if keyset:
+                    results[f"{scope}_page_{pages}"] = {'keyset_ms': percentiles(keyset),
+                                                        'offset_ms': percentiles(offsets)}
+        if args.explain:
+            # The deepest page of one sensor type of a motor, the narrowest filter
+            filters = SCOPES['motor_sensor_type']('MTR-0000')
+            where, params = history_where(filters)
+            for pages in sorted(args.depths, reverse=True):
+                rows = offset_page(db_manager, where, params, 1, max(0, pages * args.page_size - 1))
+                if rows:
+                    break
+            conditions = where.replace("WHERE", "WHERE timestamp <= %s AND (timestamp, id) < (%s, %s) AND")
+            with db_manager.connection.cursor() as cursor:
+                cursor.execute(f"""
+                    EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+                    SELECT id, motor_id, sensor_type, timestamp, value, alert_type, created_at
+                    FROM motor_alerts
+                    {conditions}
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT %s;
+                """, [rows[0]['timestamp'], rows[0]['timestamp'], rows[0]['id']] + params + [args.page_size + 1])
+                print('\n'.join(line for line, in cursor.fetchall()), end='\n\n')
+        return results
+    finally:
+        if not args.keep:
+            with db_manager.connection.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA {schema} CASCADE;")
+        db_manager.disconnect()
+
+def report(results):
+    print(f"{'page':<24} {'keyset p50':>12} {'OFFSET p50':>12}  ms")
+    for name, result in results['pages'].items():
+        print(f"{name:<24} {result['keyset_ms']['p50']:>12.2f} {result['offset_ms']['p50']:>12.2f}")
+    print(f"\n{'indexes':<24} {'rows/s':>12} {'index MiB':>12}")
+    for name, result in results['loads'].items():
+        print(f"{name:<24} {result['load_rows_per_s']:>12.0f} {result['index_bytes'] / 2**20:>12.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare keyset and OFFSET history pages, and the index sets' insert cost")
+    parser.add_argument('--rows', type=int, default=1000000, help="alerts filled in for the page timings")
+    parser.add_argument('--motors', type=int, default=500, help="distinct motors")
+    parser.add_argument('--days', type=int, default=7, help="days the alerts are spread over")
+    parser.add_argument('--page-size', type=int, default=50, help="alerts per history page")
+    parser.add_argument('--depths', type=lambda value: [int(pages) for pages in value.split(',')],
+                        default=[0, 10, 100, 1000, 10000], help="pages skipped before the timed one")
+    parser.add_argument('--queries', type=int, default=20, help="samples per page depth")
+    parser.add_argument('--load-rows', type=int, default=100000, help="alerts loaded per index set")
+    parser.add_argument('--batch-size', type=int, default=500, help="alerts per insert_alerts call")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--explain', action='store_true', help="print the plan of the deepest keyset page")
+    parser.add_argument('--keep', action='store_true', help="keep the scratch schemas")
+    parser.add_argument('--output', help="write JSON results to this file")
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(args.log_level)
+
+    alerts = [parse_alert_message(body) for body in generate_alerts(args.load_rows, motors=args.motors, seed=args.seed)]
+    step = timedelta(days=args.days) / len(alerts)
+    first = alerts[0]['timestamp']
+    for index, alert in enumerate(alerts):
+        alert['timestamp'] = first + step * index
+
+    results = {
+        'pages': page_depths(first, args),
+        'loads': {index_set: load_indexes(index_set, alerts, args) for index_set in INDEX_SETS},
+    }
+    report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), **results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Alert pipeline benchmark
+
+Drives AlertProcessor end to end on the in-memory broker with synthetic
+alerts and times the parse, DB write and notification publish stages on
+their own, and the time from startup to the first ack. Results can be saved
+as JSON and compared with compare.py.
+
+    python bench/run_bench.py --messages 20000 --output before.json
+    python bench/run_bench.py --messages 20000 --batch-size 50 --output after.json
+    python bench/compare.py before.json after.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alert_processor import AlertProcessor, parse_alert_message
+from backends import InMemoryBroker, SQLiteAlertStore
+from config import Config
+from database import DatabaseManager
+from workload import bursts, generate_alerts
+
+def percentiles(samples):
+    """p50/p95/p99/max (nearest rank) of a list of seconds, in milliseconds"""
+    if not samples:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None}
+    ordered = sorted(samples)
+    def rank(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {'p50': rank(0.50), 'p95': rank(0.95), 'p99': rank(0.99), 'max': ordered[-1] * 1000}
+
+def make_config(args):
+    config = Config()
+    config.BATCH_SIZE = args.batch_size
+    config.BATCH_TIMEOUT_MS = args.batch_timeout_ms
+    config.WORKER_COUNT = args.workers
+    config.PREFETCH_COUNT = args.prefetch
+    config.NOTIFICATION_BATCH_SIZE = args.notification_batch_size
+    config.COALESCE_WINDOW_S = args.coalesce_window_s
+    return config
+
+def make_store(args, config):
+    if args.store == 'postgres':
+        return DatabaseManager(config)
+    return SQLiteAlertStore(config)
+
+def make_processor(args):
+    config = make_config(args)
+    broker = InMemoryBroker(config)
+    processor = AlertProcessor(config, broker=broker, store=make_store(args, config))
+    if not processor.startup():
+        raise RuntimeError("processor failed to start")
+    return processor, broker
+
+def shutdown(processor):
+    processor.settle_pending()
+    processor.disconnect_rabbitmq()
+    processor.db_manager.disconnect()
+
+def run_scenario(args, messages, burst_size=None, burst_gap=0.0):
+    """Publish messages (all at once, or in bursts from a publisher thread) and drain them"""
+    processor, broker = make_processor(args)
+    latencies = []
+    outcomes = {'acked': 0, 'rejected': 0}
+
+    def on_settle(properties, acked):
+        latencies.append(time.perf_counter() - properties.published_at)
+        outcomes['acked' if acked else 'rejected'] += 1
+    broker.on_settle = on_settle
+
+    def publish(chunk):
+        for body in chunk:
+            broker.publish_alert(body, SimpleNamespace(published_at=time.perf_counter()))
+
+    started = time.perf_counter()
+    if burst_size:
+        def publisher():
+            for chunk in bursts(messages, burst_size):
+                publish(chunk)
+                time.sleep(burst_gap)
+        thread = threading.Thread(target=publisher, daemon=True)
+        thread.start()
+        while thread.is_alive() or not broker.is_drained():
+            broker.process_data_events(time_limit=0.01)
+        thread.join()
+    else:
+        publish(messages)
+    broker.drain()
+    elapsed = time.perf_counter() - started
+    shutdown(processor)
+
+    return {
+        'messages': len(messages),
+        'acked': outcomes['acked'],
+        'rejected': outcomes['rejected'],
+        'elapsed_s': elapsed,
+        'msgs_per_s': len(messages) / elapsed,
+        'latency_ms': percentiles(latencies),
+    }
+
+def measure_allocations(args, messages):
+    """Peak traced bytes while one message goes through the pipeline, and bytes left behind"""
+    processor, broker = make_processor(args)
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    peaks = []
+    for body in messages:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        broker.publish_alert(body, SimpleNamespace(published_at=0.0))
+        broker.drain()
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    shutdown(processor)
+    return {
+        'peak_bytes_per_msg': sum(peaks) / len(peaks),
+        'retained_bytes_per_msg': (current - baseline) / len(messages),
+    }
+
+def measure_startup(args, messages):
+    """Startup to consuming, and startup to the first ack with messages already queued.
+
+    The processor is started --startup-runs times on the same store; only
+    the first start can find the schema missing, so it is reported apart.
+    """
+    ready, first_ack = [], []
+    for _ in range(args.startup_runs):
+        config = make_config(args)
+        broker = InMemoryBroker(config)
+        processor = AlertProcessor(config, broker=broker, store=make_store(args, config))
+        # A restarted processor finds a backlog waiting for it
+        for body in messages:
+            broker.publish_alert(body, SimpleNamespace(published_at=0.0))
+        started = time.perf_counter()
+        if not processor.startup():
+            raise RuntimeError("processor failed to start")
+        ready.append(time.perf_counter() - started)
+        while processor.first_ack_s is None:
+            broker.process_data_events(time_limit=0.001)
+        first_ack.append(processor.first_ack_s)
+        broker.drain()
+        shutdown(processor)
+    return {
+        'runs': args.startup_runs,
+        'first_start_ms': {'ready': ready[0] * 1000, 'first_ack': first_ack[0] * 1000},
+        'ready_ms': percentiles(ready[1:]),
+        'first_ack_ms': percentiles(first_ack[1:]),
+    }
+
+def time_calls(func, items, warmup=100):
+    for item in items[:warmup]:
+        func(item)
+    samples = []
+    for item in items:
+        started = time.perf_counter()
+        func(item)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def stage_summary(samples, messages_per_sample=1):
+    total = sum(samples)
+    count = len(samples) * messages_per_sample
+    return {
+        'calls': len(samples),
+        'us_per_msg': total / count * 1e6,
+        'msgs_per_s': count / total if total else None,
+        'latency_ms': percentiles(samples),
+    }
+
+def run_stages(args, messages):
+    """Time parse, DB write and publish separately on valid messages"""
+    stages = {}
+
+    stages['parse'] = stage_summary(time_calls(
+        lambda body: parse_alert_message(body), messages
+    ))
+    alerts = [parse_alert_message(body) for body in messages]
+
+    processor, broker = make_processor(args)
+    store = processor.db_manager
+    stages['db_write'] = stage_summary(time_calls(lambda alert: store.insert_alert(**alert), alerts))
+    if args.batch_size > 1:
+        batches = [alerts[i:i + args.batch_size] for i in range(0, len(alerts), args.batch_size)]
+        stages['db_write_batched'] = stage_summary(
+            time_calls(store.insert_alerts, batches), messages_per_sample=args.batch_size
+        )
+
+    stages['publish'] = stage_summary(time_calls(
+        lambda alert: processor.publish_notification(alert, 1), alerts
+    ))
+    shutdown(processor)
+    return stages
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_summary(results):
+    print(f"\n{'scenario':<12} {'msgs/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, result in results['scenarios'].items():
+        latency = result['latency_ms']
+        print(f"{name:<12} {result['msgs_per_s']:>10.0f} {latency['p50']:>9.2f} "
+              f"{latency['p95']:>9.2f} {latency['p99']:>9.2f}")
+
+    print(f"\n{'stage':<18} {'us/msg':>9} {'p99 ms':>9}")
+    for name, stage in results['stages'].items():
+        print(f"{name:<18} {stage['us_per_msg']:>9.1f} {stage['latency_ms']['p99']:>9.3f}")
+
+    startup = results['startup']
+    print(f"\nstartup: ready {startup['ready_ms']['p50']:.1f} ms, first ack {startup['first_ack_ms']['p50']:.1f} ms "
+          f"(p50 of {startup['runs'] - 1} restarts; first start {startup['first_start_ms']['first_ack']:.1f} ms)")
+
+    memory = results['allocations']
+    print(f"\nallocations: {memory['peak_bytes_per_msg']:.0f} peak bytes/msg, "
+          f"{memory['retained_bytes_per_msg']:.0f} retained bytes/msg")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the alert pipeline")
+    parser.add_argument('--messages', type=int, default=10000, help="messages per scenario")
+    parser.add_argument('--motors', type=int, default=200, help="distinct motors in the workload")
+    parser.add_argument('--malformed-ratio', type=float, default=0.1,
+                        help="share of malformed payloads in the 'mixed' scenario")
+    parser.add_argument('--burst-size', type=int, default=500)
+    parser.add_argument('--burst-gap-ms', type=float, default=20)
+    parser.add_argument('--batch-size', type=int, default=Config.BATCH_SIZE)
+    parser.add_argument('--batch-timeout-ms', type=int, default=Config.BATCH_TIMEOUT_MS)
+    parser.add_argument('--workers', type=int, default=Config.WORKER_COUNT)
+    parser.add_argument('--prefetch', type=int, default=Config.PREFETCH_COUNT)
+    parser.add_argument('--notification-batch-size', type=int, default=Config.NOTIFICATION_BATCH_SIZE)
+    parser.add_argument('--coalesce-window-s', type=float, default=Config.COALESCE_WINDOW_S,
+                        help="fold repeat alerts into episodes (drains wait for episodes to close)")
+    parser.add_argument('--store', choices=['sqlite', 'postgres'], default='sqlite',
+                        help="alert store (postgres writes real rows: use a scratch database)")
+    parser.add_argument('--alloc-messages', type=int, default=500,
+                        help="messages traced for the allocation measurement")
+    parser.add_argument('--startup-runs', type=int, default=6,
+                        help="processor starts timed for startup to first ack (at least 2)")
+    parser.add_argument('--output', help="write JSON results to this file")
+    parser.add_argument('--log-level', default='CRITICAL',
+                        help="processor log level during the run (default CRITICAL)")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(args.log_level)
+
+    valid = generate_alerts(args.messages, motors=args.motors)
+    mixed = generate_alerts(args.messages, motors=args.motors, malformed_ratio=args.malformed_ratio)
+
+    results = {
+        'meta': {
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': vars(args),
+        },
+        'scenarios': {
+            'steady': run_scenario(args, valid),
+            'bursty': run_scenario(args, valid, burst_size=args.burst_size,
+                                   burst_gap=args.burst_gap_ms / 1000.0),
+            'mixed': run_scenario(args, mixed),
+        },
+        'stages': run_stages(args, valid),
+        'allocations': measure_allocations(args, valid[:args.alloc_messages]),
+        'startup': measure_startup(args, valid[:args.batch_size]),
+    }
+
+    print_summary(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
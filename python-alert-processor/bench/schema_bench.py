@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Size and latency of the two motor_alerts layouts
+
+Loads the same synthetic alerts into the text layout (motor_alerts with
+TEXT and NUMERIC columns) and the compact layout (COMPACT_SCHEMA), each in
+a scratch schema of the configured database, then compares table and index
+size, insert latency and the latency of typical reads.
+
+    python bench/schema_bench.py --rows 200000 --output schema.json
+
+The scratch schemas are dropped afterwards unless --keep is given.
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alert_processor import parse_alert_message
+from config import Config
+from database import DIMENSIONS, DatabaseManager
+from run_bench import percentiles
+from workload import generate_alerts
+
+LAYOUTS = ('text', 'compact')
+
+SIZE_SQL = """
+    SELECT COALESCE(SUM(pg_table_size(relid)), 0)::bigint, COALESCE(SUM(pg_indexes_size(relid)), 0)::bigint
+    FROM pg_partition_tree(%s::regclass);
+"""
+
+MOTOR_RANGE_SQL = """
+    SELECT COUNT(*), AVG(value) FROM motor_alerts
+    WHERE motor_id = %s AND timestamp >= %s AND timestamp < %s;
+"""
+
+def open_layout(layout, schema):
+    config = Config()
+    config.COMPACT_SCHEMA = layout == 'compact'
+    db_manager = DatabaseManager(config)
+    if not db_manager.connect():
+        raise RuntimeError("Failed to connect to database")
+    with db_manager.connection.cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE;")
+        cursor.execute(f"CREATE SCHEMA {schema};")
+        cursor.execute(f"SET search_path TO {schema};")
+    if not db_manager.create_tables():
+        raise RuntimeError(f"Failed to create the {layout} layout")
+    return db_manager
+
+def timed(samples, call, *args):
+    started = time.perf_counter()
+    result = call(*args)
+    samples.append(time.perf_counter() - started)
+    return result
+
+def run_layout(layout, alerts, args):
+    schema = f"bench_{layout}_{os.getpid()}"
+    db_manager = open_layout(layout, schema)
+    rng = random.Random(args.seed)
+    try:
+        # Rows go to their day's partition, as in production
+        db_manager.ensure_partitions({alert['timestamp'].date() for alert in alerts})
+
+        batch_samples = []
+        started = time.perf_counter()
+        for i in range(0, len(alerts), args.batch_size):
+            timed(batch_samples, db_manager.insert_alerts, alerts[i:i + args.batch_size])
+        load_s = time.perf_counter() - started
+
+        single_samples = []
+        for alert in rng.sample(alerts, min(args.queries, len(alerts))):
+            timed(single_samples, lambda: db_manager.insert_alert(**alert))
+
+        with db_manager.connection.cursor() as cursor:
+            cursor.execute("ANALYZE;")
+            table_bytes, index_bytes = 0, 0
+            tables = [db_manager.alerts_table]
+            if layout == 'compact':
+                tables.extend(table for table, _ in DIMENSIONS)
+            for table in tables:
+                cursor.execute(SIZE_SQL, (table,))
+                heap, indexes = cursor.fetchone()
+                table_bytes += heap
+                index_bytes += indexes
+            cursor.execute("SELECT MIN(id), MAX(id) FROM motor_alerts;")
+            first_id, last_id = cursor.fetchone()
+
+        motors = sorted({alert['motor_id'] for alert in alerts})
+        start = min(alert['timestamp'] for alert in alerts)
+        span = max(alert['timestamp'] for alert in alerts) - start
+        reads = {'recent_alerts': [], 'motor_range': [], 'alerts_after': [], 'summary': []}
+        for _ in range(args.queries):
+            motor_id = rng.choice(motors)
+            timed(reads['recent_alerts'], db_manager.get_recent_alerts, motor_id, 5)
+            range_start = start + span * rng.random() / 2
+            with db_manager.connection.cursor() as cursor:
+                timed(reads['motor_range'], cursor.execute, MOTOR_RANGE_SQL,
+                      (motor_id, range_start, range_start + span / 4))
+                cursor.fetchall()
+            timed(reads['alerts_after'], db_manager.get_alerts_after, rng.randint(first_id, last_id), 100)
+        for _ in range(max(1, args.queries // 50)):
+            timed(reads['summary'], db_manager.get_alert_summary)
+
+        rows = len(alerts) + len(single_samples)
+        return {
+            'rows': rows,
+            'table_bytes': table_bytes,
+            'index_bytes': index_bytes,
+            'bytes_per_row': (table_bytes + index_bytes) / rows,
+            'load_rows_per_s': len(alerts) / load_s,
+            'insert_batch_ms': percentiles(batch_samples),
+            'insert_one_ms': percentiles(single_samples),
+            'reads_ms': {name: percentiles(samples) for name, samples in reads.items()},
+        }
+    finally:
+        if not args.keep:
+            with db_manager.connection.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA {schema} CASCADE;")
+        db_manager.disconnect()
+
+def report(results):
+    text, compact = results['text'], results['compact']
+
+    def line(name, before, after, unit):
+        change = f"{after / before - 1:+.0%}" if before else ''
+        print(f"{name:<28} {before:>12.2f} {after:>12.2f} {change:>7}  {unit}")
+
+    print(f"{'':<28} {'text':>12} {'compact':>12}")
+    line('table', text['table_bytes'] / 2**20, compact['table_bytes'] / 2**20, 'MiB')
+    line('indexes', text['index_bytes'] / 2**20, compact['index_bytes'] / 2**20, 'MiB')
+    line('bytes per row', text['bytes_per_row'], compact['bytes_per_row'], 'B')
+    line('batch load', text['load_rows_per_s'], compact['load_rows_per_s'], 'rows/s')
+    for q in ('p50', 'p99'):
+        line(f"insert_one {q}", text['insert_one_ms'][q], compact['insert_one_ms'][q], 'ms')
+    for name in text['reads_ms']:
+        for q in ('p50', 'p99'):
+            line(f"{name} {q}", text['reads_ms'][name][q], compact['reads_ms'][name][q], 'ms')
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the text and compact motor_alerts layouts")
+    parser.add_argument('--rows', type=int, default=200000, help="alerts loaded into each layout")
+    parser.add_argument('--motors', type=int, default=500, help="distinct motors in the workload")
+    parser.add_argument('--days', type=int, default=7, help="days the alerts are spread over")
+    parser.add_argument('--batch-size', type=int, default=500, help="alerts per insert_alerts call")
+    parser.add_argument('--queries', type=int, default=500, help="samples per read query")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--keep', action='store_true', help="keep the scratch schemas")
+    parser.add_argument('--output', help="write JSON results to this file")
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(args.log_level)
+
+    alerts = [parse_alert_message(body) for body in generate_alerts(args.rows, motors=args.motors, seed=args.seed)]
+    # Spread the readings over --days, so they span several partitions
+    step = timedelta(days=args.days) / len(alerts)
+    first = alerts[0]['timestamp']
+    for index, alert in enumerate(alerts):
+        alert['timestamp'] = first + step * index
+
+    results = {layout: run_layout(layout, alerts, args) for layout in LAYOUTS}
+    report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'layouts': results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Synthetic alert workloads for the benchmark suite.
+
+Messages have the shape produced by the Node ingestor's checkThresholds():
+one alert per sensor reading over its threshold (vibration > 2.5 g,
+temperature > 80 C), with the reading's ISO timestamp passed through.
+"""
+
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+VIBRATION_THRESHOLD = 2.5
+TEMPERATURE_THRESHOLD = 80
+
+MALFORMED_BODIES = (
+    b'{not json',
+    b'',
+    json.dumps({"motorId": "MTR-01", "timestamp": "2025-07-17T10:15:00Z"}).encode('utf-8'),
+    json.dumps({"motorId": "MTR-01", "timestamp": "yesterday", "sensorType": "vibration",
+                "value": 3.2, "alertType": "high_vibration"}).encode('utf-8'),
+    json.dumps({"motorId": "MTR-01", "timestamp": "2025-07-17T10:15:00Z", "sensorType": "vibration",
+                "value": "n/a", "alertType": "high_vibration"}).encode('utf-8'),
+)
+
+def motor_ids(count):
+    return [f"MTR-{index:04d}" for index in range(1, count + 1)]
+
+def generate_alerts(count, motors=100, malformed_ratio=0.0, seed=1,
+                    start=datetime(2025, 7, 17, 10, 0, tzinfo=timezone.utc)):
+    """Return `count` encoded alert messages.
+
+    Readings advance one second at a time and every motor reports once per
+    tick, so the same timestamp repeats across motors as it does in
+    production. A `malformed_ratio` share of messages is replaced by
+    payloads that the processor must reject.
+    """
+    rng = random.Random(seed)
+    ids = motor_ids(motors)
+    messages = []
+
+    reading = 0
+    while len(messages) < count:
+        motor_id = ids[reading % motors]
+        timestamp = (start + timedelta(seconds=reading // motors)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        reading += 1
+
+        if rng.random() < malformed_ratio:
+            messages.append(rng.choice(MALFORMED_BODIES))
+            continue
+
+        # Mirror checkThresholds(): one reading can breach one or both thresholds
+        alerts = []
+        if rng.random() < 0.7:
+            alerts.append({
+                'motorId': motor_id,
+                'timestamp': timestamp,
+                'sensorType': 'vibration',
+                'value': round(VIBRATION_THRESHOLD + rng.expovariate(2.0), 2),
+                'alertType': 'high_vibration'
+            })
+        if not alerts or rng.random() < 0.4:
+            alerts.append({
+                'motorId': motor_id,
+                'timestamp': timestamp,
+                'sensorType': 'temperature',
+                'value': round(TEMPERATURE_THRESHOLD + rng.expovariate(0.2), 1),
+                'alertType': 'high_temperature'
+            })
+
+        messages.extend(json.dumps(alert).encode('utf-8') for alert in alerts)
+
+    return messages[:count]
+
+def bursts(messages, burst_size):
+    """Split messages into consecutive bursts of `burst_size`"""
+    return [messages[i:i + burst_size] for i in range(0, len(messages), burst_size)]
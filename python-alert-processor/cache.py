@@ -0,0 +1,146 @@
+import bisect
+import threading
+from collections import OrderedDict
+from datetime import timezone
+
+class _MotorAlerts:
+    __slots__ = ('keys', 'alerts', 'complete')
+
+    def __init__(self, complete):
+        # Oldest first, ordered by (timestamp, id) like the ORDER BY in get_recent_alerts
+        self.keys = []
+        self.alerts = []
+        # True when `alerts` is known to hold the motor's latest alerts
+        # (warmed, filled after a miss, or first seen when every motor was known)
+        self.complete = complete
+
+class RecentAlertCache:
+    """Write-through cache of the latest alerts per motor.
+
+    Holds up to `size` alerts for each of at most `max_motors` motors, evicting
+    the least recently used motor. Rows have the same keys as
+    DatabaseManager.get_recent_alerts; values are floats.
+    """
+
+    def __init__(self, size, max_motors):
+        self.size = size
+        self.max_motors = max_motors
+        self.motors = OrderedDict()
+        self.lock = threading.Lock()
+        # Until warm() has seen every motor, an unknown motor may have history in the DB
+        self.all_motors_known = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def warm(self, rows):
+        """Load rows from DatabaseManager.get_recent_alerts_by_motor"""
+        with self.lock:
+            self.motors.clear()
+            evictions = self.evictions
+            for row in rows:
+                entry = self.motors.get(row['motor_id'])
+                if entry is None:
+                    entry = self._new_entry(row['motor_id'], complete=True)
+                self._insert(entry, dict(row, value=float(row['value'])))
+            self.all_motors_known = self.evictions == evictions
+
+    def add(self, alert):
+        """Record a newly stored alert"""
+        with self.lock:
+            entry = self.motors.get(alert['motor_id'])
+            if entry is None:
+                entry = self._new_entry(alert['motor_id'], complete=self.all_motors_known)
+            else:
+                self.motors.move_to_end(alert['motor_id'])
+            self._insert(entry, alert)
+
+    def get(self, motor_id, limit=5):
+        """Newest-first alerts for a motor, or None if the cache can't answer"""
+        with self.lock:
+            entry = self.motors.get(motor_id)
+            if entry is None and self.all_motors_known and limit <= self.size:
+                # Every motor with alerts is cached, so this one has none
+                self.hits += 1
+                return []
+            # An incomplete entry only holds alerts seen since the motor was (re)added;
+            # an older evicted alert may still be newer by timestamp
+            if entry is None or limit > self.size or not entry.complete:
+                self.misses += 1
+                return None
+
+            self.motors.move_to_end(motor_id)
+            self.hits += 1
+            return [dict(alert) for alert in entry.alerts[:-limit - 1:-1]]
+
+    def fill(self, motor_id, rows):
+        """Store a motor's newest `size` alerts read from the DB after a miss"""
+        with self.lock:
+            entry = self.motors.get(motor_id)
+            if entry is None:
+                entry = self._new_entry(motor_id, complete=True)
+            cached_ids = {key[1] for key in entry.keys}
+            for row in rows:
+                if row['id'] not in cached_ids:
+                    self._insert(entry, dict(row, value=float(row['value'])))
+            entry.complete = True
+
+    def stats(self):
+        with self.lock:
+            return {
+                'motors': len(self.motors),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _new_entry(self, motor_id, complete):
+        entry = _MotorAlerts(complete)
+        self.motors[motor_id] = entry
+        if len(self.motors) > self.max_motors:
+            self.motors.popitem(last=False)
+            self.evictions += 1
+            self.all_motors_known = False
+        return entry
+
+    def _insert(self, entry, alert):
+        timestamp = alert['timestamp']
+        if timestamp.tzinfo is None:
+            # Naive timestamps can't be compared with aware ones; order them as UTC
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        key = (timestamp, alert['id'])
+        if len(entry.keys) >= self.size:
+            if key < entry.keys[0]:
+                return
+            del entry.keys[0]
+            del entry.alerts[0]
+        position = bisect.bisect(entry.keys, key)
+        entry.keys.insert(position, key)
+        entry.alerts.insert(position, alert)
+
+class DimensionCache:
+    """Small integer keys of motor IDs, sensor types and alert types (COMPACT_SCHEMA).
+
+    A key is assigned once by its dimension table and never changes, so each
+    name is looked up in the database on first sight only. Plain dict reads
+    and writes, so no lock: two threads resolving the same new name both get
+    the same key from the database.
+    """
+
+    def __init__(self, tables):
+        self.keys = {table: {} for table in tables}
+        # Names resolved against the database
+        self.lookups = 0
+
+    def missing(self, table, names):
+        keys = self.keys[table]
+        return {name for name in names if name not in keys}
+
+    def update(self, table, pairs):
+        """Record (name, key) pairs read from `table`"""
+        pairs = list(pairs)
+        self.keys[table].update(pairs)
+        self.lookups += len(pairs)
+
+    def stats(self):
+        return {table: len(keys) for table, keys in self.keys.items()}
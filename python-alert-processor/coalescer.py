@@ -0,0 +1,224 @@
+import itertools
+import time
+from collections import OrderedDict
+from datetime import timedelta, timezone
+
+def _comparable(timestamp):
+    # Naive timestamps can't be compared with aware ones; order them as UTC
+    return timestamp.replace(tzinfo=timezone.utc) if timestamp.tzinfo is None else timestamp
+
+class Episode:
+    """Repeated alerts of one (motor_id, sensor_type, alert_type) folded together"""
+
+    __slots__ = (
+        'motor_id', 'sensor_type', 'alert_type', 'first_alert', 'alert_id', 'episode_id',
+        'first_timestamp', 'last_timestamp', 'count', 'max_value', 'last_seen', 'closed', 'dirty',
+        'acks', 'taken_acks'
+    )
+
+    def __init__(self, alert, now):
+        self.motor_id = alert['motor_id']
+        self.sensor_type = alert['sensor_type']
+        self.alert_type = alert['alert_type']
+        # The alert that opened the episode; it is stored as a motor_alerts row
+        self.first_alert = alert
+        self.alert_id = None
+        self.episode_id = None
+        self.first_timestamp = _comparable(alert['timestamp'])
+        self.last_timestamp = self.first_timestamp
+        self.count = 1
+        self.max_value = alert['value']
+        self.last_seen = now
+        self.closed = False
+        # Changed since it was last written to the store
+        self.dirty = False
+        # Acks of the alerts folded in since the last take_updates, and of those
+        # taken with it: the caller settles them once the episode is written
+        self.acks = []
+        self.taken_acks = []
+
+    def fold(self, alert, now, ack):
+        timestamp = _comparable(alert['timestamp'])
+        self.first_timestamp = min(self.first_timestamp, timestamp)
+        self.last_timestamp = max(self.last_timestamp, timestamp)
+        self.count += 1
+        self.max_value = max(self.max_value, alert['value'])
+        self.last_seen = now
+        self.dirty = True
+        if ack is not None:
+            self.acks.append(ack)
+
+    def row(self):
+        """Column values in motor_alert_episodes order (after id)"""
+        return (self.alert_id, self.motor_id, self.sensor_type, self.alert_type) + self.state()
+
+    def state(self):
+        """The columns that change as alerts are folded in"""
+        return (self.first_timestamp, self.last_timestamp, self.count, self.max_value, self.closed)
+
+class AlertCoalescer:
+    """Folds alert storms into episodes before they reach the store.
+
+    The first alert for a (motor_id, sensor_type, alert_type) opens an episode
+    and is processed as usual. Later alerts for the same key whose reading
+    timestamps fall within `window_s` of the episode are folded into it
+    instead of becoming rows and notifications of their own; they are only
+    acknowledged once the episode is written (see written() and requeue()).
+    An episode closes
+    once no alert has arrived for it for `window_s`, when a later alert falls
+    outside its window, or when more than `max_episodes` are open (the least
+    recently active one closes first).
+
+    Not thread-safe: AlertProcessor only uses it from the consumer thread.
+    """
+
+    def __init__(self, window_s, max_episodes, clock=time.monotonic):
+        self.window_s = window_s
+        self.window = timedelta(seconds=window_s)
+        self.max_episodes = max_episodes
+        self.clock = clock
+        # Least recently active first
+        self.episodes = OrderedDict()
+        self.closed = []
+        self.opened_count = 0
+        self.folded_count = 0
+        # Folded alerts waiting for their episode to be written
+        self.unacked = 0
+
+    def fold(self, alert, ack=None):
+        """Fold an alert into its open episode; returns False if it opened a new episode.
+        
+        `ack` is kept with the episode until written() or requeue() hands it back.
+        """
+        key = (alert['motor_id'], alert['sensor_type'], alert['alert_type'])
+        now = self.clock()
+        episode = self.episodes.get(key)
+        if episode is not None:
+            timestamp = _comparable(alert['timestamp'])
+            if (episode.first_timestamp - self.window <= timestamp
+                    <= episode.last_timestamp + self.window):
+                episode.fold(alert, now, ack)
+                self.episodes.move_to_end(key)
+                self.folded_count += 1
+                if ack is not None:
+                    self.unacked += 1
+                return True
+            self._close(key)
+
+        self.episodes[key] = Episode(alert, now)
+        self.opened_count += 1
+        if len(self.episodes) > self.max_episodes:
+            self._close(next(iter(self.episodes)))
+        return False
+
+    def stored(self, alert, alert_id):
+        """Record the ID of a stored alert, linking it to the episode it opened"""
+        episode = self.episodes.get((alert['motor_id'], alert['sensor_type'], alert['alert_type']))
+        if episode is None or episode.first_alert is not alert:
+            # The episode may have closed while its first alert was still being written
+            episode = next((closed for closed in self.closed if closed.first_alert is alert), None)
+        if episode is not None:
+            episode.alert_id = alert_id
+            if episode.count > 1:
+                episode.dirty = True
+
+    def expire(self):
+        """Close episodes that have had no alerts for the window"""
+        deadline = self.clock() - self.window_s
+        while self.episodes:
+            key, episode = next(iter(self.episodes.items()))
+            if episode.last_seen > deadline:
+                break
+            self._close(key)
+
+    def close_all(self):
+        """Close every open episode (at shutdown)"""
+        while self.episodes:
+            self._close(next(iter(self.episodes)))
+
+    def take_updates(self):
+        """Episodes to write: newly closed ones and open ones that changed.
+
+        Episodes of a single alert are dropped here: the alert row already
+        records them. One that was written with more is written again.
+        """
+        updates = [episode for episode in self.closed if episode.count > 1 or episode.episode_id is not None]
+        self.closed = []
+        for episode in self.episodes.values():
+            if episode.dirty and (episode.count > 1 or episode.episode_id is not None):
+                updates.append(episode)
+        for episode in updates:
+            episode.dirty = False
+            episode.taken_acks, episode.acks = episode.acks, []
+        return updates
+
+    def written(self, episodes):
+        """Acks of the alerts folded into `episodes` from take_updates, now that they are written"""
+        acks = [ack for episode in episodes for ack in episode.taken_acks]
+        for episode in episodes:
+            episode.taken_acks = []
+        self.unacked -= len(acks)
+        return acks
+
+    def requeue(self, episodes):
+        """Hand back episodes from take_updates that could not be written.
+        
+        Returns the acks of the alerts folded into them since they were last
+        written. Those alerts are taken back out of the episode counts, so the
+        caller must have them redelivered rather than acked: they fold in again.
+        """
+        acks = []
+        for episode in episodes:
+            episode.dirty = True
+            if episode.closed:
+                self.closed.append(episode)
+            episode.count -= len(episode.taken_acks)
+            acks.extend(episode.taken_acks)
+            episode.taken_acks = []
+        self.unacked -= len(acks)
+        return acks
+
+    def drop_acks(self, gone, episodes=()):
+        """Forget the acks for which `gone(ack)` is true, taking their alerts back out of the episode counts.
+        
+        For acks whose channel has closed: the broker redelivers those alerts
+        and they fold in again, so they must not stay counted. `episodes` are
+        ones from take_updates that are already written but not yet passed to
+        written(); they are written again at the next flush. Returns the
+        number of acks dropped.
+        """
+        dropped = 0
+        seen = set()
+        for episode in itertools.chain(self.episodes.values(), self.closed, episodes):
+            if id(episode) in seen:
+                continue
+            seen.add(id(episode))
+            acks = [ack for ack in episode.acks if not gone(ack)]
+            taken_acks = [ack for ack in episode.taken_acks if not gone(ack)]
+            lost = len(episode.acks) + len(episode.taken_acks) - len(acks) - len(taken_acks)
+            if not lost:
+                continue
+            episode.acks, episode.taken_acks = acks, taken_acks
+            episode.count -= lost
+            dropped += lost
+            if episode in episodes and not episode.dirty:
+                episode.dirty = True
+                if episode.closed:
+                    self.closed.append(episode)
+        self.unacked -= dropped
+        return dropped
+
+    def has_open_episodes(self):
+        return bool(self.episodes)
+
+    def stats(self):
+        return {
+            'open': len(self.episodes),
+            'opened': self.opened_count,
+            'folded': self.folded_count,
+        }
+
+    def _close(self, key):
+        episode = self.episodes.pop(key)
+        episode.closed = True
+        self.closed.append(episode)
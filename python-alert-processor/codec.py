@@ -0,0 +1,77 @@
+"""
+Fast encoding and decoding for alert and notification messages.
+
+Decoding works on raw message bytes. It uses orjson when it is installed
+and the stdlib json module otherwise. Any payload orjson rejects is
+decoded again by the stdlib, so what is accepted and the errors raised
+for bad payloads are the same as json.loads.
+
+Notifications are encoded by a template that produces exactly the bytes
+json.dumps would. It falls back to json.dumps for anything the template
+does not cover.
+"""
+
+import json
+import math
+from datetime import datetime
+from functools import lru_cache
+from json.encoder import encode_basestring_ascii
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+def loads(data):
+    """Decode a JSON document from bytes or str"""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # Let the stdlib accept what it accepts (NaN, huge ints, ...) and
+            # raise its own error for everything else
+            pass
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode('utf-8')
+    return json.loads(data)
+
+@lru_cache(maxsize=4096)
+def _parse_iso_timestamp(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def parse_timestamp(value):
+    """Parse an ISO-8601 timestamp, accepting a trailing 'Z' for UTC.
+
+    Alerts for different motors carry the same reading timestamps, so parsed
+    values are cached (datetimes are immutable, so sharing them is safe).
+    """
+    if type(value) is str:
+        return _parse_iso_timestamp(value)
+    # Same error as the uncached path for non-string input
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+NOTIFICATION_KEYS = (
+    'alertId', 'motorId', 'sensorType', 'timestamp', 'value', 'alertType', 'processedAt'
+)
+
+def encode_notification(notification):
+    """Encode a notification dict to the same bytes as json.dumps(notification).encode()"""
+    if tuple(notification) != NOTIFICATION_KEYS:
+        return json.dumps(notification).encode('utf-8')
+
+    value = notification['value']
+    strings = (
+        notification['motorId'], notification['sensorType'], notification['timestamp'],
+        notification['alertType'], notification['processedAt']
+    )
+    if (type(notification['alertId']) is not int
+            or type(value) is not float or not math.isfinite(value)
+            or any(type(text) is not str for text in strings)):
+        return json.dumps(notification).encode('utf-8')
+
+    motor_id, sensor_type, timestamp, alert_type, processed_at = map(encode_basestring_ascii, strings)
+    return (
+        f'{{"alertId": {notification["alertId"]!r}, "motorId": {motor_id}, '
+        f'"sensorType": {sensor_type}, "timestamp": {timestamp}, "value": {value!r}, '
+        f'"alertType": {alert_type}, "processedAt": {processed_at}}}'
+    ).encode('ascii')
@@ -10,6 +10,10 @@ class Config:
     MOTOR_ALERTS_EXCHANGE = os.getenv('MOTOR_ALERTS_EXCHANGE', 'motor.alerts')
     MOTOR_ALERTS_QUEUE = os.getenv('MOTOR_ALERTS_QUEUE', 'motor.alerts.queue')
     MOTOR_NOTIFICATIONS_EXCHANGE = os.getenv('MOTOR_NOTIFICATIONS_EXCHANGE', 'motor.notifications')
+    SHARD_EXCHANGE = os.getenv('SHARD_EXCHANGE', 'motor.alerts.sharded')  # x-consistent-hash, --workers > 1
+    DEAD_LETTER_QUEUE = os.getenv('DEAD_LETTER_QUEUE', 'motor.alerts.dlq')  # empty nacks failed messages instead
+    READINGS_EXCHANGE = os.getenv('READINGS_EXCHANGE', 'motor.readings')  # raw readings, --mode readings
+    READINGS_QUEUE = os.getenv('READINGS_QUEUE', 'motor.readings.queue')
     
     # PostgreSQL Configuration
     DB_HOST = os.getenv('DB_HOST', 'localhost')
@@ -17,6 +21,8 @@ class Config:
     DB_NAME = os.getenv('DB_NAME', 'motor_monitoring')
     DB_USER = os.getenv('DB_USER', 'postgres')
     DB_PASSWORD = os.getenv('DB_PASSWORD', 'password')
+    COMPACT_SCHEMA = os.getenv('COMPACT_SCHEMA', 'false').lower() == 'true'  # dimension tables + fixed-width values
+    PREPARED_STATEMENTS = os.getenv('PREPARED_STATEMENTS', 'true').lower() == 'true'  # false behind transaction pooling
     
     @property
     def database_url(self):
@@ -27,6 +33,60 @@ class Config:
     
     # Processing Configuration
     PREFETCH_COUNT = int(os.getenv('PREFETCH_COUNT', '10'))
-    RETRY_ATTEMPTS = int(os.getenv('RETRY_ATTEMPTS', '3'))
-    RETRY_DELAY = int(os.getenv('RETRY_DELAY', '5'))  # seconds
+    BATCH_SIZE = int(os.getenv('BATCH_SIZE', '1'))  # 1 disables batching
+    BATCH_TIMEOUT_MS = int(os.getenv('BATCH_TIMEOUT_MS', '50'))  # milliseconds
+    WORKER_COUNT = int(os.getenv('WORKER_COUNT', '1'))  # 1 processes on the consumer thread
+    FLOW_CONTROL = os.getenv('FLOW_CONTROL', 'false').lower() == 'true'  # adapt prefetch and batch size to insert latency
+    FLOW_PREFETCH_MIN = int(os.getenv('FLOW_PREFETCH_MIN', '5'))
+    FLOW_PREFETCH_MAX = int(os.getenv('FLOW_PREFETCH_MAX', '500'))
+    FLOW_TARGET_LATENCY_MS = float(os.getenv('FLOW_TARGET_LATENCY_MS', '100'))  # per insert call
+    FLOW_INTERVAL_MS = int(os.getenv('FLOW_INTERVAL_MS', '1000'))  # milliseconds between adjustments
+    FLOW_PAUSE_MS = int(os.getenv('FLOW_PAUSE_MS', '5000'))  # consumption paused when congested at the minimum
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '4'))
+    PROCESSOR_ENGINE = os.getenv('PROCESSOR_ENGINE', 'blocking')  # blocking or asyncio
+    MAX_IN_FLIGHT = int(os.getenv('MAX_IN_FLIGHT', '100'))  # asyncio engine only
+    NOTIFICATION_BATCH_SIZE = int(os.getenv('NOTIFICATION_BATCH_SIZE', '1'))  # alerts per notification message
+    NOTIFICATION_FLUSH_MS = int(os.getenv('NOTIFICATION_FLUSH_MS', '50'))  # milliseconds
+    PUBLISHER_CONFIRMS = os.getenv('PUBLISHER_CONFIRMS', 'false').lower() == 'true'
+    NOTIFICATION_RETRY_LIMIT = int(os.getenv('NOTIFICATION_RETRY_LIMIT', '10000'))
+    NOTIFICATION_RETRY_PER_FLUSH = int(os.getenv('NOTIFICATION_RETRY_PER_FLUSH', '100'))  # failed notifications resent per flush
+    RECENT_CACHE_SIZE = int(os.getenv('RECENT_CACHE_SIZE', '5'))  # alerts kept per motor, 0 disables
+    RECENT_CACHE_MAX_MOTORS = int(os.getenv('RECENT_CACHE_MAX_MOTORS', '10000'))
+    PARTITION_INTERVAL = os.getenv('PARTITION_INTERVAL', 'day')  # day or month
+    PARTITION_PREMAKE = int(os.getenv('PARTITION_PREMAKE', '3'))  # partitions created ahead of time
+    PARTITION_RETENTION_DAYS = int(os.getenv('PARTITION_RETENTION_DAYS', '0'))  # 0 keeps all history
+    PARTITION_RETENTION_ACTION = os.getenv('PARTITION_RETENTION_ACTION', 'detach')  # detach or drop
+    PARTITION_MAINTENANCE_INTERVAL_S = int(os.getenv('PARTITION_MAINTENANCE_INTERVAL_S', '3600'))
+    COALESCE_WINDOW_S = float(os.getenv('COALESCE_WINDOW_S', '0'))  # 0 stores every alert
+    COALESCE_MAX_EPISODES = int(os.getenv('COALESCE_MAX_EPISODES', '10000'))
+    COALESCE_FLUSH_MS = int(os.getenv('COALESCE_FLUSH_MS', '1000'))  # milliseconds
+    TIMESERIES_WINDOW = int(os.getenv('TIMESERIES_WINDOW', '0'))  # alerts kept per series, 0 disables (needs numpy)
+    TIMESERIES_SNAPSHOT = os.getenv('TIMESERIES_SNAPSHOT', '')  # .npz path, empty disables snapshots
+    TIMESERIES_SNAPSHOT_S = int(os.getenv('TIMESERIES_SNAPSHOT_S', '300'))  # seconds between snapshots
+    METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+    METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))  # 0 disables the /metrics endpoint
+    METRICS_QUEUE_POLL_S = float(os.getenv('METRICS_QUEUE_POLL_S', '5'))  # seconds
+    READ_API_HOST = os.getenv('READ_API_HOST', '127.0.0.1')
+    READ_API_PORT = int(os.getenv('READ_API_PORT', '0'))  # read API inside the processor, 0 disables it
+    READ_API_CACHE_TTL_S = float(os.getenv('READ_API_CACHE_TTL_S', '5'))  # seconds
+    READ_API_CACHE_ENTRIES = int(os.getenv('READ_API_CACHE_ENTRIES', '1024'))
+    READ_API_POOL_SIZE = int(os.getenv('READ_API_POOL_SIZE', '4'))
+    SPILL_DIR = os.getenv('SPILL_DIR', '')  # empty disables the spill log
+    SPILL_SEGMENT_BYTES = int(os.getenv('SPILL_SEGMENT_BYTES', str(64 * 1024 * 1024)))
+    SPILL_FSYNC_BATCH = int(os.getenv('SPILL_FSYNC_BATCH', '100'))  # spilled alerts per fsync
+    SPILL_FSYNC_MS = int(os.getenv('SPILL_FSYNC_MS', '20'))  # milliseconds
+    SPILL_REPLAY_BATCH = int(os.getenv('SPILL_REPLAY_BATCH', '500'))  # alerts per replay insert
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '10000'))  # rows per server-side cursor fetch
+    BACKFILL_WORKERS = int(os.getenv('BACKFILL_WORKERS', '4'))  # COPY worker processes
+    BACKFILL_CHUNK_BYTES = int(os.getenv('BACKFILL_CHUNK_BYTES', str(8 * 1024 * 1024)))  # input per COPY
+    PROCESS_WORKERS = int(os.getenv('PROCESS_WORKERS', '1'))  # shard processes; 1 runs a single processor
+    SUPERVISOR_REPORT_S = float(os.getenv('SUPERVISOR_REPORT_S', '30'))  # seconds between throughput reports
+    SHUTDOWN_TIMEOUT_S = float(os.getenv('SHUTDOWN_TIMEOUT_S', '30'))  # grace period before killing a shard
+    RETRY_ATTEMPTS = int(os.getenv('RETRY_ATTEMPTS', '3'))  # delayed retries of a failed store before the DLQ
+    RETRY_DELAY = int(os.getenv('RETRY_DELAY', '5'))  # seconds: first retry delay (doubling), spill replays, shard restarts
+    READINGS_PREFETCH = int(os.getenv('READINGS_PREFETCH', '20000'))  # readings unacked until their buckets are written (max 65535)
+    READINGS_FLUSH_MS = int(os.getenv('READINGS_FLUSH_MS', '1000'))  # milliseconds between bucket writes
+    
+    # Shard index of this process, set by the supervisor (None when not sharded)
+    SHARD = None
 
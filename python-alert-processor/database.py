@@ -1,26 +1,589 @@
 import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
 import psycopg2.extras
+import psycopg2.pool
+import psycopg2.sql
+import csv
+import hashlib
+import io
+import itertools
 import logging
-from datetime import datetime
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import partitions
+import readings
+from backends import AlertStore, decode_history_cursor, encode_history_cursor
+from cache import DimensionCache
 from config import Config
 
 logger = logging.getLogger(__name__)
 
-class DatabaseManager:
+# DDL run at startup by every processor engine. motor_alerts is range
+# partitioned on timestamp (see partitions.py); a partitioned table's primary
+# key must include the partition column.
+def history_index_statements(table, motor, sensor, alert):
+    """CREATE INDEX statements of the history pages (get_alert_history) on `table`.
+
+    A page walks one index newest first from its cursor: the motor index for
+    a page of one motor, the time index otherwise. Both INCLUDE every other
+    column a page returns, so the sensor and alert type filters are checked
+    on the index entries, and in partitions the visibility map marks
+    all-visible (all but the newest) a page is an index-only scan. A page
+    filtered on a type reads past the other types' entries to fill up.
+    """
+    columns = f"{sensor}, {alert}, value, created_at"
+    return (
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_by_motor "
+        f"ON {table}({motor}, timestamp DESC, id DESC) INCLUDE ({columns});",
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_by_time "
+        f"ON {table}(timestamp DESC, id DESC) INCLUDE ({motor}, {columns});",
+    )
+
+def superseded_indexes(table):
+    """Earlier indexes of `table` that the history indexes replace"""
+    return tuple(
+        f"idx_{table}_{name}"
+        for name in ('motor_id', 'timestamp', 'created_at', 'sensor_type', 'alert_type', 'motor_timestamp',
+                     'motor_history', 'history', 'time', 'motor_time', 'sensor_time', 'motor_sensor_time',
+                     'alert_time', 'motor_alert_time')
+    )
+
+ALERTS_TABLE_STATEMENTS = (
+    """
+    CREATE TABLE IF NOT EXISTS motor_alerts (
+        id SERIAL,
+        motor_id TEXT NOT NULL,
+        sensor_type TEXT NOT NULL,
+        timestamp TIMESTAMPTZ NOT NULL,
+        value NUMERIC NOT NULL,
+        alert_type TEXT NOT NULL,
+        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, timestamp)
+    ) PARTITION BY RANGE (timestamp);
+    """,
+    # History pages; the motor index also serves get_recent_alerts, and the
+    # time one exports and time ranges
+    *history_index_statements('motor_alerts', 'motor_id', 'sensor_type', 'alert_type'),
+    # Superseded by the history indexes (motor_id and timestamp lead them),
+    # or never used by a query: they only slowed down inserts
+    *(f"DROP INDEX IF EXISTS {index};" for index in superseded_indexes('motor_alerts')),
+)
+
+# Tables shared by both alert layouts
+SHARED_STATEMENTS = (
+    # Daily counts and value aggregates maintained at insert time, so range
+    # queries and the time-series warm-up never scan motor_alerts
+    """
+    CREATE TABLE IF NOT EXISTS motor_alert_daily_counts (
+        motor_id TEXT NOT NULL,
+        day DATE NOT NULL,
+        sensor_type TEXT NOT NULL,
+        alert_type TEXT NOT NULL,
+        count BIGINT NOT NULL,
+        value_sum DOUBLE PRECISION,
+        value_min DOUBLE PRECISION,
+        value_max DOUBLE PRECISION,
+        first_at TIMESTAMPTZ,
+        last_at TIMESTAMPTZ,
+        PRIMARY KEY (motor_id, day, sensor_type, alert_type)
+    );
+    """,
+    # Rollups created before the value aggregates get them empty (NULL) until
+    # backfill_daily_counts recounts their days
+    """
+    ALTER TABLE motor_alert_daily_counts
+        ADD COLUMN IF NOT EXISTS value_sum DOUBLE PRECISION,
+        ADD COLUMN IF NOT EXISTS value_min DOUBLE PRECISION,
+        ADD COLUMN IF NOT EXISTS value_max DOUBLE PRECISION,
+        ADD COLUMN IF NOT EXISTS first_at TIMESTAMPTZ,
+        ADD COLUMN IF NOT EXISTS last_at TIMESTAMPTZ;
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_motor_alert_daily_counts_day
+    ON motor_alert_daily_counts(day, motor_id);
+    """,
+    # Alert storms folded by the coalescer (COALESCE_WINDOW_S); alert_id is the
+    # motor_alerts row of the alert that opened the episode
+    """
+    CREATE TABLE IF NOT EXISTS motor_alert_episodes (
+        id SERIAL PRIMARY KEY,
+        alert_id INTEGER,
+        motor_id TEXT NOT NULL,
+        sensor_type TEXT NOT NULL,
+        alert_type TEXT NOT NULL,
+        first_timestamp TIMESTAMPTZ NOT NULL,
+        last_timestamp TIMESTAMPTZ NOT NULL,
+        alert_count INTEGER NOT NULL,
+        max_value NUMERIC NOT NULL,
+        closed BOOLEAN NOT NULL DEFAULT FALSE
+    );
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_motor_alert_episodes_motor_last
+    ON motor_alert_episodes(motor_id, last_timestamp DESC);
+    """,
+    # How far each processor's spill log (spill.py) has been replayed; written
+    # in the same transaction as the replayed alerts
+    """
+    CREATE TABLE IF NOT EXISTS motor_alert_spill_checkpoints (
+        spill_id TEXT PRIMARY KEY,
+        segment BIGINT NOT NULL,
+        segment_offset BIGINT NOT NULL,
+        updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    # Input chunks loaded by manage.py backfill-alerts (backfill.py); written in
+    # the same transaction as the chunk's rows, so a rerun skips exactly those
+    """
+    CREATE TABLE IF NOT EXISTS motor_alert_backfill_chunks (
+        source TEXT NOT NULL,
+        chunk_start BIGINT NOT NULL,
+        chunk_end BIGINT NOT NULL,
+        loaded BIGINT NOT NULL,
+        rejected BIGINT NOT NULL,
+        first_day DATE,
+        last_day DATE,
+        loaded_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (source, chunk_start)
+    );
+    """,
+) + tuple(
+    # Raw reading aggregates written by the readings consumer (readings.py), one
+    # table per bucket width; the primary key serves per-motor time ranges
+    f"""
+    CREATE TABLE IF NOT EXISTS {readings.reading_table(suffix)} (
+        motor_id TEXT NOT NULL,
+        sensor_type TEXT NOT NULL,
+        bucket TIMESTAMPTZ NOT NULL,
+        reading_count BIGINT NOT NULL,
+        min_value DOUBLE PRECISION NOT NULL,
+        max_value DOUBLE PRECISION NOT NULL,
+        sum_value DOUBLE PRECISION NOT NULL,
+        avg_value DOUBLE PRECISION GENERATED ALWAYS AS (sum_value / reading_count) STORED,
+        last_value DOUBLE PRECISION NOT NULL,
+        last_at TIMESTAMPTZ NOT NULL,
+        PRIMARY KEY (motor_id, sensor_type, bucket)
+    );
+    """
+    for suffix, _ in readings.RESOLUTIONS
+)
+
+# Dashboard views from sql/01_create_tables.sql, recreated when motor_alerts
+# is migrated to a partitioned table
+VIEW_STATEMENTS = (
+    """
+    CREATE OR REPLACE VIEW recent_alerts AS
+    SELECT 
+        id,
+        motor_id,
+        sensor_type,
+        timestamp,
+        value,
+        alert_type,
+        created_at,
+        EXTRACT(EPOCH FROM (NOW() - timestamp)) / 3600 AS hours_ago
+    FROM motor_alerts
+    WHERE timestamp >= NOW() - INTERVAL '24 hours'
+    ORDER BY timestamp DESC;
+    """,
+    """
+    CREATE OR REPLACE VIEW alert_summary AS
+    SELECT 
+        motor_id,
+        sensor_type,
+        alert_type,
+        COUNT(*) as total_alerts,
+        MIN(timestamp) as first_alert,
+        MAX(timestamp) as last_alert,
+        AVG(value) as avg_value,
+        MIN(value) as min_value,
+        MAX(value) as max_value
+    FROM motor_alerts
+    GROUP BY motor_id, sensor_type, alert_type
+    ORDER BY motor_id, sensor_type, alert_type;
+    """,
+)
+
+SCHEMA_STATEMENTS = ALERTS_TABLE_STATEMENTS + SHARED_STATEMENTS
+
+# Dimension tables of the compact layout, each mapping a name to a small key
+DIMENSIONS = (('motors', 'motor_id'), ('sensor_types', 'sensor_type'), ('alert_types', 'alert_type'))
+# (dimension table, key column of the compact motor_alerts view) of the type names
+COMPACT_NAME_KEYS = {'sensor_type': ('sensor_types', 'sensor_code'), 'alert_type': ('alert_types', 'alert_code')}
+
+# COMPACT_SCHEMA layout: alerts are stored in motor_alert_facts with integer
+# keys into the dimension tables and a double precision value. Fixed-width
+# columns come widest first, so a row has no alignment padding. motor_alerts
+# is a view with the original columns, so readers need no changes; it also
+# exposes the keys, which lets name filters use the facts indexes.
+COMPACT_TABLE_STATEMENTS = (
+    """
+    CREATE TABLE IF NOT EXISTS motors (
+        id SERIAL PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sensor_types (
+        id SMALLSERIAL PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS alert_types (
+        id SMALLSERIAL PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS motor_alert_facts (
+        timestamp TIMESTAMPTZ NOT NULL,
+        value DOUBLE PRECISION NOT NULL,
+        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+        id SERIAL,
+        motor_key INTEGER NOT NULL,
+        sensor_code SMALLINT NOT NULL,
+        alert_code SMALLINT NOT NULL,
+        PRIMARY KEY (id, timestamp)
+    ) PARTITION BY RANGE (timestamp);
+    """,
+    # The history indexes of the text layout, on the keys
+    *history_index_statements('motor_alert_facts', 'motor_key', 'sensor_code', 'alert_code'),
+    *(f"DROP INDEX IF EXISTS {index};" for index in superseded_indexes('motor_alert_facts')),
+    """
+    CREATE OR REPLACE VIEW motor_alerts AS
+    SELECT
+        facts.id,
+        motors.name AS motor_id,
+        sensor_types.name AS sensor_type,
+        facts.timestamp,
+        facts.value,
+        alert_types.name AS alert_type,
+        facts.created_at,
+        facts.motor_key,
+        facts.sensor_code,
+        facts.alert_code
+    FROM motor_alert_facts facts
+    JOIN motors ON motors.id = facts.motor_key
+    JOIN sensor_types ON sensor_types.id = facts.sensor_code
+    JOIN alert_types ON alert_types.id = facts.alert_code;
+    """,
+)
+
+COMPACT_SCHEMA_STATEMENTS = COMPACT_TABLE_STATEMENTS + SHARED_STATEMENTS + VIEW_STATEMENTS
+
+# The table motor_alerts is renamed to while migrate_to_compact moves its rows
+COMPACT_LEGACY_TABLE = 'motor_alerts_uncompacted'
+
+# Alerts moved per transaction by migrate_to_compact (by ID range)
+COMPACT_MIGRATE_BATCH = 50000
+
+# Inserts alerts and bumps their daily rollup rows in a single statement, so
+# both happen in one transaction. {values} is the VALUES list placeholder.
+# Rollup keys are upserted in sorted order so concurrent writers lock rows in
+# the same order.
+INSERT_ALERTS_SQL = """
+    WITH inserted AS (
+        INSERT INTO motor_alerts (motor_id, sensor_type, timestamp, value, alert_type)
+        VALUES {values}
+        RETURNING id, motor_id, sensor_type, timestamp, value, alert_type
+    ), rollup AS (
+        INSERT INTO motor_alert_daily_counts AS counts
+            (motor_id, day, sensor_type, alert_type, count, value_sum, value_min, value_max, first_at, last_at)
+        SELECT motor_id, timestamp::date, sensor_type, alert_type, COUNT(*),
+            SUM(value), MIN(value), MAX(value), MIN(timestamp), MAX(timestamp)
+        FROM inserted
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 1, 2, 3, 4
+        ON CONFLICT (motor_id, day, sensor_type, alert_type)
+        DO UPDATE SET
+            count = counts.count + EXCLUDED.count,
+            value_sum = counts.value_sum + EXCLUDED.value_sum,
+            value_min = LEAST(counts.value_min, EXCLUDED.value_min),
+            value_max = GREATEST(counts.value_max, EXCLUDED.value_max),
+            first_at = LEAST(counts.first_at, EXCLUDED.first_at),
+            last_at = GREATEST(counts.last_at, EXCLUDED.last_at)
+    )
+    SELECT id FROM inserted ORDER BY id;
+"""
+
+# INSERT_ALERTS_SQL for the compact layout; VALUES rows are (motor_key,
+# sensor_code, timestamp, value, alert_code, motor_id, sensor_type,
+# alert_type), so the rollup takes its names from the input, not from joins
+COMPACT_INSERT_ALERTS_SQL = """
+    WITH input (motor_key, sensor_code, timestamp, value, alert_code, motor_id, sensor_type, alert_type) AS (
+        VALUES {values}
+    ), inserted AS (
+        INSERT INTO motor_alert_facts (motor_key, sensor_code, timestamp, value, alert_code)
+        SELECT motor_key, sensor_code, timestamp, value, alert_code FROM input
+        RETURNING id
+    ), rollup AS (
+        INSERT INTO motor_alert_daily_counts AS counts
+            (motor_id, day, sensor_type, alert_type, count, value_sum, value_min, value_max, first_at, last_at)
+        SELECT motor_id, timestamp::date, sensor_type, alert_type, COUNT(*),
+            SUM(value), MIN(value), MAX(value), MIN(timestamp), MAX(timestamp)
+        FROM input
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 1, 2, 3, 4
+        ON CONFLICT (motor_id, day, sensor_type, alert_type)
+        DO UPDATE SET
+            count = counts.count + EXCLUDED.count,
+            value_sum = counts.value_sum + EXCLUDED.value_sum,
+            value_min = LEAST(counts.value_min, EXCLUDED.value_min),
+            value_max = GREATEST(counts.value_max, EXCLUDED.value_max),
+            first_at = LEAST(counts.first_at, EXCLUDED.first_at),
+            last_at = GREATEST(counts.last_at, EXCLUDED.last_at)
+    )
+    SELECT id FROM inserted ORDER BY id;
+"""
+
+# Typed row template of COMPACT_INSERT_ALERTS_SQL: the CTE has no target
+# columns to infer parameter types from
+COMPACT_VALUES_TEMPLATE = "(%s::integer, %s::smallint, %s::timestamptz, %s::double precision, %s::smallint, %s, %s, %s)"
+
+# alert_summary aggregates plus the highest alert ID of each group
+ALERT_SUMMARY_SQL = """
+    SELECT 
+        motor_id,
+        sensor_type,
+        alert_type,
+        COUNT(*) as total_alerts,
+        MIN(timestamp) as first_alert,
+        MAX(timestamp) as last_alert,
+        AVG(value) as avg_value,
+        MIN(value) as min_value,
+        MAX(value) as max_value,
+        MAX(id) as last_id
+    FROM motor_alerts
+    GROUP BY motor_id, sensor_type, alert_type
+    ORDER BY motor_id, sensor_type, alert_type;
+"""
+
+# ALERT_SUMMARY_SQL for the compact layout: groups by key, then joins the
+# few result rows to the names instead of every alert
+COMPACT_ALERT_SUMMARY_SQL = """
+    SELECT
+        motors.name as motor_id,
+        sensor_types.name as sensor_type,
+        alert_types.name as alert_type,
+        summary.total_alerts,
+        summary.first_alert,
+        summary.last_alert,
+        summary.avg_value,
+        summary.min_value,
+        summary.max_value,
+        summary.last_id
+    FROM (
+        SELECT
+            motor_key,
+            sensor_code,
+            alert_code,
+            COUNT(*) as total_alerts,
+            MIN(timestamp) as first_alert,
+            MAX(timestamp) as last_alert,
+            AVG(value) as avg_value,
+            MIN(value) as min_value,
+            MAX(value) as max_value,
+            MAX(id) as last_id
+        FROM motor_alert_facts
+        GROUP BY motor_key, sensor_code, alert_code
+    ) summary
+    JOIN motors ON motors.id = summary.motor_key
+    JOIN sensor_types ON sensor_types.id = summary.sensor_code
+    JOIN alert_types ON alert_types.id = summary.alert_code
+    ORDER BY motor_id, sensor_type, alert_type;
+"""
+
+# ALERT_SUMMARY_SQL from the daily rollup instead of the alerts, so its cost
+# grows with days and series rather than alerts. `complete` is false while
+# a series has days from before the rollup kept value aggregates. last_id is
+# the highest alert ID of all; {table} holds the alert rows
+ALERT_TOTALS_SQL = """
+    SELECT
+        motor_id,
+        sensor_type,
+        alert_type,
+        SUM(count)::bigint as total_alerts,
+        MIN(first_at) as first_alert,
+        MAX(last_at) as last_alert,
+        SUM(value_sum) / SUM(count) as avg_value,
+        MIN(value_min) as min_value,
+        MAX(value_max) as max_value,
+        BOOL_AND(value_sum IS NOT NULL) as complete,
+        (SELECT MAX(id) FROM {table}) as last_id
+    FROM motor_alert_daily_counts
+    GROUP BY motor_id, sensor_type, alert_type
+    ORDER BY motor_id, sensor_type, alert_type;
+"""
+
+# Adds names missing from a dimension table; {table} is one of DIMENSIONS
+INSERT_DIMENSION_SQL = """
+    INSERT INTO {table} (name) SELECT unnest(%s::text[]) ORDER BY 1 ON CONFLICT (name) DO NOTHING;
+"""
+
+# Total size with indexes and TOAST, over every partition of a partitioned table
+RELATION_SIZE_SQL = """
+    SELECT COALESCE(SUM(pg_total_relation_size(relid)), 0)::bigint FROM pg_partition_tree(%s::regclass);
+"""
+
+# Episode writes; {values} and {id} are the engine's placeholders, filled from Episode.row()
+INSERT_EPISODE_SQL = """
+    INSERT INTO motor_alert_episodes
+        (alert_id, motor_id, sensor_type, alert_type, first_timestamp, last_timestamp,
+         alert_count, max_value, closed)
+    VALUES {values}
+    RETURNING id;
+"""
+
+SPILL_CHECKPOINT_SQL = """
+    SELECT segment, segment_offset FROM motor_alert_spill_checkpoints WHERE spill_id = %s;
+"""
+
+SAVE_SPILL_CHECKPOINT_SQL = """
+    INSERT INTO motor_alert_spill_checkpoints (spill_id, segment, segment_offset)
+    VALUES (%s, %s, %s)
+    ON CONFLICT (spill_id) DO UPDATE
+    SET segment = EXCLUDED.segment,
+        segment_offset = EXCLUDED.segment_offset,
+        updated_at = CURRENT_TIMESTAMP;
+"""
+
+UPDATE_EPISODE_SQL = """
+    UPDATE motor_alert_episodes
+    SET (alert_id, first_timestamp, last_timestamp, alert_count, max_value, closed) = {values}
+    WHERE id = {id};
+"""
+
+# Bucket rows from ReadingAggregator.close_buckets() merged into what the table
+# already holds for the bucket; {table} is readings.reading_table(suffix)
+SAVE_READING_BUCKETS_SQL = """
+    INSERT INTO {table} AS buckets
+        (motor_id, sensor_type, bucket, reading_count, min_value, max_value, sum_value, last_value, last_at)
+    VALUES %s
+    ON CONFLICT (motor_id, sensor_type, bucket) DO UPDATE
+    SET reading_count = buckets.reading_count + EXCLUDED.reading_count,
+        min_value = LEAST(buckets.min_value, EXCLUDED.min_value),
+        max_value = GREATEST(buckets.max_value, EXCLUDED.max_value),
+        sum_value = buckets.sum_value + EXCLUDED.sum_value,
+        last_value = CASE WHEN EXCLUDED.last_at >= buckets.last_at
+                          THEN EXCLUDED.last_value ELSE buckets.last_value END,
+        last_at = GREATEST(buckets.last_at, EXCLUDED.last_at);
+"""
+
+# Columns of an alert export, in output order
+EXPORT_COLUMNS = ('id', 'motor_id', 'sensor_type', 'timestamp', 'value', 'alert_type', 'created_at')
+
+# Bulk load of a backfill chunk; rows are CSV in this column order
+COPY_ALERTS_SQL = """
+    COPY motor_alerts (motor_id, sensor_type, timestamp, value, alert_type) FROM STDIN WITH (FORMAT csv)
+"""
+
+COMPACT_COPY_ALERTS_SQL = """
+    COPY motor_alert_facts (motor_key, sensor_code, timestamp, value, alert_code) FROM STDIN WITH (FORMAT csv)
+"""
+
+# Days are taken in the session time zone, like backfill_daily_counts
+SAVE_BACKFILL_CHUNK_SQL = """
+    INSERT INTO motor_alert_backfill_chunks
+        (source, chunk_start, chunk_end, loaded, rejected, first_day, last_day)
+    VALUES (%s, %s, %s, %s, %s, %s::timestamptz::date, %s::timestamptz::date);
+"""
+
+# The schema version create_tables last applied, in a single row. A start
+# that finds its own version skips the DDL (and the locks it takes). The
+# version is read only while motor_alerts exists, so dropping it by hand
+# brings the DDL back.
+SCHEMA_VERSION_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS motor_alert_schema_version (
+        singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+        version TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+SCHEMA_VERSION_SQL = """
+    SELECT version FROM motor_alert_schema_version WHERE to_regclass('motor_alerts') IS NOT NULL;
+"""
+
+SAVE_SCHEMA_VERSION_SQL = """
+    INSERT INTO motor_alert_schema_version (version) VALUES (%s)
+    ON CONFLICT (singleton) DO UPDATE
+    SET version = EXCLUDED.version,
+        applied_at = CURRENT_TIMESTAMP;
+"""
+
+# Serializes schema changes between processors starting at the same time
+SCHEMA_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('motor_alerts_schema'));"
+
+def schema_version(statements):
+    """Version of a schema: a digest of the statements that create it"""
+    digest = hashlib.sha256()
+    for statement in statements:
+        digest.update(' '.join(statement.split()).encode('utf-8'))
+        digest.update(b';')
+    return digest.hexdigest()[:16]
+
+def numbered_params(sql):
+    """`sql` with its %s placeholders numbered $1, $2, ... as PREPARE takes them"""
+    numbers = itertools.count(1)
+    return re.sub(r'%s', lambda _: f"${next(numbers)}", sql)
+
+class PreparingConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers the statements prepared on it.
+
+    Prepared statements live as long as the server session, so each
+    connection (the consumer's, and every pooled one) prepares its own.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+class DatabaseManager(AlertStore):
     def __init__(self, config: Config):
         self.config = config
-        self.connection = None
+        self._connection = None
+        self.pool = None
+        self._pool_slots = None
+        self._local = threading.local()
+        # COMPACT_SCHEMA: rows go to motor_alert_facts, keyed through the dimension tables
+        self.compact = config.COMPACT_SCHEMA
+        self.alerts_table = partitions.partitioned_table(config)
+        self.insert_sql = COMPACT_INSERT_ALERTS_SQL if self.compact else INSERT_ALERTS_SQL
+        self.values_template = COMPACT_VALUES_TEMPLATE if self.compact else "(%s, %s, %s, %s, %s)"
+        self.dimensions = DimensionCache(table for table, _ in DIMENSIONS)
+        self.schema_statements = COMPACT_SCHEMA_STATEMENTS if self.compact else SCHEMA_STATEMENTS
+        self.schema_version = schema_version(
+            self.schema_statements + (partitions.default_partition_sql(self.alerts_table),))
+    
+    @property
+    def connection(self):
+        """Connection for the calling thread: its pooled connection if it holds one"""
+        return getattr(self._local, 'connection', None) or self._connection
+    
+    @connection.setter
+    def connection(self, value):
+        self._connection = value
+    
+    def _connection_params(self):
+        return dict(
+            host=self.config.DB_HOST,
+            port=self.config.DB_PORT,
+            database=self.config.DB_NAME,
+            user=self.config.DB_USER,
+            password=self.config.DB_PASSWORD,
+            connection_factory=PreparingConnection
+        )
         
     def connect(self):
-        """Establish database connection"""
-        try:
-            self.connection = psycopg2.connect(
-                host=self.config.DB_HOST,
-                port=self.config.DB_PORT,
-                database=self.config.DB_NAME,
-                user=self.config.DB_USER,
-                password=self.config.DB_PASSWORD
-            )
+        """Establish database connection (replacing a previous one, e.g. after a restart)"""
+        if self._connection is not None:
+            self._connection.close()
+        try:
+            self.connection = psycopg2.connect(**self._connection_params())
             self.connection.autocommit = True
             logger.info("Connected to PostgreSQL database")
             return True
@@ -28,59 +591,155 @@ class DatabaseManager:
             logger.error(f"Failed to connect to database: {e}")
             return False
     
+    def create_pool(self, minconn, maxconn):
+        """Create a thread-safe connection pool for concurrent workers"""
+        try:
+            self.pool = psycopg2.pool.ThreadedConnectionPool(
+                minconn, maxconn, **self._connection_params()
+            )
+            # ThreadedConnectionPool raises instead of waiting when exhausted,
+            # so callers queue on this semaphore for a free connection
+            self._pool_slots = threading.BoundedSemaphore(maxconn)
+            logger.info(f"Created PostgreSQL connection pool ({minconn}-{maxconn} connections)")
+            return True
+        except psycopg2.Error as e:
+            logger.error(f"Failed to create connection pool: {e}")
+            return False
+    
+    @contextmanager
+    def pooled_connection(self):
+        """Bind a pooled connection to the calling thread for the duration of the block"""
+        self._pool_slots.acquire()
+        try:
+            connection = self.pool.getconn()
+            connection.autocommit = True
+            self._local.connection = connection
+            try:
+                yield connection
+            finally:
+                self._local.connection = None
+                self.pool.putconn(connection, close=bool(connection.closed))
+        finally:
+            self._pool_slots.release()
+    
     def disconnect(self):
         """Close database connection"""
-        if self.connection:
-            self.connection.close()
+        if self.pool:
+            self.pool.closeall()
+            self.pool = None
+        if self._connection:
+            self._connection.close()
             logger.info("Disconnected from PostgreSQL database")
     
+    @contextmanager
+    def _transaction(self):
+        """Cursor in an explicit transaction (the connection is in autocommit mode)"""
+        with self.connection.cursor() as cursor:
+            cursor.execute("BEGIN;")
+            try:
+                yield cursor
+            except BaseException:
+                cursor.execute("ROLLBACK;")
+                raise
+            cursor.execute("COMMIT;")
+    
+    def _table_kind(self, table=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(partitions.table_kind_sql(table or self.alerts_table))
+            row = cursor.fetchone()
+            return row[0] if row else None
+    
+    def applied_schema_version(self):
+        """Schema version create_tables last applied, or None if it never has"""
+        with self.connection.cursor() as cursor:
+            try:
+                cursor.execute(SCHEMA_VERSION_SQL)
+            except psycopg2.errors.UndefinedTable:
+                return None
+            row = cursor.fetchone()
+            return row[0] if row else None
+    
     def create_tables(self):
-        """Create the motor_alerts table if it doesn't exist"""
+        """Create the motor_alerts table (or the compact layout) if it doesn't exist.
+        
+        When the schema version table already records this layout's version,
+        only that row is read. Otherwise the DDL runs in one transaction under
+        SCHEMA_LOCK_SQL and records the version, so processors starting
+        together apply it once.
+        """
         try:
-            with self.connection.cursor() as cursor:
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS motor_alerts (
-                        id SERIAL PRIMARY KEY,
-                        motor_id TEXT NOT NULL,
-                        sensor_type TEXT NOT NULL,
-                        timestamp TIMESTAMPTZ NOT NULL,
-                        value NUMERIC NOT NULL,
-                        alert_type TEXT NOT NULL,
-                        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
-                    );
-                """)
+            if self.applied_schema_version() == self.schema_version:
+                logger.info(f"Database schema is up to date (version {self.schema_version})")
+                return True
+            
+            with self._transaction() as cursor:
+                cursor.execute(SCHEMA_LOCK_SQL)
+                cursor.execute(SCHEMA_VERSION_TABLE_SQL)
+                cursor.execute(SCHEMA_VERSION_SQL)
+                row = cursor.fetchone()
+                if row and row[0] == self.schema_version:
+                    logger.info(f"Database schema version {self.schema_version} was applied by another processor")
+                    return True
                 
-                # Create indexes for better query performance
-                cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_motor_alerts_motor_id 
-                    ON motor_alerts(motor_id);
-                """)
+                alerts_kind = self._table_kind(partitions.ALERTS_TABLE)
+                if self.compact and alerts_kind in ('r', 'p'):
+                    logger.error("COMPACT_SCHEMA is set but motor_alerts is still a table; "
+                                 "run 'python manage.py migrate-compact' first")
+                    return False
+                if not self.compact and alerts_kind == 'v':
+                    logger.error("motor_alerts is a view over the compact layout; set COMPACT_SCHEMA=true")
+                    return False
                 
-                cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_motor_alerts_timestamp 
-                    ON motor_alerts(timestamp);
-                """)
+                for statement in self.schema_statements:
+                    cursor.execute(statement)
                 
-                cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_motor_alerts_created_at 
-                    ON motor_alerts(created_at);
-                """)
-                
-                logger.info("Database tables and indexes created successfully")
-                return True
+                if self._table_kind() == 'p':
+                    cursor.execute(partitions.default_partition_sql(self.alerts_table))
+                else:
+                    logger.warning("motor_alerts is not partitioned; "
+                                   "run 'python manage.py migrate-partitions' to migrate it")
+                cursor.execute(SAVE_SCHEMA_VERSION_SQL, (self.schema_version,))
+            
+            logger.info(f"Database tables and indexes created successfully (schema version {self.schema_version})")
+            return True
         except psycopg2.Error as e:
             logger.error(f"Failed to create tables: {e}")
             return False
     
+    def forget_schema_version(self, cursor):
+        """Make the next create_tables run its DDL again; for migrations that change tables"""
+        cursor.execute(SCHEMA_VERSION_TABLE_SQL)
+        cursor.execute("DELETE FROM motor_alert_schema_version;")
+    
+    def _execute(self, cursor, name, sql, params):
+        """Run `sql` as the server-side prepared statement `name` (PREPARED_STATEMENTS).
+        
+        The statement is prepared the first time the cursor's connection runs
+        it; later calls only send EXECUTE with the parameters, so the server
+        skips parsing and planning. `sql` keeps psycopg2's %s placeholders.
+        """
+        prepared = getattr(cursor.connection, 'prepared', None)
+        if not self.config.PREPARED_STATEMENTS or prepared is None:
+            cursor.execute(sql, params)
+            return
+        if name not in prepared:
+            cursor.execute(f"PREPARE {name} AS {numbered_params(sql)}")
+            prepared.add(name)
+        try:
+            cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))});", params)
+        except psycopg2.errors.InvalidSqlStatementName:
+            # Deallocated behind our back (DISCARD ALL); prepare again on the next call
+            prepared.clear()
+            raise
+    
     def insert_alert(self, motor_id, sensor_type, timestamp, value, alert_type):
         """Insert a new alert into the motor_alerts table"""
         try:
+            row = (motor_id, sensor_type, timestamp, value, alert_type)
+            if self.compact:
+                row = self._compact_rows([row])[0]
             with self.connection.cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO motor_alerts (motor_id, sensor_type, timestamp, value, alert_type)
-                    VALUES (%s, %s, %s, %s, %s)
-                    RETURNING id;
-                """, (motor_id, sensor_type, timestamp, value, alert_type))
+                self._execute(cursor, 'insert_alert', self.insert_sql.format(values=self.values_template), row)
                 
                 alert_id = cursor.fetchone()[0]
                 logger.info(f"Alert inserted with ID: {alert_id}")
@@ -88,15 +747,161 @@ class DatabaseManager:
         except psycopg2.Error as e:
             logger.error(f"Failed to insert alert: {e}")
             raise
+
+    def insert_alerts(self, alerts):
+        """Insert several alerts in one multi-row statement, returning their IDs in input order"""
+        if not alerts:
+            return []
+        try:
+            rows = self._alert_rows(alerts)
+            with self.connection.cursor() as cursor:
+                alert_ids = self._insert_alert_rows(cursor, rows)
+                logger.info(f"Inserted batch of {len(alert_ids)} alerts")
+                return alert_ids
+        except psycopg2.Error as e:
+            logger.error(f"Failed to insert alert batch: {e}")
+            raise
+
+    def _alert_rows(self, alerts):
+        """VALUES rows of alert dicts for self.insert_sql, in input order"""
+        rows = [
+            (alert['motor_id'], alert['sensor_type'], alert['timestamp'],
+             alert['value'], alert['alert_type'])
+            for alert in alerts
+        ]
+        return self._compact_rows(rows) if self.compact else rows
+
+    def _compact_rows(self, rows):
+        """Prefix the names in (motor_id, sensor_type, timestamp, value, alert_type) rows with keys.
+        
+        Rows become (motor_key, sensor_code, timestamp, value, alert_code,
+        motor_id, sensor_type, alert_type), as COMPACT_INSERT_ALERTS_SQL takes
+        them.
+        
+        Names not seen before are added to their dimension table and looked
+        up in autocommit mode, never inside a transaction: a rolled-back
+        dimension row must not leave a key behind in the cache.
+        """
+        for column, (table, _) in zip((0, 1, 4), DIMENSIONS):
+            missing = self.dimensions.missing(table, {row[column] for row in rows})
+            if missing:
+                names = sorted(missing)
+                with self.connection.cursor() as cursor:
+                    cursor.execute(INSERT_DIMENSION_SQL.format(table=table), (names,))
+                    cursor.execute(f"SELECT name, id FROM {table} WHERE name = ANY(%s);", (names,))
+                    self.dimensions.update(table, cursor.fetchall())
+        motors, sensor_types, alert_types = (self.dimensions.keys[table] for table, _ in DIMENSIONS)
+        return [
+            (motors[motor_id], sensor_types[sensor_type], timestamp, value, alert_types[alert_type],
+             motor_id, sensor_type, alert_type)
+            for motor_id, sensor_type, timestamp, value, alert_type in rows
+        ]
+
+    def _insert_alert_rows(self, cursor, rows):
+        rows = psycopg2.extras.execute_values(
+            cursor,
+            self.insert_sql.format(values="%s"),
+            rows,
+            template=self.values_template,
+            page_size=len(rows),
+            fetch=True
+        )
+        return [row[0] for row in rows]
+
+    def insert_spilled_alerts(self, alerts, spill_id, position):
+        """Insert replayed spill-log alerts and record `position` as replayed, atomically"""
+        try:
+            rows = self._alert_rows(alerts)
+            with self._transaction() as cursor:
+                alert_ids = self._insert_alert_rows(cursor, rows) if rows else []
+                cursor.execute(SAVE_SPILL_CHECKPOINT_SQL, (spill_id,) + tuple(position))
+            logger.info(f"Replayed {len(alert_ids)} spilled alerts")
+            return alert_ids
+        except psycopg2.Error as e:
+            logger.error(f"Failed to replay spilled alerts: {e}")
+            raise
+
+    def get_spill_checkpoint(self, spill_id):
+        """(segment, offset) a spill log has been replayed up to, or None"""
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute(SPILL_CHECKPOINT_SQL, (spill_id,))
+                row = cursor.fetchone()
+                return tuple(row) if row else None
+        except psycopg2.Error as e:
+            logger.error(f"Failed to read spill checkpoint: {e}")
+            raise
+
+    def save_episodes(self, episodes):
+        """Insert new episodes and update known ones in one transaction, returning their IDs"""
+        if not episodes:
+            return []
+        try:
+            episode_ids = []
+            with self._transaction() as cursor:
+                for episode in episodes:
+                    if episode.episode_id is None:
+                        cursor.execute(
+                            INSERT_EPISODE_SQL.format(values="(%s, %s, %s, %s, %s, %s, %s, %s, %s)"),
+                            episode.row()
+                        )
+                        episode_ids.append(cursor.fetchone()[0])
+                    else:
+                        cursor.execute(
+                            UPDATE_EPISODE_SQL.format(values="(%s, %s, %s, %s, %s, %s)", id="%s"),
+                            (episode.alert_id,) + episode.state() + (episode.episode_id,)
+                        )
+                        episode_ids.append(episode.episode_id)
+            return episode_ids
+        except psycopg2.Error as e:
+            logger.error(f"Failed to save alert episodes: {e}")
+            raise
+    
+    def save_reading_buckets(self, rows):
+        """Merge ReadingAggregator bucket rows into the reading tables in one transaction"""
+        if not rows:
+            return 0
+        try:
+            with self._transaction() as cursor:
+                for suffix, group in itertools.groupby(rows, key=lambda row: row[0]):
+                    psycopg2.extras.execute_values(
+                        cursor,
+                        SAVE_READING_BUCKETS_SQL.format(table=readings.reading_table(suffix)),
+                        [row[1:] for row in group],
+                        page_size=1000
+                    )
+            return len(rows)
+        except psycopg2.Error as e:
+            logger.error(f"Failed to save reading buckets: {e}")
+            raise
+    
+    def _motor_filter(self, many=False):
+        """WHERE condition on motor_alerts for one motor_id parameter (an array of them if `many`).
+        
+        In the compact layout the name is looked up first, so the planner can
+        use the motor_key indexes instead of joining every row to motors.
+        """
+        if not self.compact:
+            return "motor_id = ANY(%s)" if many else "motor_id = %s"
+        if many:
+            return "motor_key IN (SELECT id FROM motors WHERE name = ANY(%s))"
+        return "motor_key = (SELECT id FROM motors WHERE name = %s)"
+    
+    def _name_filter(self, column):
+        """WHERE condition on motor_alerts for one sensor_type or alert_type parameter, by key when compact"""
+        if not self.compact:
+            return f"{column} = %s"
+        table, key = COMPACT_NAME_KEYS[column]
+        return f"{key} = (SELECT id FROM {table} WHERE name = %s)"
     
     def get_recent_alerts(self, motor_id, limit=5):
         """Get recent alerts for a specific motor"""
         try:
             with self.connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
-                cursor.execute("""
+                self._execute(cursor, 'get_recent_alerts', f"""
                     SELECT id, motor_id, sensor_type, timestamp, value, alert_type, created_at
                     FROM motor_alerts
-                    WHERE motor_id = %s
+                    WHERE {self._motor_filter()}
                     ORDER BY timestamp DESC
                     LIMIT %s;
                 """, (motor_id, limit))
@@ -106,6 +911,133 @@ class DatabaseManager:
             logger.error(f"Failed to get recent alerts: {e}")
             return []
     
+    def get_recent_alerts_by_motor(self, limit=5):
+        """Get the most recent alerts of every motor in one query"""
+        try:
+            with self.connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.execute("""
+                    SELECT id, motor_id, sensor_type, timestamp, value, alert_type, created_at
+                    FROM (
+                        SELECT *,
+                            ROW_NUMBER() OVER (
+                                PARTITION BY motor_id ORDER BY timestamp DESC, id DESC
+                            ) AS motor_rank
+                        FROM motor_alerts
+                    ) ranked
+                    WHERE motor_rank <= %s
+                    ORDER BY motor_id, timestamp DESC;
+                """, (limit,))
+                
+                return cursor.fetchall()
+        except psycopg2.Error as e:
+            logger.error(f"Failed to get recent alerts by motor: {e}")
+            return []
+    
+    def get_alert_summary(self):
+        """alert_summary aggregates per (motor_id, sensor_type, alert_type), plus the highest alert ID"""
+        try:
+            with self.connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.execute(COMPACT_ALERT_SUMMARY_SQL if self.compact else ALERT_SUMMARY_SQL)
+                
+                return cursor.fetchall()
+        except psycopg2.Error as e:
+            logger.error(f"Failed to get alert summary: {e}")
+            return []
+    
+    def get_alert_totals(self):
+        """get_alert_summary rows from the daily rollup, without reading motor_alerts.
+        
+        last_id is the highest alert ID of all. None if the rollup has days
+        from before it kept value aggregates (rebuild them with
+        backfill_daily_counts).
+        """
+        try:
+            with self.connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.execute(ALERT_TOTALS_SQL.format(table=self.alerts_table))
+                rows = cursor.fetchall()
+        except psycopg2.Error as e:
+            logger.error(f"Failed to get alert totals: {e}")
+            return []
+        if not all(row.pop('complete') for row in rows):
+            return None
+        return rows
+    
+    def get_alerts_after(self, alert_id, limit, motor_id=None):
+        """Up to `limit` alerts (of `motor_id` if given) with an ID above `alert_id`, in ID order.
+        
+        Used to catch up after a snapshot and for the read API's since= polling.
+        IDs are taken in insert order but committed in any order, so an alert
+        with a lower ID than the last one returned can still show up later.
+        """
+        name, motor_filter, params = 'get_alerts_after', "", (alert_id, limit)
+        if motor_id is not None:
+            name, motor_filter = 'get_motor_alerts_after', f"AND {self._motor_filter()}"
+            params = (alert_id, motor_id, limit)
+        try:
+            with self.connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                self._execute(cursor, name, f"""
+                    SELECT id, motor_id, sensor_type, timestamp, value, alert_type, created_at
+                    FROM motor_alerts
+                    WHERE id > %s {motor_filter}
+                    ORDER BY id
+                    LIMIT %s;
+                """, params)
+                
+                return cursor.fetchall()
+        except psycopg2.Error as e:
+            logger.error(f"Failed to get alerts after ID {alert_id}: {e}")
+            return []
+    
+    def get_alert_history(self, limit, after=None, motor_id=None, sensor_type=None, alert_type=None,
+                          start=None, end=None):
+        """(alerts, next cursor) of one history page, newest first by (timestamp, id).
+        
+        `after` is the opaque cursor returned with the previous page, None for
+        the first one; the next cursor is None after the last page. A page
+        resumes right after the (timestamp, id) of the previous page's last
+        row, walking a covering index (history_index_statements), so
+        it costs the same at any depth, unlike OFFSET. The filters are optional:
+        one motor, sensor type and alert type, and start <= timestamp < end.
+        """
+        conditions, params = [], []
+        if motor_id is not None:
+            conditions.append(self._motor_filter())
+            params.append(motor_id)
+        for column, value in (('sensor_type', sensor_type), ('alert_type', alert_type)):
+            if value is not None:
+                conditions.append(self._name_filter(column))
+                params.append(value)
+        if start is not None:
+            conditions.append("timestamp >= %s")
+            params.append(start)
+        if end is not None:
+            conditions.append("timestamp < %s")
+            params.append(end)
+        if after is not None:
+            timestamp, alert_id = decode_history_cursor(after)
+            # The plain bound lets the planner skip the partitions after the cursor
+            conditions += ["timestamp <= %s", "(timestamp, id) < (%s, %s)"]
+            params += [timestamp, timestamp, alert_id]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        try:
+            with self.connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                # One row more than the page tells whether another page follows
+                cursor.execute(f"""
+                    SELECT id, motor_id, sensor_type, timestamp, value, alert_type, created_at
+                    FROM motor_alerts
+                    {where}
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT %s;
+                """, params + [limit + 1])
+                rows = cursor.fetchall()
+        except psycopg2.Error as e:
+            logger.error(f"Failed to get alert history: {e}")
+            return [], None
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, encode_history_cursor(rows[-1]['timestamp'], rows[-1]['id'])
+    
     def get_daily_alert_counts(self, start_date, end_date):
         """Get daily alert counts per motor between two dates"""
         try:
@@ -113,11 +1045,11 @@ class DatabaseManager:
                 cursor.execute("""
                     SELECT 
                         motor_id,
-                        DATE(timestamp) as alert_date,
-                        COUNT(*) as count
-                    FROM motor_alerts
-                    WHERE DATE(timestamp) BETWEEN %s AND %s
-                    GROUP BY motor_id, DATE(timestamp)
+                        day as alert_date,
+                        SUM(count)::bigint as count
+                    FROM motor_alert_daily_counts
+                    WHERE day BETWEEN %s AND %s
+                    GROUP BY motor_id, day
                     ORDER BY alert_date DESC, motor_id;
                 """, (start_date, end_date))
                 
@@ -126,6 +1058,416 @@ class DatabaseManager:
             logger.error(f"Failed to get daily alert counts: {e}")
             return []
     
+    def _export_query(self, motor_ids, start, end):
+        """SELECT for an export: alerts of `motor_ids` (all if None) with start <= timestamp < end"""
+        conditions = []
+        params = []
+        if motor_ids:
+            conditions.append(self._motor_filter(many=True))
+            params.append(list(motor_ids))
+        if start is not None:
+            conditions.append("timestamp >= %s")
+            params.append(start)
+        if end is not None:
+            conditions.append("timestamp < %s")
+            params.append(end)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return f"""
+            SELECT {', '.join(EXPORT_COLUMNS)}
+            FROM motor_alerts
+            {where}
+            ORDER BY timestamp, id
+        """, params
+    
+    def get_alert_time_range(self, motor_ids=None):
+        """(first, last) alert timestamp of `motor_ids` (all motors if None), or (None, None)"""
+        query = "SELECT MIN(timestamp), MAX(timestamp) FROM motor_alerts"
+        params = []
+        if motor_ids:
+            query += f" WHERE {self._motor_filter(many=True)}"
+            params.append(list(motor_ids))
+        with self.connection.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchone()
+    
+    def stream_alerts(self, motor_ids=None, start=None, end=None, batch_size=10000):
+        """Yield alerts as lists of up to `batch_size` row tuples (EXPORT_COLUMNS order).
+        
+        Rows come from a named (server-side) cursor, so only one batch is held
+        in memory however many rows match. Named cursors need a transaction,
+        so the connection leaves autocommit mode until the generator finishes;
+        use a connection that nothing else is using meanwhile.
+        """
+        query, params = self._export_query(motor_ids, start, end)
+        connection = self.connection
+        connection.autocommit = False
+        try:
+            with connection.cursor(name='motor_alerts_export') as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+        finally:
+            connection.rollback()
+            connection.autocommit = True
+    
+    def copy_alerts_csv(self, file, motor_ids=None, start=None, end=None, header=True):
+        """Write matching alerts to `file` as CSV with COPY ... TO STDOUT; returns the row count.
+        
+        The server formats the rows and psycopg2 writes them to `file` as they
+        arrive, so memory use does not depend on the number of rows.
+        """
+        query, params = self._export_query(motor_ids, start, end)
+        with self.connection.cursor() as cursor:
+            copy = f"COPY ({cursor.mogrify(query, params).decode()}) TO STDOUT WITH (FORMAT csv, HEADER {header})"
+            cursor.copy_expert(copy, file)
+            return cursor.rowcount
+    
+    def copy_alert_chunk(self, alerts, source, chunk_start, chunk_end, rejected):
+        """COPY alert dicts into the alerts table and record the backfill chunk, atomically.
+        
+        The daily rollup is not updated; rebuild it for the loaded days
+        afterwards with backfill_daily_counts.
+        """
+        try:
+            rows = self._alert_rows(alerts)
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(
+                (motor, sensor, timestamp.isoformat(), repr(value), alert)
+                for motor, sensor, timestamp, value, alert, *_ in rows
+            )
+            buffer.seek(0)
+            timestamps = [alert['timestamp'] for alert in alerts]
+            first, last = (min(timestamps), max(timestamps)) if timestamps else (None, None)
+            with self._transaction() as cursor:
+                cursor.copy_expert(COMPACT_COPY_ALERTS_SQL if self.compact else COPY_ALERTS_SQL, buffer)
+                cursor.execute(SAVE_BACKFILL_CHUNK_SQL,
+                               (source, chunk_start, chunk_end, len(alerts), rejected, first, last))
+        except psycopg2.Error as e:
+            logger.error(f"Failed to load backfill chunk at {chunk_start} of {source}: {e}")
+            raise
+    
+    def get_backfill_chunks(self, source):
+        """{chunk_start: chunk_end} of the chunks of `source` loaded so far"""
+        with self.connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT chunk_start, chunk_end FROM motor_alert_backfill_chunks WHERE source = %s;
+            """, (source,))
+            return dict(cursor.fetchall())
+    
+    def get_backfill_totals(self, source):
+        """(loaded, rejected, first_day, last_day) over every loaded chunk of `source`"""
+        with self.connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT COALESCE(SUM(loaded), 0)::bigint, COALESCE(SUM(rejected), 0)::bigint,
+                       MIN(first_day), MAX(last_day)
+                FROM motor_alert_backfill_chunks
+                WHERE source = %s;
+            """, (source,))
+            return cursor.fetchone()
+    
+    def reset_backfill(self, source):
+        """Forget the loaded chunks of `source`, so the next backfill loads it from the start"""
+        with self.connection.cursor() as cursor:
+            cursor.execute("DELETE FROM motor_alert_backfill_chunks WHERE source = %s;", (source,))
+    
+    def drop_secondary_indexes(self):
+        """Drop the indexes on the alerts table other than its primary key; returns their definitions.
+        
+        Pass the result to create_indexes to rebuild them. The definitions are
+        logged too, so they can be recreated by hand if the caller dies first.
+        """
+        with self._transaction() as cursor:
+            cursor.execute("""
+                SELECT index_class.relname, pg_get_indexdef(pg_index.indexrelid)
+                FROM pg_index
+                JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid
+                WHERE pg_index.indrelid = %s::regclass AND NOT pg_index.indisprimary;
+            """, (self.alerts_table,))
+            indexes = cursor.fetchall()
+            # Should the caller die before create_indexes, the next start rebuilds the processor's own
+            self.forget_schema_version(cursor)
+            for index_name, definition in indexes:
+                logger.info(f"Dropping index {index_name}: {definition}")
+                cursor.execute(psycopg2.sql.SQL("DROP INDEX {};").format(psycopg2.sql.Identifier(index_name)))
+        # ON ONLY would build only the parent's index, leaving it invalid
+        return [definition.replace(" ON ONLY ", " ON ", 1) for _, definition in indexes]
+    
+    def create_indexes(self, definitions):
+        """Run CREATE INDEX statements, e.g. those returned by drop_secondary_indexes"""
+        with self.connection.cursor() as cursor:
+            for definition in definitions:
+                started = time.monotonic()
+                cursor.execute(definition)
+                logger.info(f"Built index in {time.monotonic() - started:.1f}s: {definition}")
+    
+    def ensure_partitions(self, days, table=None):
+        """Create any missing partitions of the alerts table for `days` (UTC dates), if it is partitioned"""
+        table = table or self.alerts_table
+        interval = self.config.PARTITION_INTERVAL
+        starts = sorted({partitions.interval_start(day, interval) for day in days})
+        if not starts or self._table_kind(table) != 'p':
+            return
+        with self._transaction() as cursor:
+            cursor.execute(partitions.MAINTENANCE_LOCK_SQL)
+            cursor.execute(partitions.list_partitions_sql(table))
+            existing = [row[0] for row in cursor.fetchall()]
+            for start in partitions.missing_partitions(existing, starts, interval, table):
+                for statement in partitions.create_partition_statements(start, interval, table):
+                    cursor.execute(statement)
+    
+    def backfill_daily_counts(self, start_date=None, end_date=None):
+        """Rebuild motor_alert_daily_counts from motor_alerts, one day per transaction.
+        
+        Each day's raw rows are locked against concurrent inserts (SHARE lock)
+        only while that day is recounted, so the processor can keep running.
+        Returns the number of days rebuilt.
+        """
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT MIN(timestamp)::date, MAX(timestamp)::date FROM motor_alerts;
+                """)
+                first_day, last_day = cursor.fetchone()
+            if first_day is None:
+                return 0
+            
+            day = max(first_day, start_date) if start_date else first_day
+            last_day = min(last_day, end_date) if end_date else last_day
+            days = 0
+            while day <= last_day:
+                with self._transaction() as cursor:
+                    cursor.execute("LOCK TABLE motor_alerts IN SHARE MODE;")
+                    cursor.execute("""
+                        DELETE FROM motor_alert_daily_counts WHERE day = %s;
+                    """, (day,))
+                    cursor.execute("""
+                        INSERT INTO motor_alert_daily_counts
+                            (motor_id, day, sensor_type, alert_type, count,
+                             value_sum, value_min, value_max, first_at, last_at)
+                        SELECT motor_id, %s, sensor_type, alert_type, COUNT(*),
+                            SUM(value), MIN(value), MAX(value), MIN(timestamp), MAX(timestamp)
+                        FROM motor_alerts
+                        WHERE timestamp >= %s::date::timestamptz
+                          AND timestamp < (%s::date + 1)::timestamptz
+                        GROUP BY motor_id, sensor_type, alert_type;
+                    """, (day, day, day))
+                days += 1
+                day += timedelta(days=1)
+            
+            logger.info(f"Backfilled daily alert counts for {days} days")
+            return days
+        except psycopg2.Error as e:
+            logger.error(f"Failed to backfill daily alert counts: {e}")
+            raise
+    
+    def maintain_partitions(self):
+        """Create upcoming motor_alerts partitions and expire old ones per the retention policy"""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute(partitions.MAINTENANCE_LOCK_SQL)
+                if self._table_kind() != 'p':
+                    logger.warning(f"Skipping partition maintenance: {self.alerts_table} is not partitioned")
+                    return False
+                cursor.execute(partitions.list_partitions_sql(self.alerts_table))
+                plan = partitions.plan_for_config([row[0] for row in cursor.fetchall()], self.config)
+                for statement in plan.statements:
+                    cursor.execute(statement)
+            
+            if plan.created or plan.expired:
+                logger.info(f"Partition maintenance: created {plan.created}, expired {plan.expired} "
+                            f"({self.config.PARTITION_RETENTION_ACTION})")
+            return True
+        except psycopg2.Error as e:
+            logger.error(f"Failed to maintain partitions: {e}")
+            return False
+    
+    def migrate_to_partitions(self):
+        """Move an unpartitioned motor_alerts table into the partitioned layout.
+        
+        The plain table is renamed to motor_alerts_legacy and a partitioned
+        motor_alerts takes its place in one short transaction, so a running
+        processor carries on inserting into the new table. Legacy rows are then
+        moved one partition range per transaction. If interrupted, running it
+        again resumes with the rows still in motor_alerts_legacy.
+        """
+        interval = self.config.PARTITION_INTERVAL
+        try:
+            if self._table_kind() == 'r':
+                with self._transaction() as cursor:
+                    cursor.execute("LOCK TABLE motor_alerts IN ACCESS EXCLUSIVE MODE;")
+                    # Free the index names for the partitioned table's indexes
+                    cursor.execute("""
+                        SELECT index_class.relname
+                        FROM pg_index
+                        JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid
+                        WHERE pg_index.indrelid = 'motor_alerts'::regclass;
+                    """)
+                    for (index_name,) in cursor.fetchall():
+                        cursor.execute(psycopg2.sql.SQL("ALTER INDEX {} RENAME TO {};").format(
+                            psycopg2.sql.Identifier(index_name),
+                            psycopg2.sql.Identifier(f"{index_name}_legacy")
+                        ))
+                    cursor.execute(f"ALTER TABLE motor_alerts RENAME TO {partitions.LEGACY_TABLE};")
+                    self.forget_schema_version(cursor)
+                    
+                    for statement in SCHEMA_STATEMENTS + (partitions.DEFAULT_PARTITION_SQL,) + VIEW_STATEMENTS:
+                        cursor.execute(statement)
+                    # New IDs continue after the legacy ones
+                    cursor.execute(f"""
+                        SELECT setval(pg_get_serial_sequence('motor_alerts', 'id'),
+                                      (SELECT COALESCE(MAX(id), 0) + 1 FROM {partitions.LEGACY_TABLE}),
+                                      false);
+                    """)
+                logger.info(f"Renamed motor_alerts to {partitions.LEGACY_TABLE} "
+                            f"and created the partitioned table")
+            
+            with self.connection.cursor() as cursor:
+                cursor.execute(f"SELECT to_regclass('{partitions.LEGACY_TABLE}') IS NOT NULL;")
+                if not cursor.fetchone()[0]:
+                    logger.info("motor_alerts is already partitioned")
+                    return self.maintain_partitions()
+                # Only ranges that hold alerts get a partition; gaps fall to the default partition
+                cursor.execute(f"""
+                    SELECT DISTINCT (timestamp AT TIME ZONE 'UTC')::date FROM {partitions.LEGACY_TABLE};
+                """)
+                starts = sorted({partitions.interval_start(row[0], interval) for row in cursor.fetchall()})
+            
+            moved = 0
+            if starts:
+                self.ensure_partitions(starts)
+                
+                for start in starts:
+                    with self._transaction() as cursor:
+                        cursor.execute(f"""
+                            WITH legacy AS (
+                                DELETE FROM {partitions.LEGACY_TABLE}
+                                WHERE timestamp >= %s::timestamp AT TIME ZONE 'UTC'
+                                  AND timestamp < %s::timestamp AT TIME ZONE 'UTC'
+                                RETURNING id, motor_id, sensor_type, timestamp, value, alert_type, created_at
+                            )
+                            INSERT INTO motor_alerts
+                                (id, motor_id, sensor_type, timestamp, value, alert_type, created_at)
+                            SELECT * FROM legacy;
+                        """, (start, partitions.next_start(start, interval)))
+                        moved += cursor.rowcount
+            
+            with self._transaction() as cursor:
+                # Normally empty by now: every date range has been moved
+                cursor.execute(f"""
+                    WITH legacy AS (
+                        DELETE FROM {partitions.LEGACY_TABLE}
+                        RETURNING id, motor_id, sensor_type, timestamp, value, alert_type, created_at
+                    )
+                    INSERT INTO motor_alerts
+                        (id, motor_id, sensor_type, timestamp, value, alert_type, created_at)
+                    SELECT * FROM legacy;
+                """)
+                moved += cursor.rowcount
+                cursor.execute(f"DROP TABLE {partitions.LEGACY_TABLE};")
+            
+            logger.info(f"Moved {moved} alerts into partitioned motor_alerts")
+            return self.maintain_partitions()
+        except psycopg2.Error as e:
+            logger.error(f"Failed to migrate motor_alerts to partitions: {e}")
+            return False
+    
+    def relation_size(self, table):
+        """Bytes used by `table` with its indexes and TOAST, over all of its partitions"""
+        with self.connection.cursor() as cursor:
+            cursor.execute(RELATION_SIZE_SQL, (table,))
+            return cursor.fetchone()[0]
+    
+    def compact_size(self):
+        """Bytes used by the compact layout: motor_alert_facts plus the dimension tables"""
+        return sum(self.relation_size(table) for table in (partitions.COMPACT_TABLE,)
+                   + tuple(table for table, _ in DIMENSIONS))
+    
+    def migrate_to_compact(self):
+        """Move motor_alerts into the compact layout (COMPACT_SCHEMA).
+        
+        One short transaction renames motor_alerts to motor_alerts_uncompacted
+        and creates the dimension tables, motor_alert_facts and the
+        motor_alerts view in its place. From then on, processors running with
+        COMPACT_SCHEMA=true write to the new layout. The old rows are then
+        moved COMPACT_MIGRATE_BATCH IDs per transaction. If interrupted,
+        running it again resumes with the rows still in the old table.
+        Returns the sizes before and after in bytes, or None on failure.
+        """
+        legacy = COMPACT_LEGACY_TABLE
+        try:
+            size_before = None
+            if self._table_kind(partitions.ALERTS_TABLE) in ('r', 'p'):
+                size_before = self.relation_size(partitions.ALERTS_TABLE)
+                with self._transaction() as cursor:
+                    cursor.execute("LOCK TABLE motor_alerts IN ACCESS EXCLUSIVE MODE;")
+                    cursor.execute(f"ALTER TABLE motor_alerts RENAME TO {legacy};")
+                    self.forget_schema_version(cursor)
+                    # The dashboard views followed the rename; rebuild them on the new view
+                    cursor.execute("DROP VIEW IF EXISTS recent_alerts, alert_summary;")
+                    for statement in COMPACT_TABLE_STATEMENTS + VIEW_STATEMENTS:
+                        cursor.execute(statement)
+                    cursor.execute(partitions.default_partition_sql(partitions.COMPACT_TABLE))
+                    # New IDs continue after the old ones
+                    cursor.execute(f"""
+                        SELECT setval(pg_get_serial_sequence('{partitions.COMPACT_TABLE}', 'id'),
+                                      (SELECT COALESCE(MAX(id), 0) + 1 FROM {legacy}),
+                                      false);
+                    """)
+                logger.info(f"Renamed motor_alerts to {legacy} and created the compact layout")
+            
+            with self.connection.cursor() as cursor:
+                cursor.execute(f"SELECT to_regclass('{legacy}') IS NOT NULL;")
+                if not cursor.fetchone()[0]:
+                    logger.info("motor_alerts already uses the compact layout")
+                    return size_before, self.compact_size()
+                for table, column in DIMENSIONS:
+                    cursor.execute(f"""
+                        INSERT INTO {table} (name)
+                        SELECT DISTINCT {column} FROM {legacy} ORDER BY 1
+                        ON CONFLICT (name) DO NOTHING;
+                    """)
+                cursor.execute(f"SELECT DISTINCT (timestamp AT TIME ZONE 'UTC')::date FROM {legacy};")
+                days = [row[0] for row in cursor.fetchall()]
+            self.ensure_partitions(days, partitions.COMPACT_TABLE)
+            
+            moved = 0
+            while True:
+                with self.connection.cursor() as cursor:
+                    cursor.execute(f"SELECT MIN(id) FROM {legacy};")
+                    first_id = cursor.fetchone()[0]
+                if first_id is None:
+                    break
+                with self._transaction() as cursor:
+                    cursor.execute(f"""
+                        WITH legacy AS (
+                            DELETE FROM {legacy}
+                            WHERE id >= %s AND id < %s
+                            RETURNING id, motor_id, sensor_type, timestamp, value, alert_type, created_at
+                        )
+                        INSERT INTO motor_alert_facts
+                            (timestamp, value, created_at, id, motor_key, sensor_code, alert_code)
+                        SELECT legacy.timestamp, legacy.value, legacy.created_at, legacy.id,
+                               motors.id, sensor_types.id, alert_types.id
+                        FROM legacy
+                        JOIN motors ON motors.name = legacy.motor_id
+                        JOIN sensor_types ON sensor_types.name = legacy.sensor_type
+                        JOIN alert_types ON alert_types.name = legacy.alert_type;
+                    """, (first_id, first_id + COMPACT_MIGRATE_BATCH))
+                    moved += cursor.rowcount
+            
+            with self.connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE {legacy};")
+            size_after = self.compact_size()
+            logger.info(f"Moved {moved} alerts into the compact layout")
+            return size_before, size_after
+        except psycopg2.Error as e:
+            logger.error(f"Failed to migrate motor_alerts to the compact layout: {e}")
+            return None
+    
     def health_check(self):
         """Check database connection health"""
         try:
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Inspect and re-drive the dead-letter queue (DEAD_LETTER_QUEUE, see retry.py).
+
+    python dlq.py list [--limit N] [--reason TEXT] [--json]
+    python dlq.py redrive [--limit N] [--reason TEXT] [--queue QUEUE]
+
+`list` shows the dead-lettered messages and leaves them in the queue.
+`redrive` moves them back to the queue they failed on, with their retry
+headers cleared, so they get a fresh set of RETRY_ATTEMPTS retries.
+--reason only selects messages whose failure reason contains TEXT.
+
+Messages are taken with basic.get and held until the command is done;
+those not moved are returned to the dead-letter queue in their order.
+Only the messages in the queue when the command starts are looked at.
+"""
+
+import argparse
+import json
+import logging
+import sys
+
+import pika
+from pika.exceptions import UnroutableError
+
+import retry
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Body characters shown per message by `list`
+BODY_PREVIEW_CHARS = 200
+
+# Headers removed when a message is re-driven
+RETRY_HEADERS = (retry.ATTEMPT_HEADER, retry.REASON_HEADER, retry.QUEUE_HEADER, retry.FAILED_AT_HEADER, 'x-death')
+
+def open_channel(config: Config):
+    """(connection, channel) with publisher confirms, the dead-letter queue declared"""
+    connection = pika.BlockingConnection(pika.URLParameters(config.RABBITMQ_URL))
+    channel = connection.channel()
+    channel.confirm_delivery()
+    channel.queue_declare(queue=config.DEAD_LETTER_QUEUE, durable=True)
+    return connection, channel
+
+def dead_letters(channel, config: Config, limit=None, reason=None):
+    """Yield (delivery_tag, properties, body) of dead-lettered messages, unacked.
+
+    Messages whose failure reason does not contain `reason` are skipped but
+    stay unacked, like the yielded ones, until the caller settles them.
+    """
+    depth = channel.queue_declare(queue=config.DEAD_LETTER_QUEUE, passive=True).method.message_count
+    found = 0
+    for _ in range(depth):
+        if limit is not None and found >= limit:
+            return
+        method, properties, body = channel.basic_get(queue=config.DEAD_LETTER_QUEUE, auto_ack=False)
+        if method is None:
+            return
+        headers = properties.headers or {}
+        if reason is not None and reason not in str(headers.get(retry.REASON_HEADER, '')):
+            continue
+        found += 1
+        yield method.delivery_tag, properties, body
+
+def describe(properties, body):
+    """Summary of a dead-lettered message for `list`"""
+    headers = properties.headers or {}
+    return {
+        'attempts': retry.attempts(headers),
+        'reason': headers.get(retry.REASON_HEADER),
+        'queue': headers.get(retry.QUEUE_HEADER),
+        'failedAt': headers.get(retry.FAILED_AT_HEADER),
+        'body': body.decode('utf-8', errors='replace')[:BODY_PREVIEW_CHARS],
+    }
+
+def list_dead_letters(config: Config, limit=None, reason=None, as_json=False, out=sys.stdout):
+    """Print dead-lettered messages, leaving them in the queue; returns how many were shown"""
+    connection, channel = open_channel(config)
+    try:
+        shown = 0
+        for _, properties, body in dead_letters(channel, config, limit, reason):
+            summary = describe(properties, body)
+            if as_json:
+                out.write(json.dumps(summary) + '\n')
+            else:
+                out.write(f"{summary['failedAt']}  {summary['queue']}  retries={summary['attempts']}  "
+                          f"{summary['reason']}\n    {summary['body']}\n")
+            shown += 1
+        # Put back everything taken, in order
+        channel.basic_nack(delivery_tag=0, multiple=True, requeue=True)
+        logger.info(f"Listed {shown} messages from {config.DEAD_LETTER_QUEUE}")
+        return shown
+    finally:
+        connection.close()
+
+def redrive_dead_letters(config: Config, limit=None, reason=None, queue=None):
+    """Move dead-lettered messages back to their queue (or `queue`); returns (moved, failed)"""
+    connection, channel = open_channel(config)
+    try:
+        moved = failed = 0
+        kept = []
+        for delivery_tag, properties, body in dead_letters(channel, config, limit, reason):
+            headers = {key: value for key, value in (properties.headers or {}).items() if key not in RETRY_HEADERS}
+            target = queue or (properties.headers or {}).get(retry.QUEUE_HEADER) or config.MOTOR_ALERTS_QUEUE
+            try:
+                # mandatory: a queue that no longer exists (e.g. a removed shard) fails the publish
+                channel.basic_publish(
+                    exchange='',
+                    routing_key=target,
+                    body=body,
+                    properties=pika.BasicProperties(
+                        content_type=properties.content_type,
+                        headers=headers,
+                        delivery_mode=2
+                    ),
+                    mandatory=True
+                )
+            except UnroutableError:
+                logger.error(f"Queue {target} does not exist; leaving the message in "
+                             f"{config.DEAD_LETTER_QUEUE} (use --queue)")
+                kept.append(delivery_tag)
+                failed += 1
+                continue
+            channel.basic_ack(delivery_tag=delivery_tag)
+            moved += 1
+        # Skipped and unroutable messages go back to the dead-letter queue
+        channel.basic_nack(delivery_tag=0, multiple=True, requeue=True)
+        logger.info(f"Re-drove {moved} messages from {config.DEAD_LETTER_QUEUE}"
+                    + (f", {failed} left for an unknown queue" if failed else ""))
+        return moved, failed
+    finally:
+        connection.close()
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    parser = argparse.ArgumentParser(description="Inspect and re-drive the alert dead-letter queue")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    lister = commands.add_parser('list', help="Show dead-lettered messages, leaving them in the queue")
+    lister.add_argument('--json', action='store_true', help="one JSON object per message")
+
+    redriver = commands.add_parser('redrive', help="Move dead-lettered messages back for processing")
+    redriver.add_argument('--queue', help="queue to move them to (default: the queue each one failed on)")
+
+    for command in (lister, redriver):
+        command.add_argument('--limit', type=int, help="most messages to take (default: all)")
+        command.add_argument('--reason', help="only messages whose failure reason contains this text")
+    args = parser.parse_args()
+
+    config = Config()
+    if not config.DEAD_LETTER_QUEUE:
+        logger.error("DEAD_LETTER_QUEUE is not set")
+        sys.exit(1)
+    try:
+        if args.command == 'list':
+            list_dead_letters(config, args.limit, args.reason, args.json)
+            sys.exit(0)
+        _, failed = redrive_dead_letters(config, args.limit, args.reason, args.queue)
+        sys.exit(1 if failed else 0)
+    except Exception as e:
+        logger.error(f"{args.command} failed: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Streaming export of alert history (python manage.py export).
+
+Alerts for a set of motors and a time range are written to CSV, JSONL or
+Parquet as they are read, so memory use stays flat however many rows are
+exported:
+
+- csv: the server formats the rows with COPY ... TO STDOUT
+- jsonl, parquet: rows are fetched EXPORT_BATCH_SIZE at a time from a
+  server-side cursor (DatabaseManager.stream_alerts) and written per batch,
+  one Parquet row group per batch
+
+With parallel > 1 the time range is split into equal slices, each exported
+over its own connection to its own part file (alerts.part-000.csv, ...).
+Parts are in time order and only the first CSV part has a header, so
+concatenating them gives the same file as a serial export.
+
+Parquet output needs the optional pyarrow package.
+"""
+
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from config import Config
+from database import EXPORT_COLUMNS, DatabaseManager
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional dependency
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+VALUE_COLUMN = EXPORT_COLUMNS.index('value')
+
+def time_slices(start, end, parts):
+    """Split [start, end) into `parts` consecutive ranges of equal length"""
+    step = (end - start) / parts
+    bounds = [start + step * i for i in range(parts)] + [end]
+    return list(zip(bounds, bounds[1:]))
+
+def part_path(path, index):
+    """alerts.csv -> alerts.part-003.csv"""
+    stem, extension = os.path.splitext(path)
+    return f"{stem}.part-{index:03d}{extension}"
+
+def _isoformat(value):
+    return value.astimezone(timezone.utc).isoformat() if value is not None else None
+
+class JsonlWriter:
+    def __init__(self, file):
+        self.file = file
+
+    def write(self, rows):
+        lines = []
+        for alert_id, motor_id, sensor_type, timestamp, value, alert_type, created_at in rows:
+            lines.append(json.dumps({
+                'id': alert_id,
+                'motor_id': motor_id,
+                'sensor_type': sensor_type,
+                'timestamp': _isoformat(timestamp),
+                'value': float(value),
+                'alert_type': alert_type,
+                'created_at': _isoformat(created_at),
+            }))
+        self.file.write('\n'.join(lines) + '\n')
+
+    def close(self):
+        pass
+
+class ParquetWriter:
+    def __init__(self, file):
+        self.schema = pyarrow.schema([
+            ('id', pyarrow.int64()),
+            ('motor_id', pyarrow.string()),
+            ('sensor_type', pyarrow.string()),
+            ('timestamp', pyarrow.timestamp('us', tz='UTC')),
+            ('value', pyarrow.float64()),
+            ('alert_type', pyarrow.string()),
+            ('created_at', pyarrow.timestamp('us', tz='UTC')),
+        ])
+        self.writer = pyarrow.parquet.ParquetWriter(file, self.schema)
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        # NUMERIC arrives as Decimal
+        columns[VALUE_COLUMN] = [float(value) for value in columns[VALUE_COLUMN]]
+        arrays = [pyarrow.array(column, type=field.type) for column, field in zip(columns, self.schema)]
+        self.writer.write_batch(pyarrow.record_batch(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+def _open_output(path, fmt):
+    if path == '-':
+        return sys.stdout.buffer if fmt == 'parquet' else sys.stdout
+    if fmt == 'parquet':
+        return open(path, 'wb')
+    return open(path, 'w', newline='', encoding='utf-8')
+
+def export_part(config, path, fmt, motor_ids, start, end, batch_size, header=True):
+    """Export one time range to `path` ('-' for stdout) over its own connection; returns the row count"""
+    db_manager = DatabaseManager(config)
+    if not db_manager.connect():
+        raise RuntimeError("Failed to connect to database")
+    output = _open_output(path, fmt)
+    try:
+        if fmt == 'csv':
+            return db_manager.copy_alerts_csv(output, motor_ids, start, end, header=header)
+
+        writer = ParquetWriter(output) if fmt == 'parquet' else JsonlWriter(output)
+        count = 0
+        try:
+            for rows in db_manager.stream_alerts(motor_ids, start, end, batch_size):
+                writer.write(rows)
+                count += len(rows)
+        finally:
+            writer.close()
+        return count
+    finally:
+        if output not in (sys.stdout, sys.stdout.buffer):
+            output.close()
+        else:
+            output.flush()
+        db_manager.disconnect()
+
+def export_alerts(config: Config, path, fmt='csv', motor_ids=None, start=None, end=None,
+                  parallel=1, batch_size=None):
+    """Export alerts of `motor_ids` (all if None) with start <= timestamp < end.
+
+    Writes `path`, or with parallel > 1 the part files part_path(path, i).
+    Returns the number of rows exported.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt == 'parquet' and pyarrow is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    batch_size = batch_size or config.EXPORT_BATCH_SIZE
+
+    if parallel <= 1:
+        count = export_part(config, path, fmt, motor_ids, start, end, batch_size)
+        logger.info(f"Exported {count} alerts to {path}")
+        return count
+
+    if path == '-':
+        raise ValueError("A parallel export writes part files and needs an output path")
+    if start is None or end is None:
+        # Slices need both bounds; take the missing ones from the data
+        db_manager = DatabaseManager(config)
+        if not db_manager.connect():
+            raise RuntimeError("Failed to connect to database")
+        try:
+            first, last = db_manager.get_alert_time_range(motor_ids)
+        finally:
+            db_manager.disconnect()
+        if first is None:
+            # Nothing to export; still write the (empty) parts
+            first = last = start or end or datetime.now(timezone.utc)
+        start = start or first
+        # The end is exclusive, so step past the newest alert
+        end = end or (last + timedelta(microseconds=1))
+
+    slices = time_slices(start, end, parallel)
+    with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix='export') as executor:
+        futures = [
+            executor.submit(export_part, config, part_path(path, index), fmt, motor_ids,
+                            slice_start, slice_end, batch_size, header=(index == 0))
+            for index, (slice_start, slice_end) in enumerate(slices)
+        ]
+        count = sum(future.result() for future in futures)
+    logger.info(f"Exported {count} alerts to {parallel} parts of {path}")
+    return count
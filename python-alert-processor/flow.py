@@ -0,0 +1,127 @@
+"""
+Adaptive prefetch window and backpressure for the alert consumer (FLOW_CONTROL).
+
+AlertProcessor reports every delivery it receives and how long every
+insert call took. Every FLOW_INTERVAL_MS it asks FlowController for the
+next prefetch window, given the unsettled deliveries and the alerts queue
+depth. The window follows AIMD, like TCP's congestion window:
+
+- congested: the mean insert latency of the interval is above
+  FLOW_TARGET_LATENCY_MS, or the window was full and no insert finished.
+  The window is cut by DECREASE_FACTOR
+- messages wait in the queue, at least BUSY_SHARE of a window was delivered
+  during the interval and inserts keep up: the window grows by
+  INCREASE_STEP
+- otherwise it stays as it is
+
+Growth counts deliveries rather than the unsettled ones at adjustment time.
+The consumer settles each alert inside its own callback when it does not
+batch or use workers, so between callbacks nothing is ever unsettled, even
+while it drains a full window.
+
+A congested interval with the window already at FLOW_PREFETCH_MIN pauses
+consumption for FLOW_PAUSE_MS. The backlog then waits in RabbitMQ instead
+of in the processor's memory. Consumption resumes at the smallest window
+and grows again from there.
+"""
+
+import threading
+import time
+
+# Window growth per uncongested interval with a backlog, in messages
+INCREASE_STEP = 5
+# Window shrink factor per congested interval
+DECREASE_FACTOR = 0.5
+# Share of a window that must be delivered in an interval before it grows
+BUSY_SHARE = 0.5
+
+class FlowController:
+    """AIMD prefetch window between `min_prefetch` and `max_prefetch`.
+
+    observe() may be called from any thread (the insert workers);
+    delivered() and adjust() only from the consumer thread.
+    """
+
+    def __init__(self, min_prefetch, max_prefetch, target_s, pause_s, initial=None, clock=time.monotonic):
+        self.min_prefetch = max(1, min_prefetch)
+        self.max_prefetch = max(self.min_prefetch, max_prefetch)
+        self.target_s = target_s
+        self.pause_s = pause_s
+        self.clock = clock
+        self.prefetch = self._clamp(initial if initial is not None else self.min_prefetch)
+        # Monotonic time a pause ends, None while consuming
+        self.paused_until = None
+        # Mean insert latency of the last interval that had inserts
+        self.latency_s = None
+        self.increases = 0
+        self.decreases = 0
+        self.pauses = 0
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._seconds = 0.0
+        # Deliveries since the last adjust()
+        self._delivered = 0
+
+    def _clamp(self, prefetch):
+        return min(self.max_prefetch, max(self.min_prefetch, int(prefetch)))
+
+    @property
+    def paused(self):
+        return self.paused_until is not None
+
+    def observe(self, seconds):
+        """Record the duration of one insert call"""
+        with self._lock:
+            self._calls += 1
+            self._seconds += seconds
+
+    def delivered(self, count=1):
+        """Record deliveries received from the broker"""
+        self._delivered += count
+
+    def adjust(self, in_flight, queue_depth):
+        """Move the window for the interval since the last call; returns True if it or the pause changed"""
+        with self._lock:
+            calls, seconds = self._calls, self._seconds
+            self._calls, self._seconds = 0, 0.0
+        delivered, self._delivered = self._delivered, 0
+        if calls:
+            self.latency_s = seconds / calls
+
+        if self.paused_until is not None:
+            if self.clock() < self.paused_until:
+                return False
+            self.paused_until = None
+            self.prefetch = self.min_prefetch
+            return True
+
+        if calls:
+            congested = self.latency_s > self.target_s
+        else:
+            # Nothing finished although the window was full: the store is stalled
+            congested = in_flight >= self.prefetch
+        if congested:
+            if self.prefetch > self.min_prefetch:
+                self.prefetch = self._clamp(self.prefetch * DECREASE_FACTOR)
+                self.decreases += 1
+            else:
+                self.paused_until = self.clock() + self.pause_s
+                self.pauses += 1
+            return True
+
+        if calls and queue_depth > 0 and delivered >= self.prefetch * BUSY_SHARE \
+                and self.prefetch < self.max_prefetch:
+            self.prefetch = self._clamp(self.prefetch + INCREASE_STEP)
+            self.increases += 1
+            return True
+        return False
+
+    def stats(self):
+        return {
+            'prefetch': self.prefetch,
+            'paused': self.paused,
+            'latency_ms': None if self.latency_s is None else round(self.latency_s * 1000, 3),
+            'increases': self.increases,
+            'decreases': self.decreases,
+            'pauses': self.pauses,
+        }
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Maintenance commands for the motor alert database and its RabbitMQ queues
+
+    python manage.py backfill-daily-counts [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+    python manage.py migrate-partitions
+    python manage.py migrate-compact
+    python manage.py maintain-partitions
+    python manage.py export --output FILE [--format csv|jsonl|parquet] [--motor ID ...]
+                            [--start TIMESTAMP] [--end TIMESTAMP] [--parallel N]
+    python manage.py backfill-alerts FILE [--format jsonl|csv] [--workers N] [--defer-indexes]
+                                     [--chunk-bytes N] [--source NAME] [--restart]
+    python manage.py retire-shards
+"""
+
+import argparse
+import logging
+import sys
+from datetime import date, timezone
+
+import pika
+
+import backfill
+import codec
+import export
+from backends import retire_sharding
+from config import Config
+from database import DatabaseManager
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def backfill_daily_counts(db_manager, args):
+    """Rebuild motor_alert_daily_counts for existing alerts"""
+    db_manager.backfill_daily_counts(args.start, args.end)
+    return True
+
+def migrate_partitions(db_manager, args):
+    """Move an unpartitioned motor_alerts table into day/month partitions"""
+    return db_manager.migrate_to_partitions()
+
+def migrate_compact(db_manager, args):
+    """Move motor_alerts into the compact layout (dimension tables, fixed-width values)"""
+    sizes = db_manager.migrate_to_compact()
+    if sizes is None:
+        return False
+    size_before, size_after = sizes
+    if size_before:
+        logger.info(f"motor_alerts with indexes: {size_before / 2**20:.1f} MiB before, "
+                    f"{size_after / 2**20:.1f} MiB after ({size_after / size_before:.0%})")
+    return True
+
+def maintain_partitions(db_manager, args):
+    """Create upcoming partitions and apply the retention policy (for cron)"""
+    return db_manager.maintain_partitions()
+
+def export_alerts(db_manager, args):
+    """Stream alerts for a motor set and time range to a file"""
+    export.export_alerts(
+        db_manager.config, args.output, args.format, args.motor, args.start, args.end,
+        parallel=args.parallel, batch_size=args.batch_size
+    )
+    return True
+
+def backfill_alerts(db_manager, args):
+    """Bulk load alerts from a JSONL or CSV dump with parallel COPY"""
+    return backfill.backfill_alerts(
+        db_manager.config, db_manager, args.input, args.format, workers=args.workers,
+        chunk_bytes=args.chunk_bytes, defer_indexes=args.defer_indexes,
+        source=args.source, restart=args.restart
+    )
+
+def retire_shards(config, args):
+    """Detach the consistent-hash exchange and shard queues of a stopped --workers run"""
+    connection = pika.BlockingConnection(pika.URLParameters(config.RABBITMQ_URL))
+    try:
+        return retire_sharding(connection, config)
+    finally:
+        connection.close()
+
+def _timestamp(value):
+    # Naive timestamps are UTC, as everywhere else in the pipeline
+    timestamp = codec.parse_timestamp(value)
+    return timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=timezone.utc)
+
+def main():
+    parser = argparse.ArgumentParser(description="Motor alert database maintenance")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    rollup = commands.add_parser(
+        'backfill-daily-counts',
+        help="Rebuild the daily alert-count rollup from motor_alerts"
+    )
+    rollup.add_argument('--start', type=date.fromisoformat,
+                          help="first day to rebuild (default: oldest alert)")
+    rollup.add_argument('--end', type=date.fromisoformat,
+                          help="last day to rebuild (default: newest alert)")
+    rollup.set_defaults(handler=backfill_daily_counts)
+
+    commands.add_parser(
+        'migrate-partitions',
+        help="Migrate an unpartitioned motor_alerts table to the partitioned layout"
+    ).set_defaults(handler=migrate_partitions)
+
+    commands.add_parser(
+        'migrate-compact',
+        help="Migrate motor_alerts to the compact layout used with COMPACT_SCHEMA=true"
+    ).set_defaults(handler=migrate_compact, create_tables=False)
+
+    commands.add_parser(
+        'maintain-partitions',
+        help="Create upcoming partitions and expire old ones (PARTITION_* settings)"
+    ).set_defaults(handler=maintain_partitions)
+
+    exporter = commands.add_parser(
+        'export',
+        help="Stream alert history to CSV, JSONL or Parquet"
+    )
+    exporter.add_argument('--output', required=True,
+                          help="file to write, '-' for stdout; with --parallel the name of the part files")
+    exporter.add_argument('--format', choices=export.FORMATS, default='csv',
+                          help="output format (default: csv; parquet needs pyarrow)")
+    exporter.add_argument('--motor', action='append',
+                          help="motor ID to export, repeatable (default: all motors)")
+    exporter.add_argument('--start', type=_timestamp,
+                          help="first reading timestamp, inclusive (ISO 8601, default UTC)")
+    exporter.add_argument('--end', type=_timestamp,
+                          help="last reading timestamp, exclusive (ISO 8601, default UTC)")
+    exporter.add_argument('--parallel', type=int, default=1,
+                          help="export N time slices concurrently into N part files (default: 1)")
+    exporter.add_argument('--batch-size', type=int,
+                          help="rows per server-side cursor fetch (default: EXPORT_BATCH_SIZE)")
+    exporter.set_defaults(handler=export_alerts)
+
+    loader = commands.add_parser(
+        'backfill-alerts',
+        help="Bulk load alerts from a JSONL or CSV file of queue messages"
+    )
+    loader.add_argument('input', help="JSONL file of alert messages, or CSV with the message fields as header")
+    loader.add_argument('--format', choices=backfill.FORMATS,
+                        help="input format (default: from the file extension)")
+    loader.add_argument('--workers', type=int,
+                        help="COPY worker processes (default: BACKFILL_WORKERS)")
+    loader.add_argument('--chunk-bytes', type=int,
+                        help="input bytes per COPY (default: BACKFILL_CHUNK_BYTES); keep it when resuming")
+    loader.add_argument('--defer-indexes', action='store_true',
+                        help="drop the secondary indexes of motor_alerts during the load and rebuild them after")
+    loader.add_argument('--source', help="name recorded for resuming (default: the absolute input path)")
+    loader.add_argument('--restart', action='store_true',
+                        help="forget chunks loaded by earlier runs and load the whole input again")
+    loader.set_defaults(handler=backfill_alerts)
+
+    commands.add_parser(
+        'retire-shards',
+        help="Return RabbitMQ to a single processor after a --workers run (shard processes must be stopped)"
+    ).set_defaults(handler=retire_shards, broker_only=True)
+
+    parser.set_defaults(create_tables=True, broker_only=False)
+    args = parser.parse_args()
+
+    if args.broker_only:
+        # Only changes the RabbitMQ topology; no database needed
+        try:
+            success = args.handler(Config(), args)
+        except Exception as e:
+            logger.error(f"{args.command} failed: {e}")
+            success = False
+        sys.exit(0 if success else 1)
+
+    db_manager = DatabaseManager(Config())
+    if not db_manager.connect():
+        sys.exit(1)
+    try:
+        # migrate-compact runs before the configured layout exists
+        if args.create_tables and not db_manager.create_tables():
+            sys.exit(1)
+        success = args.handler(db_manager, args)
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        logger.error(f"{args.command} failed: {e}")
+        sys.exit(1)
+    finally:
+        db_manager.disconnect()
+
+if __name__ == "__main__":
+    main()
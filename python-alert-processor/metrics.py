@@ -0,0 +1,259 @@
+"""
+In-process metrics for the alert processor, served in Prometheus text format.
+
+Metrics are module-level objects that the processing code updates directly:
+
+    started = time.perf_counter()
+    alert_data = parse_alert_message(body)
+    metrics.PARSE_SECONDS.observe(time.perf_counter() - started)
+
+Recording is a bisect over a short bucket list and an addition to a
+per-thread cell, with no lock, so it adds well under a microsecond per call. start_http_server() exposes
+every metric at /metrics on a local port (METRICS_HOST:METRICS_PORT).
+"""
+
+import bisect
+import logging
+import threading
+import time
+from datetime import timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Stage latencies from tens of microseconds up to a few seconds
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Reading timestamp to ack, which includes time queued in RabbitMQ
+END_TO_END_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                      10.0, 30.0, 60.0, 300.0)
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_registry = []
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    """Per-thread cells, so recording never takes a lock.
+
+    Each thread that records gets its own list of values (a "cell"); readers
+    sum every cell. Only the first recording on a thread takes the lock, to
+    register its cell.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, size):
+        self.name = name
+        self.documentation = documentation
+        self._size = size
+        self._cells = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _new_cell(self):
+        cell = [0] * self._size
+        with self._lock:
+            self._cells.append(cell)
+        self._local.cell = cell
+        return cell
+
+    def _totals(self):
+        with self._lock:
+            cells = list(self._cells)
+        return [sum(values) for values in zip(*cells)] if cells else [0] * self._size
+
+    def _header(self):
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation):
+        super().__init__(name, documentation, 1)
+
+    def inc(self, amount=1):
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._new_cell()
+        cell[0] += amount
+
+    @property
+    def value(self):
+        return self._totals()[0]
+
+    def render(self):
+        return self._header() + [f"{self.name} {_format(self.value)}"]
+
+class Gauge:
+    # A single value set from one place (a poller), so no cells are needed
+    kind = 'gauge'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0
+        _registry.append(self)
+
+    def set(self, value):
+        self.value = value
+
+    def render(self):
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            f"{self.name} {_format(self.value)}",
+        ]
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets):
+        self.bounds = tuple(buckets)
+        # Per-bucket (not cumulative) counts, the last one for +Inf, then the sum
+        super().__init__(name, documentation, len(self.bounds) + 2)
+
+    def observe(self, value, count=1):
+        """Record `count` observations of `value` (count > 1 for a batch sharing one timing)"""
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._new_cell()
+        cell[bisect.bisect_left(self.bounds, value)] += count
+        cell[-1] += value * count
+
+    def snapshot(self):
+        """(per-bucket counts, sum of observed values)"""
+        totals = self._totals()
+        return totals[:-1], float(totals[-1])
+
+    def render(self):
+        counts, total = self.snapshot()
+        lines = self._header()
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float('inf'),), counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{_format(bound)}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {_format(total)}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+MESSAGES_PROCESSED = Counter(
+    'alert_messages_processed_total', 'Alert messages stored (or coalesced) and acknowledged')
+MESSAGES_FAILED = Counter(
+    'alert_messages_failed_total', 'Alert messages that failed to parse or store')
+MESSAGES_NACKED = Counter(
+    'alert_messages_nacked_total', 'Alert messages rejected without requeue')
+MESSAGES_RETRIED = Counter(
+    'alert_messages_retried_total', 'Alert messages sent to a delay queue for another attempt')
+MESSAGES_DEAD_LETTERED = Counter(
+    'alert_messages_dead_lettered_total', 'Alert messages moved to the dead-letter queue')
+MESSAGES_COALESCED = Counter(
+    'alert_messages_coalesced_total', 'Repeat alerts folded into an open episode')
+MESSAGES_SPILLED = Counter(
+    'alert_messages_spilled_total', 'Alert messages written to the spill log and acknowledged')
+SPILL_REPLAYED = Counter(
+    'alert_spill_replayed_total', 'Spilled alerts replayed into the store')
+CONSUMER_PAUSES = Counter(
+    'alert_consumer_pauses_total', 'Times flow control paused consumption because the database fell behind')
+READINGS_PROCESSED = Counter(
+    'reading_messages_processed_total', 'Raw reading messages folded into buckets and acknowledged')
+READINGS_FAILED = Counter(
+    'reading_messages_failed_total', 'Raw reading messages rejected because they failed to parse')
+READING_BUCKETS_WRITTEN = Counter(
+    'reading_buckets_written_total', 'Reading bucket rows merged into the reading tables')
+NOTIFICATIONS_PUBLISHED = Counter(
+    'alert_notifications_published_total', 'Notifications published to motor.notifications')
+
+PARSE_SECONDS = Histogram(
+    'alert_parse_seconds', 'Time to decode and validate one alert message', LATENCY_BUCKETS)
+INSERT_SECONDS = Histogram(
+    'alert_insert_seconds', 'Time per database insert call (one alert or one batch)', LATENCY_BUCKETS)
+PUBLISH_SECONDS = Histogram(
+    'alert_publish_seconds', 'Time per notification message sent to RabbitMQ', LATENCY_BUCKETS)
+END_TO_END_SECONDS = Histogram(
+    'alert_end_to_end_seconds', 'Alert timestamp to acknowledgement', END_TO_END_BUCKETS)
+READING_FLUSH_SECONDS = Histogram(
+    'reading_flush_seconds', 'Time to write the closed reading buckets to the store', LATENCY_BUCKETS)
+BATCH_SIZE = Histogram(
+    'alert_batch_size', 'Alerts written per database insert call', BATCH_SIZE_BUCKETS)
+
+QUEUE_DEPTH = Gauge(
+    'alert_queue_depth', 'Messages waiting in the alerts queue (polled)')
+PREFETCH_WINDOW = Gauge(
+    'alert_prefetch_window', 'Prefetch count set on the consumer channel')
+CONSUMER_PAUSED = Gauge(
+    'alert_consumer_paused', '1 while flow control has paused consumption')
+STARTUP_SECONDS = Gauge(
+    'alert_startup_seconds', 'Time from startup until consuming (connections, schema check, cache warm-up)')
+FIRST_ACK_SECONDS = Gauge(
+    'alert_first_ack_seconds', 'Time from startup to the first acknowledged message')
+
+def record_acked(alerts):
+    """Count acknowledged alerts and their reading timestamp -> ack latency"""
+    now = time.time()
+    for alert in alerts:
+        timestamp = alert['timestamp']
+        if timestamp.tzinfo is None:
+            # Naive reading timestamps are UTC, as everywhere else in the pipeline
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        # Producer clocks can run ahead of ours; count those as zero latency
+        END_TO_END_SECONDS.observe(max(0.0, now - timestamp.timestamp()))
+    MESSAGES_PROCESSED.inc(len(alerts))
+
+def record_rejected():
+    """Count a message that failed and was rejected"""
+    MESSAGES_FAILED.inc()
+    MESSAGES_NACKED.inc()
+
+def record_retried():
+    """Count a message that failed and was sent to a delay queue"""
+    MESSAGES_FAILED.inc()
+    MESSAGES_RETRIED.inc()
+
+def record_dead_lettered():
+    """Count a message that failed and was moved to the dead-letter queue"""
+    MESSAGES_FAILED.inc()
+    MESSAGES_DEAD_LETTERED.inc()
+
+def render():
+    """Every registered metric in Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the processor log
+        pass
+
+def start_http_server(host, port):
+    """Serve /metrics from a daemon thread; returns the server (call shutdown() to stop)"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+    thread.start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_port}/metrics")
+    return server
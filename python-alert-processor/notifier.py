@@ -0,0 +1,186 @@
+import itertools
+import logging
+import time
+from collections import deque
+
+import pika
+from pika.exceptions import UnroutableError
+
+import codec
+import metrics
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Envelope messages carry a JSON array of notifications; this message type
+# lets dashboard consumers tell them apart from single notifications
+ENVELOPE_TYPE = 'motor.notification.batch'
+
+# Longest wait between attempts to resend failed notifications
+MAX_RETRY_BACKOFF_S = 30.0
+
+class NotificationPublisher:
+    """Publishes notifications to motor.notifications, optionally packed into envelopes.
+
+    Notifications are buffered and sent as one message per
+    NOTIFICATION_BATCH_SIZE alerts (a JSON array), or per alert when the
+    batch size is 1. Partial envelopes are flushed after NOTIFICATION_FLUSH_MS.
+
+    With PUBLISHER_CONFIRMS enabled every message is confirmed by the broker
+    and published as mandatory, so one that no queue is bound to receive is
+    returned. pika's BlockingChannel waits for each confirm on the consumer
+    thread, so the envelope is the confirm window: one round trip covers a
+    whole envelope, and confirms need NOTIFICATION_BATCH_SIZE above 1 to
+    keep up. A returned envelope had no queue to go to (no dashboard is
+    listening), so its notifications are counted as unroutable and dropped.
+    Notifications in an envelope the broker nacks, or that fails to send, are
+    kept for retry (up to NOTIFICATION_RETRY_LIMIT) and only counted as
+    dropped once the retry buffer overflows. Retries wait for a backoff that
+    doubles after every failed flush, and one flush resends at most
+    NOTIFICATION_RETRY_PER_FLUSH of them, so a broken exchange costs the
+    consumer thread little.
+    """
+
+    def __init__(self, config: Config, clock=time.monotonic):
+        self.config = config
+        self.clock = clock
+        self.connection = None
+        self.channel = None
+        self.pending = []
+        self.retry = deque(maxlen=config.NOTIFICATION_RETRY_LIMIT)
+        self.flush_timer = None
+        # No retries before retry_at; the wait doubles after each failed flush
+        self.retry_at = 0.0
+        self.retry_backoff = 0.0
+
+        # Shared by every publish instead of being rebuilt per message
+        self.properties = pika.BasicProperties(
+            delivery_mode=2,  # Make message persistent
+            content_type='application/json'
+        )
+        self.envelope_properties = pika.BasicProperties(
+            delivery_mode=2,
+            content_type='application/json',
+            type=ENVELOPE_TYPE
+        )
+
+        self.published_count = 0
+        self.message_count = 0
+        self.failed_count = 0
+        self.retried_count = 0
+        self.dropped_count = 0
+        self.unroutable_count = 0
+
+    def attach(self, connection, channel):
+        """Publish on this connection/channel (enabling confirms if configured)"""
+        self.connection = connection
+        self.channel = channel
+        self.flush_timer = None
+        if self.config.PUBLISHER_CONFIRMS:
+            self.channel.confirm_delivery()
+            if self.config.NOTIFICATION_BATCH_SIZE == 1:
+                logger.warning("PUBLISHER_CONFIRMS waits for a confirm per alert; set "
+                               "NOTIFICATION_BATCH_SIZE above 1 to confirm whole envelopes")
+
+    def publish(self, notification):
+        """Queue a notification, sending it once its envelope is full"""
+        self.pending.append(codec.encode_notification(notification))
+
+        if len(self.pending) >= self.config.NOTIFICATION_BATCH_SIZE:
+            self.flush()
+        elif self.flush_timer is None:
+            self.flush_timer = self.connection.call_later(
+                self.config.NOTIFICATION_FLUSH_MS / 1000.0,
+                self._on_flush_timeout
+            )
+
+    def _on_flush_timeout(self):
+        self.flush_timer = None
+        self.flush()
+
+    def flush(self, final=False):
+        """Send everything buffered, retrying previously failed notifications first.
+
+        Retries wait for their backoff and are capped per flush, unless `final`
+        (at shutdown). Sending stops at the first failure; the rest is kept.
+        """
+        if self.flush_timer is not None:
+            self.connection.remove_timeout(self.flush_timer)
+            self.flush_timer = None
+
+        retries = 0
+        if final or self.clock() >= self.retry_at:
+            retries = len(self.retry) if final else min(len(self.retry), self.config.NOTIFICATION_RETRY_PER_FLUSH)
+        bodies = list(itertools.islice(self.retry, retries)) + self.pending
+        self.retried_count += retries
+        self.pending = []
+
+        batch_size = self.config.NOTIFICATION_BATCH_SIZE
+        done = 0
+        failed = False
+        for start in range(0, len(bodies), batch_size):
+            chunk = bodies[start:start + batch_size]
+            try:
+                started = time.perf_counter()
+                self._send(chunk)
+                metrics.PUBLISH_SECONDS.observe(time.perf_counter() - started)
+                metrics.NOTIFICATIONS_PUBLISHED.inc(len(chunk))
+                self.published_count += len(chunk)
+                self.message_count += 1
+            except UnroutableError:
+                # Nobody is listening; resending would only come back again
+                self.unroutable_count += len(chunk)
+                logger.warning(f"Dropped {len(chunk)} unroutable notification(s), no queue is bound "
+                               f"to {self.config.MOTOR_NOTIFICATIONS_EXCHANGE}")
+            except Exception as e:
+                logger.error(f"Failed to publish {len(chunk)} notification(s): {e}")
+                failed = True
+                break
+            done += len(chunk)
+
+        # Retries that failed again stay at the head of the buffer, in order
+        for _ in range(min(done, retries)):
+            self.retry.popleft()
+        if failed:
+            self._keep_for_retry(bodies[max(done, retries):])
+            self.retry_backoff = min(max(self.retry_backoff * 2, self.config.NOTIFICATION_FLUSH_MS / 1000.0),
+                                     MAX_RETRY_BACKOFF_S)
+            self.retry_at = self.clock() + self.retry_backoff
+        elif retries:
+            self.retry_backoff = 0.0
+
+    def _send(self, chunk):
+        if self.config.NOTIFICATION_BATCH_SIZE == 1:
+            body, properties = chunk[0], self.properties
+        else:
+            # Same bytes json.dumps would produce for the list of notifications
+            body, properties = b'[' + b', '.join(chunk) + b']', self.envelope_properties
+
+        self.channel.basic_publish(
+            exchange=self.config.MOTOR_NOTIFICATIONS_EXCHANGE,
+            routing_key='',
+            body=body,
+            properties=properties,
+            # Only reported back (as UnroutableError) with confirms on
+            mandatory=self.config.PUBLISHER_CONFIRMS
+        )
+
+    def _keep_for_retry(self, chunk):
+        self.failed_count += len(chunk)
+        # The retry deque is bounded: appending past the limit drops the oldest
+        overflow = len(self.retry) + len(chunk) - self.retry.maxlen
+        if overflow > 0:
+            self.dropped_count += overflow
+            logger.warning(f"Notification retry buffer full, dropped {overflow} notification(s)")
+        self.retry.extend(chunk)
+
+    def stats(self):
+        return {
+            'published': self.published_count,
+            'messages': self.message_count,
+            'failed': self.failed_count,
+            'retried': self.retried_count,
+            'dropped': self.dropped_count,
+            'unroutable': self.unroutable_count,
+            'awaiting_retry': len(self.retry),
+        }
@@ -0,0 +1,155 @@
+"""
+Range partitions of motor_alerts by day or by month.
+
+motor_alerts is partitioned on `timestamp`. Each partition covers one UTC
+day (motor_alerts_p20250717) or month (motor_alerts_p202507). Alerts outside
+every partition land in motor_alerts_default. With COMPACT_SCHEMA the rows
+live in motor_alert_facts instead, partitioned the same way
+(motor_alert_facts_p20250717, ...); every function takes the table name.
+
+This module only plans SQL. DatabaseManager (psycopg2) and AsyncAlertProcessor
+(asyncpg) run the plan inside a transaction that holds MAINTENANCE_LOCK_SQL,
+so processors running at the same time never both create the same partition.
+"""
+
+import re
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+
+ALERTS_TABLE = 'motor_alerts'
+# Holds the alert rows with COMPACT_SCHEMA; motor_alerts is then a view over it
+COMPACT_TABLE = 'motor_alert_facts'
+LEGACY_TABLE = 'motor_alerts_legacy'
+
+def partitioned_table(config):
+    """The table that holds alert rows, and is partitioned, under `config`"""
+    return COMPACT_TABLE if config.COMPACT_SCHEMA else ALERTS_TABLE
+
+def table_kind_sql(table=ALERTS_TABLE):
+    """'r' for a plain table (before migration), 'p' once partitioned, 'v' for a view, NULL if missing"""
+    return f"SELECT relkind::text FROM pg_class WHERE oid = to_regclass('{table}');"
+
+def list_partitions_sql(table=ALERTS_TABLE):
+    return f"""
+    SELECT child.relname
+    FROM pg_inherits
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE pg_inherits.inhparent = '{table}'::regclass
+    ORDER BY child.relname;
+"""
+
+def default_partition_sql(table=ALERTS_TABLE):
+    return f"""
+    CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT;
+"""
+
+TABLE_KIND_SQL = table_kind_sql()
+LIST_PARTITIONS_SQL = list_partitions_sql()
+DEFAULT_PARTITION_SQL = default_partition_sql()
+
+MAINTENANCE_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('motor_alerts_partitions'));"
+
+MaintenancePlan = namedtuple('MaintenancePlan', ['created', 'expired', 'statements'])
+
+def interval_start(day, interval):
+    """First day of the partition containing `day`"""
+    return day if interval == 'day' else day.replace(day=1)
+
+def next_start(start, interval):
+    """First day of the partition after the one starting at `start`"""
+    if interval == 'day':
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def partition_name(start, interval, table=ALERTS_TABLE):
+    return f"{table}_p{start:%Y%m%d}" if interval == 'day' else f"{table}_p{start:%Y%m}"
+
+def partition_range(name, table=ALERTS_TABLE):
+    """(start, end) dates covered by a partition of `table` this module named, else None"""
+    match = re.match(rf'^{table}_p(\d{{6}}|\d{{8}})$', name)
+    if not match:
+        return None
+    digits = match.group(1)
+    if len(digits) == 8:
+        start = date(int(digits[:4]), int(digits[4:6]), int(digits[6:]))
+        return start, next_start(start, 'day')
+    start = date(int(digits[:4]), int(digits[4:]), 1)
+    return start, next_start(start, 'month')
+
+def _bound(day):
+    # Partition bounds are UTC midnights, whatever the session time zone
+    return f"'{day.isoformat()} 00:00:00+00'"
+
+def create_partition_statements(start, interval, table=ALERTS_TABLE):
+    """Create the partition starting at `start` and attach it.
+
+    Rows already in the default partition for that range are moved into the
+    new table first (ATTACH fails otherwise). Building the table and then
+    attaching it only takes a brief lock on the parent, unlike
+    CREATE TABLE ... PARTITION OF, so inserts keep flowing.
+    """
+    name = partition_name(start, interval, table)
+    lower, upper = _bound(start), _bound(next_start(start, interval))
+    in_range = f"timestamp >= {lower} AND timestamp < {upper}"
+    return [
+        f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS);",
+        f"INSERT INTO {name} SELECT * FROM {table}_default WHERE {in_range};",
+        f"DELETE FROM {table}_default WHERE {in_range};",
+        f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ({lower}) TO ({upper});",
+    ]
+
+def missing_partitions(existing_names, starts, interval, table=ALERTS_TABLE):
+    """Starts of partitions to create, skipping ranges an existing partition overlaps
+    (partitions made before PARTITION_INTERVAL changed keep their ranges)"""
+    ranges = [r for r in (partition_range(name, table) for name in existing_names) if r]
+    missing = []
+    for start in starts:
+        end = next_start(start, interval)
+        if not any(start < other_end and other_start < end for other_start, other_end in ranges):
+            missing.append(start)
+            ranges.append((start, end))
+    return missing
+
+def plan_maintenance(existing_names, today, interval, premake, retention_days, retention_action,
+                     table=ALERTS_TABLE):
+    """Statements creating the current and next `premake` partitions and expiring old ones.
+
+    With retention_days > 0, partitions that end on or before
+    today - retention_days are detached (left as standalone tables) or dropped.
+    Dropping also deletes expired rows from the default partition.
+    """
+    starts = [interval_start(today, interval)]
+    for _ in range(premake):
+        starts.append(next_start(starts[-1], interval))
+
+    created = missing_partitions(existing_names, starts, interval, table)
+    statements = []
+    for start in created:
+        statements.extend(create_partition_statements(start, interval, table))
+
+    expired = []
+    if retention_days > 0:
+        cutoff = today - timedelta(days=retention_days)
+        for name in existing_names:
+            bounds = partition_range(name, table)
+            if bounds and bounds[1] <= cutoff:
+                expired.append(name)
+                statements.append(f"ALTER TABLE {table} DETACH PARTITION {name};")
+                if retention_action == 'drop':
+                    statements.append(f"DROP TABLE {name};")
+        if retention_action == 'drop':
+            statements.append(f"DELETE FROM {table}_default WHERE timestamp < {_bound(cutoff)};")
+
+    return MaintenancePlan([partition_name(start, interval, table) for start in created], expired, statements)
+
+def plan_for_config(existing_names, config, today=None):
+    """plan_maintenance with the PARTITION_* settings of a Config"""
+    return plan_maintenance(
+        existing_names,
+        today or datetime.now(timezone.utc).date(),
+        config.PARTITION_INTERVAL,
+        config.PARTITION_PREMAKE,
+        config.PARTITION_RETENTION_DAYS,
+        config.PARTITION_RETENTION_ACTION,
+        partitioned_table(config)
+    )
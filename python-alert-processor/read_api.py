@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Read API for the dashboard: recent alerts, daily counts and summary as JSON.
+
+    GET /api/motors/<motor_id>/alerts?limit=5[&since=<alert id>]
+    GET /api/alerts?limit=5                  latest `limit` alerts of every motor
+    GET /api/alerts?since=<alert id>[&limit=500]
+    GET /api/history?[motor=&sensorType=&alertType=&start=&end=&limit=50&cursor=]
+    GET /api/daily-counts?start=YYYY-MM-DD&end=YYYY-MM-DD
+    GET /api/summary
+
+Every response carries `lastId`, the highest alert ID it contains; a polling
+client passes it back as `since=` and gets only the alerts stored after it.
+IDs are handed out when an insert starts, not when it commits. With several
+writers (WORKER_COUNT > 1, the asyncio engine, --workers, a backfill) an
+alert can become visible after one with a higher ID, and a client that has
+already moved past it with since= never sees it. Clients that must see every
+alert re-read a margin (pass a lastId from an earlier poll) and drop the IDs
+they already have.
+
+/api/history pages through older alerts, newest first, optionally of one
+motor, sensor type and alert type between two ISO 8601 times (naive ones are
+UTC). Each page carries `nextCursor`, null after the last page; passing it
+back as `cursor=` returns the next page, equally fast at any depth.
+
+Responses are built once and cached for READ_API_CACHE_TTL_S. When the
+service runs inside the processor (READ_API_PORT > 0), every stored alert
+also invalidates the cached responses that could include it. Cached bodies
+have a weak ETag, so an unchanged response costs a 304 with no body, and are
+gzip-encoded for clients that accept it.
+
+Run on its own (TTL expiry only) with:
+
+    python read_api.py [--host HOST] [--port PORT]
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import signal
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from config import Config
+from backends import decode_history_cursor
+from database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+# Largest `limit` a client may ask for
+MAX_LIMIT = 1000
+# Default page size of a since= delta
+DELTA_LIMIT = 500
+# Default page size of /api/history
+HISTORY_LIMIT = 50
+# Bodies smaller than this are sent uncompressed; gzip would barely shrink them
+GZIP_MIN_BYTES = 512
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _camel(name):
+    head, *rest = name.split('_')
+    return head + ''.join(word.capitalize() for word in rest)
+
+def _camel_row(row):
+    return {_camel(key): value for key, value in row.items()}
+
+class _Entry:
+    __slots__ = ('body', 'gzipped', 'etag', 'expires', 'version')
+
+    def __init__(self, body, expires, version):
+        self.body = body
+        self.gzipped = None
+        self.etag = f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        self.expires = expires
+        self.version = version
+
+class ReadService:
+    """Builds, caches and invalidates read API responses.
+
+    Data comes from `store` (a DatabaseManager of its own by default, used
+    through its connection pool) and, inside the processor, from the
+    processor's recent-alert cache and time-series store.
+    """
+
+    def __init__(self, config: Config, store=None, recent_cache=None, timeseries=None):
+        self.config = config
+        self.owns_store = store is None
+        self.store = store or DatabaseManager(config)
+        self.recent_cache = recent_cache
+        self.timeseries = timeseries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Bumped for every stored alert: per motor and for all motors
+        self.motor_versions = defaultdict(int)
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.server = None
+
+    def start(self):
+        """Connect (if the store is ours) and serve on READ_API_HOST:READ_API_PORT"""
+        if self.owns_store:
+            if not self.store.connect():
+                return False
+            if not self.store.create_pool(1, self.config.READ_API_POOL_SIZE):
+                return False
+        self.server = ThreadingHTTPServer((self.config.READ_API_HOST, self.config.READ_API_PORT), _ReadApiHandler)
+        self.server.daemon_threads = True
+        self.server.service = self
+        thread = threading.Thread(target=self.server.serve_forever, name='read-api-http', daemon=True)
+        thread.start()
+        logger.info(f"Serving read API on http://{self.config.READ_API_HOST}:{self.server.server_port}/api/")
+        return True
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.owns_store:
+            self.store.disconnect()
+        logger.info(f"Read API cache stats: {self.stats()}")
+
+    def alert_stored(self, motor_id):
+        """Invalidate cached responses that a newly stored alert of `motor_id` changes"""
+        # Plain increments: readers only compare versions, a torn read just misses
+        self.motor_versions[motor_id] += 1
+        self.version += 1
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+    def get(self, path, query):
+        """(status, _Entry) for a request; errors are entries too, but never cached"""
+        try:
+            route = self._route(path, parse_qs(query))
+        except ValueError as e:
+            return 400, self._error(str(e))
+        if route is None:
+            return 404, self._error("Not found")
+        key, motor_id, build = route
+
+        # Read the version before building, so an alert stored meanwhile makes the entry stale
+        # (.get: a client asking for an unknown motor must not add it)
+        version = self.motor_versions.get(motor_id, 0) if motor_id is not None else self.version
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.expires > now and entry.version == version:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return 200, entry
+            self.misses += 1
+
+        try:
+            payload = build()
+        except Exception as e:
+            logger.error(f"Read API request {path}?{query} failed: {e}")
+            return 500, self._error("Internal error")
+        body = json.dumps(payload, default=_json_default, separators=(',', ':')).encode('utf-8')
+        entry = _Entry(body, now + self.config.READ_API_CACHE_TTL_S, version)
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.config.READ_API_CACHE_ENTRIES:
+                self.entries.popitem(last=False)
+        return 200, entry
+
+    @staticmethod
+    def _error(message):
+        return _Entry(json.dumps({'error': message}).encode('utf-8'), 0.0, None)
+
+    @staticmethod
+    def _int(params, name, default, maximum=None):
+        values = params.get(name)
+        if not values:
+            return default
+        try:
+            value = int(values[0])
+        except ValueError:
+            raise ValueError(f"{name} must be an integer")
+        if value < 0:
+            raise ValueError(f"{name} must not be negative")
+        if maximum is not None and value > maximum:
+            raise ValueError(f"{name} must be at most {maximum}")
+        return value
+
+    @staticmethod
+    def _date(params, name, default):
+        values = params.get(name)
+        if not values:
+            return default
+        try:
+            return date.fromisoformat(values[0])
+        except ValueError:
+            raise ValueError(f"{name} must be a date (YYYY-MM-DD)")
+
+    @staticmethod
+    def _datetime(params, name):
+        values = params.get(name)
+        if not values:
+            return None
+        try:
+            value = datetime.fromisoformat(values[0])
+        except ValueError:
+            raise ValueError(f"{name} must be an ISO 8601 date or time")
+        return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+    @staticmethod
+    def _str(params, name):
+        values = params.get(name)
+        return values[0] if values else None
+
+    def _route(self, path, params):
+        """(cache key, motor_id the response depends on or None for all motors, builder)"""
+        parts = [unquote(part) for part in path.strip('/').split('/')]
+        if len(parts) == 4 and parts[:2] == ['api', 'motors'] and parts[3] == 'alerts':
+            motor_id = parts[2]
+            since = self._int(params, 'since', None)
+            limit = self._int(params, 'limit', 5 if since is None else DELTA_LIMIT, MAX_LIMIT)
+            return (('motor', motor_id, limit, since), motor_id,
+                    lambda: self._motor_alerts(motor_id, limit, since))
+        if parts == ['api', 'alerts']:
+            since = self._int(params, 'since', None)
+            limit = self._int(params, 'limit', 5 if since is None else DELTA_LIMIT, MAX_LIMIT)
+            return ('alerts', limit, since), None, lambda: self._all_alerts(limit, since)
+        if parts == ['api', 'history']:
+            motor_id = self._str(params, 'motor')
+            filters = dict(motor_id=motor_id, sensor_type=self._str(params, 'sensorType'),
+                           alert_type=self._str(params, 'alertType'),
+                           start=self._datetime(params, 'start'), end=self._datetime(params, 'end'))
+            limit = self._int(params, 'limit', HISTORY_LIMIT, MAX_LIMIT)
+            after = self._str(params, 'cursor')
+            if after is not None:
+                # A bad cursor is the client's error (400), not the store's
+                decode_history_cursor(after)
+            return (('history', limit, after, *filters.values()), motor_id,
+                    lambda: self._history(limit, after, filters))
+        if parts == ['api', 'daily-counts']:
+            end = self._date(params, 'end', datetime.now(timezone.utc).date())
+            start = self._date(params, 'start', end - timedelta(days=6))
+            return ('daily', start, end), None, lambda: self._daily_counts(start, end)
+        if parts == ['api', 'summary']:
+            return ('summary',), None, self._summary
+        return None
+
+    def _query(self, method, *args):
+        """Call a store read method on a pooled connection when the store has a pool"""
+        if getattr(self.store, 'pool', None) is not None:
+            with self.store.pooled_connection():
+                return method(*args)
+        return method(*args)
+
+    @staticmethod
+    def _alerts_payload(rows, since, **fields):
+        alerts = [_camel_row(row) for row in rows]
+        last_id = max((alert['id'] for alert in alerts), default=since)
+        return {**fields, 'alerts': alerts, 'lastId': last_id}
+
+    def _motor_alerts(self, motor_id, limit, since):
+        if since is not None:
+            rows = self._query(self.store.get_alerts_after, since, limit, motor_id)
+        else:
+            rows = self.recent_cache.get(motor_id, limit) if self.recent_cache is not None else None
+            if rows is None:
+                size = max(limit, self.recent_cache.size) if self.recent_cache is not None else limit
+                rows = self._query(self.store.get_recent_alerts, motor_id, size)
+                if rows and self.recent_cache is not None:
+                    self.recent_cache.fill(motor_id, rows)
+                rows = rows[:limit]
+        return self._alerts_payload(rows, since, motorId=motor_id)
+
+    def _all_alerts(self, limit, since):
+        if since is not None:
+            rows = self._query(self.store.get_alerts_after, since, limit)
+        else:
+            rows = self._query(self.store.get_recent_alerts_by_motor, limit)
+        return self._alerts_payload(rows, since)
+
+    def _history(self, limit, after, filters):
+        rows, next_cursor = self._query(self.store.get_alert_history, limit, after, *filters.values())
+        return self._alerts_payload(rows, None, nextCursor=next_cursor)
+
+    def _daily_counts(self, start, end):
+        rows = self._query(self.store.get_daily_alert_counts, start, end)
+        return {'start': start, 'end': end, 'counts': [_camel_row(row) for row in rows]}
+
+    def _summary(self):
+        if self.timeseries is not None:
+            rows = self.timeseries.summary()
+        else:
+            rows = self._query(self.store.get_alert_summary)
+        return {'summary': [_camel_row({key: value for key, value in row.items() if key != 'last_id'})
+                            for row in rows]}
+
+class _ReadApiHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so polling dashboards reuse their connection
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        status, entry = self.server.service.get(url.path, url.query)
+
+        if status == 200 and entry.etag in self._if_none_match():
+            self.send_response(304)
+            self.send_header('ETag', entry.etag)
+            self._common_headers()
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body = entry.body
+        encoded = False
+        if len(body) >= GZIP_MIN_BYTES and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            if entry.gzipped is None:
+                entry.gzipped = gzip.compress(body, compresslevel=6)
+            body = entry.gzipped
+            encoded = True
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if status == 200:
+            self.send_header('ETag', entry.etag)
+        if encoded:
+            self.send_header('Content-Encoding', 'gzip')
+        self._common_headers()
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _if_none_match(self):
+        header = self.headers.get('If-None-Match', '')
+        return {tag.strip() for tag in header.split(',') if tag.strip()}
+
+    def _common_headers(self):
+        # Cached responses change with every insert; clients revalidate with If-None-Match
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Expose-Headers', 'ETag')
+
+    def log_message(self, format, *args):
+        # Dashboards poll every few seconds; per-request lines would flood the log
+        pass
+
+def main():
+    """Run the read API on its own"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    parser = argparse.ArgumentParser(description="Motor alert read API")
+    parser.add_argument('--host', default=Config.READ_API_HOST,
+                        help="address to listen on (default: READ_API_HOST)")
+    parser.add_argument('--port', type=int, default=Config.READ_API_PORT or 8081,
+                        help="port to listen on (default: READ_API_PORT or 8081)")
+    args = parser.parse_args()
+
+    config = Config()
+    config.READ_API_HOST = args.host
+    config.READ_API_PORT = args.port
+    service = ReadService(config)
+    if not service.start():
+        sys.exit(1)
+
+    stopping = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: stopping.set())
+    stopping.wait()
+    service.stop()
+
+if __name__ == "__main__":
+    main()
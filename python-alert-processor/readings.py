@@ -0,0 +1,181 @@
+"""
+Per-motor time-bucket aggregates of raw sensor readings.
+
+The readings consumer (readings_processor.py) gets every reading the
+ingestor accepts, not only threshold breaches. Readings are never stored
+row by row. Each one is folded into the current bucket of its (motor_id,
+sensor_type) at every resolution in RESOLUTIONS, 1 minute and 1 hour. A
+bucket keeps the count, min, max, sum and last value. The mean is sum /
+count, computed by the table.
+
+Open buckets are columns of `array` values with one entry per series and
+resolution, so a reading costs a few array writes and no objects. A series'
+bucket is closed when a reading for another bucket arrives (the next minute,
+or a late reading) and when the buckets are written out. Closed buckets wait
+in `closed`. A bucket closed twice before a write is merged there, so the
+rows handed to the store never repeat a key.
+
+The store merges each row into the bucket it already holds (count and sum
+add up, min/max and last combine). Partial buckets written by successive
+flushes, or by several consumers on one queue, therefore add up to the same
+aggregate.
+"""
+
+import math
+from array import array
+from datetime import datetime, timezone
+
+# (table suffix, bucket width in seconds); buckets go to motor_readings_<suffix>
+RESOLUTIONS = (('1m', 60), ('1h', 3600))
+
+# Aggregate columns of a bucket, in row order after (motor_id, sensor_type, bucket)
+AGGREGATE_COLUMNS = ('reading_count', 'min_value', 'max_value', 'sum_value', 'last_value', 'last_at')
+
+# Message fields that are not sensor values
+READING_FIELDS = ('motorId', 'timestamp')
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_NAIVE_EPOCH = datetime(1970, 1, 1)
+
+def reading_table(suffix):
+    """Table holding the buckets of resolution `suffix`"""
+    return f"motor_readings_{suffix}"
+
+def epoch_seconds(timestamp):
+    """Seconds since the epoch; naive timestamps are UTC, as everywhere else in the pipeline"""
+    if timestamp.tzinfo is None:
+        return (timestamp - _NAIVE_EPOCH).total_seconds()
+    return (timestamp - _EPOCH).total_seconds()
+
+def sensor_values(reading):
+    """(sensor_type, value) of every numeric field of a reading message other than READING_FIELDS"""
+    return [
+        (field, float(value))
+        for field, value in reading.items()
+        if field not in READING_FIELDS and type(value) in (int, float) and math.isfinite(value)
+    ]
+
+class ReadingAggregator:
+    """Open and closed buckets of every (motor_id, sensor_type) series.
+
+    Not thread-safe: readings are added and buckets written from the
+    consumer thread.
+    """
+
+    def __init__(self, resolutions=RESOLUTIONS):
+        self.resolutions = tuple(resolutions)
+        self.widths = tuple(width for _, width in self.resolutions)
+        # (motor_id, sensor_type) of each series, and the reverse
+        self.keys = []
+        self.index = {}
+        # Open bucket of each series, one array per resolution (count 0: none open)
+        levels = range(len(self.resolutions))
+        self.starts = [array('d') for _ in levels]
+        self.counts = [array('q') for _ in levels]
+        self.minimums = [array('d') for _ in levels]
+        self.maximums = [array('d') for _ in levels]
+        self.sums = [array('d') for _ in levels]
+        self.lasts = [array('d') for _ in levels]
+        self.last_at = [array('d') for _ in levels]
+        # {(level, series, bucket start): [count, min, max, sum, last, last_at]}
+        self.closed = {}
+        self.readings = 0
+        self.late = 0
+
+    def _series(self, key):
+        series = len(self.keys)
+        self.keys.append(key)
+        self.index[key] = series
+        for level in range(len(self.resolutions)):
+            self.starts[level].append(0.0)
+            self.counts[level].append(0)
+            for columns in (self.minimums, self.maximums, self.sums, self.lasts, self.last_at):
+                columns[level].append(0.0)
+        return series
+
+    def add(self, motor_id, sensor_type, epoch, value):
+        """Fold one reading (timestamp in epoch seconds) into its buckets"""
+        series = self.index.get((motor_id, sensor_type))
+        if series is None:
+            series = self._series((motor_id, sensor_type))
+        self.readings += 1
+        for level, width in enumerate(self.widths):
+            start = epoch - epoch % width
+            counts = self.counts[level]
+            count = counts[series]
+            if count and self.starts[level][series] == start:
+                counts[series] = count + 1
+                if value < self.minimums[level][series]:
+                    self.minimums[level][series] = value
+                if value > self.maximums[level][series]:
+                    self.maximums[level][series] = value
+                self.sums[level][series] += value
+                if epoch >= self.last_at[level][series]:
+                    self.lasts[level][series] = value
+                    self.last_at[level][series] = epoch
+                continue
+            if count:
+                if start < self.starts[level][series]:
+                    self.late += 1
+                self._close(level, series)
+            self.starts[level][series] = start
+            counts[series] = 1
+            self.minimums[level][series] = value
+            self.maximums[level][series] = value
+            self.sums[level][series] = value
+            self.lasts[level][series] = value
+            self.last_at[level][series] = epoch
+
+    def _close(self, level, series):
+        """Move the open bucket of a series to `closed`"""
+        key = (level, series, self.starts[level][series])
+        bucket = (self.counts[level][series], self.minimums[level][series], self.maximums[level][series],
+                  self.sums[level][series], self.lasts[level][series], self.last_at[level][series])
+        self.counts[level][series] = 0
+        closed = self.closed.get(key)
+        if closed is None:
+            self.closed[key] = list(bucket)
+            return
+        count, minimum, maximum, total, last, last_at = bucket
+        closed[0] += count
+        closed[1] = min(closed[1], minimum)
+        closed[2] = max(closed[2], maximum)
+        closed[3] += total
+        if last_at >= closed[5]:
+            closed[4], closed[5] = last, last_at
+
+    def close_buckets(self):
+        """Close every open bucket and return all closed ones as store rows.
+
+        Rows are (table suffix, motor_id, sensor_type, bucket start, count,
+        min, max, sum, last value, last reading time), with the times as UTC
+        datetimes, sorted by key. The buckets stay in `closed` until clear(),
+        so after a failed write the next call returns them again, merged with
+        what arrived since.
+        """
+        for level in range(len(self.resolutions)):
+            counts = self.counts[level]
+            for series in range(len(self.keys)):
+                if counts[series]:
+                    self._close(level, series)
+        rows = []
+        for (level, series, start), (count, minimum, maximum, total, last, last_at) in self.closed.items():
+            motor_id, sensor_type = self.keys[series]
+            rows.append((self.resolutions[level][0], motor_id, sensor_type,
+                         datetime.fromtimestamp(start, timezone.utc), count, minimum, maximum, total,
+                         last, datetime.fromtimestamp(last_at, timezone.utc)))
+        # One key order for every consumer, so concurrent upserts can't deadlock
+        rows.sort(key=lambda row: row[:4])
+        return rows
+
+    def clear(self):
+        """Forget the closed buckets once the store has them"""
+        self.closed = {}
+
+    def stats(self):
+        return {
+            'series': len(self.keys),
+            'readings': self.readings,
+            'late': self.late,
+            'closed': len(self.closed),
+        }
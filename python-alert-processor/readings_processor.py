@@ -0,0 +1,195 @@
+"""
+Raw reading consumer (alert_processor.py --mode readings).
+
+The ingestor publishes every accepted reading to the motor.readings exchange
+(READINGS_EXCHANGE), one message per POST with all of its sensor values.
+ReadingsProcessor folds them into the 1-minute and 1-hour buckets of
+readings.py and never stores them row by row.
+
+Messages are acked only once the buckets holding them are in PostgreSQL:
+every READINGS_FLUSH_MS, or as soon as READINGS_PREFETCH messages are waiting
+for a write, the closed buckets are merged into the reading tables in one
+transaction and every message up to the last one is acked with a single
+cumulative basic_ack. A crash or a failed write loses nothing; the unacked
+messages are redelivered (a write that failed is simply tried again at the
+next flush). Messages that do not parse are nacked without requeue.
+
+The consumer runs on its own queue (READINGS_QUEUE) with the blocking
+engine. Several consumers can share that queue: each writes partial
+buckets, and the upsert merges them.
+"""
+
+import copy
+import logging
+import signal
+import time
+
+import codec
+import metrics
+from backends import AlertStore, Broker, PikaBroker
+from config import Config
+from database import DatabaseManager
+from readings import ReadingAggregator, epoch_seconds, sensor_values
+
+logger = logging.getLogger(__name__)
+
+def readings_config(config: Config):
+    """Copy of `config` whose alerts exchange and queue are the readings ones.
+
+    The broker then declares and consumes motor.readings like it does
+    motor.alerts. Readings are not retried or dead-lettered.
+    """
+    config = copy.copy(config)
+    config.MOTOR_ALERTS_EXCHANGE = config.READINGS_EXCHANGE
+    config.MOTOR_ALERTS_QUEUE = config.READINGS_QUEUE
+    config.RETRY_ATTEMPTS = 0
+    config.DEAD_LETTER_QUEUE = ''
+    config.SHARD = None
+    return config
+
+def parse_reading_message(message_body):
+    """(motor_id, epoch seconds, [(sensor_type, value)]) of a reading message"""
+    reading = codec.loads(message_body)
+    for field in ('motorId', 'timestamp'):
+        if field not in reading:
+            raise ValueError(f"Missing required field: {field}")
+    values = sensor_values(reading)
+    if not values:
+        raise ValueError("Reading has no sensor values")
+    return str(reading['motorId']), epoch_seconds(codec.parse_timestamp(reading['timestamp'])), values
+
+class ReadingsProcessor:
+    """Consumes raw readings into time-bucket aggregates until stopped"""
+
+    def __init__(self, config: Config, broker: Broker = None, store: AlertStore = None):
+        self.config = readings_config(config)
+        self.broker = broker or PikaBroker(self.config)
+        self.db_manager = store or DatabaseManager(self.config)
+        self.aggregator = ReadingAggregator()
+
+        self.connection = None
+        self.channel = None
+        self.should_stop = False
+        # Newest delivery folded into the buckets since the last write, and
+        # how many deliveries its cumulative ack will cover
+        self.last_tag = None
+        self.unacked = 0
+        self.next_flush = 0.0
+
+        # Serves /metrics while running (METRICS_PORT > 0)
+        self.metrics_server = None
+
+        signal.signal(signal.SIGINT, self._signal_handler)
+        signal.signal(signal.SIGTERM, self._signal_handler)
+
+    def _signal_handler(self, signum, frame):
+        # The connection stays open so the last buckets can still be written and acked
+        logger.info(f"Received signal {signum}, initiating graceful shutdown...")
+        self.should_stop = True
+
+    def process_reading(self, ch, method, properties, body):
+        """Fold one reading message into the buckets; it is acked by the next flush"""
+        try:
+            motor_id, epoch, values = parse_reading_message(body)
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.error(f"Failed to parse reading message: {e}")
+            metrics.READINGS_FAILED.inc()
+            self.channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return
+        for sensor_type, value in values:
+            self.aggregator.add(motor_id, sensor_type, epoch, value)
+        self.last_tag = method.delivery_tag
+        self.unacked += 1
+        if self.unacked >= self.config.READINGS_PREFETCH:
+            # The prefetch window is full, so nothing more arrives until a write
+            self.flush()
+
+    def flush(self):
+        """Write the closed buckets and ack every message folded into them"""
+        self.next_flush = time.monotonic() + self.config.READINGS_FLUSH_MS / 1000.0
+        rows = self.aggregator.close_buckets()
+        if rows:
+            started = time.perf_counter()
+            try:
+                self.db_manager.save_reading_buckets(rows)
+            except Exception as e:
+                # The buckets stay closed and are merged into the next write
+                logger.error(f"Failed to write {len(rows)} reading buckets: {e}")
+                return False
+            metrics.READING_FLUSH_SECONDS.observe(time.perf_counter() - started)
+            metrics.READING_BUCKETS_WRITTEN.inc(len(rows))
+            self.aggregator.clear()
+        if self.last_tag is not None:
+            self.channel.basic_ack(delivery_tag=self.last_tag, multiple=True)
+            metrics.READINGS_PROCESSED.inc(self.unacked)
+            self.last_tag = None
+            self.unacked = 0
+        return True
+
+    def startup(self):
+        """Connect the store and broker and start consuming; returns True on success"""
+        if not self.db_manager.connect():
+            logger.error("Failed to connect to database")
+            return False
+        if not self.db_manager.create_tables():
+            logger.error("Failed to create database tables")
+            return False
+        if not self.broker.connect():
+            logger.error("Failed to connect to RabbitMQ")
+            return False
+        self.connection = self.broker.connection
+        self.channel = self.broker.channel
+        self.channel.basic_qos(prefetch_count=self.config.READINGS_PREFETCH)
+
+        logger.info(f"Starting to consume raw readings from {self.config.READINGS_QUEUE}...")
+        self.channel.basic_consume(
+            queue=self.config.READINGS_QUEUE,
+            on_message_callback=self.process_reading
+        )
+        self.next_flush = time.monotonic() + self.config.READINGS_FLUSH_MS / 1000.0
+        return True
+
+    def start_consuming(self):
+        """Consume and flush on the READINGS_FLUSH_MS timer until stopped"""
+        logger.info("Waiting for readings. To exit press CTRL+C")
+        while not self.should_stop:
+            try:
+                self.connection.process_data_events(
+                    time_limit=min(1.0, max(0.0, self.next_flush - time.monotonic()))
+                )
+                if time.monotonic() >= self.next_flush:
+                    self.flush()
+            except KeyboardInterrupt:
+                logger.info("Received keyboard interrupt")
+                break
+            except Exception as e:
+                logger.error(f"Error processing data events: {e}")
+                break
+        if self.channel and self.channel.is_open:
+            self.flush()
+        logger.info(f"Reading aggregator stats: {self.aggregator.stats()}")
+        logger.info("Stopped consuming readings")
+
+    def run(self):
+        """Main run method"""
+        logger.info("Starting Readings Processor...")
+        try:
+            if self.config.METRICS_PORT > 0:
+                try:
+                    self.metrics_server = metrics.start_http_server(self.config.METRICS_HOST, self.config.METRICS_PORT)
+                except OSError as e:
+                    logger.error(f"Failed to start metrics server: {e}")
+            if not self.startup():
+                return False
+            self.start_consuming()
+        except Exception as e:
+            logger.error(f"Unexpected error in run: {e}")
+            return False
+        finally:
+            self.broker.disconnect()
+            self.db_manager.disconnect()
+            if self.metrics_server is not None:
+                self.metrics_server.shutdown()
+                self.metrics_server.server_close()
+            logger.info("Readings Processor stopped")
+        return True
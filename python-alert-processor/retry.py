@@ -0,0 +1,76 @@
+"""
+Delayed retries and the dead-letter queue for failed alert messages.
+
+A message that fails for a transient reason (the store is down or rejected
+the insert) is republished to a delay queue and acked, so the consumer moves
+on at once. Each delay queue holds messages for a fixed TTL, then
+dead-letters them back to the consumer's own queue through the default
+exchange. Attempt n waits RETRY_DELAY * 2**(n-1) seconds, and the attempt
+count travels in the x-retry-attempt header.
+
+Messages that can never succeed (they fail to parse), and transient failures
+that have used up RETRY_ATTEMPTS retries, go to DEAD_LETTER_QUEUE instead,
+with the reason in their headers. `python dlq.py` inspects and re-drives it.
+
+The queue names carry their delay, so changing RETRY_DELAY declares new
+delay queues instead of clashing with the TTL of the old ones.
+"""
+
+from datetime import datetime, timezone
+
+from config import Config
+
+ATTEMPT_HEADER = 'x-retry-attempt'
+REASON_HEADER = 'x-failure-reason'
+QUEUE_HEADER = 'x-original-queue'
+FAILED_AT_HEADER = 'x-failed-at'
+
+# Longest failure reason kept in the headers
+MAX_REASON_CHARS = 500
+
+def retry_delay_ms(config: Config, attempt):
+    """Delay before retry `attempt` (1 for the first retry), in milliseconds"""
+    return int(config.RETRY_DELAY * 1000 * 2 ** (attempt - 1))
+
+def retry_queue(config: Config, attempt, queue=None):
+    """Delay queue holding messages of `queue` (default: the alerts queue) waiting for retry `attempt`"""
+    return f"{queue or config.MOTOR_ALERTS_QUEUE}.retry.{retry_delay_ms(config, attempt)}ms"
+
+def failure_queues(config: Config):
+    """[(queue, arguments)] of the delay queues and the dead-letter queue to declare"""
+    queues = [
+        (retry_queue(config, attempt), {
+            'x-message-ttl': retry_delay_ms(config, attempt),
+            'x-dead-letter-exchange': '',
+            'x-dead-letter-routing-key': config.MOTOR_ALERTS_QUEUE,
+        })
+        for attempt in range(1, config.RETRY_ATTEMPTS + 1)
+    ]
+    if config.DEAD_LETTER_QUEUE:
+        queues.append((config.DEAD_LETTER_QUEUE, {}))
+    return queues
+
+def attempts(headers):
+    """Retries a message has had so far, from its headers"""
+    return int((headers or {}).get(ATTEMPT_HEADER, 0))
+
+def route_failure(config: Config, headers, reason, transient):
+    """(queue, headers) to republish a failed message to, or None to reject it.
+
+    A transient failure goes to the delay queue of its next attempt while
+    retries are left; anything else goes to the dead-letter queue. None
+    means there is no dead-letter queue (DEAD_LETTER_QUEUE is empty).
+    """
+    retries = attempts(headers)
+    headers = {
+        **(headers or {}),
+        REASON_HEADER: str(reason)[:MAX_REASON_CHARS],
+        QUEUE_HEADER: config.MOTOR_ALERTS_QUEUE,
+        FAILED_AT_HEADER: datetime.now(timezone.utc).isoformat(),
+    }
+    if transient and retries < config.RETRY_ATTEMPTS:
+        headers[ATTEMPT_HEADER] = retries + 1
+        return retry_queue(config, retries + 1), headers
+    if not config.DEAD_LETTER_QUEUE:
+        return None
+    return config.DEAD_LETTER_QUEUE, headers
@@ -0,0 +1,173 @@
+"""
+Append-only, segmented spill log for alerts that cannot be stored right now.
+
+While the database is unavailable AlertProcessor appends alerts here and
+acknowledges them once they are fsynced; a replayer later loads them into the
+store in the order they were written. The log is a directory of segment files
+(segment-00000000000000000001.log, ...) written sequentially. Each record is
+
+    <payload length: uint32 LE> <crc32 of payload: uint32 LE> <payload>
+
+where the payload is the alert as a compact JSON array. A write torn by a
+crash fails its length or CRC check and ends that segment.
+
+A position in the log is a (segment, offset) tuple; positions compare in log
+order. The replayer stores the position it has loaded up to in the database,
+in the same transaction as the alerts, so a replay interrupted at any point
+resumes without loading an alert twice.
+"""
+
+import json
+import logging
+import os
+import struct
+import threading
+import uuid
+import zlib
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct('<II')
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.log'
+ID_FILE = 'spill.id'
+
+START = (0, 0)
+
+def encode_alert(alert):
+    return json.dumps(
+        [alert['motor_id'], alert['sensor_type'], alert['timestamp'].isoformat(),
+         alert['value'], alert['alert_type']],
+        separators=(',', ':')
+    ).encode('utf-8')
+
+def decode_alert(payload):
+    motor_id, sensor_type, timestamp, value, alert_type = json.loads(payload)
+    return {
+        'motor_id': motor_id,
+        'sensor_type': sensor_type,
+        'timestamp': datetime.fromisoformat(timestamp),
+        'value': value,
+        'alert_type': alert_type
+    }
+
+def _segment_name(segment):
+    return f"{SEGMENT_PREFIX}{segment:020d}{SEGMENT_SUFFIX}"
+
+class SpillLog:
+    """Writer and reader of one spill directory.
+
+    append() and sync() are called from the consumer thread; read(), end()
+    and discard_before() may be called from the replayer thread at the same
+    time. Only synced records are visible to read().
+    """
+
+    def __init__(self, directory, segment_bytes):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.spill_id = None
+        # True while alerts must go to the log rather than the store (set and
+        # cleared by the consumer thread)
+        self.active = False
+        self._file = None
+        self._segment = 0
+        self._written = 0
+        self._end = START
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Create the directory if needed and start a new segment for appends"""
+        os.makedirs(self.directory, exist_ok=True)
+        id_path = os.path.join(self.directory, ID_FILE)
+        if os.path.exists(id_path):
+            with open(id_path) as id_file:
+                self.spill_id = id_file.read().strip()
+        else:
+            self.spill_id = uuid.uuid4().hex
+            with open(id_path, 'w') as id_file:
+                id_file.write(self.spill_id)
+                id_file.flush()
+                os.fsync(id_file.fileno())
+
+        # Never append after a segment from an earlier run: its tail may be torn
+        segments = self._segments()
+        self._open_segment((segments[-1] + 1) if segments else 1)
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def append(self, alert):
+        """Buffer an alert for the next sync(), rolling to a new segment when full"""
+        if self._written >= self.segment_bytes:
+            self.sync()
+            self._file.close()
+            self._open_segment(self._segment + 1)
+        payload = encode_alert(alert)
+        self._file.write(HEADER.pack(len(payload), zlib.crc32(payload)))
+        self._file.write(payload)
+        self._written += HEADER.size + len(payload)
+
+    def sync(self):
+        """Write buffered records to disk and make them visible to read()"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        with self._lock:
+            self._end = (self._segment, self._written)
+
+    def end(self):
+        """Position just after the last synced record"""
+        with self._lock:
+            return self._end
+
+    def read(self, position, limit):
+        """Up to `limit` synced alerts from `position`, and the position after them"""
+        end = self.end()
+        alerts = []
+        for segment in self._segments():
+            if segment < position[0] or (segment, 0) > end:
+                continue
+            offset = position[1] if segment == position[0] else 0
+            stop = end[1] if segment == end[0] else None
+            path = os.path.join(self.directory, _segment_name(segment))
+            with open(path, 'rb') as segment_file:
+                segment_file.seek(offset)
+                while len(alerts) < limit and (stop is None or offset < stop):
+                    header = segment_file.read(HEADER.size)
+                    if len(header) < HEADER.size:
+                        break
+                    length, crc = HEADER.unpack(header)
+                    payload = segment_file.read(length)
+                    if len(payload) < length or zlib.crc32(payload) != crc:
+                        logger.warning(f"Ignoring torn record at {path}:{offset}")
+                        break
+                    alerts.append(decode_alert(payload))
+                    offset += HEADER.size + length
+            position = (segment, offset)
+            if len(alerts) >= limit:
+                break
+        return alerts, position
+
+    def discard_before(self, position):
+        """Delete segments that lie entirely before `position`"""
+        for segment in self._segments():
+            if segment >= position[0] or segment == self._segment:
+                break
+            os.remove(os.path.join(self.directory, _segment_name(segment)))
+
+    def _segments(self):
+        return sorted(
+            int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _open_segment(self, segment):
+        self._segment = segment
+        self._written = 0
+        self._file = open(os.path.join(self.directory, _segment_name(segment)), 'ab')
+        with self._lock:
+            self._end = (segment, 0)
@@ -0,0 +1,216 @@
+"""
+Multi-process sharded consumer mode (alert_processor.py --workers N).
+
+The supervisor starts N shard processes, each an ordinary AlertProcessor (or
+AsyncAlertProcessor) with its own RabbitMQ and database connections. Alerts
+are sharded by motor: motor.alerts is bound to a consistent-hash exchange
+that routes each message, by its routing key (the motor ID), to one of the
+queues motor.alerts.queue.shard-0 ... shard-(N-1). Every alert for a motor
+goes through one queue and one process, so per-motor order is kept. Shard
+queues of an earlier run with more processes are unbound at startup.
+`manage.py retire-shards` unbinds the consistent-hash exchange and all shard
+queues once the shard processes are stopped (backends.retire_sharding).
+
+The supervisor restarts a shard process that exits, forwards SIGINT/SIGTERM
+to every shard (each shuts down through its own signal handler) and logs the
+throughput of each shard every SUPERVISOR_REPORT_S seconds.
+"""
+
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+
+import pika
+
+import metrics
+from backends import declare_shard_queue, retire_shard_queues, shard_queue
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# How often a shard process copies its processed count to the supervisor
+COUNTER_INTERVAL_S = 1.0
+
+def shard_config(shard):
+    """Config for shard process `shard`: its own queue, metrics port, spill directory and snapshot"""
+    config = Config()
+    config.SHARD = shard
+    config.MOTOR_ALERTS_QUEUE = shard_queue(config, shard)
+    if config.METRICS_PORT > 0:
+        config.METRICS_PORT += shard
+    # A shard sees only its own motors; run read_api.py on its own instead
+    config.READ_API_PORT = 0
+    if config.SPILL_DIR:
+        config.SPILL_DIR = os.path.join(config.SPILL_DIR, f"shard-{shard}")
+    if config.TIMESERIES_SNAPSHOT:
+        stem, extension = os.path.splitext(config.TIMESERIES_SNAPSHOT)
+        config.TIMESERIES_SNAPSHOT = f"{stem}.shard-{shard}{extension}"
+    return config
+
+def _report_processed(counters, shard):
+    while True:
+        counters[shard] = metrics.MESSAGES_PROCESSED.value
+        time.sleep(COUNTER_INTERVAL_S)
+
+def run_shard(engine, shard, counters):
+    """Entry point of a shard process"""
+    config = shard_config(shard)
+    logger.info(f"Shard {shard} consuming {config.MOTOR_ALERTS_QUEUE} (pid {os.getpid()})")
+    threading.Thread(target=_report_processed, args=(counters, shard),
+                     name='shard-counter', daemon=True).start()
+
+    if engine == 'asyncio':
+        import asyncio
+        from async_processor import AsyncAlertProcessor
+        success = asyncio.run(AsyncAlertProcessor(config).run())
+    else:
+        from alert_processor import AlertProcessor
+        success = AlertProcessor(config).run()
+    sys.exit(0 if success else 1)
+
+class Supervisor:
+    """Runs `workers` shard processes until SIGINT/SIGTERM.
+
+    `target` is the shard entry point, called as target(engine, shard,
+    counters) in a fresh (spawned) process.
+    """
+
+    def __init__(self, config: Config, engine, workers, target=run_shard):
+        self.config = config
+        self.engine = engine
+        self.workers = workers
+        self.target = target
+        # Spawned rather than forked, so no shard inherits the supervisor's sockets or threads
+        self.context = multiprocessing.get_context('spawn')
+        # Alerts processed by each shard process since it (re)started
+        self.counters = self.context.Array('Q', workers, lock=False)
+        self.processes = [None] * workers
+        # Monotonic time at which each exited shard is restarted
+        self.restart_at = [None] * workers
+        self.restarts = [0] * workers
+        self.last_counts = [0] * workers
+        self.stopping = threading.Event()
+
+    def _signal_handler(self, signum, frame):
+        """Handle shutdown signals"""
+        logger.info(f"Received signal {signum}, stopping shard processes...")
+        self.stop()
+
+    def stop(self):
+        self.stopping.set()
+
+    def setup_topology(self):
+        """Declare every shard queue, then detach the unsharded queue and any extra shard queues"""
+        try:
+            connection = pika.BlockingConnection(pika.URLParameters(self.config.RABBITMQ_URL))
+            try:
+                channel = connection.channel()
+                channel.exchange_declare(
+                    exchange=self.config.MOTOR_ALERTS_EXCHANGE,
+                    exchange_type='fanout',
+                    durable=True
+                )
+                # Bind the shard queues first so no alert is dropped in between
+                for shard in range(self.workers):
+                    declare_shard_queue(channel, self.config, shard_queue(self.config, shard))
+
+                # Otherwise motor.alerts.queue keeps filling with nobody consuming it
+                result = channel.queue_declare(queue=self.config.MOTOR_ALERTS_QUEUE, durable=True)
+                channel.queue_unbind(
+                    queue=self.config.MOTOR_ALERTS_QUEUE,
+                    exchange=self.config.MOTOR_ALERTS_EXCHANGE
+                )
+                if result.method.message_count:
+                    logger.warning(f"{result.method.message_count} messages are left in "
+                                   f"{self.config.MOTOR_ALERTS_QUEUE}; run a single processor to drain them")
+
+                # A former run with more workers left its extra shard queues bound to the hash ring
+                retire_shard_queues(connection, self.config, first=self.workers)
+            finally:
+                connection.close()
+            logger.info(f"Declared {self.workers} shard queues on {self.config.SHARD_EXCHANGE}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to set up shard queues: {e}")
+            return False
+
+    def start_shard(self, shard):
+        process = self.context.Process(
+            target=self.target,
+            args=(self.engine, shard, self.counters),
+            name=f"alert-shard-{shard}"
+        )
+        self.counters[shard] = 0
+        self.last_counts[shard] = 0
+        process.start()
+        self.processes[shard] = process
+        self.restart_at[shard] = None
+        logger.info(f"Started shard {shard} (pid {process.pid})")
+
+    def check_shards(self):
+        """Schedule a restart for every shard that exited, and restart those that are due"""
+        now = time.monotonic()
+        for shard, process in enumerate(self.processes):
+            if self.restart_at[shard] is None:
+                if process.exitcode is None:
+                    continue
+                logger.error(f"Shard {shard} (pid {process.pid}) exited with code {process.exitcode}, "
+                             f"restarting in {self.config.RETRY_DELAY}s")
+                self.restart_at[shard] = now + self.config.RETRY_DELAY
+            if now >= self.restart_at[shard]:
+                self.restarts[shard] += 1
+                self.start_shard(shard)
+
+    def report_throughput(self, elapsed):
+        """Log alerts per second for each shard over the last `elapsed` seconds"""
+        rates = []
+        for shard in range(self.workers):
+            count = self.counters[shard]
+            rates.append(max(0, count - self.last_counts[shard]) / elapsed)
+            self.last_counts[shard] = count
+        per_shard = ', '.join(f"shard-{shard}={rate:.1f}/s" for shard, rate in enumerate(rates))
+        logger.info(f"Throughput: {sum(rates):.1f} alerts/s ({per_shard})")
+
+    def stop_shards(self):
+        """Send SIGTERM to every shard and wait for it to exit, killing any that take too long"""
+        running = [process for process in self.processes
+                   if process is not None and process.exitcode is None]
+        for process in running:
+            os.kill(process.pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.config.SHUTDOWN_TIMEOUT_S
+        for process in running:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.exitcode is None:
+                logger.error(f"Shard process {process.pid} did not stop in time, killing it")
+                process.kill()
+                process.join()
+
+    def run(self):
+        """Main run method"""
+        logger.info(f"Starting supervisor with {self.workers} shard processes...")
+        signal.signal(signal.SIGINT, self._signal_handler)
+        signal.signal(signal.SIGTERM, self._signal_handler)
+
+        if not self.setup_topology():
+            return False
+
+        try:
+            for shard in range(self.workers):
+                self.start_shard(shard)
+
+            last_report = time.monotonic()
+            while not self.stopping.wait(0.5):
+                self.check_shards()
+                now = time.monotonic()
+                if now - last_report >= self.config.SUPERVISOR_REPORT_S:
+                    self.report_throughput(now - last_report)
+                    last_report = now
+        finally:
+            self.stop_shards()
+            logger.info(f"Supervisor stopped (restarts per shard: {self.restarts})")
+
+        return True
@@ -6,7 +6,7 @@ This script can be used to test database operations and message parsing
 
 import json
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from config import Config
 from database import DatabaseManager
 
@@ -76,7 +76,14 @@ def test_database_operations():
         logger.info(f"Daily alert counts: {len(daily_counts)}")
         for count in daily_counts:
             logger.info(f"  {count['motor_id']} on {count['alert_date']}: {count['count']} alerts")
-        
+
+        # The rollup maintained at insert time should match a rebuild from motor_alerts
+        db_manager.backfill_daily_counts(start_date, end_date)
+        rebuilt_counts = db_manager.get_daily_alert_counts(start_date, end_date)
+        if rebuilt_counts != daily_counts:
+            logger.error(f"Daily counts changed after backfill: {daily_counts} != {rebuilt_counts}")
+            return False
+
         # Test health check
         health = db_manager.health_check()
         logger.info(f"Database health check: {'PASS' if health else 'FAIL'}")
@@ -143,13 +150,2269 @@ def test_message_parsing():
     logger.info("Message parsing test completed successfully")
     return True
 
+def test_batch_processing():
+    """Test micro-batched inserts, cumulative acks and per-row fallback"""
+    logger.info("Testing batch processing...")
+    
+    from types import SimpleNamespace
+    from alert_processor import AlertProcessor
+    
+    class FakeChannel:
+        def __init__(self):
+            self.acks = []
+            self.nacks = []
+            self.published = 0
+        
+        def basic_ack(self, delivery_tag, multiple=False):
+            self.acks.append((delivery_tag, multiple))
+        
+        def basic_nack(self, delivery_tag, requeue=True):
+            self.nacks.append(delivery_tag)
+        
+        def basic_publish(self, **kwargs):
+            self.published += 1
+    
+    class FakeConnection:
+        def call_later(self, delay, callback):
+            return callback
+        
+        def remove_timeout(self, timer):
+            pass
+    
+    class FakeDatabase:
+        def __init__(self, fail_batch):
+            self.fail_batch = fail_batch
+            self.next_id = 1
+        
+        def insert_alerts(self, alerts):
+            if self.fail_batch:
+                raise RuntimeError("batch rejected")
+            ids = list(range(self.next_id, self.next_id + len(alerts)))
+            self.next_id += len(alerts)
+            return ids
+        
+        def insert_alert(self, **alert):
+            if alert['value'] < 0:
+                raise RuntimeError("row rejected")
+            self.next_id += 1
+            return self.next_id - 1
+    
+    def make_message(value):
+        return json.dumps({
+            "motorId": "MTR-01",
+            "timestamp": "2025-07-17T10:15:00Z",
+            "sensorType": "vibration",
+            "value": value,
+            "alertType": "high_vibration"
+        }).encode('utf-8')
+    
+    config = Config()
+    config.BATCH_SIZE = 3
+    # Without a dead-letter queue, failed messages are nacked
+    config.DEAD_LETTER_QUEUE = ''
+    config.RETRY_ATTEMPTS = 0
+    
+    try:
+        # Happy path: a full batch is inserted once and acked cumulatively,
+        # while the malformed message is rejected on its own
+        processor = AlertProcessor(config)
+        processor.channel = FakeChannel()
+        processor.connection = FakeConnection()
+        processor.notifier.attach(processor.connection, processor.channel)
+        processor.db_manager = FakeDatabase(fail_batch=False)
+        
+        bodies = [make_message(3.2), b'{not json', make_message(3.4)]
+        for tag, body in enumerate(bodies, start=1):
+            processor.process_alert(processor.channel, SimpleNamespace(delivery_tag=tag), None, body)
+        
+        assert processor.channel.nacks == [2]
+        assert processor.channel.acks == [(3, True)]
+        assert processor.channel.published == 2
+        assert processor.batch == []
+        
+        # Fallback path: a rejected batch is retried row by row
+        processor.channel = FakeChannel()
+        processor.notifier.attach(processor.connection, processor.channel)
+        processor.db_manager = FakeDatabase(fail_batch=True)
+        
+        bodies = [make_message(3.2), make_message(-1), make_message(3.4)]
+        for tag, body in enumerate(bodies, start=1):
+            processor.process_alert(processor.channel, SimpleNamespace(delivery_tag=tag), None, body)
+        
+        assert processor.channel.acks == [(1, False), (3, False)]
+        assert processor.channel.nacks == [2]
+        
+        logger.info("Batch processing test completed successfully")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Batch processing test failed: {e}")
+        return False
+
+def test_in_memory_pipeline():
+    """Test the full pipeline on the in-memory broker and SQLite store"""
+    logger.info("Testing in-memory pipeline...")
+    
+    from alert_processor import AlertProcessor
+    from backends import InMemoryBroker, SQLiteAlertStore
+    
+    results = []
+    for batch_size, worker_count in [(1, 1), (4, 1), (4, 3)]:
+        config = Config()
+        config.BATCH_SIZE = batch_size
+        config.WORKER_COUNT = worker_count
+        
+        broker = InMemoryBroker(config)
+        store = SQLiteAlertStore(config)
+        processor = AlertProcessor(config, broker=broker, store=store)
+        
+        try:
+            assert processor.startup()
+            
+            for i in range(20):
+                broker.publish_alert(json.dumps({
+                    "motorId": f"MTR-0{i % 3}",
+                    "timestamp": f"2025-07-17T10:15:{i:02d}Z",
+                    "sensorType": "vibration",
+                    "value": 2.6 + i / 10,
+                    "alertType": "high_vibration"
+                }))
+            broker.publish_alert('{"motorId": "MTR-01"}')
+            
+            assert broker.drain(timeout=5)
+            processor.settle_pending()
+            
+            # The malformed message is acked once it is in the dead-letter queue
+            assert broker.acked_count == 21
+            assert len(broker.dead_lettered) == 1
+            assert len(broker.published[config.MOTOR_NOTIFICATIONS_EXCHANGE]) == 20
+            assert 0 < processor.first_ack_s < 5
+            
+            recent = store.get_recent_alerts('MTR-00', 5)
+            assert [alert['timestamp'].second for alert in recent] == [18, 15, 12, 9, 6]
+            
+            counts = store.get_daily_alert_counts(datetime(2025, 7, 17).date(), datetime(2025, 7, 17).date())
+            assert sorted(row['count'] for row in counts) == [6, 7, 7]
+            
+            results.append(True)
+            
+        except Exception as e:
+            logger.error(f"In-memory pipeline test failed (batch_size={batch_size}, "
+                         f"workers={worker_count}): {e!r}")
+            results.append(False)
+        
+        finally:
+            processor.disconnect_rabbitmq()
+            store.disconnect()
+    
+    if all(results):
+        logger.info("In-memory pipeline test completed successfully")
+    return all(results)
+
+def test_retry_queues():
+    """Test delayed retries of store failures and the dead-letter queue, on the in-memory broker"""
+    logger.info("Testing retry queues...")
+    
+    import retry
+    from alert_processor import AlertProcessor
+    from backends import InMemoryBroker, SQLiteAlertStore
+    
+    config = Config()
+    config.RETRY_ATTEMPTS = 3
+    config.RETRY_DELAY = 0.02
+    
+    class FlakyStore(SQLiteAlertStore):
+        """Fails MTR-FLAKY twice, then stores it; always fails MTR-BROKEN"""
+        def __init__(self, config):
+            super().__init__(config)
+            self.flaky_failures = 2
+        
+        def insert_alert(self, motor_id, sensor_type, timestamp, value, alert_type):
+            if motor_id == 'MTR-BROKEN' or (motor_id == 'MTR-FLAKY' and self.flaky_failures):
+                if motor_id == 'MTR-FLAKY':
+                    self.flaky_failures -= 1
+                raise RuntimeError(f"insert of {motor_id} failed")
+            return super().insert_alert(motor_id, sensor_type, timestamp, value, alert_type)
+    
+    def message(motor_id):
+        return json.dumps({
+            "motorId": motor_id,
+            "timestamp": "2025-07-17T10:15:00Z",
+            "sensorType": "temperature",
+            "value": 85.0,
+            "alertType": "high_temperature"
+        })
+    
+    broker = InMemoryBroker(config)
+    store = FlakyStore(config)
+    processor = AlertProcessor(config, broker=broker, store=store)
+    
+    try:
+        # Delays double per attempt, and the queue names carry them
+        queues = dict(retry.failure_queues(config))
+        assert [arguments.get('x-message-ttl') for arguments in queues.values()] == [20, 40, 80, None]
+        assert retry.retry_queue(config, 2) == f"{config.MOTOR_ALERTS_QUEUE}.retry.40ms"
+        assert queues[retry.retry_queue(config, 1)]['x-dead-letter-routing-key'] == config.MOTOR_ALERTS_QUEUE
+        
+        queue, headers = retry.route_failure(config, {retry.ATTEMPT_HEADER: 1}, "db down", transient=True)
+        assert queue == retry.retry_queue(config, 2) and headers[retry.ATTEMPT_HEADER] == 2
+        queue, headers = retry.route_failure(config, {retry.ATTEMPT_HEADER: 3}, "db down", transient=True)
+        assert queue == config.DEAD_LETTER_QUEUE and headers[retry.REASON_HEADER] == "db down"
+        assert retry.route_failure(config, None, "bad json", transient=False)[0] == config.DEAD_LETTER_QUEUE
+        
+        assert processor.startup()
+        for motor_id in ('MTR-FLAKY', 'MTR-BROKEN', 'MTR-OK'):
+            broker.publish_alert(message(motor_id))
+        broker.publish_alert('{"motorId": "MTR-01"}')
+        assert broker.drain(timeout=5)
+        processor.settle_pending()
+        
+        # The flaky alert is stored on its third delivery, after the one behind it
+        flaky = store.get_recent_alerts('MTR-FLAKY', 5)
+        assert len(flaky) == 1 and flaky[0]['id'] > store.get_recent_alerts('MTR-OK', 5)[0]['id']
+        assert not store.get_recent_alerts('MTR-BROKEN', 5)
+        
+        # The broken one used up its retries; the malformed one never had any
+        dead = {json.loads(body)['motorId']: headers
+                for body, headers in zip(broker.dead_lettered, broker.dead_letter_headers)}
+        assert set(dead) == {'MTR-BROKEN', 'MTR-01'}
+        assert retry.attempts(dead['MTR-BROKEN']) == 3
+        assert dead['MTR-BROKEN'][retry.REASON_HEADER] == "insert of MTR-BROKEN failed"
+        assert dead['MTR-BROKEN'][retry.QUEUE_HEADER] == config.MOTOR_ALERTS_QUEUE
+        assert retry.attempts(dead['MTR-01']) == 0
+        assert dead['MTR-01'][retry.REASON_HEADER] == "Missing required field: timestamp"
+        assert not processor.deliveries
+        
+        logger.info("Retry queues test completed successfully")
+        return True
+    except Exception as e:
+        logger.error(f"Retry queues test failed: {e!r}")
+        return False
+    finally:
+        processor.disconnect_rabbitmq()
+        store.disconnect()
+
+def test_flow_control():
+    """Test the AIMD prefetch window, the batch size that follows it and pausing on a slow store"""
+    logger.info("Testing flow control...")
+    
+    import metrics
+    from alert_processor import AlertProcessor
+    from backends import InMemoryBroker, SQLiteAlertStore
+    from flow import FlowController
+    
+    now = [0.0]
+    def clock():
+        return now[0]
+    
+    config = Config()
+    config.FLOW_CONTROL = True
+    config.FLOW_PREFETCH_MIN = 4
+    config.FLOW_PREFETCH_MAX = 40
+    config.FLOW_TARGET_LATENCY_MS = 100
+    config.FLOW_PAUSE_MS = 5000
+    config.PREFETCH_COUNT = 10
+    config.BATCH_SIZE = 8
+    broker = InMemoryBroker(config)
+    store = SQLiteAlertStore(config)
+    processor = AlertProcessor(config, broker=broker, store=store)
+    processor.flow.clock = clock
+    
+    def message(i):
+        return json.dumps({
+            "motorId": f"MTR-0{i % 3}",
+            "timestamp": f"2025-07-17T10:15:{i % 60:02d}Z",
+            "sensorType": "vibration",
+            "value": 2.6,
+            "alertType": "high_vibration"
+        })
+    
+    try:
+        # The window grows additively only while inserts are fast, half a window or
+        # more was delivered and a backlog is waiting
+        flow = FlowController(5, 20, 0.1, 5.0, initial=10, clock=clock)
+        assert not flow.adjust(in_flight=0, queue_depth=0)
+        flow.observe(0.01)
+        flow.delivered(10)
+        assert not flow.adjust(in_flight=0, queue_depth=0)
+        flow.observe(0.01)
+        flow.delivered(2)
+        assert not flow.adjust(in_flight=2, queue_depth=100)
+        for expected in (15, 20):
+            flow.observe(0.01)
+            flow.delivered(expected - 5)
+            assert flow.adjust(in_flight=0, queue_depth=100) and flow.prefetch == expected
+        flow.observe(0.01)
+        flow.delivered(20)
+        assert not flow.adjust(in_flight=20, queue_depth=100) and flow.prefetch == 20
+        
+        # Slow inserts halve it, down to the minimum, then pause consumption
+        for expected in (10, 5):
+            flow.observe(0.5)
+            assert flow.adjust(in_flight=20, queue_depth=100) and flow.prefetch == expected
+        flow.observe(0.5)
+        assert flow.adjust(in_flight=5, queue_depth=100) and flow.paused
+        now[0] += 4.9
+        assert not flow.adjust(in_flight=0, queue_depth=100) and flow.paused
+        now[0] += 0.1
+        assert flow.adjust(in_flight=0, queue_depth=100) and not flow.paused and flow.prefetch == 5
+        # A full window with no insert finishing counts as congested too
+        assert flow.adjust(in_flight=5, queue_depth=100) and flow.paused
+        assert flow.stats()['pauses'] == 2 and flow.stats()['decreases'] == 2
+        
+        assert processor.startup()
+        assert broker.prefetch_count == 10 and processor.batch_size == 8
+        for i in range(24):
+            broker.publish_alert(message(i))
+        assert broker.drain(timeout=5)
+        processor.adjust_flow()
+        assert broker.prefetch_count == 10
+        
+        # The store falls behind: the window and the batch size shrink together
+        processor.flow.observe(1.0)
+        processor.adjust_flow()
+        assert broker.prefetch_count == 5 and processor.batch_size == 5
+        assert metrics.PREFETCH_WINDOW.value == 5
+        processor.flow.observe(1.0)
+        processor.adjust_flow()
+        assert broker.prefetch_count == 4 and processor.batch_size == 4
+        
+        # At the minimum it stops consuming; the backlog stays in the queue
+        pauses = metrics.CONSUMER_PAUSES.value
+        processor.flow.observe(1.0)
+        processor.adjust_flow()
+        assert processor.flow.paused and metrics.CONSUMER_PAUSED.value == 1
+        assert metrics.CONSUMER_PAUSES.value == pauses + 1
+        for i in range(12):
+            broker.publish_alert(message(i))
+        broker.process_data_events(time_limit=0)
+        assert broker.queue_depth() == 12 and broker.acked_count == 24
+        
+        # After FLOW_PAUSE_MS it resumes at the smallest window
+        now[0] += 5.0
+        processor.adjust_flow()
+        assert not processor.flow.paused and metrics.CONSUMER_PAUSED.value == 0
+        assert broker.prefetch_count == 4
+        assert broker.drain(timeout=5)
+        processor.settle_pending()
+        assert broker.acked_count == 36 and not processor.deliveries
+        processor.disconnect_rabbitmq()
+        
+        # Unbatched, each alert is settled in its own callback, so nothing is ever
+        # unsettled between callbacks; the window still grows while it keeps up
+        config.BATCH_SIZE = 1
+        broker = InMemoryBroker(config)
+        processor = AlertProcessor(config, broker=broker, store=store)
+        assert processor.startup()
+        assert broker.prefetch_count == 10 and processor.batch_size == 1
+        published = 0
+        for expected in (15, 20, 25):
+            for i in range(published, published + 40):
+                broker.publish_alert(message(i))
+            published += 40
+            broker.process_data_events(time_limit=0)
+            assert not processor.deliveries
+            # More alerts wait in the queue when the flow controller looks
+            for i in range(published, published + 10):
+                broker.publish_alert(message(i))
+            published += 10
+            processor.adjust_flow()
+            assert broker.prefetch_count == expected and processor.flow.stats()['increases'] == (expected - 10) // 5
+        assert broker.drain(timeout=5)
+        assert broker.acked_count == published
+        
+        logger.info("Flow control test completed successfully")
+        return True
+    except Exception as e:
+        logger.error(f"Flow control test failed: {e!r}")
+        return False
+    finally:
+        processor.disconnect_rabbitmq()
+        store.disconnect()
+
+def test_raw_readings():
+    """Test raw reading aggregation into 1-minute and 1-hour buckets, acks after writes and the upsert merge"""
+    logger.info("Testing raw reading aggregates...")
+    
+    import uuid
+    import metrics
+    from backends import InMemoryBroker, SQLiteAlertStore
+    from readings import ReadingAggregator, epoch_seconds
+    from readings_processor import ReadingsProcessor, readings_config
+    
+    minute = datetime(2025, 7, 17, 10, 0, tzinfo=timezone.utc)
+    
+    def reading(seconds, vibration, motor_id="MTR-001", **extra):
+        return json.dumps({
+            "motorId": motor_id,
+            "timestamp": (minute + timedelta(seconds=seconds)).isoformat().replace('+00:00', 'Z'),
+            "vibration": vibration,
+            "temperature": 60.0,
+            **extra
+        })
+    
+    class FlakyStore(SQLiteAlertStore):
+        failures = 0
+        def save_reading_buckets(self, rows):
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError("database is restarting")
+            return super().save_reading_buckets(rows)
+    
+    config = Config()
+    config.READINGS_PREFETCH = 5
+    config.READINGS_FLUSH_MS = 60000
+    broker = InMemoryBroker(readings_config(config))
+    store = FlakyStore(config)
+    processor = ReadingsProcessor(config, broker=broker, store=store)
+    schema = f"readings_test_{uuid.uuid4().hex[:8]}"
+    db_manager = DatabaseManager(Config())
+    
+    def buckets(table):
+        rows = store.connection.execute(f"""
+            SELECT motor_id, sensor_type, bucket, reading_count, min_value, max_value,
+                   avg_value, last_value
+            FROM {table} WHERE sensor_type = 'vibration' ORDER BY bucket;
+        """).fetchall()
+        return [tuple(row) for row in rows]
+    
+    try:
+        # Buckets close when the next one starts; a late reading reopens its own
+        start = epoch_seconds(minute)
+        aggregator = ReadingAggregator()
+        for seconds, value in ((5, 1.0), (50, 3.0), (65, 2.0), (20, 5.0)):
+            aggregator.add('MTR-001', 'vibration', start + seconds, value)
+        rows = aggregator.close_buckets()
+        assert [row[:4] for row in rows] == [
+            ('1h', 'MTR-001', 'vibration', minute),
+            ('1m', 'MTR-001', 'vibration', minute),
+            ('1m', 'MTR-001', 'vibration', minute + timedelta(minutes=1)),
+        ]
+        # count, min, max, sum, last value, last reading time
+        assert rows[0][4:] == (4, 1.0, 5.0, 11.0, 2.0, minute + timedelta(seconds=65))
+        assert rows[1][4:] == (3, 1.0, 5.0, 9.0, 3.0, minute + timedelta(seconds=50))
+        assert rows[2][4:] == (1, 2.0, 2.0, 2.0, 2.0, minute + timedelta(seconds=65))
+        assert aggregator.stats()['late'] == 1
+        # Until clear() the closed buckets are handed out again, merged with newer readings
+        aggregator.add('MTR-001', 'vibration', start + 10, 0.5)
+        again = aggregator.close_buckets()
+        assert again[1][4:7] == (4, 0.5, 5.0) and len(again) == 3
+        aggregator.clear()
+        aggregator.add('MTR-001', 'vibration', start + 70, 4.0)
+        assert [row[4] for row in aggregator.close_buckets()] == [1, 1]
+        
+        assert processor.startup()
+        assert broker.prefetch_count == 5
+        
+        # A full prefetch window writes at once; bad messages are nacked on their own
+        failed = metrics.READINGS_FAILED.value
+        for i, value in enumerate((1.0, 2.0, 3.0)):
+            broker.publish_alert(reading(i, value))
+        broker.publish_alert('{"motorId": "MTR-001", "timestamp": "2025-07-17T10:00:03Z"}')
+        broker.publish_alert(reading(4, 4.0, motor_id="MTR-002", running=True))
+        broker.publish_alert(reading(70, 6.0))
+        broker.process_data_events(time_limit=0)
+        assert broker.acked_count == 5 and len(broker.dead_lettered) == 1
+        assert metrics.READINGS_FAILED.value == failed + 1
+        assert buckets('motor_readings_1m') == [
+            ('MTR-001', 'vibration', minute.isoformat(), 3, 1.0, 3.0, 2.0, 3.0),
+            ('MTR-002', 'vibration', minute.isoformat(), 1, 4.0, 4.0, 4.0, 4.0),
+            ('MTR-001', 'vibration', (minute + timedelta(minutes=1)).isoformat(), 1, 6.0, 6.0, 6.0, 6.0),
+        ]
+        assert store.connection.execute(
+            "SELECT COUNT(*) FROM motor_readings_1m WHERE sensor_type = 'running';").fetchone()[0] == 0
+        
+        # A failed write acks nothing; the next one writes the merged buckets once
+        store.failures = 1
+        broker.publish_alert(reading(10, 0.5))
+        broker.publish_alert(reading(75, 8.0))
+        broker.process_data_events(time_limit=0)
+        assert not processor.flush()
+        assert broker.acked_count == 5 and processor.unacked == 2
+        broker.publish_alert(reading(80, 7.0))
+        broker.process_data_events(time_limit=0)
+        assert processor.flush()
+        assert broker.is_drained() and broker.acked_count == 8
+        assert buckets('motor_readings_1m')[0][3:6] == (4, 0.5, 3.0)
+        assert buckets('motor_readings_1m')[2][3:] == (3, 6.0, 8.0, 7.0, 7.0)
+        assert buckets('motor_readings_1h') == [
+            ('MTR-001', 'vibration', minute.isoformat(), 7, 0.5, 8.0, 27.5 / 7, 7.0),
+            ('MTR-002', 'vibration', minute.isoformat(), 1, 4.0, 4.0, 4.0, 4.0),
+        ]
+        
+        # PostgreSQL merges partial buckets (from another flush or consumer) the same way
+        if not db_manager.connect():
+            logger.error("Failed to connect to database")
+            return False
+        with db_manager.connection.cursor() as cursor:
+            cursor.execute(f"CREATE SCHEMA {schema};")
+            cursor.execute(f"SET search_path TO {schema};")
+        assert db_manager.create_tables()
+        first = ReadingAggregator()
+        second = ReadingAggregator()
+        for seconds, value in ((1, 2.0), (30, 1.0)):
+            first.add('MTR-001', 'vibration', start + seconds, value)
+        for seconds, value in ((20, 4.0), (3700, 3.0)):
+            second.add('MTR-001', 'vibration', start + seconds, value)
+        assert db_manager.save_reading_buckets(first.close_buckets()) == 2
+        assert db_manager.save_reading_buckets(second.close_buckets()) == 4
+        with db_manager.connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT bucket, reading_count, min_value, max_value, avg_value, last_value, last_at
+                FROM motor_readings_1m ORDER BY bucket;
+            """)
+            assert cursor.fetchall() == [
+                (minute, 3, 1.0, 4.0, 7.0 / 3, 1.0, minute + timedelta(seconds=30)),
+                (minute + timedelta(minutes=61), 1, 3.0, 3.0, 3.0, 3.0, minute + timedelta(seconds=3700)),
+            ]
+            cursor.execute("SELECT bucket, reading_count FROM motor_readings_1h ORDER BY bucket;")
+            assert cursor.fetchall() == [(minute, 3), (minute + timedelta(hours=1), 1)]
+        
+        logger.info("Raw reading aggregates test completed successfully")
+        return True
+    except Exception as e:
+        logger.error(f"Raw reading aggregates test failed: {e!r}")
+        return False
+    finally:
+        broker.disconnect()
+        store.disconnect()
+        if db_manager.connection is not None:
+            with db_manager.connection.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE;")
+        db_manager.disconnect()
+
+def test_spill_replay():
+    """Test that alerts are spilled to disk while the store is down and replayed in order"""
+    logger.info("Testing spill and replay...")
+    
+    import os
+    import sqlite3
+    import tempfile
+    import time
+    from alert_processor import AlertProcessor
+    from backends import InMemoryBroker, SQLiteAlertStore
+    from spill import START, SpillLog
+    
+    class FlakyStore(SQLiteAlertStore):
+        down = False
+        
+        def _check(self):
+            if self.down:
+                raise sqlite3.OperationalError("database is restarting")
+        
+        def insert_alert(self, *args, **kwargs):
+            self._check()
+            return super().insert_alert(*args, **kwargs)
+        
+        def insert_alerts(self, alerts):
+            self._check()
+            return super().insert_alerts(alerts)
+        
+        def insert_spilled_alerts(self, alerts, spill_id, position):
+            self._check()
+            return super().insert_spilled_alerts(alerts, spill_id, position)
+        
+        def health_check(self):
+            return not self.down and super().health_check()
+    
+    def publish(broker, start, count):
+        for i in range(start, start + count):
+            broker.publish_alert(json.dumps({
+                "motorId": f"MTR-0{i % 3}",
+                "timestamp": (datetime(2025, 7, 17, 10, 0) + timedelta(seconds=i)).isoformat() + "Z",
+                "sensorType": "vibration",
+                "value": 2.6 + i / 100,
+                "alertType": "high_vibration"
+            }))
+    
+    results = []
+    
+    # A record torn by a crash ends its segment; the valid records before it are kept
+    with tempfile.TemporaryDirectory() as spill_dir:
+        try:
+            log = SpillLog(spill_dir, 1024)
+            log.open()
+            for i in range(3):
+                log.append({'motor_id': 'MTR-01', 'sensor_type': 'vibration', 'value': 3.0,
+                            'timestamp': datetime(2025, 7, 17, 10, 0, i), 'alert_type': 'high_vibration'})
+            log.close()
+            segment = os.path.join(spill_dir, sorted(os.listdir(spill_dir))[0])
+            with open(segment, 'ab') as segment_file:
+                segment_file.write(b'\x10\x00\x00\x00torn')
+            
+            reopened = SpillLog(spill_dir, 1024)
+            reopened.open()
+            alerts, position = reopened.read(START, 10)
+            assert [alert['timestamp'].second for alert in alerts] == [0, 1, 2]
+            assert position == reopened.end()
+            reopened.close()
+            results.append(True)
+        except Exception as e:
+            logger.error(f"Spill log test failed: {e!r}")
+            results.append(False)
+    
+    for batch_size, worker_count in [(1, 1), (4, 1), (4, 3)]:
+        with tempfile.TemporaryDirectory() as spill_dir:
+            config = Config()
+            config.BATCH_SIZE = batch_size
+            config.WORKER_COUNT = worker_count
+            config.SPILL_DIR = spill_dir
+            config.SPILL_FSYNC_BATCH = 8
+            config.SPILL_REPLAY_BATCH = 7
+            config.RETRY_DELAY = 0.02
+            
+            broker = InMemoryBroker(config)
+            store = FlakyStore(config)
+            processor = AlertProcessor(config, broker=broker, store=store)
+            
+            try:
+                assert processor.startup()
+                
+                publish(broker, 0, 10)
+                assert broker.drain(timeout=5)
+                
+                # Outage: alerts are acked into the spill log instead of being dropped
+                store.down = True
+                publish(broker, 10, 20)
+                assert broker.drain(timeout=5)
+                assert processor.spill.active
+                assert broker.acked_count == 30 and not broker.dead_lettered
+                
+                # Recovery: the replayer loads the backlog, later alerts queue behind it
+                store.down = False
+                publish(broker, 30, 5)
+                deadline = time.monotonic() + 5
+                while processor.spill.active or not broker.is_drained():
+                    assert time.monotonic() < deadline
+                    broker.process_data_events(time_limit=0.01)
+                processor.settle_pending()
+                
+                rows = store.connection.execute(
+                    "SELECT motor_id, timestamp FROM motor_alerts ORDER BY id"
+                ).fetchall()
+                assert len(rows) == 35 and len(set(rows)) == 35
+                for motor in ('MTR-00', 'MTR-01', 'MTR-02'):
+                    timestamps = [timestamp for motor_id, timestamp in rows if motor_id == motor]
+                    assert timestamps == sorted(timestamps), motor
+                assert len(broker.published[config.MOTOR_NOTIFICATIONS_EXCHANGE]) == 35
+                
+                # A restart finds the log fully replayed and loads nothing twice
+                restarted = AlertProcessor(config, broker=InMemoryBroker(config), store=store)
+                restarted.open_spill()
+                assert not restarted.spill.active
+                restarted.spill.close()
+                
+                results.append(True)
+            
+            except Exception as e:
+                logger.error(f"Spill replay test failed (batch_size={batch_size}, "
+                             f"workers={worker_count}): {e!r}")
+                results.append(False)
+            
+            finally:
+                processor.disconnect_rabbitmq()
+                store.disconnect()
+    
+    if all(results):
+        logger.info("Spill and replay test completed successfully")
+    return all(results)
+
+def test_codec_compatibility():
+    """Test that the fast codec matches the stdlib json behaviour byte for byte"""
+    logger.info("Testing codec compatibility...")
+    
+    import codec
+    from alert_processor import build_notification, parse_alert_message
+    
+    def reference_parse(body):
+        alert_data = json.loads(body.decode('utf-8'))
+        for field in ['motorId', 'timestamp', 'sensorType', 'value', 'alertType']:
+            if field not in alert_data:
+                raise ValueError(f"Missing required field: {field}")
+        return {
+            'motor_id': alert_data['motorId'],
+            'sensor_type': alert_data['sensorType'],
+            'timestamp': datetime.fromisoformat(alert_data['timestamp'].replace('Z', '+00:00')),
+            'value': float(alert_data['value']),
+            'alert_type': alert_data['alertType']
+        }
+    
+    base = {
+        "motorId": "MTR-01",
+        "timestamp": "2025-07-17T10:15:00Z",
+        "sensorType": "vibration",
+        "value": 3.2,
+        "alertType": "high_vibration"
+    }
+    bodies = [
+        json.dumps(base),
+        json.dumps({**base, "motorId": "Motör \"7\"", "value": 1e-7}),
+        json.dumps({**base, "timestamp": "2025-07-17T10:15:00.123+02:00", "value": 85}),
+        json.dumps({**base, "motorId": 42, "value": "3.5"}),
+        json.dumps({**base, "value": float('nan')}),
+        json.dumps({**base, "value": 10 ** 30}),
+        json.dumps({k: v for k, v in base.items() if k != 'value'}),
+        json.dumps({**base, "timestamp": "not a time"}),
+        json.dumps({**base, "timestamp": 1752747300}),
+        json.dumps(["motorId"]),
+        '"motorId timestamp sensorType value alertType"',
+        '{not json',
+        '',
+    ]
+    
+    try:
+        for body in bodies:
+            body = body.encode('utf-8')
+            try:
+                expected = ('ok', reference_parse(body))
+            except Exception as e:
+                expected = ('error', type(e), str(e))
+            try:
+                actual = ('ok', parse_alert_message(body))
+            except Exception as e:
+                actual = ('error', type(e), str(e))
+            assert repr(actual) == repr(expected), f"{body!r}: {actual} != {expected}"
+            
+            if actual[0] == 'ok':
+                notification = build_notification(actual[1], 123)
+                assert codec.encode_notification(notification) == json.dumps(notification).encode('utf-8')
+        
+        logger.info("Codec compatibility test completed successfully")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Codec compatibility test failed: {e}")
+        return False
+
+def test_notification_publisher():
+    """Test notification envelopes and retry of failed publishes"""
+    logger.info("Testing notification publisher...")
+    
+    from pika.exceptions import UnroutableError
+    from backends import InMemoryBroker
+    from notifier import NotificationPublisher
+    
+    config = Config()
+    config.NOTIFICATION_BATCH_SIZE = 3
+    config.NOTIFICATION_RETRY_LIMIT = 4
+    config.NOTIFICATION_RETRY_PER_FLUSH = 3
+    
+    broker = InMemoryBroker(config)
+    broker.connect()
+    now = [0.0]
+    publisher = NotificationPublisher(config, clock=lambda: now[0])
+    publisher.attach(broker.connection, broker.channel)
+    published = broker.published[config.MOTOR_NOTIFICATIONS_EXCHANGE]
+    
+    def notification(alert_id):
+        return {
+            'alertId': alert_id, 'motorId': 'MTR-01', 'sensorType': 'vibration',
+            'timestamp': '2025-07-17T10:15:00+00:00', 'value': 3.2,
+            'alertType': 'high_vibration', 'processedAt': '2025-07-17T10:15:01'
+        }
+    
+    def sent_ids(bodies):
+        return [n['alertId'] for body in bodies for n in json.loads(body)]
+    
+    try:
+        # Full envelopes go out immediately, partial ones on the flush timer
+        for alert_id in range(1, 5):
+            publisher.publish(notification(alert_id))
+        assert [len(json.loads(body)) for body in published] == [3]
+        broker.drain()
+        assert [len(json.loads(body)) for body in published] == [3, 1]
+        assert json.loads(published[0])[0] == notification(1)
+        
+        # Failed envelopes are kept; overflow beyond the limit is counted
+        real_publish = broker.channel.basic_publish
+        def failing_publish(**kwargs):
+            raise ConnectionError("channel closed")
+        broker.channel.basic_publish = failing_publish
+        for alert_id in range(5, 11):
+            publisher.publish(notification(alert_id))
+        assert publisher.stats()['dropped'] == 2
+        assert publisher.stats()['awaiting_retry'] == 4
+        
+        # They are resent after a backoff, at most NOTIFICATION_RETRY_PER_FLUSH per flush
+        broker.channel.basic_publish = real_publish
+        publisher.flush()
+        assert len(published) == 2
+        now[0] += publisher.retry_backoff
+        publisher.flush()
+        assert sent_ids(published[2:]) == [7, 8, 9]
+        publisher.flush()
+        assert sent_ids(published[2:]) == [7, 8, 9, 10]
+        assert publisher.stats()['awaiting_retry'] == 0 and publisher.retry_backoff == 0
+        
+        # Nothing is retried past the backoff; each failed flush doubles it
+        broker.channel.basic_publish = failing_publish
+        publisher.publish(notification(11))
+        publisher.flush()
+        first_backoff = publisher.retry_backoff
+        now[0] += first_backoff
+        publisher.flush()
+        assert publisher.retry_backoff == 2 * first_backoff
+        assert publisher.stats()['awaiting_retry'] == 1
+        broker.channel.basic_publish = real_publish
+        publisher.flush(final=True)
+        assert sent_ids(published[-1:]) == [11]
+        
+        # With confirms, envelopes are mandatory; those returned unroutable
+        # (no dashboard is listening) are counted and dropped, not retried
+        config.PUBLISHER_CONFIRMS = True
+        publisher = NotificationPublisher(config)
+        publisher.attach(broker.connection, broker.channel)
+        def unroutable_publish(**kwargs):
+            assert kwargs['mandatory']
+            raise UnroutableError([])
+        broker.channel.basic_publish = unroutable_publish
+        for alert_id in range(12, 15):
+            publisher.publish(notification(alert_id))
+        stats = publisher.stats()
+        assert stats['unroutable'] == 3 and stats['failed'] == 0 and stats['awaiting_retry'] == 0
+        
+        logger.info("Notification publisher test completed successfully")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Notification publisher test failed: {e!r}")
+        return False
+
+def test_recent_alert_cache():
+    """Test that cached recent alerts match the store, including after eviction"""
+    logger.info("Testing recent-alert cache...")
+    
+    from alert_processor import AlertProcessor
+    from backends import InMemoryBroker, SQLiteAlertStore
+    
+    config = Config()
+    config.RECENT_CACHE_SIZE = 3
+    config.RECENT_CACHE_MAX_MOTORS = 2
+    
+    store = SQLiteAlertStore(config)
+    store.connect()
+    store.create_tables()
+    # History from before startup, picked up when the cache warms
+    store.insert_alert('MTR-00', 'vibration', datetime(2025, 7, 16, 9, 0), 2.9, 'high_vibration')
+    
+    broker = InMemoryBroker(config)
+    processor = AlertProcessor(config, broker=broker, store=store)
+    
+    try:
+        assert processor.startup()
+        assert processor.recent_cache.stats()['motors'] == 1
+        
+        # Arrivals out of timestamp order, across three motors (one more than the cap)
+        for minute in [5, 1, 9, 3, 7, 2, 8]:
+            for motor in ['MTR-00', 'MTR-01', 'MTR-02']:
+                broker.publish_alert(json.dumps({
+                    "motorId": motor,
+                    "timestamp": f"2025-07-17T10:{minute:02d}:00Z",
+                    "sensorType": "temperature",
+                    "value": 80 + minute,
+                    "alertType": "high_temperature"
+                }))
+        assert broker.drain(timeout=5)
+        
+        for motor in ['MTR-01', 'MTR-02', 'MTR-00', 'MTR-09']:
+            for limit in [1, 3, 5]:
+                cached = processor.get_recent_alerts(motor, limit)
+                expected = store.get_recent_alerts(motor, limit)
+                assert [a['id'] for a in cached] == [a['id'] for a in expected], (motor, limit)
+        
+        stats = processor.recent_cache.stats()
+        assert stats['hits'] > 0 and stats['misses'] > 0 and stats['evictions'] > 0
+        
+        logger.info("Recent-alert cache test completed successfully")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Recent-alert cache test failed: {e!r}")
+        return False
+    
+    finally:
+        processor.disconnect_rabbitmq()
+        store.disconnect()
+
+def test_alert_coalescing():
+    """Test that alert storms are folded into episodes instead of rows and notifications"""
+    logger.info("Testing alert coalescing...")
+    
+    import sqlite3
+    from alert_processor import AlertProcessor
+    from backends import InMemoryBroker, SQLiteAlertStore
+    from coalescer import AlertCoalescer
+    
+    def alert(motor_id, second, value=3.0):
+        return {
+            'motor_id': motor_id, 'sensor_type': 'vibration', 'alert_type': 'high_vibration',
+            'timestamp': datetime(2025, 7, 17, 10, 15) + timedelta(seconds=second), 'value': value
+        }
+    
+    results = []
+    try:
+        # Bounded state: opening a third episode closes the least recently active one
+        coalescer = AlertCoalescer(10, 2, clock=lambda: 0.0)
+        assert not coalescer.fold(alert('MTR-00', 0))
+        assert not coalescer.fold(alert('MTR-01', 0))
+        assert coalescer.fold(alert('MTR-00', 1))
+        assert not coalescer.fold(alert('MTR-02', 0))
+        assert list(coalescer.episodes) == [('MTR-00', 'vibration', 'high_vibration'),
+                                            ('MTR-02', 'vibration', 'high_vibration')]
+        # A reading past the window starts a new episode
+        assert not coalescer.fold(alert('MTR-00', 30))
+        assert [episode.count for episode in coalescer.closed] == [1, 2]
+        
+        # Folded alerts are handed back to be acked once their episode is
+        # written, or to be retried, and counted again, if the write fails
+        coalescer = AlertCoalescer(10, 10, clock=lambda: 0.0)
+        assert not coalescer.fold(alert('MTR-00', 0), 1)
+        assert coalescer.fold(alert('MTR-00', 1), 2) and coalescer.fold(alert('MTR-00', 2), 3)
+        episodes = coalescer.take_updates()
+        assert coalescer.fold(alert('MTR-00', 3), 4)
+        assert coalescer.requeue(episodes) == [2, 3] and episodes[0].count == 2
+        episodes = coalescer.take_updates()
+        assert coalescer.written(episodes) == [4] and coalescer.unacked == 0
+        
+        # Acks whose channel closed are dropped with their alerts, which are
+        # redelivered; a written episode they were counted in is written again
+        assert coalescer.fold(alert('MTR-00', 4), 5) and coalescer.fold(alert('MTR-00', 5), 6)
+        episodes = coalescer.take_updates()
+        episodes[0].episode_id = 1
+        assert coalescer.fold(alert('MTR-00', 6), 7)
+        assert coalescer.drop_acks(lambda ack: ack != 6, episodes) == 2
+        assert coalescer.written(episodes) == [6] and coalescer.unacked == 0
+        assert [episode.count for episode in coalescer.take_updates()] == [3]
+        results.append(True)
+    except Exception as e:
+        logger.error(f"Alert coalescing test failed (coalescer): {e!r}")
+        results.append(False)
+    
+    for batch_size, worker_count in [(1, 1), (4, 1), (4, 3)]:
+        config = Config()
+        config.BATCH_SIZE = batch_size
+        config.WORKER_COUNT = worker_count
+        config.COALESCE_WINDOW_S = 0.5
+        config.COALESCE_FLUSH_MS = 100
+        
+        broker = InMemoryBroker(config)
+        store = SQLiteAlertStore(config)
+        processor = AlertProcessor(config, broker=broker, store=store)
+        
+        try:
+            assert processor.startup()
+            
+            # A motor stuck over threshold: a reading every 100 ms
+            for i in range(50):
+                broker.publish_alert(json.dumps({
+                    "motorId": "MTR-STUCK",
+                    "timestamp": f"2025-07-17T10:15:{i // 10:02d}.{i % 10}00000Z",
+                    "sensorType": "vibration",
+                    "value": 2.6 + (i % 7) / 10,
+                    "alertType": "high_vibration"
+                }))
+            for motor in ['MTR-01', 'MTR-02', 'MTR-03']:
+                broker.publish_alert(json.dumps({
+                    "motorId": motor,
+                    "timestamp": "2025-07-17T10:15:00Z",
+                    "sensorType": "temperature",
+                    "value": 85.0,
+                    "alertType": "high_temperature"
+                }))
+            broker.publish_alert('{"motorId": "MTR-01"}')
+            
+            # Draining waits for the storm's episode to go quiet and close
+            assert broker.drain(timeout=5)
+            processor.settle_pending()
+            
+            assert broker.acked_count == 54
+            assert len(broker.dead_lettered) == 1
+            assert len(store.get_recent_alerts('MTR-STUCK', 100)) == 1
+            
+            notifications = [json.loads(body) for body in broker.published[config.MOTOR_NOTIFICATIONS_EXCHANGE]]
+            episodes = [n for n in notifications if 'episodeId' in n]
+            assert len(notifications) == 5 and len(episodes) == 1
+            assert episodes[0]['count'] == 50 and episodes[0]['maxValue'] == 3.2
+            
+            rows = [tuple(row) for row in store.connection.execute("""
+                SELECT alert_id, alert_count, max_value, closed FROM motor_alert_episodes;
+            """)]
+            assert rows == [(store.get_recent_alerts('MTR-STUCK', 1)[0]['id'], 50, 3.2, 1)], rows
+            
+            results.append(True)
+            
+        except Exception as e:
+            logger.error(f"Alert coalescing test failed (batch_size={batch_size}, "
+                         f"workers={worker_count}): {e!r}")
+            results.append(False)
+        
+        finally:
+            processor.disconnect_rabbitmq()
+            store.disconnect()
+    
+    # The first episode write fails: the repeats folded into it are retried, not acked
+    config = Config()
+    config.COALESCE_WINDOW_S = 0.5
+    config.COALESCE_FLUSH_MS = 100
+    config.RETRY_DELAY = 0.1
+    
+    broker = InMemoryBroker(config)
+    store = SQLiteAlertStore(config)
+    processor = AlertProcessor(config, broker=broker, store=store)
+    save_episodes = store.save_episodes
+    failures = []
+    
+    def save_episodes_once(episodes):
+        if not failures:
+            failures.append(sum(episode.count for episode in episodes))
+            raise sqlite3.OperationalError("database is locked")
+        return save_episodes(episodes)
+    
+    store.save_episodes = save_episodes_once
+    try:
+        assert processor.startup()
+        for i in range(20):
+            broker.publish_alert(json.dumps({
+                "motorId": "MTR-STUCK",
+                "timestamp": f"2025-07-17T10:15:00.{i:02d}0000Z",
+                "sensorType": "vibration",
+                "value": 2.6,
+                "alertType": "high_vibration"
+            }))
+        
+        assert broker.drain(timeout=5)
+        processor.settle_pending()
+        
+        assert failures and failures[0] > 1
+        assert not broker.dead_lettered and not broker.unacked
+        assert [tuple(row) for row in store.connection.execute(
+            "SELECT alert_count FROM motor_alert_episodes;"
+        )] == [(20,)]
+        results.append(True)
+    except Exception as e:
+        logger.error(f"Alert coalescing test failed (failed episode write): {e!r}")
+        results.append(False)
+    finally:
+        processor.disconnect_rabbitmq()
+        store.disconnect()
+    
+    # The channel closes before the episode is written: its repeats are
+    # redelivered, so the episode leaves them out rather than counting them twice
+    config = Config()
+    config.PREFETCH_COUNT = 100
+    config.COALESCE_WINDOW_S = 0.5
+    config.COALESCE_FLUSH_MS = 60000
+    
+    broker = InMemoryBroker(config)
+    store = SQLiteAlertStore(config)
+    processor = AlertProcessor(config, broker=broker, store=store)
+    try:
+        assert processor.startup()
+        for i in range(20):
+            broker.publish_alert(json.dumps({
+                "motorId": "MTR-STUCK",
+                "timestamp": f"2025-07-17T10:15:00.{i:02d}0000Z",
+                "sensorType": "vibration",
+                "value": 2.6,
+                "alertType": "high_vibration"
+            }))
+        processor.connection.process_data_events(time_limit=0.5)
+        assert processor.coalescer.unacked == 19
+        broker.connection.close()
+        processor.settle_pending()
+        assert not list(store.connection.execute("SELECT alert_count FROM motor_alert_episodes;"))
+        
+        config.COALESCE_FLUSH_MS = 100
+        redelivered = InMemoryBroker(config)
+        for body, _, _ in broker.ready:
+            redelivered.publish_alert(body)
+        processor = AlertProcessor(config, broker=redelivered, store=store)
+        assert processor.startup()
+        assert redelivered.drain(timeout=5)
+        processor.settle_pending()
+        
+        # The first alert and the first redelivered one are rows; the other 18 fold into an episode
+        assert len(store.get_recent_alerts('MTR-STUCK', 100)) == 2
+        assert [tuple(row) for row in store.connection.execute(
+            "SELECT alert_count FROM motor_alert_episodes;"
+        )] == [(19,)]
+        results.append(True)
+    except Exception as e:
+        logger.error(f"Alert coalescing test failed (channel closed before the write): {e!r}")
+        results.append(False)
+    finally:
+        processor.disconnect_rabbitmq()
+        store.disconnect()
+    
+    if all(results):
+        logger.info("Alert coalescing test completed successfully")
+    return all(results)
+
+def test_partition_planning():
+    """Test which partitions maintenance creates and expires"""
+    logger.info("Testing partition planning...")
+    
+    from datetime import date
+    import partitions
+    
+    try:
+        # Daily partitions: today plus two ahead, skipping ones that already exist
+        plan = partitions.plan_maintenance(
+            ['motor_alerts_default', 'motor_alerts_p20250717'], date(2025, 7, 17), 'day', 2, 0, 'detach'
+        )
+        assert plan.created == ['motor_alerts_p20250718', 'motor_alerts_p20250719'], plan.created
+        assert plan.expired == []
+        assert any("FOR VALUES FROM ('2025-07-18 00:00:00+00') TO ('2025-07-19 00:00:00+00')" in statement
+                   for statement in plan.statements)
+        
+        # Monthly partitions across a year boundary; a month overlapping an
+        # existing daily partition is left alone
+        plan = partitions.plan_maintenance(
+            ['motor_alerts_p20260115'], date(2025, 12, 31), 'month', 2, 0, 'detach'
+        )
+        assert plan.created == ['motor_alerts_p202512', 'motor_alerts_p202602'], plan.created
+        
+        # Retention: partitions ending on or before the cutoff expire
+        existing = ['motor_alerts_p20250601', 'motor_alerts_p20250602', 'motor_alerts_p202505',
+                    'motor_alerts_p20250717', 'motor_alerts_default']
+        plan = partitions.plan_maintenance(existing, date(2025, 7, 17), 'day', 0, 45, 'drop')
+        assert plan.expired == ['motor_alerts_p20250601', 'motor_alerts_p202505'], plan.expired
+        assert "DROP TABLE motor_alerts_p202505;" in plan.statements
+        assert not any('motor_alerts_default;' in statement for statement in plan.statements)
+        
+        logger.info("Partition planning test completed successfully")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Partition planning test failed: {e!r}")
+        return False
+
+def _flaky_shard(engine, shard, counters):
+    """Shard entry point for test_supervisor: crashes on its first start, then
+    counts alerts until SIGTERM and records that it stopped cleanly"""
+    import os
+    import signal
+    import sys
+    import time
+    
+    state_dir = os.environ['SUPERVISOR_TEST_DIR']
+    started = os.path.join(state_dir, f"started-{shard}")
+    if not os.path.exists(started):
+        open(started, 'w').close()
+        sys.exit(3)
+    
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    while not stopping:
+        counters[shard] += 10
+        time.sleep(0.01)
+    open(os.path.join(state_dir, f"stopped-{shard}"), 'w').close()
+    sys.exit(0)
+
+def test_supervisor():
+    """Test shard routing config and that the supervisor restarts and stops shard processes"""
+    logger.info("Testing supervisor...")
+    
+    import os
+    import tempfile
+    import threading
+    import time
+    from types import SimpleNamespace
+    from pika.exceptions import ChannelClosedByBroker
+    import retry
+    from backends import retire_sharding, retire_shard_queues
+    from supervisor import Supervisor, shard_config
+    
+    class LocalSupervisor(Supervisor):
+        # No RabbitMQ here; the shard processes don't use it either
+        def setup_topology(self):
+            return True
+    
+    class TopologyChannel:
+        # The broker state retire_sharding reads and changes: queues with the routing keys of
+        # their messages, consumer counts and bindings. SHARD_EXCHANGE routes by key length
+        def __init__(self, broker):
+            self.broker = broker
+            self.is_open = True
+        
+        def _missing(self, name):
+            self.is_open = False
+            raise ChannelClosedByBroker(404, f"NOT_FOUND - no {name}")
+        
+        def confirm_delivery(self):
+            pass
+        
+        def exchange_declare(self, exchange, passive):
+            if exchange not in self.broker.exchanges:
+                self._missing(exchange)
+        
+        def exchange_unbind(self, destination, source):
+            self.broker.bindings.discard((source, destination))
+        
+        def queue_declare(self, queue, passive=False, durable=False):
+            if queue not in self.broker.queues:
+                if passive:
+                    self._missing(queue)
+                self.broker.queues[queue] = []
+            return SimpleNamespace(method=SimpleNamespace(message_count=len(self.broker.queues[queue]),
+                                                          consumer_count=self.broker.consumers.get(queue, 0)))
+        
+        def queue_bind(self, exchange, queue):
+            self.broker.bindings.add((exchange, queue))
+        
+        def queue_unbind(self, queue, exchange, routing_key):
+            self.broker.bindings.discard((exchange, queue))
+        
+        def queue_delete(self, queue):
+            del self.broker.queues[queue]
+        
+        def basic_get(self, queue, auto_ack):
+            if not self.broker.queues[queue]:
+                return None, None, None
+            routing_key = self.broker.queues[queue].pop(0)
+            return SimpleNamespace(routing_key=routing_key, delivery_tag=1), None, routing_key.encode()
+        
+        def basic_publish(self, exchange, routing_key, body, properties, mandatory):
+            if exchange == config.SHARD_EXCHANGE:
+                bound = sorted(queue for source, queue in self.broker.bindings if source == exchange)
+                routing_key, queue = body.decode(), bound[len(routing_key) % len(bound)]
+            else:
+                routing_key, queue = body.decode(), routing_key
+            self.broker.queues[queue].append(routing_key)
+        
+        def basic_ack(self, delivery_tag):
+            pass
+        
+        def close(self):
+            self.is_open = False
+    
+    try:
+        config = shard_config(2)
+        assert config.SHARD == 2
+        assert config.MOTOR_ALERTS_QUEUE == f"{Config.MOTOR_ALERTS_QUEUE}.shard-2"
+        assert Config.SHARD is None
+        
+        # A run with 4 shards left shard-3 holding alerts, two of them waiting for a retry;
+        # 2 shards retire shard-2 and shard-3 and move their alerts onto the shards left
+        config = Config()
+        shards = [f"{config.MOTOR_ALERTS_QUEUE}.shard-{shard}" for shard in range(4)]
+        delayed = retry.retry_queue(config, 1, shards[3])
+        broker = SimpleNamespace(
+            exchanges={config.SHARD_EXCHANGE},
+            queues={shards[0]: [], shards[1]: [], shards[2]: [],
+                    shards[3]: ['MTR-1', 'MTR-22', 'MTR-1'], delayed: [delayed, delayed]},
+            consumers={shards[0]: 1, shards[1]: 1},
+            bindings={(config.MOTOR_ALERTS_EXCHANGE, config.SHARD_EXCHANGE)} |
+                     {(config.SHARD_EXCHANGE, queue) for queue in shards}
+        )
+        connection = SimpleNamespace(channel=lambda: TopologyChannel(broker))
+        retire_shard_queues(connection, config, first=2)
+        assert set(broker.queues) == {shards[0], shards[1]}
+        assert sorted(broker.queues[shards[0]] + broker.queues[shards[1]]) == \
+            sorted(['MTR-1', 'MTR-22', 'MTR-1', delayed, delayed])
+        # Per-motor routing is kept
+        assert broker.queues[shards[1]].count('MTR-1') in (0, 2)
+        assert broker.bindings == {(config.MOTOR_ALERTS_EXCHANGE, config.SHARD_EXCHANGE),
+                                   (config.SHARD_EXCHANGE, shards[0]), (config.SHARD_EXCHANGE, shards[1])}
+        
+        # A single processor may not retire sharding while shard processes consume
+        assert not retire_sharding(connection, config)
+        assert (config.MOTOR_ALERTS_EXCHANGE, config.SHARD_EXCHANGE) in broker.bindings
+        assert shards[0] in broker.queues
+        
+        # Once they are stopped, it moves everything to the unsharded queue, bound in their place
+        broker.consumers.clear()
+        assert retire_sharding(connection, config)
+        assert list(broker.queues) == [config.MOTOR_ALERTS_QUEUE]
+        assert len(broker.queues[config.MOTOR_ALERTS_QUEUE]) == 5
+        assert broker.bindings == {(config.MOTOR_ALERTS_EXCHANGE, config.MOTOR_ALERTS_QUEUE)}
+        
+        # A shard queue that is consumed is left alone
+        broker.queues[shards[0]] = ['MTR-1']
+        broker.consumers[shards[0]] = 1
+        retire_shard_queues(connection, config)
+        assert broker.queues[shards[0]] == ['MTR-1']
+        
+        # Nothing to do if the processor never ran sharded
+        broker = SimpleNamespace(exchanges=set(), queues={}, consumers={}, bindings=set())
+        assert retire_sharding(connection, config)
+        
+        with tempfile.TemporaryDirectory() as state_dir:
+            os.environ['SUPERVISOR_TEST_DIR'] = state_dir
+            config = Config()
+            config.RETRY_DELAY = 0.1
+            config.SUPERVISOR_REPORT_S = 0.2
+            config.SHUTDOWN_TIMEOUT_S = 10
+            supervisor = LocalSupervisor(config, 'blocking', 2, target=_flaky_shard)
+            
+            def stop_when_recovered():
+                deadline = time.monotonic() + 30
+                while time.monotonic() < deadline:
+                    if supervisor.restarts == [1, 1] and all(supervisor.counters):
+                        break
+                    time.sleep(0.05)
+                supervisor.stop()
+            
+            watcher = threading.Thread(target=stop_when_recovered)
+            watcher.start()
+            try:
+                assert supervisor.run()
+            finally:
+                watcher.join()
+                del os.environ['SUPERVISOR_TEST_DIR']
+            
+            # Each shard crashed once, was restarted, and then stopped on SIGTERM
+            assert supervisor.restarts == [1, 1]
+            assert all(supervisor.counters)
+            assert all(process.exitcode == 0 for process in supervisor.processes)
+            assert sorted(os.listdir(state_dir)) == ['started-0', 'started-1', 'stopped-0', 'stopped-1']
+        
+        logger.info("Supervisor test completed successfully")
+        return True
+    except Exception as e:
+        logger.error(f"Supervisor test failed: {e!r}")
+        return False
+
+def test_export():
+    """Test streaming export to CSV and JSONL, serial and split by time range"""
+    logger.info("Testing alert export...")
+    
+    import csv
+    import os
+    import tempfile
+    import uuid
+    from datetime import timezone
+    from export import export_alerts, part_path, time_slices
+    
+    config = Config()
+    db_manager = DatabaseManager(config)
+    
+    try:
+        start = datetime(2025, 7, 1, tzinfo=timezone.utc)
+        slices = time_slices(start, start + timedelta(hours=3), 3)
+        assert slices[0] == (start, start + timedelta(hours=1))
+        assert slices[-1][1] == start + timedelta(hours=3)
+        assert part_path('/tmp/alerts.csv', 2) == '/tmp/alerts.part-002.csv'
+        
+        if not db_manager.connect() or not db_manager.create_tables():
+            logger.error("Failed to connect to database")
+            return False
+        
+        motor_id = f"EXPORT-{uuid.uuid4().hex[:8]}"
+        db_manager.insert_alerts([
+            {'motor_id': motor_id, 'sensor_type': 'vibration', 'value': 2.5 + i / 10,
+             'timestamp': start + timedelta(minutes=7 * i), 'alert_type': 'high_vibration'}
+            for i in range(25)
+        ])
+        
+        with tempfile.TemporaryDirectory() as output_dir:
+            path = os.path.join(output_dir, 'alerts.csv')
+            assert export_alerts(config, path, 'csv', [motor_id], batch_size=4) == 25
+            with open(path, newline='') as csv_file:
+                rows = list(csv.DictReader(csv_file))
+            assert len(rows) == 25 and rows[3]['value'] == '2.8'
+            
+            # Batches smaller than the result exercise the server-side cursor
+            path = os.path.join(output_dir, 'alerts.jsonl')
+            end = start + timedelta(minutes=70)
+            assert export_alerts(config, path, 'jsonl', [motor_id], start, end, batch_size=4) == 10
+            with open(path) as jsonl_file:
+                alerts = [json.loads(line) for line in jsonl_file]
+            assert [alert['value'] for alert in alerts] == [2.5 + i / 10 for i in range(10)]
+            
+            # Parallel parts, concatenated, match the serial export
+            path = os.path.join(output_dir, 'parallel.csv')
+            assert export_alerts(config, path, 'csv', [motor_id], parallel=3, batch_size=4) == 25
+            lines = []
+            for index in range(3):
+                with open(part_path(path, index), newline='') as part_file:
+                    lines.extend(part_file.read().splitlines())
+            with open(os.path.join(output_dir, 'alerts.csv'), newline='') as csv_file:
+                assert lines == csv_file.read().splitlines()
+        
+        with db_manager.connection.cursor() as cursor:
+            cursor.execute("DELETE FROM motor_alerts WHERE motor_id = %s;", (motor_id,))
+            cursor.execute("DELETE FROM motor_alert_daily_counts WHERE motor_id = %s;", (motor_id,))
+        
+        logger.info("Export test completed successfully")
+        return True
+    except Exception as e:
+        logger.error(f"Export test failed: {e!r}")
+        return False
+    finally:
+        db_manager.disconnect()
+
+def test_backfill():
+    """Test the bulk backfill: chunking, validation, parallel COPY, resuming and the daily rollup"""
+    logger.info("Testing alert backfill...")
+    
+    import os
+    import tempfile
+    import uuid
+    from backfill import backfill_alerts, file_chunks, parse_chunk
+    
+    config = Config()
+    db_manager = DatabaseManager(config)
+    motor_id = f"BACKFILL-{uuid.uuid4().hex[:8]}"
+    
+    def message(i):
+        return json.dumps({
+            "motorId": motor_id,
+            "timestamp": (datetime(2025, 7, 1, 22) + timedelta(minutes=10 * i)).isoformat() + "Z",
+            "sensorType": "temperature",
+            "value": 80 + i,
+            "alertType": "high_temperature"
+        })
+    
+    try:
+        alerts, rejected, errors = parse_chunk(
+            f'{message(0)}\nnot json\n\n{{"motorId": "M"}}\n'.encode(), 'jsonl')
+        assert len(alerts) == 1 and alerts[0]['value'] == 80.0
+        assert rejected == 2 and errors[1] == "ValueError: Missing required field: timestamp"
+        
+        if not db_manager.connect() or not db_manager.create_tables():
+            logger.error("Failed to connect to database")
+            return False
+        
+        with tempfile.TemporaryDirectory() as input_dir:
+            path = os.path.join(input_dir, 'alerts.jsonl')
+            with open(path, 'w') as jsonl_file:
+                jsonl_file.write('\n'.join([message(i) for i in range(40)] + ['{"bad": 1}']) + '\n')
+            
+            # Chunks end at line boundaries and cover the whole file
+            chunks = file_chunks(path, 1000)
+            assert len(chunks) > 3 and chunks[0][0] == 0 and chunks[-1][1] == os.path.getsize(path)
+            assert all(end == start for (_, end), (start, _) in zip(chunks, chunks[1:]))
+            with open(path, 'rb') as jsonl_file:
+                data = jsonl_file.read()
+            assert all(data[end - 1:end] == b'\n' for _, end in chunks)
+            
+            assert backfill_alerts(config, db_manager, path, workers=2, chunk_bytes=1000, defer_indexes=True)
+            # A rerun finds every chunk loaded and adds nothing
+            assert backfill_alerts(config, db_manager, path, workers=2, chunk_bytes=1000)
+            assert db_manager.get_backfill_totals(os.path.abspath(path))[:2] == (40, 1)
+            
+            # CSV with the message fields as header, in any order, extra columns ignored
+            path = os.path.join(input_dir, 'alerts.csv')
+            with open(path, 'w') as csv_file:
+                csv_file.write("value,note,alertType,sensorType,motorId,timestamp\n")
+                for i in range(40, 45):
+                    timestamp = (datetime(2025, 7, 1, 22) + timedelta(minutes=10 * i)).isoformat()
+                    csv_file.write(f"{80 + i},x,high_temperature,temperature,{motor_id},{timestamp}Z\n")
+            assert backfill_alerts(config, db_manager, path, workers=1)
+        
+        with db_manager.connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT COUNT(*), MIN(value), MAX(value) FROM motor_alerts WHERE motor_id = %s;
+            """, (motor_id,))
+            assert cursor.fetchone() == (45, 80, 124)
+            # Alerts run from 22:00 on July 1st into July 2nd (UTC)
+            cursor.execute("""
+                SELECT SUM(count) FROM motor_alert_daily_counts WHERE motor_id = %s;
+            """, (motor_id,))
+            assert cursor.fetchone()[0] == 45
+            cursor.execute("""
+                SELECT COUNT(*) FROM pg_index WHERE indrelid = 'motor_alerts'::regclass AND indisvalid;
+            """)
+            # The primary key and the two history indexes, rebuilt after the deferred load
+            assert cursor.fetchone()[0] == 3
+            cursor.execute("DELETE FROM motor_alerts WHERE motor_id = %s;", (motor_id,))
+            cursor.execute("DELETE FROM motor_alert_daily_counts WHERE motor_id = %s;", (motor_id,))
+            cursor.execute("DELETE FROM motor_alert_backfill_chunks WHERE source LIKE %s;",
+                           (os.path.join(input_dir, '%'),))
+        
+        logger.info("Backfill test completed successfully")
+        return True
+    except Exception as e:
+        logger.error(f"Backfill test failed: {e!r}")
+        return False
+    finally:
+        db_manager.disconnect()
+
+def test_compact_schema():
+    """Test the compact layout: migration, reads through the view, key resolution and the guards"""
+    logger.info("Testing compact schema...")
+    
+    import uuid
+    
+    schema = f"compact_test_{uuid.uuid4().hex[:8]}"
+    text_db = DatabaseManager(Config())
+    compact_config = Config()
+    compact_config.COMPACT_SCHEMA = True
+    compact_db = DatabaseManager(compact_config)
+    timestamp = datetime(2025, 7, 1, 12, tzinfo=timezone.utc)
+    
+    try:
+        if not text_db.connect() or not compact_db.connect():
+            logger.error("Failed to connect to database")
+            return False
+        # Both layouts live in a scratch schema, so the real motor_alerts is untouched
+        with text_db.connection.cursor() as cursor:
+            cursor.execute(f"CREATE SCHEMA {schema};")
+        for db_manager in (text_db, compact_db):
+            with db_manager.connection.cursor() as cursor:
+                cursor.execute(f"SET search_path TO {schema};")
+        
+        assert text_db.create_tables()
+        text_db.insert_alerts([
+            {'motor_id': 'MTR-1', 'sensor_type': 'temperature', 'timestamp': timestamp + timedelta(minutes=i),
+             'value': 80.5 + i, 'alert_type': 'HIGH'}
+            for i in range(3)
+        ])
+        text_db.insert_alert('MTR-2', 'vibration', timestamp, 7.25, 'CRITICAL')
+        
+        # Each process refuses to start on the other layout
+        assert not compact_db.create_tables()
+        size_before, size_after = compact_db.migrate_to_compact()
+        assert size_before > 0 and size_after > 0
+        assert not text_db.create_tables()
+        assert compact_db.create_tables()
+        
+        # Readers see the same columns and values through the view
+        recent = compact_db.get_recent_alerts('MTR-1', 2)
+        assert [(row['motor_id'], row['sensor_type'], row['value'], row['alert_type']) for row in recent] == [
+            ('MTR-1', 'temperature', 82.5, 'HIGH'), ('MTR-1', 'temperature', 81.5, 'HIGH')]
+        assert [row['id'] for row in compact_db.get_alerts_after(0, 10, 'MTR-2')] == [4]
+        
+        # A new motor is resolved once, then served from the cache
+        alert_id = compact_db.insert_alert('MTR-3', 'temperature', timestamp, 90.0, 'HIGH')
+        assert alert_id == 5
+        lookups = compact_db.dimensions.lookups
+        compact_db.insert_alerts([
+            {'motor_id': 'MTR-3', 'sensor_type': 'temperature', 'timestamp': timestamp + timedelta(minutes=1),
+             'value': 91.0, 'alert_type': 'HIGH'}
+        ])
+        assert compact_db.dimensions.lookups == lookups
+        assert compact_db.dimensions.stats() == {'motors': 1, 'sensor_types': 1, 'alert_types': 1}
+        
+        summary = {row['motor_id']: row for row in compact_db.get_alert_summary()}
+        assert summary['MTR-1']['total_alerts'] == 3 and summary['MTR-1']['max_value'] == 82.5
+        assert summary['MTR-3']['total_alerts'] == 2 and summary['MTR-3']['last_id'] == 6
+        counts = {row['motor_id']: row['count'] for row in
+                  compact_db.get_daily_alert_counts(timestamp.date(), timestamp.date())}
+        assert counts == {'MTR-1': 3, 'MTR-2': 1, 'MTR-3': 2}
+        
+        logger.info("Compact schema test completed successfully")
+        return True
+    except Exception as e:
+        logger.error(f"Compact schema test failed: {e!r}")
+        return False
+    finally:
+        if text_db.connection is not None:
+            with text_db.connection.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE;")
+        text_db.disconnect()
+        compact_db.disconnect()
+
+def test_schema_version():
+    """Test the schema version check at startup and the prepared hot-path statements"""
+    logger.info("Testing schema version and prepared statements...")
+    
+    import uuid
+    
+    schema = f"version_test_{uuid.uuid4().hex[:8]}"
+    db_manager = DatabaseManager(Config())
+    unprepared_config = Config()
+    unprepared_config.PREPARED_STATEMENTS = False
+    unprepared_db = DatabaseManager(unprepared_config)
+    timestamp = datetime(2025, 7, 1, 12, tzinfo=timezone.utc)
+    
+    def index_exists(name):
+        with db_manager.connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (name,))
+            return cursor.fetchone()[0]
+    
+    def server_prepared(db):
+        with db.connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM pg_prepared_statements;")
+            return {row[0] for row in cursor.fetchall()}
+    
+    try:
+        if not db_manager.connect() or not unprepared_db.connect():
+            logger.error("Failed to connect to database")
+            return False
+        with db_manager.connection.cursor() as cursor:
+            cursor.execute(f"CREATE SCHEMA {schema};")
+        for db in (db_manager, unprepared_db):
+            with db.connection.cursor() as cursor:
+                cursor.execute(f"SET search_path TO {schema};")
+        
+        assert db_manager.applied_schema_version() is None
+        assert db_manager.create_tables()
+        assert db_manager.applied_schema_version() == db_manager.schema_version
+        
+        # With the version recorded, a restart runs no DDL at all
+        with db_manager.connection.cursor() as cursor:
+            cursor.execute("DROP INDEX idx_motor_alerts_by_time;")
+        assert db_manager.create_tables()
+        assert not index_exists('idx_motor_alerts_by_time')
+        
+        # A migration forgets the version, so the next start applies the schema again
+        with db_manager._transaction() as cursor:
+            db_manager.forget_schema_version(cursor)
+        assert db_manager.create_tables()
+        assert index_exists('idx_motor_alerts_by_time')
+        
+        # The hot paths are prepared once per connection and give the same results
+        alert_ids = [db_manager.insert_alert('MTR-1', 'temperature', timestamp + timedelta(minutes=i), 80.5 + i, 'HIGH')
+                     for i in range(3)]
+        assert alert_ids == [1, 2, 3]
+        recent = db_manager.get_recent_alerts('MTR-1', 2)
+        assert [row['id'] for row in recent] == [3, 2]
+        assert [row['id'] for row in db_manager.get_alerts_after(1, 10, 'MTR-1')] == [2, 3]
+        assert [row['id'] for row in db_manager.get_alerts_after(2, 10)] == [3]
+        names = {'insert_alert', 'get_recent_alerts', 'get_alerts_after', 'get_motor_alerts_after'}
+        assert db_manager.connection.prepared == names
+        assert server_prepared(db_manager) == names
+        
+        assert unprepared_db.insert_alert('MTR-1', 'temperature', timestamp, 79.0, 'HIGH') == 4
+        assert [row['id'] for row in unprepared_db.get_recent_alerts('MTR-1', 4)] == [3, 2, 1, 4]
+        assert server_prepared(unprepared_db) == set()
+        
+        # Statements deallocated behind its back are prepared again after one failed call
+        with db_manager.connection.cursor() as cursor:
+            cursor.execute("DEALLOCATE ALL;")
+        assert db_manager.get_recent_alerts('MTR-1', 2) == []
+        assert [row['id'] for row in db_manager.get_recent_alerts('MTR-1', 2)] == [3, 2]
+        
+        logger.info("Schema version test completed successfully")
+        return True
+    except Exception as e:
+        logger.error(f"Schema version test failed: {e!r}")
+        return False
+    finally:
+        if db_manager.connection is not None:
+            with db_manager.connection.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE;")
+        db_manager.disconnect()
+        unprepared_db.disconnect()
+
+def test_alert_history():
+    """Test keyset-paginated alert history on both layouts, its filters and the history indexes"""
+    logger.info("Testing alert history...")
+    
+    import uuid
+    from backends import SQLiteAlertStore, decode_history_cursor, encode_history_cursor
+    
+    schema = f"history_test_{uuid.uuid4().hex[:8]}"
+    compact_schema = f"history_compact_test_{uuid.uuid4().hex[:8]}"
+    text_db = DatabaseManager(Config())
+    compact_config = Config()
+    compact_config.COMPACT_SCHEMA = True
+    compact_db = DatabaseManager(compact_config)
+    sqlite_store = SQLiteAlertStore()
+    timestamp = datetime(2025, 7, 1, 12, tzinfo=timezone.utc)
+    # Pairs of alerts share a timestamp, so pages must break ties by ID
+    alerts = [
+        {'motor_id': f"MTR-{i % 2}", 'sensor_type': ('temperature', 'vibration')[i % 3 == 0],
+         'timestamp': timestamp + timedelta(minutes=i // 2), 'value': 80.0 + i,
+         'alert_type': ('HIGH', 'CRITICAL')[i % 4 == 0]}
+        for i in range(11)
+    ]
+    
+    def all_pages(store, limit, **filters):
+        pages, cursor = [], None
+        while True:
+            rows, cursor = store.get_alert_history(limit, cursor, **filters)
+            pages.append([row['id'] for row in rows])
+            if cursor is None:
+                return pages
+    
+    def index_names(db_manager):
+        with db_manager.connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT indexname FROM pg_indexes
+                WHERE schemaname = current_schema() AND tablename IN ('motor_alerts', 'motor_alert_facts');
+            """)
+            return {row[0] for row in cursor.fetchall()}
+    
+    try:
+        assert decode_history_cursor(encode_history_cursor(timestamp, 42)) == (timestamp, 42)
+        for bad in ('', 'not-a-cursor', encode_history_cursor(timestamp, 42)[:-3], 'w6k'):
+            try:
+                decode_history_cursor(bad)
+                assert False, f"accepted cursor {bad!r}"
+            except ValueError:
+                pass
+        
+        if not text_db.connect() or not compact_db.connect():
+            logger.error("Failed to connect to database")
+            return False
+        with text_db.connection.cursor() as cursor:
+            cursor.execute(f"CREATE SCHEMA {schema};")
+            cursor.execute(f"CREATE SCHEMA {compact_schema};")
+            cursor.execute(f"SET search_path TO {schema};")
+        with compact_db.connection.cursor() as cursor:
+            cursor.execute(f"SET search_path TO {compact_schema};")
+        sqlite_store.connect()
+        for store in (text_db, compact_db, sqlite_store):
+            assert store.create_tables()
+            store.insert_alerts(alerts)
+        
+        # Only the history indexes are left on the alerts
+        for db_manager, table in ((text_db, 'motor_alerts'), (compact_db, 'motor_alert_facts')):
+            assert index_names(db_manager) == {f"{table}_pkey", f"idx_{table}_by_motor", f"idx_{table}_by_time"}
+        
+        # Newest first, ties broken by the higher ID, and every alert exactly once
+        for store in (text_db, compact_db, sqlite_store):
+            assert all_pages(store, 4) == [[11, 10, 9, 8], [7, 6, 5, 4], [3, 2, 1]]
+            assert all_pages(store, 11) == [[11, 10, 9, 8, 7, 6, 5, 4, 3, 2, 1]]
+            assert all_pages(store, 2, motor_id='MTR-1') == [[10, 8], [6, 4], [2]]
+            assert all_pages(store, 2, sensor_type='vibration', alert_type='HIGH') == [[10, 7], [4]]
+            assert all_pages(store, 2, sensor_type='vibration', alert_type='CRITICAL') == [[1]]
+            assert all_pages(store, 3, start=timestamp + timedelta(minutes=1),
+                             end=timestamp + timedelta(minutes=4)) == [[8, 7, 6], [5, 4, 3]]
+            assert all_pages(store, 5, motor_id='MTR-9') == [[]]
+            rows, _ = store.get_alert_history(1)
+            assert rows[0]['motor_id'] == 'MTR-0' and rows[0]['sensor_type'] == 'temperature'
+            assert rows[0]['alert_type'] == 'HIGH' and float(rows[0]['value']) == 90.0
+        
+        # The indexes cover a page: once vacuumed, a filtered page never reads the table
+        with text_db.connection.cursor() as cursor:
+            cursor.execute("VACUUM ANALYZE motor_alerts;")
+            cursor.execute("SET enable_seqscan = off;")
+            for filters in ("motor_id = 'MTR-1' AND alert_type = 'HIGH'", "sensor_type = 'vibration'"):
+                cursor.execute(f"""
+                    EXPLAIN (ANALYZE, COSTS OFF)
+                    SELECT id, motor_id, sensor_type, timestamp, value, alert_type, created_at
+                    FROM motor_alerts WHERE {filters}
+                    ORDER BY timestamp DESC, id DESC LIMIT 3;
+                """)
+                plan = '\n'.join(line for line, in cursor.fetchall())
+                assert 'Index Only Scan' in plan and 'Heap Fetches: 0' in plan, plan
+            cursor.execute("RESET enable_seqscan;")
+        
+        # A cursor stays valid while newer alerts arrive
+        rows, cursor = text_db.get_alert_history(4)
+        text_db.insert_alert('MTR-0', 'temperature', timestamp + timedelta(hours=1), 99.0, 'HIGH')
+        assert [row['id'] for row in text_db.get_alert_history(4, cursor)[0]] == [7, 6, 5, 4]
+        try:
+            text_db.get_alert_history(4, 'not-a-cursor')
+            assert False, "accepted a bad cursor"
+        except ValueError:
+            pass
+        
+        logger.info("Alert history test completed successfully")
+        return True
+    except Exception as e:
+        logger.error(f"Alert history test failed: {e!r}")
+        return False
+    finally:
+        if text_db.connection is not None:
+            with text_db.connection.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE;")
+                cursor.execute(f"DROP SCHEMA IF EXISTS {compact_schema} CASCADE;")
+        text_db.disconnect()
+        compact_db.disconnect()
+        sqlite_store.disconnect()
+
+def test_timeseries():
+    """Test the columnar time-series store: kernels, summary, snapshots and restart catch-up"""
+    logger.info("Testing time-series store...")
+    
+    import math
+    import os
+    import statistics
+    import tempfile
+    import uuid
+    from datetime import timezone
+    import timeseries
+    from alert_processor import AlertProcessor
+    from backends import InMemoryBroker, SQLiteAlertStore
+    
+    if timeseries.np is None:
+        logger.warning("numpy is not installed, skipping time-series test")
+        return True
+    
+    def alert(motor_id, sensor_type, seconds, value):
+        return {'motor_id': motor_id, 'sensor_type': sensor_type, 'alert_type': f"high_{sensor_type}",
+                'timestamp': datetime(2025, 7, 17, 10, 0) + timedelta(seconds=seconds), 'value': value}
+    
+    try:
+        now = alert('', '', 600, 0)['timestamp'].replace(tzinfo=timezone.utc).timestamp()
+        store = timeseries.TimeSeriesStore(window=8, initial_series=1)
+        # Vibration rises 0.01 g/s; temperature is flat; 12 alerts overflow the 8-slot rings
+        for i in range(12):
+            store.add(alert('MTR-01', 'vibration', 540 + 5 * i, 2.6 + 0.05 * i), i + 1)
+            store.add(alert('MTR-02', 'temperature', 540 + 5 * i, 85.0 + (i % 2)), i + 101)
+        assert len(store.keys) == 2 and store.last_id == 112
+        
+        stats = store.rolling_stats(30, now=now)
+        vibration = [2.6 + 0.05 * i for i in range(12) if 540 + 5 * i >= 570]
+        assert stats['motor_id'] == ['MTR-01', 'MTR-02']
+        assert list(stats['count']) == [len(vibration), len(vibration)]
+        assert math.isclose(stats['mean'][0], statistics.fmean(vibration))
+        assert math.isclose(stats['std'][0], statistics.pstdev(vibration))
+        assert math.isclose(store.alert_rate(30, now=now)['per_minute'][0], len(vibration) * 2.0)
+        
+        trend = store.time_to_threshold({'vibration': 3.5}, 60, now=now)
+        assert math.isclose(trend['slope'][0], 0.01)
+        # Fitted value at 600s is 2.6 + 0.01 * 60 = 3.2, so 3.5 is 30 seconds away
+        assert math.isclose(trend['seconds'][0], 30.0)
+        assert math.isnan(trend['seconds'][1])
+        
+        summary = store.summary()
+        assert summary[0]['total_alerts'] == 12 and math.isclose(summary[0]['max_value'], 3.15)
+        
+        # Snapshots keep the newest alerts when loaded with a different window
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            path = os.path.join(snapshot_dir, 'timeseries.npz')
+            store.save(path)
+            for window in (8, 4, 16):
+                loaded = timeseries.TimeSeriesStore(window)
+                loaded.load(path)
+                assert loaded.summary() == summary and loaded.last_id == 112
+                expected = store.rolling_stats(3600, now=now)
+                if window < 8:
+                    vibration = [2.6 + 0.05 * i for i in range(8, 12)]
+                    assert math.isclose(loaded.rolling_stats(3600, now=now)['mean'][0], statistics.fmean(vibration))
+                else:
+                    assert list(loaded.rolling_stats(3600, now=now)['mean']) == list(expected['mean'])
+                loaded.add(alert('MTR-01', 'vibration', 600, 3.3), 113)
+                assert loaded.summary()[0]['total_alerts'] == 13
+        
+        # Fed by the processor; a restart loads the snapshot and catches up from the store
+        with tempfile.TemporaryDirectory() as work_dir:
+            config = Config()
+            config.TIMESERIES_WINDOW = 16
+            config.TIMESERIES_SNAPSHOT = os.path.join(work_dir, 'timeseries.npz')
+            database = os.path.join(work_dir, 'alerts.db')
+            
+            def publish(broker, start, count):
+                for i in range(start, start + count):
+                    broker.publish_alert(json.dumps({
+                        "motorId": f"MTR-0{i % 3}",
+                        "timestamp": (datetime(2025, 7, 17, 10, 0) + timedelta(seconds=i)).isoformat() + "Z",
+                        "sensorType": "vibration",
+                        "value": 2.6 + i / 100,
+                        "alertType": "high_vibration"
+                    }))
+            
+            for run, offline in ((0, 0), (20, 7)):
+                sqlite_store = SQLiteAlertStore(config, path=database)
+                if offline:
+                    # Stored by another processor while this one was down
+                    sqlite_store.connect()
+                    sqlite_store.create_tables()
+                    sqlite_store.insert_alerts([alert('MTR-09', 'vibration', i, 3.0) for i in range(offline)])
+                broker = InMemoryBroker(config)
+                processor = AlertProcessor(config, broker=broker, store=sqlite_store)
+                assert processor.startup()
+                publish(broker, run, 20)
+                assert broker.drain(timeout=5)
+                processor.settle_pending()
+                
+                expected = sqlite_store.get_alert_summary()
+                served = processor.get_alert_summary()
+                assert [row['total_alerts'] for row in served] == [row['total_alerts'] for row in expected]
+                for row, expected_row in zip(served, expected):
+                    assert math.isclose(row['avg_value'], expected_row['avg_value'])
+                    assert row['last_alert'].replace(tzinfo=None) == expected_row['last_alert'].replace(tzinfo=None)
+                processor.disconnect_rabbitmq()
+                sqlite_store.disconnect()
+            assert sum(row['total_alerts'] for row in served) == 47
+        
+        # Without a snapshot the aggregates come from the daily rollup, which matches alert_summary
+        for compact in (False, True):
+            config = Config()
+            config.COMPACT_SCHEMA = compact
+            db_manager = DatabaseManager(config)
+            schema = f"totals_test_{uuid.uuid4().hex[:8]}"
+            if not db_manager.connect():
+                logger.error("Failed to connect to database")
+                return False
+            try:
+                with db_manager.connection.cursor() as cursor:
+                    cursor.execute(f"CREATE SCHEMA {schema};")
+                    cursor.execute(f"SET search_path TO {schema};")
+                assert db_manager.create_tables()
+                db_manager.insert_alerts([alert(f"MTR-0{i % 3}", 'vibration', 3600 * 9 * i, 2.5 + i / 8)
+                                          for i in range(12)])
+                db_manager.insert_alert(**alert('MTR-01', 'temperature', 0, 91.5))
+                
+                def rounded(rows):
+                    return [{key: round(float(value), 9) if key.endswith('value') else value
+                             for key, value in row.items() if key != 'last_id'} for row in rows]
+                
+                totals = db_manager.get_alert_totals()
+                assert rounded(totals) == rounded(db_manager.get_alert_summary()), totals
+                assert {row['last_id'] for row in totals} == {13}
+                
+                # Days from before the rollup kept value aggregates, until they are rebuilt
+                with db_manager.connection.cursor() as cursor:
+                    cursor.execute("UPDATE motor_alert_daily_counts SET value_sum = NULL WHERE motor_id = 'MTR-02';")
+                assert db_manager.get_alert_totals() is None
+                db_manager.backfill_daily_counts()
+                assert rounded(db_manager.get_alert_totals()) == rounded(db_manager.get_alert_summary())
+            finally:
+                with db_manager.connection.cursor() as cursor:
+                    cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE;")
+                db_manager.disconnect()
+        
+        logger.info("Time-series store test completed successfully")
+        return True
+    except Exception as e:
+        logger.error(f"Time-series store test failed: {e!r}")
+        return False
+
+def test_read_api():
+    """Test read API responses, caching, invalidation by inserts, ETags, gzip and since= deltas"""
+    logger.info("Testing read API...")
+    
+    import gzip
+    import urllib.error
+    import urllib.request
+    from alert_processor import AlertProcessor
+    from backends import InMemoryBroker, SQLiteAlertStore
+    from read_api import ReadService
+    
+    def publish(broker, start, count):
+        for i in range(start, start + count):
+            broker.publish_alert(json.dumps({
+                "motorId": f"MTR-0{i % 3}",
+                "timestamp": (datetime(2025, 7, 17, 10, 0) + timedelta(seconds=i)).isoformat() + "Z",
+                "sensorType": "vibration",
+                "value": round(2.6 + i / 100, 2),
+                "alertType": "high_vibration"
+            }))
+    
+    def request(path, headers=None):
+        try:
+            with urllib.request.urlopen(urllib.request.Request(base + path, headers=headers or {})) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+    
+    config = Config()
+    config.READ_API_PORT = 0
+    config.READ_API_CACHE_TTL_S = 60
+    broker = InMemoryBroker(config)
+    store = SQLiteAlertStore(config)
+    processor = AlertProcessor(config, broker=broker, store=store)
+    service = None
+    
+    try:
+        assert processor.startup()
+        service = ReadService(config, store=store, recent_cache=processor.recent_cache)
+        assert service.start()
+        processor.read_api = service
+        base = f"http://127.0.0.1:{service.server.server_port}"
+        publish(broker, 0, 30)
+        assert broker.drain(timeout=5)
+        
+        status, headers, body = request('/api/motors/MTR-01/alerts?limit=3')
+        payload = json.loads(body)
+        assert status == 200 and payload['motorId'] == 'MTR-01'
+        assert [alert['value'] for alert in payload['alerts']] == [2.88, 2.85, 2.82]
+        assert set(payload['alerts'][0]) == {'id', 'motorId', 'sensorType', 'timestamp', 'value',
+                                             'alertType', 'createdAt'}
+        etag = headers['ETag']
+        
+        # Unchanged: served from the cache, and a 304 for a client holding the ETag
+        status, _, body = request('/api/motors/MTR-01/alerts?limit=3', {'If-None-Match': etag})
+        assert status == 304 and body == b''
+        assert service.stats()['hits'] == 1
+        
+        # A stored alert for MTR-01 invalidates its responses, not other motors'
+        request('/api/motors/MTR-02/alerts?limit=3')
+        publish(broker, 31, 1)
+        assert broker.drain(timeout=5)
+        status, headers, body = request('/api/motors/MTR-01/alerts?limit=3', {'If-None-Match': etag})
+        assert status == 200 and headers['ETag'] != etag
+        assert json.loads(body)['alerts'][0]['value'] == 2.91
+        hits = service.stats()['hits']
+        request('/api/motors/MTR-02/alerts?limit=3')
+        assert service.stats()['hits'] == hits + 1
+        
+        # Delta polling: only alerts stored after lastId
+        status, _, body = request('/api/alerts?since=' + str(payload['lastId']))
+        delta = json.loads(body)
+        assert [alert['value'] for alert in delta['alerts']] == [2.89, 2.91]
+        status, _, body = request(f"/api/motors/MTR-01/alerts?since={payload['lastId']}")
+        assert [alert['value'] for alert in json.loads(body)['alerts']] == [2.91]
+        assert json.loads(request(f"/api/alerts?since={delta['lastId']}")[2]) == {
+            'alerts': [], 'lastId': delta['lastId']}
+        
+        # Large bodies are gzip-encoded for clients that accept it
+        status, headers, body = request('/api/alerts?limit=20', {'Accept-Encoding': 'gzip'})
+        assert headers['Content-Encoding'] == 'gzip'
+        assert len(json.loads(gzip.decompress(body))['alerts']) == 31
+        
+        summary = json.loads(request('/api/summary')[2])['summary']
+        assert [(row['motorId'], row['totalAlerts']) for row in summary] == [
+            ('MTR-00', 10), ('MTR-01', 11), ('MTR-02', 10)]
+        counts = json.loads(request('/api/daily-counts?start=2025-07-17&end=2025-07-17')[2])['counts']
+        assert sum(row['count'] for row in counts) == 31
+        
+        # History pages resume from nextCursor until it is null
+        values, cursor = [], None
+        for _ in range(3):
+            query = '/api/history?motor=MTR-01&limit=4' + (f"&cursor={cursor}" if cursor else '')
+            page = json.loads(request(query)[2])
+            values.append([alert['value'] for alert in page['alerts']])
+            cursor = page['nextCursor']
+        assert values == [[2.91, 2.88, 2.85, 2.82], [2.79, 2.76, 2.73, 2.7], [2.67, 2.64, 2.61]]
+        assert cursor is None
+        page = json.loads(request('/api/history?start=2025-07-17T10:00:10&end=2025-07-17T10:00:13')[2])
+        assert [alert['value'] for alert in page['alerts']] == [2.72, 2.71, 2.7]
+        assert page['nextCursor'] is None and page['lastId'] == max(alert['id'] for alert in page['alerts'])
+        assert request('/api/history?cursor=not-a-cursor')[0] == 400
+        assert request('/api/history?start=yesterday')[0] == 400
+        
+        assert request('/api/alerts?limit=abc')[0] == 400
+        assert request('/api/alerts?limit=5000')[0] == 400
+        assert request('/api/unknown')[0] == 404
+        
+        logger.info("Read API test completed successfully")
+        return True
+    except Exception as e:
+        logger.error(f"Read API test failed: {e!r}")
+        return False
+    finally:
+        if service is not None:
+            service.stop()
+        processor.settle_pending()
+        processor.disconnect_rabbitmq()
+        store.disconnect()
+
+def test_metrics():
+    """Test that processing updates the metrics and /metrics serves them"""
+    logger.info("Testing metrics...")
+    
+    import threading
+    import urllib.request
+    import metrics
+    from alert_processor import AlertProcessor
+    from backends import InMemoryBroker, SQLiteAlertStore
+    
+    def count(histogram):
+        return sum(histogram.snapshot()[0])
+    
+    config = Config()
+    config.BATCH_SIZE = 3
+    config.BATCH_TIMEOUT_MS = 10
+    config.NOTIFICATION_BATCH_SIZE = 1
+    
+    store = SQLiteAlertStore(config)
+    broker = InMemoryBroker(config)
+    processor = AlertProcessor(config, broker=broker, store=store)
+    server = None
+    
+    before = {
+        'processed': metrics.MESSAGES_PROCESSED.value,
+        'dead_lettered': metrics.MESSAGES_DEAD_LETTERED.value,
+        'parse': count(metrics.PARSE_SECONDS),
+        'insert': count(metrics.INSERT_SECONDS),
+        'publish': count(metrics.PUBLISH_SECONDS),
+        'end_to_end': count(metrics.END_TO_END_SECONDS),
+        'batch_size_sum': metrics.BATCH_SIZE.snapshot()[1],
+    }
+    
+    try:
+        assert processor.startup()
+        
+        for minute in range(5):
+            broker.publish_alert(json.dumps({
+                "motorId": f"MTR-{minute:02d}",
+                "timestamp": f"2025-07-17T10:{minute:02d}:00Z",
+                "sensorType": "temperature",
+                "value": 90.5,
+                "alertType": "high_temperature"
+            }))
+        broker.publish_alert("not json")
+        processor.poll_queue_depth()
+        assert metrics.QUEUE_DEPTH.value == 6
+        assert broker.drain(timeout=5)
+        processor.settle_pending()
+        
+        assert metrics.MESSAGES_PROCESSED.value - before['processed'] == 5
+        assert metrics.MESSAGES_DEAD_LETTERED.value - before['dead_lettered'] == 1
+        assert count(metrics.PARSE_SECONDS) - before['parse'] == 6
+        assert count(metrics.INSERT_SECONDS) - before['insert'] == 2  # batches of 3 and 2
+        assert metrics.BATCH_SIZE.snapshot()[1] - before['batch_size_sum'] == 5
+        assert count(metrics.PUBLISH_SECONDS) - before['publish'] == 5
+        assert count(metrics.END_TO_END_SECONDS) - before['end_to_end'] == 5
+        
+        # Bucket counts are cumulative and end with +Inf == _count
+        histogram = metrics.Histogram('test_seconds', 'Test histogram', (0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 7.0):
+            histogram.observe(value)
+        lines = histogram.render()
+        assert 'test_seconds_bucket{le="0.1"} 2' in lines
+        assert 'test_seconds_bucket{le="1.0"} 3' in lines
+        assert 'test_seconds_bucket{le="+Inf"} 4' in lines
+        assert 'test_seconds_count 4' in lines
+        
+        # Each thread records into its own cell; readers see the total
+        counter = metrics.Counter('test_total', 'Test counter')
+        threads = [threading.Thread(target=lambda: [counter.inc() for _ in range(1000)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert counter.value == 4000
+        
+        server = metrics.start_http_server('127.0.0.1', 0)
+        url = f"http://127.0.0.1:{server.server_port}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert response.headers['Content-Type'] == metrics.CONTENT_TYPE
+            body = response.read().decode('utf-8')
+        assert '# TYPE alert_insert_seconds histogram' in body
+        assert f"alert_messages_processed_total {metrics.MESSAGES_PROCESSED.value}" in body
+        
+        logger.info("Metrics test completed successfully")
+        return True
+    
+    except Exception as e:
+        logger.error(f"Metrics test failed: {e!r}")
+        return False
+    
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        processor.disconnect_rabbitmq()
+        store.disconnect()
+
+def test_async_engine():
+    """Test that the asyncio engine acks stored alerts and moves failed ones to the DLQ or a delay queue"""
+    logger.info("Testing asyncio engine...")
+    
+    import asyncio
+    import uuid
+    from types import SimpleNamespace
+    import asyncpg
+    import retry
+    from async_processor import AsyncAlertProcessor
+    
+    class StubMessage:
+        # The parts of an aio_pika IncomingMessage the engine uses
+        def __init__(self, body):
+            self.body = body.encode('utf-8')
+            self.headers = {}
+            self.content_type = 'application/json'
+            self.settled = None
+        
+        async def ack(self):
+            self.settled = 'ack'
+        
+        async def nack(self, requeue=True):
+            self.settled = f"nack(requeue={requeue})"
+    
+    class StubExchange:
+        def __init__(self):
+            self.published = []
+        
+        async def publish(self, message, routing_key):
+            self.published.append((routing_key, message))
+    
+    def alert_message(motor_id):
+        return StubMessage(json.dumps({
+            "motorId": motor_id,
+            "timestamp": "2025-07-17T10:15:00Z",
+            "sensorType": "vibration",
+            "value": 3.2,
+            "alertType": "high_vibration"
+        }))
+    
+    config = Config()
+    schema = f"async_test_{uuid.uuid4().hex[:8]}"
+    db_manager = DatabaseManager(config)
+    
+    async def run():
+        processor = AsyncAlertProcessor(config)
+        processor.in_flight = asyncio.Semaphore(config.MAX_IN_FLIGHT)
+        processor.notifications_exchange = StubExchange()
+        processor.channel = SimpleNamespace(default_exchange=StubExchange())
+        # The same pool connect_database opens, confined to the scratch schema
+        processor.pool = await asyncpg.create_pool(
+            host=config.DB_HOST, port=config.DB_PORT, database=config.DB_NAME,
+            user=config.DB_USER, password=config.DB_PASSWORD, min_size=1, max_size=2,
+            server_settings={'search_path': schema}
+        )
+        try:
+            assert await processor.create_tables()
+            
+            # Stored: acked, with a notification
+            message = alert_message("MTR-01")
+            await processor.process_alert(message)
+            assert message.settled == 'ack'
+            assert await processor.pool.fetchval("SELECT motor_id FROM motor_alerts;") == "MTR-01"
+            assert len(processor.notifications_exchange.published) == 1
+            
+            # Unparseable: straight to the dead-letter queue, then acked
+            republished = processor.channel.default_exchange.published
+            message = StubMessage('{"motorId": "MTR-01"}')
+            await processor.process_alert(message)
+            assert message.settled == 'ack'
+            assert republished[-1][0] == config.DEAD_LETTER_QUEUE
+            assert retry.REASON_HEADER in republished[-1][1].headers
+            
+            # Without a dead-letter queue it is nacked instead of requeued
+            config.DEAD_LETTER_QUEUE = ''
+            message = StubMessage('not json')
+            await processor.process_alert(message)
+            assert message.settled == 'nack(requeue=False)' and len(republished) == 1
+            
+            # The insert fails: to the first delay queue, for another attempt
+            await processor.pool.execute("ALTER TABLE motor_alerts RENAME TO motor_alerts_moved;")
+            message = alert_message("MTR-02")
+            await processor.process_alert(message)
+            assert message.settled == 'ack'
+            assert republished[-1][0] == retry.retry_queue(config, 1)
+            assert republished[-1][1].headers[retry.ATTEMPT_HEADER] == 1
+            assert await processor.pool.fetchval("SELECT COUNT(*) FROM motor_alerts_moved;") == 1
+        finally:
+            await processor.pool.close()
+    
+    try:
+        if not db_manager.connect():
+            logger.error("Failed to connect to database")
+            return False
+        with db_manager.connection.cursor() as cursor:
+            cursor.execute(f"CREATE SCHEMA {schema};")
+        
+        asyncio.run(run())
+        
+        logger.info("Asyncio engine test completed successfully")
+        return True
+    except Exception as e:
+        logger.error(f"Asyncio engine test failed: {e!r}")
+        return False
+    finally:
+        if db_manager.connection is not None:
+            with db_manager.connection.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE;")
+        db_manager.disconnect()
+
 def main():
     """Run all tests"""
     logger.info("Starting Alert Processor tests...")
     
     tests = [
         ("Message Parsing", test_message_parsing),
+        ("Batch Processing", test_batch_processing),
+        ("In-Memory Pipeline", test_in_memory_pipeline),
+        ("Retry Queues", test_retry_queues),
+        ("Flow Control", test_flow_control),
+        ("Raw Readings", test_raw_readings),
+        ("Spill and Replay", test_spill_replay),
+        ("Codec Compatibility", test_codec_compatibility),
+        ("Notification Publisher", test_notification_publisher),
+        ("Recent-Alert Cache", test_recent_alert_cache),
+        ("Partition Planning", test_partition_planning),
+        ("Alert Coalescing", test_alert_coalescing),
+        ("Time-Series Store", test_timeseries),
+        ("Read API", test_read_api),
+        ("Metrics", test_metrics),
+        ("Supervisor", test_supervisor),
         ("Database Operations", test_database_operations),
+        ("Alert Export", test_export),
+        ("Alert Backfill", test_backfill),
+        ("Compact Schema", test_compact_schema),
+        ("Schema Version", test_schema_version),
+        ("Alert History", test_alert_history),
+        ("Asyncio Engine", test_async_engine),
     ]
     
     results = {}
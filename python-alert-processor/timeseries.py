@@ -0,0 +1,312 @@
+"""
+In-process columnar store of alert values, with vectorized statistics.
+
+Every stored alert is appended to the series of its (motor_id, sensor_type,
+alert_type). Alerts are not kept as Python objects:
+
+- `timestamps` and `values` (float64 arrays, one row per series) are ring
+  buffers of each series' latest `window` alerts, timestamps in epoch seconds
+- count, sum, min, max, first and last timestamp aggregate every alert the
+  series has seen, like the alert_summary view. They are plain lists with one
+  entry per series, which keeps add() to two array writes
+
+The kernels (rolling_stats, alert_rate, time_to_threshold) work on whole
+arrays, so they cost a handful of NumPy operations for all motors at once
+rather than a Python loop per motor. They return a dict of columns: the key
+columns as lists and one NumPy array per statistic, all in series order.
+
+save() writes the arrays to an .npz snapshot and load() reads it back, so a
+restarted processor only has to catch up on alerts stored since the snapshot.
+
+Needs the optional numpy package.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+logger = logging.getLogger(__name__)
+
+KEY_COLUMNS = ('motor_id', 'sensor_type', 'alert_type')
+# Per-series scalars, kept as lists and saved as arrays
+SERIES_LISTS = ('positions', 'lengths', 'counts', 'sums', 'minimums', 'maximums', 'first', 'last')
+# Alerts read per query when catching up after loading a snapshot
+CATCH_UP_BATCH = 10000
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_NAIVE_EPOCH = datetime(1970, 1, 1)
+
+def _epoch(timestamp):
+    # Subtracting is several times faster than datetime.timestamp(). Naive
+    # reading timestamps are UTC, as everywhere else in the pipeline
+    if timestamp.tzinfo is None:
+        return (timestamp - _NAIVE_EPOCH).total_seconds()
+    return (timestamp - _EPOCH).total_seconds()
+
+def _datetime(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc)
+
+class TimeSeriesStore:
+    """Latest `window` alerts and all-time aggregates of every series.
+
+    add() is called for each stored alert; the kernels and summary() may be
+    called from other threads. Kernels copy the arrays under the lock and
+    compute outside it.
+    """
+
+    def __init__(self, window, initial_series=1024):
+        self.window = window
+        self.keys = []
+        self.index = {}
+        # Highest alert ID seen, so a restart from a snapshot knows where to catch up
+        self.last_id = 0
+        self.lock = threading.Lock()
+        self._allocate(initial_series)
+
+    def _allocate(self, capacity):
+        self.timestamps = np.zeros((capacity, self.window))
+        self.values = np.zeros((capacity, self.window))
+        # Next slot written in each ring, and how many slots hold data
+        self.positions = []
+        self.lengths = []
+        self.counts = []
+        self.sums = []
+        self.minimums = []
+        self.maximums = []
+        self.first = []
+        self.last = []
+
+    def _series(self, key):
+        series = self.index.get(key)
+        if series is None:
+            series = len(self.keys)
+            if series == len(self.timestamps):
+                # Double the rings' rows; the per-series lists just grow
+                for name in ('timestamps', 'values'):
+                    rings = getattr(self, name)
+                    setattr(self, name, np.concatenate([rings, np.zeros_like(rings)]))
+            self.keys.append(key)
+            self.index[key] = series
+            self.positions.append(0)
+            self.lengths.append(0)
+            self.counts.append(0)
+            self.sums.append(0.0)
+            self.minimums.append(math.inf)
+            self.maximums.append(-math.inf)
+            self.first.append(math.inf)
+            self.last.append(-math.inf)
+        return series
+
+    def add(self, alert, alert_id=None):
+        """Append a stored alert to its series"""
+        timestamp = _epoch(alert['timestamp'])
+        value = float(alert['value'])
+        with self.lock:
+            series = self._series((alert['motor_id'], alert['sensor_type'], alert['alert_type']))
+            position = self.positions[series]
+            self.timestamps[series, position] = timestamp
+            self.values[series, position] = value
+            self.positions[series] = position + 1 if position + 1 < self.window else 0
+            if self.lengths[series] < self.window:
+                self.lengths[series] += 1
+            self.counts[series] += 1
+            self.sums[series] += value
+            if value < self.minimums[series]:
+                self.minimums[series] = value
+            if value > self.maximums[series]:
+                self.maximums[series] = value
+            if timestamp < self.first[series]:
+                self.first[series] = timestamp
+            if timestamp > self.last[series]:
+                self.last[series] = timestamp
+            if alert_id is not None and alert_id > self.last_id:
+                self.last_id = alert_id
+
+    def warm(self, rows):
+        """Load all-time aggregates from AlertStore.get_alert_totals() (or get_alert_summary()) rows.
+
+        The ring buffers stay empty, so the rolling kernels only cover alerts
+        stored from now on.
+        """
+        with self.lock:
+            for row in rows:
+                series = self._series((row['motor_id'], row['sensor_type'], row['alert_type']))
+                self.counts[series] = row['total_alerts']
+                self.sums[series] = float(row['avg_value']) * row['total_alerts']
+                self.minimums[series] = float(row['min_value'])
+                self.maximums[series] = float(row['max_value'])
+                self.first[series] = _epoch(row['first_alert'])
+                self.last[series] = _epoch(row['last_alert'])
+                self.last_id = max(self.last_id, row['last_id'])
+
+    def _window_arrays(self):
+        """Copies of the used rows: keys, timestamps, values, valid-slot mask"""
+        with self.lock:
+            used = len(self.keys)
+            keys = list(self.keys)
+            timestamps = self.timestamps[:used].copy()
+            values = self.values[:used].copy()
+            lengths = np.array(self.lengths)
+        # Rings fill from slot 0, so a ring holding n alerts uses slots 0..n-1
+        valid = np.arange(self.window) < lengths[:, None]
+        return keys, timestamps, values, valid
+
+    @staticmethod
+    def _columns(keys, **statistics):
+        columns = {name: [key[i] for key in keys] for i, name in enumerate(KEY_COLUMNS)}
+        columns.update(statistics)
+        return columns
+
+    def rolling_stats(self, window_s, now=None):
+        """Count, mean and standard deviation of each series over the last `window_s` seconds"""
+        now = time.time() if now is None else now
+        keys, timestamps, values, valid = self._window_arrays()
+        in_window = valid & (timestamps >= now - window_s)
+        count = in_window.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(in_window, values, 0.0).sum(axis=1) / count
+            deviations = np.where(in_window, values - mean[:, None], 0.0)
+            std = np.sqrt((deviations * deviations).sum(axis=1) / count)
+        return self._columns(keys, count=count, mean=mean, std=std)
+
+    def alert_rate(self, window_s, now=None):
+        """Alerts per minute of each series over the last `window_s` seconds.
+
+        Only alerts still in the ring are counted, so `window_s` should be short
+        enough that a series produces fewer than `window` alerts in it.
+        """
+        now = time.time() if now is None else now
+        keys, timestamps, _, valid = self._window_arrays()
+        count = (valid & (timestamps >= now - window_s)).sum(axis=1)
+        return self._columns(keys, count=count, per_minute=count * 60.0 / window_s)
+
+    def time_to_threshold(self, thresholds, window_s, now=None):
+        """Seconds until each series' trend reaches its sensor type's threshold.
+
+        A least-squares line is fitted to each series' values over the last
+        `window_s` seconds. `seconds` is 0 if the fitted value is already at
+        the threshold, inf if the trend is flat or falling, and NaN if the
+        sensor type has no threshold or fewer than two alerts are in the
+        window. `slope` is the trend in value units per second.
+        """
+        now = time.time() if now is None else now
+        keys, timestamps, values, valid = self._window_arrays()
+        in_window = valid & (timestamps >= now - window_s)
+        count = in_window.sum(axis=1)
+        levels = np.array([thresholds.get(key[1], np.nan) for key in keys], dtype=float)
+
+        # Relative to now, so squares of epoch seconds don't lose precision
+        t = np.where(in_window, timestamps - now, 0.0)
+        v = np.where(in_window, values, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_t = t.sum(axis=1) / count
+            mean_v = v.sum(axis=1) / count
+            dt = np.where(in_window, t - mean_t[:, None], 0.0)
+            dv = np.where(in_window, v - mean_v[:, None], 0.0)
+            slope = (dt * dv).sum(axis=1) / (dt * dt).sum(axis=1)
+            # Fitted value at t = 0 (now)
+            current = mean_v - slope * mean_t
+            seconds = np.where(slope > 0, (levels - current) / slope, np.inf)
+        seconds = np.where(current >= levels, 0.0, seconds)
+        seconds = np.where(np.isnan(levels) | (count < 2) | np.isnan(slope), np.nan, seconds)
+        return self._columns(keys, slope=slope, seconds=seconds)
+
+    def summary(self):
+        """Rows like the alert_summary view, served from the aggregates"""
+        with self.lock:
+            used = len(self.keys)
+            keys = list(self.keys)
+            counts = list(self.counts)
+            sums = list(self.sums)
+            minimums = list(self.minimums)
+            maximums = list(self.maximums)
+            first = list(self.first)
+            last = list(self.last)
+        rows = [
+            {
+                'motor_id': motor_id,
+                'sensor_type': sensor_type,
+                'alert_type': alert_type,
+                'total_alerts': counts[i],
+                'first_alert': _datetime(first[i]),
+                'last_alert': _datetime(last[i]),
+                'avg_value': sums[i] / counts[i],
+                'min_value': minimums[i],
+                'max_value': maximums[i],
+            }
+            for i, (motor_id, sensor_type, alert_type) in enumerate(keys)
+            if counts[i]
+        ]
+        rows.sort(key=lambda row: (row['motor_id'], row['sensor_type'], row['alert_type']))
+        return rows
+
+    def save(self, path):
+        """Write a snapshot to `path` (replaced atomically)"""
+        with self.lock:
+            used = len(self.keys)
+            arrays = {name: getattr(self, name)[:used].copy() for name in ('timestamps', 'values')}
+            arrays.update(
+                (name, np.array(getattr(self, name)))
+                for name in SERIES_LISTS
+            )
+            keys = list(self.keys)
+            last_id = self.last_id
+        for i, name in enumerate(KEY_COLUMNS):
+            arrays[name] = np.array([key[i] for key in keys], dtype=str)
+        temporary = f"{path}.tmp"
+        with open(temporary, 'wb') as snapshot:
+            np.savez(snapshot, window=self.window, last_id=last_id, **arrays)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(temporary, path)
+
+    def load(self, path):
+        """Replace the contents with a snapshot written by save()"""
+        with np.load(path, allow_pickle=False) as snapshot:
+            arrays = {name: snapshot[name] for name in snapshot.files}
+        keys = list(zip(*(arrays[name].tolist() for name in KEY_COLUMNS)))
+        used = len(keys)
+        timestamps, values = arrays['timestamps'], arrays['values']
+        positions, lengths = arrays['positions'], arrays['lengths']
+        if int(arrays['window']) != self.window:
+            timestamps, values, positions, lengths = self._resize_rings(
+                timestamps, values, positions, lengths, int(arrays['window']))
+
+        arrays['positions'], arrays['lengths'] = positions, lengths
+
+        with self.lock:
+            self._allocate(max(used, 1024))
+            self.keys = keys
+            self.index = {key: series for series, key in enumerate(keys)}
+            self.timestamps[:used] = timestamps
+            self.values[:used] = values
+            for name in SERIES_LISTS:
+                setattr(self, name, arrays[name].tolist())
+            self.last_id = int(arrays['last_id'])
+
+    def _resize_rings(self, timestamps, values, positions, lengths, old_window):
+        """Rings of `old_window` slots re-laid into rings of self.window, keeping the newest alerts"""
+        # Oldest to newest, right-aligned: full rings start at their write position,
+        # partial rings (which never wrapped) at slot 0 after the empty slots
+        order = (positions[:, None] + np.arange(old_window)) % old_window
+        timestamps = np.take_along_axis(timestamps, order, axis=1)
+        values = np.take_along_axis(values, order, axis=1)
+        if self.window < old_window:
+            timestamps, values = timestamps[:, -self.window:], values[:, -self.window:]
+        else:
+            padding = ((0, 0), (self.window - old_window, 0))
+            timestamps, values = np.pad(timestamps, padding), np.pad(values, padding)
+        lengths = np.minimum(lengths, self.window)
+        # Back to rings that start at slot 0
+        order = (np.arange(self.window) + (self.window - lengths)[:, None]) % self.window
+        positions = lengths % self.window
+        return (np.take_along_axis(timestamps, order, axis=1),
+                np.take_along_axis(values, order, axis=1), positions, lengths)
@@ -4,39 +4,147 @@
 -- This script creates the necessary tables and indexes for the motor health monitoring system.
 -- Run this script on your PostgreSQL database before starting the alert processor.
 
--- Create the motor_alerts table
+-- Create the motor_alerts table, range partitioned by reading timestamp.
+-- The alert processor creates one partition per UTC day (or month, see
+-- PARTITION_INTERVAL) ahead of time and expires old ones per
+-- PARTITION_RETENTION_DAYS. Alerts outside every partition go to
+-- motor_alerts_default. The primary key must include the partition column.
 CREATE TABLE IF NOT EXISTS motor_alerts (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     motor_id TEXT NOT NULL,
     sensor_type TEXT NOT NULL,
     timestamp TIMESTAMPTZ NOT NULL,
     value NUMERIC NOT NULL,
     alert_type TEXT NOT NULL,
-    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE IF NOT EXISTS motor_alerts_default PARTITION OF motor_alerts DEFAULT;
+
+-- Indexes (created on every partition). A history page walks one of these
+-- newest first, resuming after the last (timestamp, id) of the previous
+-- page: the motor index for a page of one motor, the time index otherwise.
+-- Both INCLUDE every other column a page returns, so sensor and alert type
+-- filters are checked on the index entries, and once a partition is
+-- vacuumed its pages are index-only scans.
+CREATE INDEX IF NOT EXISTS idx_motor_alerts_by_motor
+ON motor_alerts(motor_id, timestamp DESC, id DESC)
+INCLUDE (sensor_type, alert_type, value, created_at);
+
+CREATE INDEX IF NOT EXISTS idx_motor_alerts_by_time
+ON motor_alerts(timestamp DESC, id DESC)
+INCLUDE (motor_id, sensor_type, alert_type, value, created_at);
+
+-- Indexes of earlier versions, superseded by the two above: single columns,
+-- (motor_id, timestamp DESC), and history indexes per filter combination.
+DROP INDEX IF EXISTS idx_motor_alerts_motor_id;
+DROP INDEX IF EXISTS idx_motor_alerts_timestamp;
+DROP INDEX IF EXISTS idx_motor_alerts_created_at;
+DROP INDEX IF EXISTS idx_motor_alerts_sensor_type;
+DROP INDEX IF EXISTS idx_motor_alerts_alert_type;
+DROP INDEX IF EXISTS idx_motor_alerts_motor_timestamp;
+DROP INDEX IF EXISTS idx_motor_alerts_motor_history;
+DROP INDEX IF EXISTS idx_motor_alerts_history;
+DROP INDEX IF EXISTS idx_motor_alerts_time;
+DROP INDEX IF EXISTS idx_motor_alerts_motor_time;
+DROP INDEX IF EXISTS idx_motor_alerts_sensor_time;
+DROP INDEX IF EXISTS idx_motor_alerts_motor_sensor_time;
+DROP INDEX IF EXISTS idx_motor_alerts_alert_time;
+DROP INDEX IF EXISTS idx_motor_alerts_motor_alert_time;
+
+-- Daily alert counts and value aggregates, maintained by the alert processor
+-- in the same statement that inserts each alert. Dashboards read date ranges
+-- from here, and the processor's time-series store warms up from it, instead
+-- of scanning motor_alerts.
+CREATE TABLE IF NOT EXISTS motor_alert_daily_counts (
+    motor_id TEXT NOT NULL,
+    day DATE NOT NULL,
+    sensor_type TEXT NOT NULL,
+    alert_type TEXT NOT NULL,
+    count BIGINT NOT NULL,
+    value_sum DOUBLE PRECISION,
+    value_min DOUBLE PRECISION,
+    value_max DOUBLE PRECISION,
+    first_at TIMESTAMPTZ,
+    last_at TIMESTAMPTZ,
+    PRIMARY KEY (motor_id, day, sensor_type, alert_type)
 );
 
--- Create indexes for better query performance
-CREATE INDEX IF NOT EXISTS idx_motor_alerts_motor_id 
-ON motor_alerts(motor_id);
-
-CREATE INDEX IF NOT EXISTS idx_motor_alerts_timestamp 
-ON motor_alerts(timestamp);
-
-CREATE INDEX IF NOT EXISTS idx_motor_alerts_created_at 
-ON motor_alerts(created_at);
+-- Rollups created before the value aggregates get them empty (NULL) until
+-- `python manage.py backfill-daily-counts` recounts their days
+ALTER TABLE motor_alert_daily_counts
+    ADD COLUMN IF NOT EXISTS value_sum DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS value_min DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS value_max DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS first_at TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS last_at TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS idx_motor_alert_daily_counts_day 
+ON motor_alert_daily_counts(day, motor_id);
+
+-- Alert storms folded into episodes by the alert processor (COALESCE_WINDOW_S).
+-- alert_id is the motor_alerts row of the alert that opened the episode.
+CREATE TABLE IF NOT EXISTS motor_alert_episodes (
+    id SERIAL PRIMARY KEY,
+    alert_id INTEGER,
+    motor_id TEXT NOT NULL,
+    sensor_type TEXT NOT NULL,
+    alert_type TEXT NOT NULL,
+    first_timestamp TIMESTAMPTZ NOT NULL,
+    last_timestamp TIMESTAMPTZ NOT NULL,
+    alert_count INTEGER NOT NULL,
+    max_value NUMERIC NOT NULL,
+    closed BOOLEAN NOT NULL DEFAULT FALSE
+);
 
-CREATE INDEX IF NOT EXISTS idx_motor_alerts_sensor_type 
-ON motor_alerts(sensor_type);
+CREATE INDEX IF NOT EXISTS idx_motor_alert_episodes_motor_last 
+ON motor_alert_episodes(motor_id, last_timestamp DESC);
+
+-- How far each alert processor's spill log has been replayed (SPILL_DIR).
+-- Written in the same transaction as the replayed alerts, so a replay that is
+-- interrupted resumes without inserting an alert twice.
+CREATE TABLE IF NOT EXISTS motor_alert_spill_checkpoints (
+    spill_id TEXT PRIMARY KEY,
+    segment BIGINT NOT NULL,
+    segment_offset BIGINT NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
 
-CREATE INDEX IF NOT EXISTS idx_motor_alerts_alert_type 
-ON motor_alerts(alert_type);
+-- Raw sensor readings aggregated per motor, sensor type and 1-minute or 1-hour
+-- bucket by the alert processor's readings consumer (--mode readings). Every
+-- write merges into the bucket: counts and sums add up, min/max and the last
+-- value combine.
+CREATE TABLE IF NOT EXISTS motor_readings_1m (
+    motor_id TEXT NOT NULL,
+    sensor_type TEXT NOT NULL,
+    bucket TIMESTAMPTZ NOT NULL,
+    reading_count BIGINT NOT NULL,
+    min_value DOUBLE PRECISION NOT NULL,
+    max_value DOUBLE PRECISION NOT NULL,
+    sum_value DOUBLE PRECISION NOT NULL,
+    avg_value DOUBLE PRECISION GENERATED ALWAYS AS (sum_value / reading_count) STORED,
+    last_value DOUBLE PRECISION NOT NULL,
+    last_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (motor_id, sensor_type, bucket)
+);
 
--- Create a composite index for common query patterns
-CREATE INDEX IF NOT EXISTS idx_motor_alerts_motor_timestamp 
-ON motor_alerts(motor_id, timestamp DESC);
+CREATE TABLE IF NOT EXISTS motor_readings_1h (
+    motor_id TEXT NOT NULL,
+    sensor_type TEXT NOT NULL,
+    bucket TIMESTAMPTZ NOT NULL,
+    reading_count BIGINT NOT NULL,
+    min_value DOUBLE PRECISION NOT NULL,
+    max_value DOUBLE PRECISION NOT NULL,
+    sum_value DOUBLE PRECISION NOT NULL,
+    avg_value DOUBLE PRECISION GENERATED ALWAYS AS (sum_value / reading_count) STORED,
+    last_value DOUBLE PRECISION NOT NULL,
+    last_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (motor_id, sensor_type, bucket)
+);
 
 -- Add comments to the table and columns for documentation
-COMMENT ON TABLE motor_alerts IS 'Stores all motor health alerts triggered by sensor threshold breaches';
+COMMENT ON TABLE motor_alerts IS 'Stores all motor health alerts triggered by sensor threshold breaches (partitioned by timestamp)';
 COMMENT ON COLUMN motor_alerts.id IS 'Unique identifier for each alert (auto-incrementing)';
 COMMENT ON COLUMN motor_alerts.motor_id IS 'Identifier for the motor (e.g., MTR-01)';
 COMMENT ON COLUMN motor_alerts.sensor_type IS 'Type of sensor that triggered the alert (vibration, temperature)';
@@ -45,7 +153,14 @@ COMMENT ON COLUMN motor_alerts.value IS 'The sensor reading value that triggered
 COMMENT ON COLUMN motor_alerts.alert_type IS 'Type of alert (high_vibration, high_temperature)';
 COMMENT ON COLUMN motor_alerts.created_at IS 'Timestamp when the alert was inserted into the database';
 
--- Create a view for recent alerts (last 24 hours)
+COMMENT ON TABLE motor_alert_episodes IS 'Repeated alerts for one motor, sensor type and alert type folded into a single record';
+COMMENT ON TABLE motor_alert_daily_counts IS 'Alert counts and value aggregates per motor, day, sensor type and alert type (rollup of motor_alerts)';
+COMMENT ON TABLE motor_alert_spill_checkpoints IS 'Spill log position each alert processor has replayed up to';
+COMMENT ON TABLE motor_readings_1m IS 'Count, min, max, mean and last value of raw sensor readings per motor and minute';
+COMMENT ON TABLE motor_readings_1h IS 'Count, min, max, mean and last value of raw sensor readings per motor and hour';
+
+-- Create a view for recent alerts (last 24 hours). The timestamp filter lets
+-- PostgreSQL skip every partition older than a day.
 CREATE OR REPLACE VIEW recent_alerts AS
 SELECT 
     id,
@@ -89,6 +204,12 @@ COMMENT ON VIEW alert_summary IS 'Summary statistics for alerts grouped by motor
 -- Display table information
 \d motor_alerts;
 
+-- Show the partitions
+SELECT inhrelid::regclass AS partition
+FROM pg_inherits
+WHERE inhparent = 'motor_alerts'::regclass
+ORDER BY 1;
+
 -- Show the created indexes
 SELECT 
     indexname,
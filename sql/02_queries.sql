@@ -44,24 +44,28 @@ LIMIT 5;
 -- This query returns daily alert counts per motor between two dates
 -- Replace ':start' and ':end' with actual date values when executing
 -- Returns: motor_id, alert_date, count
+--
+-- Counts come from the motor_alert_daily_counts rollup, which the processor
+-- updates as it inserts alerts, so the cost grows with days x motors rather
+-- than with the number of alerts.
 
 SELECT 
     motor_id,
-    DATE(timestamp) as alert_date,
-    COUNT(*) as count
-FROM motor_alerts
-WHERE DATE(timestamp) BETWEEN :start AND :end
-GROUP BY motor_id, DATE(timestamp)
+    day as alert_date,
+    SUM(count)::bigint as count
+FROM motor_alert_daily_counts
+WHERE day BETWEEN :start AND :end
+GROUP BY motor_id, day
 ORDER BY alert_date DESC, motor_id;
 
 -- Example usage:
 -- SELECT 
 --     motor_id,
---     DATE(timestamp) as alert_date,
---     COUNT(*) as count
--- FROM motor_alerts
--- WHERE DATE(timestamp) BETWEEN '2025-07-01' AND '2025-07-31'
--- GROUP BY motor_id, DATE(timestamp)
+--     day as alert_date,
+--     SUM(count)::bigint as count
+-- FROM motor_alert_daily_counts
+-- WHERE day BETWEEN '2025-07-01' AND '2025-07-31'
+-- GROUP BY motor_id, day
 -- ORDER BY alert_date DESC, motor_id;
 
 -- ============================================================================
@@ -150,6 +154,20 @@ ORDER BY
     END,
     total_alerts DESC;
 
+-- Query 9: Alert history of a motor, one page of 50 at a time (newest first)
+-- :lastTimestamp and :lastId are those of the last row of the previous page;
+-- leave out both conditions on them for the first page. Unlike OFFSET, a
+-- page starts right at that row in idx_motor_alerts_by_motor, so deep
+-- pages cost the same as the first one. The plain timestamp bound lets the
+-- planner skip newer partitions.
+SELECT id, motor_id, sensor_type, timestamp, value, alert_type, created_at
+FROM motor_alerts
+WHERE motor_id = :motorId
+  AND timestamp <= :lastTimestamp
+  AND (timestamp, id) < (:lastTimestamp, :lastId)
+ORDER BY timestamp DESC, id DESC
+LIMIT 50;
+
 -- ============================================================================
 -- Performance Testing Queries
 -- ============================================================================
@@ -46,6 +46,16 @@ INSERT INTO motor_alerts (motor_id, sensor_type, timestamp, value, alert_type) V
 ('MTR-02', 'temperature', '2025-07-24 12:15:00+00', 90.2, 'high_temperature'),
 ('MTR-03', 'vibration', '2025-07-24 15:30:00+00', 3.0, 'high_vibration');
 
+-- Rebuild the daily-count rollup from motor_alerts (the processor maintains it
+-- for alerts it inserts; rows loaded directly need this step)
+DELETE FROM motor_alert_daily_counts;
+INSERT INTO motor_alert_daily_counts
+    (motor_id, day, sensor_type, alert_type, count, value_sum, value_min, value_max, first_at, last_at)
+SELECT motor_id, timestamp::date, sensor_type, alert_type, COUNT(*),
+    SUM(value), MIN(value), MAX(value), MIN(timestamp), MAX(timestamp)
+FROM motor_alerts
+GROUP BY motor_id, timestamp::date, sensor_type, alert_type;
+
 -- Display inserted data summary
 SELECT 
     'Total alerts inserted' as description,